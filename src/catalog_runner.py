@@ -0,0 +1,239 @@
+"""
+Catalog Runner: elaborazione di un catalogo di corsi.
+
+Un catalogo è una directory che contiene più corsi, ciascuno strutturato come
+di consueto (capitoli con file VTT/PDF/HTML). I corsi vengono elaborati in
+parallelo da un numero limitato di thread; le risorse costose (pool di
+estrazione, writer, rate limiter) sono condivise tra i corsi dal chiamante.
+Al termine viene prodotto un report complessivo del catalogo.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from .markdown_formatter import MarkdownFormatter
+from .output_writer import WriteBehindWriter, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+CATALOG_REPORT_FILENAME = "catalog_report.md"
+
+
+@dataclass
+class CourseReport:
+    """Esito dell'elaborazione di un corso."""
+    course_name: str
+    course_dir: Path
+    output_dir: Optional[Path] = None
+    index_file: Optional[Path] = None
+    lessons_processed: int = 0
+    lessons_failed: int = 0
+    total_tokens: int = 0
+    processing_time_s: float = 0.0
+    error: Optional[str] = None # Errore che ha interrotto l'elaborazione del corso
+    shared_materials: int = 0 # Allegati identici in più lezioni, riassunti una sola volta
+    shared_material_reuses: int = 0 # Estrazioni e riassunti di allegati evitati
+    shared_material_tokens_saved: int = 0 # Stima dei token risparmiati
+
+    @property
+    def succeeded(self) -> bool:
+        """True se il corso è stato elaborato senza errori né lezioni fallite."""
+        return self.error is None and self.lessons_failed == 0
+
+
+def _is_course_dir(path: Path) -> bool:
+    """Un corso contiene almeno una directory di capitolo con un file VTT."""
+    for chapter_dir in path.iterdir():
+        if chapter_dir.is_dir() and not chapter_dir.name.startswith('.'):
+            if any(f.suffix.lower() == ".vtt" for f in chapter_dir.iterdir() if f.is_file()):
+                return True
+    return False
+
+
+def discover_courses(catalog_dir: Union[str, Path]) -> List[Path]:
+    """
+    Individua i corsi contenuti in una directory di catalogo.
+
+    Args:
+        catalog_dir (Union[str, Path]): Directory del catalogo.
+
+    Returns:
+        List[Path]: Directory dei corsi, ordinate per nome. Le directory nascoste
+                    e quelle senza capitoli con file VTT (es. output precedenti) sono escluse.
+
+    Raises:
+        ValueError: Se la directory del catalogo non esiste.
+    """
+    catalog_path = Path(catalog_dir)
+    if not catalog_path.is_dir():
+        raise ValueError(f"La directory del catalogo '{catalog_dir}' non esiste o non è una directory.")
+
+    courses = []
+    for path in sorted(catalog_path.iterdir(), key=lambda p: p.name):
+        if not path.is_dir() or path.name.startswith('.'):
+            continue
+        try:
+            if _is_course_dir(path):
+                courses.append(path)
+            else:
+                logger.info(f"Directory '{path.name}' ignorata: nessun capitolo con file VTT.")
+        except OSError as e:
+            logger.warning(f"Impossibile leggere la directory '{path}': {e}")
+    logger.info(f"Trovati {len(courses)} corsi nel catalogo '{catalog_path}'.")
+    return courses
+
+
+def run_catalog(
+    course_dirs: Sequence[Path],
+    process_course_fn: Callable[[Path], CourseReport],
+    max_parallel_courses: int = 2
+) -> List[CourseReport]:
+    """
+    Elabora i corsi del catalogo in parallelo.
+
+    Args:
+        course_dirs (Sequence[Path]): Directory dei corsi da elaborare.
+        process_course_fn (Callable[[Path], CourseReport]): Funzione che elabora un corso.
+        max_parallel_courses (int): Numero massimo di corsi elaborati contemporaneamente.
+
+    Returns:
+        List[CourseReport]: Un report per corso, nello stesso ordine di course_dirs.
+                            Un corso che solleva un'eccezione ha un report con l'errore.
+    """
+    if max_parallel_courses < 1:
+        raise ValueError(f"Il numero di corsi in parallelo deve essere almeno 1 (ricevuto {max_parallel_courses}).")
+    if not course_dirs:
+        return []
+
+    def run_one(course_dir: Path) -> CourseReport:
+        start_time = time.time()
+        try:
+            return process_course_fn(course_dir)
+        except Exception as e:
+            logger.error(f"Errore imprevisto durante l'elaborazione del corso '{course_dir.name}': {e}", exc_info=True)
+            return CourseReport(
+                course_name=course_dir.name,
+                course_dir=course_dir,
+                processing_time_s=time.time() - start_time,
+                error=str(e)
+            )
+
+    workers = min(max_parallel_courses, len(course_dirs))
+    logger.info(f"Elaborazione di {len(course_dirs)} corsi con {workers} corsi in parallelo.")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalog-course") as executor:
+        return list(executor.map(run_one, course_dirs))
+
+
+def render_catalog_report(
+    formatter: MarkdownFormatter,
+    catalog_name: str,
+    reports: Sequence[CourseReport],
+    output_root: Path,
+    total_time_s: float,
+    rate_limiter_stats: Optional[Dict[str, float]] = None
+) -> str:
+    """
+    Genera il contenuto Markdown del report del catalogo.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        catalog_name (str): Nome del catalogo.
+        reports (Sequence[CourseReport]): Report dei corsi elaborati.
+        output_root (Path): Directory in cui viene scritto il report (per i link relativi).
+        total_time_s (float): Durata complessiva dell'elaborazione del catalogo.
+        rate_limiter_stats (Optional[Dict[str, float]]): Statistiche del rate limiter condiviso.
+
+    Returns:
+        str: Il report in formato Markdown.
+    """
+    content = []
+    content.append(formatter.format_header(f"Report del Catalogo: {catalog_name}", level=1))
+    content.append(formatter.new_line())
+    content.append(formatter.format_list_item(f"Corsi elaborati: {len(reports)}"))
+    content.append(formatter.format_list_item(f"Corsi con errori o lezioni fallite: {sum(1 for r in reports if not r.succeeded)}"))
+    content.append(formatter.format_list_item(f"Lezioni elaborate: {sum(r.lessons_processed for r in reports)}"))
+    content.append(formatter.format_list_item(f"Lezioni fallite: {sum(r.lessons_failed for r in reports)}"))
+    content.append(formatter.format_list_item(f"Token totali utilizzati: {sum(r.total_tokens for r in reports)}"))
+    content.append(formatter.format_list_item(f"Tempo totale: {total_time_s:.2f} s"))
+    if rate_limiter_stats:
+        content.append(formatter.format_list_item(
+            f"Richieste all'API: {rate_limiter_stats.get('requests', 0)} "
+            f"(massimo in parallelo: {rate_limiter_stats.get('max_in_flight', 0)}, "
+            f"attesa complessiva: {rate_limiter_stats.get('wait_seconds', 0.0):.2f} s)"
+        ))
+        if "concurrency_limit" in rate_limiter_stats:
+            content.append(formatter.format_list_item(
+                f"Limite adattivo di richieste contemporanee: {rate_limiter_stats['concurrency_limit']} "
+                f"(massimo raggiunto: {rate_limiter_stats.get('peak_concurrency_limit', 0)}, "
+                f"errori 429: {rate_limiter_stats.get('rate_limited', 0)}, "
+                f"riduzioni: {rate_limiter_stats.get('limit_decreases', 0)})"
+            ))
+    content.append(formatter.new_line())
+    content.append(formatter.format_header("Corsi", level=2))
+    content.append(formatter.new_line())
+    content.append("| Corso | Lezioni | Fallite | Token | Tempo (s) | Esito |")
+    content.append("|---|---|---|---|---|---|")
+    for report in reports:
+        course_label = report.course_name.replace("|", "\\|")
+        if report.index_file is not None:
+            try:
+                course_label = formatter.format_link(course_label, report.index_file.relative_to(output_root).as_posix())
+            except ValueError:
+                course_label = formatter.format_link(course_label, report.index_file.resolve().as_uri())
+        if report.error:
+            outcome = f"Errore: {report.error}".replace("|", "\\|").replace("\n", " ")
+        elif report.lessons_failed:
+            outcome = "Incompleto"
+        else:
+            outcome = "OK"
+        content.append(
+            f"| {course_label} | {report.lessons_processed} | {report.lessons_failed} | "
+            f"{report.total_tokens} | {report.processing_time_s:.2f} | {outcome} |"
+        )
+    content.append(formatter.new_line())
+    content.append(formatter.horizontal_rule())
+    content.append(formatter.new_line())
+    content.append(f"*Report generato per il catalogo '{catalog_name}'.*")
+    return "\n".join(content)
+
+
+def write_catalog_report(
+    formatter: MarkdownFormatter,
+    catalog_name: str,
+    reports: Sequence[CourseReport],
+    output_root: Path,
+    total_time_s: float,
+    rate_limiter_stats: Optional[Dict[str, float]] = None,
+    writer: Optional[WriteBehindWriter] = None
+) -> Optional[Path]:
+    """
+    Scrive il report del catalogo (catalog_report.md) nella directory di output.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        catalog_name (str): Nome del catalogo.
+        reports (Sequence[CourseReport]): Report dei corsi elaborati.
+        output_root (Path): Directory in cui scrivere il report.
+        total_time_s (float): Durata complessiva dell'elaborazione del catalogo.
+        rate_limiter_stats (Optional[Dict[str, float]]): Statistiche del rate limiter condiviso.
+        writer (Optional[WriteBehindWriter]): Writer asincrono. Se None, il file viene
+                                              scritto atomicamente nel thread chiamante.
+
+    Returns:
+        Optional[Path]: Percorso del report, o None in caso di errore.
+    """
+    report_path = Path(output_root) / CATALOG_REPORT_FILENAME
+    content = render_catalog_report(formatter, catalog_name, reports, Path(output_root), total_time_s, rate_limiter_stats)
+    try:
+        if writer is not None:
+            writer.submit(report_path, content)
+        else:
+            write_text_atomic(report_path, content)
+        logger.info(f"Report del catalogo creato: {report_path}")
+        return report_path
+    except OSError as e:
+        logger.error(f"Errore di I/O durante la scrittura del report del catalogo '{report_path}': {e}")
+        return None
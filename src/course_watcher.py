@@ -0,0 +1,259 @@
+"""
+Course Watcher: monitoraggio dei file di un corso in fase di download.
+
+Questo modulo fornisce la classe CourseWatcher, che osserva la directory di un
+corso e dei suoi capitoli e restituisce i file modificati raggruppando le
+raffiche di eventi (debounce): i file scaricati nello stesso momento vengono
+elaborati insieme, e solo quando la directory è rimasta ferma per un intervallo.
+
+Su Linux viene usato inotify (tramite ctypes, senza dipendenze esterne); se non
+è disponibile, si ricade su un confronto periodico di dimensione e data di
+modifica dei file.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Costanti di inotify (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+_READ_SIZE = 64 * 1024
+
+
+def _is_hidden(name: str) -> bool:
+    """I file nascosti (es. download parziali '.part' o file temporanei) vengono ignorati."""
+    return name.startswith('.')
+
+
+class _PollingBackend:
+    """Rileva le modifiche confrontando periodicamente dimensione e mtime dei file."""
+
+    def __init__(self, root: Path, poll_interval: float):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot: Dict[Path, Tuple[int, int]] = {}
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError as e:
+            logger.warning(f"Impossibile leggere la directory '{self.root}': {e}")
+            return snapshot
+        for entry in entries:
+            if _is_hidden(entry.name) or not entry.is_dir():
+                continue
+            try:
+                for child in os.scandir(entry.path):
+                    if _is_hidden(child.name) or not child.is_file():
+                        continue
+                    stat = child.stat()
+                    snapshot[Path(child.path)] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue # Capitolo rimosso o non leggibile durante la scansione
+        return snapshot
+
+    def poll(self, timeout: float) -> Set[Path]:
+        time.sleep(max(0.0, min(timeout, self.poll_interval)))
+        snapshot = self._scan()
+        previous = self._snapshot
+        self._snapshot = snapshot
+        changed = {path for path, state in snapshot.items() if previous.get(path) != state}
+        changed.update(path for path in previous if path not in snapshot)
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifyBackend:
+    """Rileva le modifiche con inotify sulla directory del corso e dei capitoli."""
+
+    def __init__(self, root: Path):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.root = root
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 fallita: {os.strerror(errno)}")
+        self._watches: Dict[int, Path] = {}
+        try:
+            self._add_watch(root)
+            for entry in os.scandir(root):
+                if entry.is_dir() and not _is_hidden(entry.name):
+                    self._add_watch(Path(entry.path))
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch fallita per '{directory}': {os.strerror(errno)}")
+        self._watches[wd] = directory
+
+    def poll(self, timeout: float) -> Set[Path]:
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return set()
+
+        changed: Set[Path] = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_length].split(b"\0", 1)[0].decode("utf-8", "surrogateescape")
+            offset += name_length
+
+            if mask & _IN_Q_OVERFLOW:
+                logger.warning("Coda inotify piena: alcuni eventi sono andati persi, viene segnalata l'intera directory del corso.")
+                changed.add(self.root)
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name or _is_hidden(name):
+                continue
+
+            path = directory / name
+            if mask & _IN_ISDIR:
+                if directory == self.root and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # Nuovo capitolo: lo si osserva e si segnalano i file già presenti
+                    try:
+                        self._add_watch(path)
+                        changed.update(child for child in path.iterdir() if child.is_file() and not _is_hidden(child.name))
+                    except OSError as e:
+                        logger.warning(f"Impossibile osservare il nuovo capitolo '{path}': {e}")
+                changed.add(path)
+            elif directory != self.root:
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class CourseWatcher:
+    """
+    Osserva la directory di un corso e restituisce i file modificati, a raffiche.
+
+    Vengono osservati i file dei capitoli (un livello sotto la directory del corso)
+    e la comparsa di nuovi capitoli. I file nascosti vengono ignorati.
+    """
+
+    def __init__(
+        self,
+        course_dir: Union[str, Path],
+        debounce_seconds: float = 5.0,
+        poll_interval: float = 2.0,
+        use_inotify: bool = True
+    ):
+        """
+        Inizializza il watcher e avvia il monitoraggio.
+
+        Args:
+            course_dir (Union[str, Path]): Directory del corso da osservare.
+            debounce_seconds (float): Secondi senza nuovi eventi dopo i quali una
+                raffica di modifiche viene considerata conclusa.
+            poll_interval (float): Intervallo di scansione del backend a polling.
+            use_inotify (bool): Se False, usa sempre il backend a polling.
+        """
+        self.course_dir = Path(course_dir)
+        if not self.course_dir.is_dir():
+            raise ValueError(f"La directory del corso '{course_dir}' non esiste o non è una directory.")
+        if debounce_seconds < 0:
+            raise ValueError(f"Il debounce non può essere negativo (ricevuto {debounce_seconds}).")
+        self.debounce_seconds = debounce_seconds
+
+        self._backend: Union[_InotifyBackend, _PollingBackend]
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._backend = _InotifyBackend(self.course_dir)
+                logger.info(f"Monitoraggio di '{self.course_dir}' tramite inotify.")
+                return
+            except (OSError, AttributeError) as e: # AttributeError: libc senza inotify
+                logger.warning(f"inotify non disponibile ({e}): uso il polling ogni {poll_interval}s.")
+        self._backend = _PollingBackend(self.course_dir, poll_interval)
+        logger.info(f"Monitoraggio di '{self.course_dir}' tramite polling ogni {poll_interval}s.")
+
+    @property
+    def backend_name(self) -> str:
+        """Nome del backend in uso ("inotify" o "polling")."""
+        return "inotify" if isinstance(self._backend, _InotifyBackend) else "polling"
+
+    def wait_for_changes(self, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        Attende una raffica di modifiche e restituisce i file coinvolti.
+
+        La raffica termina quando per debounce_seconds non arrivano nuovi eventi.
+
+        Args:
+            timeout (Optional[float]): Secondi massimi di attesa del primo evento.
+                None attende indefinitamente.
+
+        Returns:
+            Set[Path]: File (o capitoli) modificati, creati o rimossi. Vuoto se il
+                       timeout scade senza modifiche. Contiene la directory del corso
+                       se alcuni eventi sono andati persi ed è necessaria una scansione completa.
+        """
+        pending: Set[Path] = set()
+        wait_deadline = None if timeout is None else time.monotonic() + timeout
+        quiet_deadline = 0.0
+        while True:
+            now = time.monotonic()
+            if pending:
+                if now >= quiet_deadline:
+                    return pending
+                wait = quiet_deadline - now
+            elif wait_deadline is not None:
+                if now >= wait_deadline:
+                    return pending
+                wait = wait_deadline - now
+            else:
+                wait = 60.0
+
+            changed = self._backend.poll(wait)
+            if changed:
+                pending.update(changed)
+                quiet_deadline = time.monotonic() + self.debounce_seconds
+
+    def close(self) -> None:
+        """Arresta il monitoraggio."""
+        self._backend.close()
+
+    def __enter__(self) -> "CourseWatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,185 @@
+"""
+Extraction Cache: cache persistente del testo estratto da VTT, PDF e HTML.
+
+Il parsing dei file di una lezione (in particolare dei PDF) è la parte più lenta
+della fase di estrazione. La cache conserva su disco, compresso, il testo (e per
+gli HTML l'elenco delle immagini) estratto da ogni file, così che le esecuzioni
+successive sullo stesso corso non debbano ripetere il parsing.
+
+Ogni voce è indicizzata su due livelli:
+
+1. percorso, dimensione e data di modifica del file (nessuna lettura del file);
+2. hash SHA-256 del contenuto, calcolato solo se il primo livello non trova nulla:
+   un file copiato, spostato o solo "toccato" riutilizza l'estrazione esistente.
+
+Entrambe le chiavi includono la versione dell'estrattore (EXTRACTOR_VERSIONS):
+incrementandola, le estrazioni prodotte dalla versione precedente vengono ignorate.
+Le voci sono file indipendenti scritti atomicamente, quindi la cache può essere
+usata contemporaneamente da più processi (il pool di estrazione di LessonPipeline).
+Una voce illeggibile o corrotta è trattata come assente.
+"""
+import hashlib
+import json
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .output_writer import temp_path_for
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_DIRNAME = ".resume_extraction_cache"
+
+# Versione di ciascun estrattore: va incrementata quando cambia il testo che produce
+EXTRACTOR_VERSIONS: Dict[str, int] = {"vtt": 1, "pdf": 2, "html": 2}
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+_COMPRESSION_LEVEL = 6
+
+
+class UncacheableExtractionError(ValueError):
+    """
+    Il file non è leggibile (es. un PDF protetto o danneggiato): l'estrazione non va memorizzata.
+
+    Chi la riceve tratta il file come privo di testo, come l'estrattore senza cache.
+    """
+
+Extraction = Tuple[str, List[Dict[str, str]]]
+
+
+def _make_key(*parts: object) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def file_content_hash(path: Path) -> str:
+    """
+    Calcola l'hash SHA-256 del contenuto di un file, leggendolo a blocchi.
+
+    Args:
+        path (Path): Percorso del file.
+
+    Returns:
+        str: Hash esadecimale del contenuto.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Cache su disco delle estrazioni di testo, indicizzata per file e versione dell'estrattore.
+
+    L'istanza contiene solo il percorso della cache e dei contatori, quindi può essere
+    passata ai processi di estrazione insieme ai job delle lezioni.
+    """
+
+    def __init__(self, directory: Path):
+        """
+        Inizializza la cache.
+
+        Args:
+            directory (Path): Directory della cache (creata alla prima scrittura).
+        """
+        self.directory = Path(directory)
+        self.hits = 0 # Estrazioni riutilizzate da questo processo
+        self.misses = 0 # Estrazioni eseguite (e memorizzate) da questo processo
+
+    def _stat_path(self, key: str) -> Path:
+        return self.directory / "stat" / key[:2] / key
+
+    def _data_path(self, key: str) -> Path:
+        return self.directory / "data" / key[:2] / f"{key}.json.z"
+
+    def _write(self, path: Path, payload: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = temp_path_for(path)
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                temp_path.unlink()
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _load(self, content_key: str) -> Optional[Extraction]:
+        try:
+            data = json.loads(zlib.decompress(self._data_path(content_key).read_bytes()).decode("utf-8"))
+            return data["text"], data["images"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, zlib.error) as e:
+            logger.debug(f"Voce della cache di estrazione illeggibile ({content_key}): {e}")
+            return None
+
+    def get_or_extract(self, file_path: Path, kind: str, extract: Callable[[Path], Extraction]) -> Extraction:
+        """
+        Restituisce l'estrazione di un file dalla cache, eseguendo l'estrattore se assente.
+
+        Le eccezioni dell'estrattore vengono propagate e il risultato non viene memorizzato;
+        un errore di scrittura della cache viene solo registrato nel log.
+
+        Args:
+            file_path (Path): Il file da estrarre.
+            kind (str): Tipo di estrattore ("vtt", "pdf", "html"; vedi EXTRACTOR_VERSIONS).
+            extract (Callable[[Path], Extraction]): Estrattore: restituisce testo e immagini.
+
+        Returns:
+            Extraction: Il testo e l'elenco delle immagini (vuoto per VTT e PDF).
+        """
+        version = EXTRACTOR_VERSIONS.get(kind, 0)
+        try:
+            stat = file_path.stat()
+            stat_key = _make_key(kind, version, file_path.resolve(), stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return extract(file_path) # Lascia all'estrattore la segnalazione del file mancante
+
+        stat_path = self._stat_path(stat_key)
+        content_key: Optional[str] = None
+        try:
+            content_key = stat_path.read_text(encoding="utf-8").strip()
+        except (OSError, UnicodeDecodeError):
+            pass
+        cached = self._load(content_key) if content_key else None
+        indexed = cached is not None
+
+        if cached is None:
+            try:
+                content_key = _make_key(kind, version, file_content_hash(file_path))
+            except OSError:
+                return extract(file_path)
+            cached = self._load(content_key)
+
+        if cached is not None:
+            self.hits += 1
+            logger.debug(f"Estrazione di '{file_path.name}' ripresa dalla cache.")
+            result = cached
+        else:
+            self.misses += 1
+            result = extract(file_path)
+            text, images = result
+            payload = json.dumps({"text": text, "images": images}, ensure_ascii=False).encode("utf-8")
+            try:
+                self._write(self._data_path(content_key), zlib.compress(payload, _COMPRESSION_LEVEL))
+            except OSError as e:
+                logger.warning(f"Impossibile salvare l'estrazione di '{file_path.name}' nella cache: {e}")
+                return result
+
+        if indexed:
+            return result
+        try:
+            self._write(stat_path, content_key.encode("utf-8"))
+        except OSError as e:
+            logger.debug(f"Impossibile aggiornare l'indice della cache di estrazione per '{file_path.name}': {e}")
+        return result
@@ -1,33 +1,182 @@
-from bs4 import BeautifulSoup
+"""
+HTML Parser: estrazione del contenuto principale dalle risorse HTML.
+
+Oltre ai tag che non sono mai contenuto (script, style, nav, ...), le pagine
+salvate dal web contengono banner dei cookie, barre laterali fatte di div,
+elenchi di articoli correlati e sezioni dei commenti. Sull'unico albero
+prodotto da BeautifulSoup, in modo simile a Readability:
+
+1. vengono rimossi i blocchi nascosti, quelli con ruolo, classe o id tipici del
+   contorno della pagina e i contenitori composti soprattutto da link, purché
+   non contengano la maggior parte del testo della pagina;
+2. i blocchi di testo abbastanza lunghi danno un punteggio al contenitore padre
+   (e metà al nonno), ridotto in proporzione alla densità di link: il
+   contenitore migliore, con i fratelli di punteggio paragonabile e i titoli,
+   è il contenuto principale;
+3. testo e immagini vengono estratti solo dal contenuto principale. Se nessun
+   blocco è abbastanza lungo (pagine brevi) viene conservato tutto il testo
+   rimasto.
+"""
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+NON_CONTENT_TAGS = ['script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript', 'template', 'iframe', 'button']
+TEXT_BLOCK_TAGS = ('p', 'pre', 'td', 'blockquote', 'li') # Blocchi che danno punteggio al contenitore
+LINK_LIST_TAGS = ('div', 'section', 'ul', 'ol', 'table', 'form', 'dl') # Rimossi se composti soprattutto da link
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+# Solo i contenitori di blocco possono essere contorno: gli elementi in linea (span, a, ...)
+# fanno parte del testo che li circonda, e il codice non viene mai toccato
+BOILERPLATE_BLOCK_TAGS = LINK_LIST_TAGS + ('aside', 'nav', 'header', 'footer', 'figure', 'dialog', 'details')
+CODE_TAGS = ('pre', 'code')
+MIN_BLOCK_CHARS = 25 # Blocchi più corti non contribuiscono al punteggio
+LINK_DENSITY_THRESHOLD = 0.5 # Frazione massima di testo nei link per un blocco di contenuto
+MAX_BOILERPLATE_SHARE = 0.5 # Un blocco con più di questa frazione del testo della pagina non è contorno
+SIBLING_SCORE_RATIO = 0.2 # Fratelli del contenitore migliore conservati (in proporzione al suo punteggio)
+MIN_SIBLING_SCORE = 10
+MIN_SIBLING_PARAGRAPH_CHARS = 80 # Paragrafi fratelli conservati anche senza punteggio
+
+_BOILERPLATE_HINTS = re.compile(
+    r"cookies?|consent|gdpr|banner|comments?|disqus|related|sidebar|share|sharing|social|newsletter|subscribe|"
+    r"promo|ads?|advert\w*|sponsor\w*|breadcrumbs?|popup|modal|menu|widgets?|footer|masthead"
+)
+_BOILERPLATE_ROLES = frozenset({"navigation", "complementary", "banner", "contentinfo", "dialog", "alertdialog", "menu", "menubar"})
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+_TOKEN_SEPARATOR = re.compile(r"[^a-z0-9]+")
+
+
+def _text_length(element) -> int:
+    return sum(len(text) for text in element.stripped_strings)
+
+
+def _link_density(element) -> float:
+    """Frazione del testo di un elemento che si trova dentro i link."""
+    length = _text_length(element)
+    if not length:
+        return 0.0
+    return sum(_text_length(link) for link in element.find_all('a')) / length
+
+
+def _has_boilerplate_hint(element) -> bool:
+    """Vero se ruolo, classe o id dell'elemento sono tipici del contorno della pagina (cookie, commenti, ...)."""
+    if (element.get('role') or '').lower() in _BOILERPLATE_ROLES:
+        return True
+    names = " ".join(element.get('class') or []) + " " + (element.get('id') or '')
+    return any(_BOILERPLATE_HINTS.fullmatch(token) for token in _TOKEN_SEPARATOR.split(names.lower()) if token)
+
+
+def _is_hidden(element) -> bool:
+    return (element.has_attr('hidden') or (element.get('aria-hidden') or '').lower() == 'true'
+            or bool(_HIDDEN_STYLE.search(element.get('style') or '')))
+
+
+def _remove_boilerplate(soup) -> int:
+    """
+    Rimuove i blocchi di contorno: nascosti, con indizi in ruolo/classe/id o composti soprattutto da link.
+
+    Vengono considerati solo i contenitori di blocco (BOILERPLATE_BLOCK_TAGS) fuori da
+    pre/code: le classi dell'evidenziazione della sintassi (es. "token comment") e gli
+    span in linea di un paragrafo restano nel testo.
+
+    Returns:
+        int: Il numero di blocchi rimossi.
+    """
+    total_length = _text_length(soup)
+    removed = 0
+    for element in soup.find_all(True):
+        if element.decomposed or element.name not in BOILERPLATE_BLOCK_TAGS or element.find_parent(CODE_TAGS):
+            continue
+        is_boilerplate = (_is_hidden(element) or _has_boilerplate_hint(element)
+                          or (element.name in LINK_LIST_TAGS and _link_density(element) > LINK_DENSITY_THRESHOLD))
+        # Un blocco con la maggior parte del testo è il contenuto (es. un wrapper "has-sidebar"), non il contorno
+        if is_boilerplate and _text_length(element) <= MAX_BOILERPLATE_SHARE * total_length:
+            element.decompose()
+            removed += 1
+    return removed
+
+
+def _is_text_block(element) -> bool:
+    """Paragrafi, voci di elenco, celle e div che contengono solo testo e tag in linea."""
+    if element.name in TEXT_BLOCK_TAGS:
+        return True
+    return element.name == 'div' and element.find(TEXT_BLOCK_TAGS + LINK_LIST_TAGS + HEADING_TAGS) is None
+
+
+def _find_main_content(soup) -> list:
+    """
+    Individua il contenuto principale in base alla densità di testo e di link dei blocchi.
+
+    Returns:
+        list: Gli elementi (in ordine di documento) che compongono il contenuto
+              principale, oppure [soup] se nessun blocco è abbastanza lungo.
+    """
+    scores = {} # id(elemento) -> (elemento, punteggio)
+    for block in soup.find_all(_is_text_block):
+        text = " ".join(block.stripped_strings)
+        length = len(text) - sum(_text_length(link) for link in block.find_all('a'))
+        if length < MIN_BLOCK_CHARS:
+            continue
+        score = 1 + text.count(',') + min(length // 100, 3)
+        for ancestor, weight in ((block.parent, 1.0), (block.parent.parent if block.parent else None, 0.5)):
+            if ancestor is None or ancestor is soup:
+                continue
+            _, previous = scores.get(id(ancestor), (ancestor, 0.0))
+            scores[id(ancestor)] = (ancestor, previous + score * weight)
+    if not scores:
+        return [soup]
+
+    final_scores = {key: score * (1 - _link_density(element)) for key, (element, score) in scores.items()}
+    best_key = max(final_scores, key=final_scores.get)
+    best = scores[best_key][0]
+    if best.name in ('html', 'body'):
+        return [soup]
+
+    threshold = max(MIN_SIBLING_SCORE, final_scores[best_key] * SIBLING_SCORE_RATIO)
+    content = []
+    for sibling in best.parent.find_all(True, recursive=False):
+        if sibling is best or sibling.name in HEADING_TAGS or final_scores.get(id(sibling), 0) >= threshold:
+            content.append(sibling)
+        elif (sibling.name == 'p' and _text_length(sibling) >= MIN_SIBLING_PARAGRAPH_CHARS
+              and _link_density(sibling) < LINK_DENSITY_THRESHOLD / 2):
+            content.append(sibling)
+    return content
+
+
 def extract_text_and_images_from_html(html_content: str) -> tuple[str, list[dict[str, str]]]:
-    """Estrae testo pulito e informazioni sulle immagini da contenuto HTML.
+    """Estrae il testo del contenuto principale e le sue immagini da contenuto HTML.
+
+    Il contorno della pagina (banner dei cookie, barre laterali, articoli
+    correlati, commenti, ...) viene scartato insieme alle immagini che contiene.
 
     Args:
         html_content: Stringa contenente l'HTML da processare.
 
     Returns:
         Una tupla contenente:
-            - Il testo estratto dall'HTML, con elementi non rilevanti rimossi.
-            - Una lista di dizionari, ognuno rappresentante un'immagine 
-              (con chiavi 'src' e 'alt').
+            - Il testo del contenuto principale dell'HTML.
+            - Una lista di dizionari, ognuno rappresentante un'immagine del
+              contenuto principale (con chiavi 'src' e 'alt').
     """
+    from bs4 import BeautifulSoup # Importato al primo utilizzo: costoso e non necessario per i corsi senza HTML
+
     soup = BeautifulSoup(html_content, 'html.parser')
 
-    # Rimuove script, style, nav, footer, header (elementi comuni non di contenuto)
-    for element_type in ['script', 'style', 'nav', 'footer', 'header', 'aside']:
+    # Rimuove gli elementi che non sono mai contenuto
+    for element_type in NON_CONTENT_TAGS:
         for element in soup.find_all(element_type):
             element.decompose()
 
-    # Estrae tutto il testo rimanente
-    text_parts = [text for text in soup.stripped_strings]
+    removed_blocks = _remove_boilerplate(soup)
+    content = _find_main_content(soup)
+
+    text_parts = [text for element in content for text in element.stripped_strings]
     extracted_text = "\n".join(text_parts)
+    logger.debug(f"HTML: rimossi {removed_blocks} blocchi di contorno, contenuto principale di {len(extracted_text)} caratteri "
+                 f"in {len(content)} elementi")
 
     images = []
-    for img_tag in soup.find_all('img'):
+    for img_tag in (img for element in content for img in element.find_all('img')):
         src = img_tag.get('src')
         alt = img_tag.get('alt', '') # Default a stringa vuota se alt non presente
         if src:
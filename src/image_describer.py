@@ -1,9 +1,14 @@
 import logging
 # import openai # Rimosso import diretto del modulo, useremo OpenAI client
-from openai import OpenAI, APIError # AGGIUNTO OpenAI e APIError
-from typing import Optional, Dict, Any # Aggiunto Any per LangfuseTracker
+from openai import OpenAI, APIError, APIConnectionError, InternalServerError, RateLimitError # AGGIUNTO OpenAI e APIError
+from typing import Optional, Dict, Any, Tuple # Aggiunto Any per LangfuseTracker
 import os
 import time
+from contextlib import nullcontext
+
+from .llm_backend import token_usage_from_response
+from .rate_limiter import client_max_retries, retry_delay_s
+from .singleflight import SingleFlight, request_fingerprint
 
 # Assumiamo che LangfuseTracker sia importabile se si trova nello stesso livello o in PYTHONPATH
 # from ..langfuse_tracker import LangfuseTracker # Esempio se fosse in un modulo genitore
@@ -11,31 +16,75 @@ import time
 
 logger = logging.getLogger(__name__)
 
+_description_flights = SingleFlight() # Descrizioni identiche in corso, condivise tra i thread
+
+# Tentativi fuori dallo slot del limitatore: con il limitatore adattivo i client non
+# ripetono da soli le richieste (vedi client_max_retries)
+MAX_ATTEMPTS = 3
+_RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
 class ImageDescriber:
-    def __init__(self, api_key: Optional[str] = None, langfuse_tracker: Optional[Any] = None): # Aggiunto langfuse_tracker
+    def __init__(self, api_key: Optional[str] = None, langfuse_tracker: Optional[Any] = None,
+                 rate_limiter: Optional[Any] = None, backend: Optional[Any] = None): # Aggiunto langfuse_tracker
         """Inizializza ImageDescriber.
 
         Args:
             api_key: La chiave API di OpenAI. Se non fornita, si assume che 
                      la variabile d'ambiente OPENAI_API_KEY sia impostata.
             langfuse_tracker: Istanza opzionale di LangfuseTracker.
+            rate_limiter: Istanza opzionale di RateLimiter, condivisa con le altre
+                          chiamate all'API (modalità catalogo).
+            backend: Istanza opzionale di LLMBackend (endpoint, modello, limite e prezzi).
+                     Se non fornita, si usa l'API di OpenAI con gpt-4o.
         """
         self.langfuse_tracker = langfuse_tracker # Memorizza il tracker
+        self.api_key = api_key
+        self.backend = backend
+        self._shared_rate_limiter = rate_limiter
+        self._route_clients: Dict[str, Any] = {} # Client dei backend scelti dall'instradamento
+        self.model = backend.model if backend is not None else "gpt-4o"
+        self.rate_limiter = backend.select_limiter(rate_limiter) if backend is not None else rate_limiter
+        client_options = self._client_options(self.rate_limiter)
         try:
-            if api_key:
-                self.client = OpenAI(api_key=api_key)
+            if backend is not None and backend.base_url:
+                self.client = OpenAI(api_key=backend.resolve_api_key(api_key), base_url=backend.base_url, **client_options)
+                logger.info(f"ImageDescriber inizializzato con l'endpoint '{backend.base_url}' (modello {self.model}).")
+                return
+            if backend is not None and backend.api_key:
+                self.client = OpenAI(api_key=backend.api_key, **client_options)
+            elif api_key:
+                self.client = OpenAI(api_key=api_key, **client_options)
             else:
-                self.client = OpenAI() # Si affiderà a OPENAI_API_KEY variabile d'ambiente
+                self.client = OpenAI(**client_options) # Si affiderà a OPENAI_API_KEY variabile d'ambiente
             logger.info("ImageDescriber inizializzato con client OpenAI.")
         except Exception as e:
             logger.error(f"Errore durante l'inizializzazione del client OpenAI in ImageDescriber: {e}")
             self.client = None # Segnala che il client non è utilizzabile
 
+    @staticmethod
+    def _client_options(rate_limiter: Optional[Any]) -> Dict[str, Any]:
+        """Opzioni del client OpenAI le cui chiamate passano da rate_limiter."""
+        max_retries = client_max_retries(rate_limiter)
+        return {"max_retries": max_retries} if max_retries is not None else {}
+
+    def _client_for_backend(self, backend: Any) -> Any:
+        """Client OpenAI per un backend diverso da quello dell'istanza (scelto dall'instradamento)."""
+        client = self._route_clients.get(backend.name)
+        if client is None:
+            client_options = self._client_options(backend.select_limiter(self._shared_rate_limiter))
+            if backend.base_url:
+                client = OpenAI(api_key=backend.resolve_api_key(self.api_key), base_url=backend.base_url, **client_options)
+            else:
+                client = OpenAI(api_key=backend.resolve_api_key(self.api_key), **client_options)
+            self._route_clients[backend.name] = client
+        return client
+
     def describe_image_url(self, image_url: str, detail: str = "high", 
                            # Parametri aggiuntivi per il tracciamento Langfuse
                            chapter_name: Optional[str] = None, 
                            lesson_name: Optional[str] = None,
-                           original_alt: Optional[str] = None) -> str:
+                           original_alt: Optional[str] = None,
+                           route: Optional[Any] = None) -> str:
         """Genera una descrizione per un'immagine fornita tramite URL.
         Traccia la chiamata con Langfuse se un tracker è fornito.
 
@@ -46,10 +95,42 @@ class ImageDescriber:
             chapter_name: Il nome del capitolo associato alla descrizione.
             lesson_name: Il nome dell'attività associata alla descrizione.
             original_alt: Il testo alternativo originale dell'immagine.
+            route: Decisione di instradamento opzionale (vedi describe_image_url_with_usage).
 
         Returns:
             Una stringa contenente la descrizione dell'immagine, o una stringa di errore.
         """
+        description, _ = self.describe_image_url_with_usage(
+            image_url,
+            detail=detail,
+            chapter_name=chapter_name,
+            lesson_name=lesson_name,
+            original_alt=original_alt,
+            route=route
+        )
+        return description
+
+    def describe_image_url_with_usage(self, image_url: str, detail: str = "high",
+                                      chapter_name: Optional[str] = None,
+                                      lesson_name: Optional[str] = None,
+                                      original_alt: Optional[str] = None,
+                                      route: Optional[Any] = None) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Come describe_image_url, ma restituisce anche l'utilizzo dei token.
+
+        Args:
+            image_url: L'URL dell'immagine da descrivere.
+            detail: Il livello di dettaglio per la descrizione ("low", "high", "auto").
+            chapter_name: Il nome del capitolo associato alla descrizione.
+            lesson_name: Il nome dell'attività associata alla descrizione.
+            original_alt: Il testo alternativo originale dell'immagine.
+            route: Decisione di instradamento opzionale (RouteDecision): se fornita, ne
+                   vengono usati backend, modello, max_tokens e livello di dettaglio.
+
+        Returns:
+            Una tupla (descrizione o stringa di errore, utilizzo dei token o None).
+        """
+        if route is not None and route.detail:
+            detail = route.detail
         logger.info(f"Richiesta descrizione per l'URL: {image_url} con dettaglio: {detail}")
         # TODO: Implementare la logica per scaricare l'immagine se l'URL è remoto
         #       e passarla al modello di visione, o passare direttamente l'URL se supportato.
@@ -58,9 +139,11 @@ class ImageDescriber:
         # Questa è una struttura Platzhalter e va sostituita con la chiamata API corretta
         # per i modelli di visione di OpenAI (GPT-4 con Vision).
 
-        if not self.client:
+        use_own_backend = route is None or route.backend is self.backend
+        client = self.client if use_own_backend else self._client_for_backend(route.backend)
+        if not client:
             logger.error("Client OpenAI non inizializzato correttamente in ImageDescriber.")
-            return "Errore: Client OpenAI non configurato."
+            return "Errore: Client OpenAI non configurato.", None
 
         # Definisci il prompt e i messaggi per l'API e per il tracciamento
         # Potremmo voler rendere il prompt testuale più configurabile in futuro
@@ -89,27 +172,51 @@ class ImageDescriber:
             "image_detail_level": detail,
             "original_alt_text": original_alt or "N/A"
         }
+        if route is not None:
+            langfuse_metadata_prompt["route"] = route.to_dict()
 
         start_time = time.time() # Per la latenza
         description = f"Errore sconosciuto nella descrizione dell'immagine: {image_url}" # Default in caso di fallimento imprevisto
         token_usage: Optional[Dict[str, int]] = None
         api_error: Optional[str] = None
-        model_used = "gpt-4o" # Modello che stiamo usando
+        model_used = route.model if route is not None else self.model # Modello del backend in uso (default gpt-4o)
+        max_tokens = route.max_tokens if route is not None and route.max_tokens else 700
+        cost_backend = route.backend if route is not None else self.backend
 
+        rate_limiter = self.rate_limiter if use_own_backend else route.backend.select_limiter(self._shared_rate_limiter)
+        def request_description():
+            for attempt in range(MAX_ATTEMPTS):
+                try:
+                    with rate_limiter if rate_limiter is not None else nullcontext():
+                        return client.chat.completions.create(
+                            model=model_used,
+                            messages=messages_for_llm, # type: ignore
+                            max_tokens=max_tokens
+                        )
+                except _RETRYABLE_ERRORS as e:
+                    if attempt == MAX_ATTEMPTS - 1:
+                        raise
+                    retry_delay = retry_delay_s(e, attempt)
+                    logger.warning(f"Descrizione di {image_url} non riuscita (tentativo {attempt + 1}/{MAX_ATTEMPTS}): {e}. Riprovo tra {retry_delay}s...")
+                    time.sleep(retry_delay) # Fuori dallo slot del limitatore
+
+        # La stessa immagine richiesta in contemporanea (es. in più pagine) viene descritta una sola volta
+        flight_key = request_fingerprint(
+            cost_backend.name if cost_backend is not None else None,
+            cost_backend.base_url if cost_backend is not None else None,
+            model_used, max_tokens, detail, image_url
+        )
         try:
-            response = self.client.chat.completions.create(
-                model=model_used,
-                messages=messages_for_llm, # type: ignore
-                max_tokens=700 
-            )
+            response, shared = _description_flights.do(flight_key, request_description)
             description = response.choices[0].message.content
-            if response.usage:
-                token_usage = {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
-            logger.info(f"Descrizione generata per {image_url}")
+            if shared:
+                # I token sono contabilizzati dalla richiesta effettivamente eseguita
+                langfuse_metadata_prompt["shared_request"] = True
+                logger.info(f"Descrizione condivisa con una richiesta identica già in corso per {image_url}")
+            else:
+                if response.usage:
+                    token_usage = token_usage_from_response(response.usage)
+                logger.info(f"Descrizione generata per {image_url}")
         
         except APIError as e:
             logger.error(f"Errore API OpenAI durante la descrizione dell'immagine {image_url}: {e}")
@@ -133,10 +240,11 @@ class ImageDescriber:
                 token_usage=token_usage,
                 latency_ms=latency_ms,
                 error=api_error,
-                prompt_info=langfuse_metadata_prompt # Informazioni specifiche dell'immagine
+                prompt_info=langfuse_metadata_prompt, # Informazioni specifiche dell'immagine
+                cost_usd=cost_backend.estimate_cost(token_usage) if cost_backend is not None else None
             )
             
-        return description
+        return description, token_usage
 
     def describe_image_data(self, image_data: bytes, detail: str = "high",
                             # Parametri aggiuntivi per il tracciamento Langfuse
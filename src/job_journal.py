@@ -0,0 +1,137 @@
+"""
+Job Journal: registro write-ahead delle unità di lavoro completate.
+
+Ogni unità completata (riassunto di una sezione, descrizione di un'immagine)
+viene accodata al journal e sincronizzata su disco appena termina. Un'esecuzione
+riavviata dopo un crash rilegge il journal e riutilizza i risultati già
+ottenuti: vengono ripetute al più le chiamate che erano in corso.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILENAME = ".resume_journal.jsonl"
+
+
+class JobJournal:
+    """
+    Journal append-only (JSON Lines) delle unità di lavoro completate.
+
+    Ogni riga contiene il tipo di unità, una chiave derivata dai suoi input,
+    il risultato e l'utilizzo dei token. Una riga troncata da un crash viene
+    ignorata in lettura. Sicuro per l'uso da più thread.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Inizializza il journal, rileggendo le unità registrate da esecuzioni precedenti.
+
+        Args:
+            path (Path): Percorso del file del journal.
+        """
+        self.path = Path(path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+        self.replayed = 0 # Unità riutilizzate in questa esecuzione
+        self._load()
+
+    @staticmethod
+    def make_key(kind: str, *parts: str) -> str:
+        """
+        Calcola la chiave di un'unità di lavoro a partire dai suoi input.
+
+        Args:
+            kind (str): Tipo di unità (es. "section", "image").
+            *parts (str): Input che determinano il risultato (testo, modello, URL, ...).
+
+        Returns:
+            str: Hash SHA-256 esadecimale degli input.
+        """
+        digest = hashlib.sha256(kind.encode("utf-8"))
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(str(part).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        skipped = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1 # Riga incompleta (es. crash durante la scrittura)
+        logger.info(f"Journal '{self.path}' riletto: {len(self._entries)} unità già completate.")
+        if skipped:
+            logger.warning(f"Ignorate {skipped} righe non valide nel journal '{self.path}'.")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Restituisce l'unità registrata con la chiave indicata.
+
+        Args:
+            key (str): Chiave dell'unità (vedi make_key).
+
+        Returns:
+            Optional[Dict[str, Any]]: L'unità ("kind", "key", "result", "usage"), o None se assente.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.replayed += 1
+            return entry
+
+    def record(self, kind: str, key: str, result: str, usage: Optional[Dict[str, int]] = None) -> None:
+        """
+        Registra un'unità completata e la sincronizza subito su disco.
+
+        Args:
+            kind (str): Tipo di unità.
+            key (str): Chiave dell'unità (vedi make_key).
+            result (str): Risultato dell'unità (riassunto o descrizione).
+            usage (Optional[Dict[str, int]]): Utilizzo dei token della chiamata.
+        """
+        entry = {"kind": kind, "key": key, "result": result, "usage": usage}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._entries[key] = entry
+            except OSError as e:
+                logger.warning(f"Impossibile aggiornare il journal '{self.path}': {e}")
+
+    def close(self) -> None:
+        """Chiude il file del journal."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self) -> None:
+        """Chiude e rimuove il journal (da chiamare quando il corso è stato completato)."""
+        self.close()
+        with self._lock:
+            self._entries.clear()
+            try:
+                self.path.unlink()
+                logger.info(f"Journal '{self.path}' rimosso: elaborazione completata.")
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,307 @@
+"""
+Job Service: servizio locale che esegue l'elaborazione di corsi e lezioni come job.
+
+Il servizio resta attivo tra una richiesta e l'altra, così l'avvio di Python,
+l'import delle librerie, il caricamento di .env, i client OpenAI e i pool di
+worker vengono pagati una sola volta. L'API è HTTP con corpi JSON, esposta su
+una porta TCP locale o su un socket Unix:
+
+- POST /jobs            Invia un job: {"type": "course" | "lesson", ...parametri}
+- GET  /jobs            Elenco dei job con stato e avanzamento
+- GET  /jobs/<id>       Stato, avanzamento e risultato di un job
+- GET  /health          Verifica che il servizio sia attivo
+
+L'esecuzione vera e propria è delegata alle funzioni registrate per ciascun
+tipo di job (vedi resume_generator.serve_jobs).
+"""
+import json
+import logging
+import os
+import socketserver
+import stat
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Dict[str, Any]]
+ProgressFunction = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+@dataclass
+class Job:
+    """Un job inviato al servizio."""
+    job_id: str
+    kind: str
+    params: Dict[str, Any]
+    status: str = "queued" # queued, running, completed, failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rappresentazione JSON del job."""
+        return {
+            "id": self.job_id,
+            "type": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobService:
+    """
+    Coda di job eseguiti da un pool di thread con risorse condivise.
+
+    I job terminati vengono conservati (fino a max_finished_jobs) per poterne
+    consultare l'esito.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        max_concurrent_jobs: int = 2,
+        progress_functions: Optional[Dict[str, ProgressFunction]] = None,
+        max_finished_jobs: int = 1000
+    ):
+        """
+        Inizializza il servizio.
+
+        Args:
+            handlers (Dict[str, JobHandler]): Funzione di esecuzione per ciascun tipo di job.
+                Riceve i parametri del job e restituisce un risultato serializzabile in JSON.
+            max_concurrent_jobs (int): Numero massimo di job eseguiti contemporaneamente.
+            progress_functions (Optional[Dict[str, ProgressFunction]]): Funzioni che calcolano
+                l'avanzamento di un job in esecuzione a partire dai suoi parametri.
+            max_finished_jobs (int): Numero massimo di job terminati conservati.
+        """
+        if max_concurrent_jobs < 1:
+            raise ValueError(f"Il numero di job contemporanei deve essere almeno 1 (ricevuto {max_concurrent_jobs}).")
+        self.handlers = dict(handlers)
+        self.progress_functions = dict(progress_functions or {})
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        """
+        Accoda un nuovo job.
+
+        Args:
+            kind (str): Tipo di job (deve avere una funzione registrata).
+            params (Dict[str, Any]): Parametri del job.
+
+        Returns:
+            Job: Il job accodato.
+
+        Raises:
+            ValueError: Se il tipo di job non è supportato.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo di job non supportato: '{kind}'. Tipi disponibili: {', '.join(sorted(self.handlers))}.")
+        job = Job(job_id=uuid.uuid4().hex, kind=kind, params=dict(params))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune_finished_jobs()
+        self._executor.submit(self._run_job, job)
+        logger.info(f"Job {job.job_id} ({kind}) accodato.")
+        return job
+
+    def _prune_finished_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _run_job(self, job: Job) -> None:
+        with self._lock:
+            job.status = "running"
+            job.started_at = time.time()
+        logger.info(f"Avvio del job {job.job_id} ({job.kind}).")
+        try:
+            result = self.handlers[job.kind](job.params)
+            with self._lock:
+                job.result = result
+                job.status = "completed"
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.kind}) fallito: {e}", exc_info=True)
+            with self._lock:
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+        logger.info(f"Job {job.job_id} terminato con stato '{job.status}'.")
+
+    def _describe(self, job: Job) -> Dict[str, Any]:
+        description = job.to_dict()
+        progress_function = self.progress_functions.get(job.kind)
+        if job.status == "running" and progress_function is not None:
+            try:
+                description["progress"] = progress_function(job.params)
+            except Exception as e: # L'avanzamento è informativo: un errore non deve bloccare la risposta
+                logger.debug(f"Impossibile calcolare l'avanzamento del job {job.job_id}: {e}")
+        return description
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Restituisce lo stato di un job.
+
+        Args:
+            job_id (str): Identificativo del job.
+
+        Returns:
+            Optional[Dict[str, Any]]: Stato, avanzamento (se in esecuzione) e risultato, o None se il job non esiste.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return self._describe(job) if job is not None else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Restituisce lo stato di tutti i job conservati, in ordine di invio."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [self._describe(job) for job in jobs]
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Arresta il pool dei job, attendendo (se wait) quelli in corso."""
+        self._executor.shutdown(wait=wait)
+
+
+class _JobRequestHandler(BaseHTTPRequestHandler):
+    """Gestore delle richieste HTTP del servizio."""
+
+    server_version = "ResumeJobService/1.0"
+
+    @property
+    def job_service(self) -> JobService:
+        return self.server.job_service # type: ignore[attr-defined]
+
+    def address_string(self) -> str:
+        # Sui socket Unix client_address è una stringa vuota
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/jobs":
+            self._send_json(200, {"jobs": self.job_service.list_jobs()})
+        elif path.startswith("/jobs/"):
+            job = self.job_service.get(path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "Job non trovato."})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": f"Percorso non valido: {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": f"Percorso non valido: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0: # read(-1) attenderebbe la chiusura della connessione
+                raise ValueError("Content-Length non valido.")
+            if length > MAX_REQUEST_BYTES:
+                self._send_json(413, {"error": "Richiesta troppo grande."})
+                return
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("Il corpo della richiesta deve essere un oggetto JSON.")
+            kind = payload.pop("type", None)
+            job = self.job_service.submit(kind, payload)
+        except ValueError as e: # Include gli errori di decodifica JSON
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(202, job.to_dict())
+
+
+def is_unix_socket(path: str) -> bool:
+    """
+    Verifica se un percorso è un socket Unix (e non un file o una directory qualsiasi).
+
+    Args:
+        path (str): Percorso da verificare.
+
+    Returns:
+        bool: True se il percorso esiste ed è un socket.
+    """
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Server HTTP su socket Unix, un thread per connessione."""
+    daemon_threads = True
+
+
+def create_server(
+    job_service: JobService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[str] = None
+) -> socketserver.BaseServer:
+    """
+    Crea il server HTTP del servizio (da avviare con serve_forever()).
+
+    Args:
+        job_service (JobService): Servizio che esegue i job.
+        host (str): Indirizzo su cui ascoltare (ignorato se unix_socket è indicato).
+        port (int): Porta TCP (0 per una porta libera qualsiasi).
+        unix_socket (Optional[str]): Percorso del socket Unix. Se indicato, il servizio
+                                     è esposto solo sul socket.
+
+    Returns:
+        socketserver.BaseServer: Il server configurato.
+
+    Raises:
+        ValueError: Se unix_socket indica un percorso esistente che non è un socket.
+    """
+    server: socketserver.BaseServer
+    if unix_socket:
+        if is_unix_socket(unix_socket):
+            os.unlink(unix_socket) # Socket residuo di un'esecuzione precedente
+        elif os.path.lexists(unix_socket):
+            raise ValueError(f"Il percorso '{unix_socket}' esiste e non è un socket Unix: non viene sovrascritto.")
+        server = _ThreadingUnixHTTPServer(unix_socket, _JobRequestHandler)
+        logger.info(f"Servizio dei job in ascolto sul socket Unix '{unix_socket}'.")
+    else:
+        server = ThreadingHTTPServer((host, port), _JobRequestHandler)
+        server.daemon_threads = True
+        logger.info(f"Servizio dei job in ascolto su http://{host}:{server.server_address[1]}.")
+    server.job_service = job_service # type: ignore[attr-defined]
+    return server
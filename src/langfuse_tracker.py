@@ -8,8 +8,10 @@ e utilizzare Langfuse per monitorare le interazioni con i modelli LLM.
 import os
 import logging
 import time
-from typing import Optional, Dict, Any
-from langfuse import Langfuse
+from typing import TYPE_CHECKING, Optional, Dict, Any
+
+if TYPE_CHECKING:
+    from langfuse import Langfuse
 
 
 class LangfuseTracker:
@@ -23,18 +25,26 @@ class LangfuseTracker:
     - Gestire sessioni distinte per diversi corsi
     """
     
-    def __init__(self):
+    def __init__(self, langfuse_client: Optional["Langfuse"] = None):
         """
         Inizializza il tracker Langfuse.
         
         Carica le chiavi API dalle variabili d'ambiente e configura la connessione.
+
+        Args:
+            langfuse_client (Optional[Langfuse]): Client Langfuse già configurato da riutilizzare.
+                Permette a più tracker (es. uno per corso in modalità catalogo) di avere
+                sessioni distinte condividendo la stessa connessione.
         """
         self.logger = logging.getLogger(__name__)
         self.langfuse = None
         self.current_trace = None
         self.current_session_id = None
         self.current_chapter_span: Optional[Any] = None
-        self._initialize_langfuse()
+        if langfuse_client is not None:
+            self.langfuse = langfuse_client
+        else:
+            self._initialize_langfuse()
     
     def _initialize_langfuse(self) -> None:
         """
@@ -55,6 +65,8 @@ class LangfuseTracker:
             return
         
         try:
+            from langfuse import Langfuse # Importato solo se il tracciamento è configurato
+
             self.langfuse = Langfuse(
                 secret_key=secret_key,
                 public_key=public_key,
@@ -157,7 +169,9 @@ class LangfuseTracker:
             metadata.update({
                 "prompt_tokens": token_usage.get("prompt_tokens", 0),
                 "completion_tokens": token_usage.get("completion_tokens", 0),
-                "total_tokens": token_usage.get("total_tokens", 0)
+                "total_tokens": token_usage.get("total_tokens", 0),
+                # Token del prompt letti dalla cache del provider (prefisso di sistema stabile)
+                "cached_tokens": token_usage.get("cached_tokens", 0)
             })
         
         if latency_ms:
@@ -193,6 +207,83 @@ class LangfuseTracker:
         except Exception as e:
             self.logger.error(f"Errore nel tracciamento della chiamata LLM: {str(e)}")
     
+    def track_routing_decision(
+        self,
+        decision: Dict[str, Any],
+        chapter_name: Optional[str] = None,
+        lesson_name: Optional[str] = None
+    ) -> None:
+        """
+        Registra la decisione di instradamento di una chiamata LLM (backend, modello e parametri).
+
+        Args:
+            decision (Dict[str, Any]): La decisione (vedi RouteDecision.to_dict)
+            chapter_name (Optional[str]): Nome del capitolo processato
+            lesson_name (Optional[str]): Nome della lezione processata
+        """
+        if not self.is_enabled() or not self.current_trace:
+            return
+
+        metadata = dict(decision)
+        metadata.update({"chapter_name": chapter_name, "lesson_name": lesson_name})
+        try:
+            event_name = f"LLM_Routing_{decision.get('content_type', 'unknown')}"
+            if lesson_name:
+                event_name += f"_{lesson_name}"
+            self.current_trace.event(name=event_name, metadata=metadata)
+            self.logger.debug(f"Decisione di instradamento tracciata: {event_name}")
+        except Exception as e:
+            self.logger.error(f"Errore nel tracciamento della decisione di instradamento: {str(e)}")
+
+    def track_text_compression(
+        self,
+        content_type: str,
+        stats: Dict[str, Any],
+        chapter_name: Optional[str] = None,
+        lesson_name: Optional[str] = None
+    ) -> None:
+        """
+        Registra la compressione estrattiva locale di un testo prima della chiamata LLM.
+
+        Args:
+            content_type (str): Tipo di contenuto compresso
+            stats (Dict[str, Any]): Le statistiche (vedi CompressionStats.to_dict)
+            chapter_name (Optional[str]): Nome del capitolo processato
+            lesson_name (Optional[str]): Nome della lezione processata
+        """
+        if not self.is_enabled() or not self.current_trace:
+            return
+
+        metadata = dict(stats)
+        metadata.update({"content_type": content_type, "chapter_name": chapter_name, "lesson_name": lesson_name})
+        try:
+            event_name = f"Text_Compression_{content_type}"
+            if lesson_name:
+                event_name += f"_{lesson_name}"
+            self.current_trace.event(name=event_name, metadata=metadata)
+            self.logger.debug(f"Compressione del testo tracciata: {event_name}")
+        except Exception as e:
+            self.logger.error(f"Errore nel tracciamento della compressione del testo: {str(e)}")
+
+    def track_concurrency_limit(self, previous_limit: int, limit: int, reason: str) -> None:
+        """
+        Registra una variazione del limite adattivo di richieste contemporanee.
+
+        Args:
+            previous_limit (int): Limite precedente
+            limit (int): Nuovo limite
+            reason (str): Motivo della variazione ("latency_stable", "rate_limited" o "latency_spike")
+        """
+        if not self.is_enabled() or not self.current_trace:
+            return
+
+        metadata = {"previous_limit": previous_limit, "limit": limit, "reason": reason}
+        try:
+            self.current_trace.event(name="Concurrency_Limit", metadata=metadata)
+            self.logger.debug(f"Variazione del limite di concorrenza tracciata: {previous_limit} -> {limit}")
+        except Exception as e:
+            self.logger.error(f"Errore nel tracciamento del limite di concorrenza: {str(e)}")
+
     def track_processing_metrics(
         self,
         lessons_processed: int,
@@ -0,0 +1,68 @@
+"""
+Lazy Import: import differito delle dipendenze pesanti.
+
+openai, langfuse, PyPDF2, webvtt, BeautifulSoup e i text splitter di LangChain
+richiedono complessivamente più di un secondo per essere importati. Con
+lazy_import il modulo viene importato solo al primo accesso a un suo attributo:
+`--help`, un corso senza PDF o un riavvio della modalità watch non pagano
+l'import delle librerie che non usano.
+"""
+import importlib
+import sys
+import threading
+from types import ModuleType
+from typing import Any, List
+
+
+class LazyModule(ModuleType):
+    """
+    Segnaposto di un modulo, importato al primo accesso a un suo attributo.
+
+    L'import è protetto da un lock: più thread (es. i worker della pipeline)
+    possono accedere contemporaneamente al modulo senza vederlo parzialmente inizializzato.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_lock = threading.Lock()
+        self._lazy_module = None
+
+    def _load(self) -> ModuleType:
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+                module = self._lazy_module
+        return module
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Invocato solo per gli attributi non definiti sul segnaposto
+        if attribute.startswith("_lazy_"):
+            raise AttributeError(attribute)
+        return getattr(self._load(), attribute)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "caricato" if self._lazy_module is not None else "non ancora caricato"
+        return f"<modulo lazy '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Restituisce un modulo da importare al primo utilizzo.
+
+    Args:
+        name (str): Nome assoluto del modulo (es. "openai").
+
+    Returns:
+        ModuleType: Il modulo, se già importato, altrimenti un LazyModule che lo
+                    importa al primo accesso a un attributo. Un modulo mancante
+                    solleva ImportError a quel punto, non all'avvio.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
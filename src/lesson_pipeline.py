@@ -0,0 +1,279 @@
+"""
+Lesson Pipeline: elaborazione a stadi delle lezioni di un corso.
+
+Questo modulo fornisce la classe LessonPipeline, che organizza l'elaborazione
+delle lezioni in tre stadi concorrenti collegati da code limitate:
+
+1. Estrazione (CPU): parsing di VTT/PDF/HTML su un pool di processi.
+2. Riassunto (rete): worker che attendono le risposte dell'LLM.
+3. Scrittura: un thread dedicato che persiste i risultati su disco.
+
+In questo modo il parsing dei PDF della lezione N+1 avviene mentre la lezione N
+è in attesa della risposta di OpenAI. Il numero di lezioni estratte ma non
+ancora riassunte è limitato, così la memoria resta contenuta anche per corsi
+con centinaia di lezioni.
+
+Con una stima del costo dei job (cost_fn), le lezioni vengono avviate dalla più
+costosa (longest job first): una lezione di 90 minuti in fondo all'elenco non
+resta da sola in coda mentre gli altri worker sono fermi, e il tempo totale si
+avvicina al lavoro complessivo diviso per il numero di worker. I risultati
+restano nell'ordine canonico dei job.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_STOP = object() # Sentinella per terminare i thread degli stadi
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+    """
+    Contesto multiprocessing per il pool di estrazione.
+
+    Con "fork" i processi ereditano lo stato dei lock tenuti da altri thread
+    (ad es. un secondo job della modalità --serve) e possono bloccarsi:
+    dove disponibile si usa quindi "forkserver".
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def longest_first_order(jobs: Sequence[Any], cost_fn: Callable[[Any], float]) -> List[int]:
+    """
+    Ordine di avvio dei job, dal più costoso (a parità di costo, nell'ordine canonico).
+
+    Args:
+        jobs (Sequence[Any]): I job, nell'ordine canonico.
+        cost_fn (Callable[[Any], float]): Stima del costo di un job. Un errore nella
+            stima assegna al job costo 0.
+
+    Returns:
+        List[int]: Gli indici dei job nell'ordine di avvio.
+    """
+    costs = []
+    for job in jobs:
+        try:
+            costs.append(float(cost_fn(job)))
+        except Exception as e:
+            logger.warning(f"Stima del costo non riuscita per il job {job}: {e}")
+            costs.append(0.0)
+    return sorted(range(len(jobs)), key=lambda index: -costs[index])
+
+
+class LessonPipeline:
+    """
+    Pipeline a stadi produttore/consumatore per l'elaborazione delle lezioni.
+
+    Gli stadi sono definiti, per ogni chiamata a run(), da tre funzioni:
+    - extract_fn(job) -> extracted: eseguita su un pool di processi, deve essere
+      una funzione di modulo (serializzabile con pickle) e ricevere job serializzabili.
+    - summarize_fn(job, extracted) -> summarized: eseguita dai worker di riassunto (thread).
+    - write_fn(job, summarized) -> result: eseguita dal thread di scrittura.
+
+    Il pool di processi resta attivo tra una chiamata a run() e l'altra, così la
+    stessa pipeline può essere riutilizzata per tutti i capitoli di un corso.
+    """
+
+    def __init__(
+        self,
+        extraction_workers: Optional[int] = None,
+        summary_workers: int = 4,
+        max_pending: Optional[int] = None
+    ):
+        """
+        Inizializza la pipeline.
+
+        Args:
+            extraction_workers (Optional[int]): Numero di processi per l'estrazione.
+                None usa il numero di CPU disponibili; 0 esegue l'estrazione nel
+                thread produttore, senza pool di processi.
+            summary_workers (int): Numero di worker di riassunto concorrenti.
+            max_pending (Optional[int]): Numero massimo di lezioni estratte (o in
+                estrazione) non ancora riassunte. Default: il doppio dei worker di riassunto.
+        """
+        if summary_workers < 1:
+            raise ValueError(f"Il numero di worker di riassunto deve essere almeno 1 (ricevuto {summary_workers}).")
+        if extraction_workers is None:
+            extraction_workers = os.cpu_count() or 1
+        if extraction_workers < 0:
+            raise ValueError(f"Il numero di processi di estrazione non può essere negativo (ricevuto {extraction_workers}).")
+
+        self.extraction_workers = extraction_workers
+        self.summary_workers = summary_workers
+        self.max_pending = max_pending if max_pending is not None else summary_workers * 2
+        if self.max_pending < 1:
+            raise ValueError(f"max_pending deve essere almeno 1 (ricevuto {self.max_pending}).")
+
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> Optional[Executor]:
+        """Crea il pool di processi per l'estrazione, o lo ricrea se un processo è terminato in modo anomalo."""
+        if self.extraction_workers == 0:
+            return None
+        with self._executor_lock:
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                self._discard_executor_locked()
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.extraction_workers,
+                    mp_context=_process_context()
+                )
+                logger.info(f"Pool di estrazione avviato con {self.extraction_workers} processi.")
+            return self._executor
+
+    def _discard_executor_locked(self) -> None:
+        """Arresta il pool non più utilizzabile (da chiamare con _executor_lock acquisito)."""
+        logger.warning("Pool di estrazione non più utilizzabile (processo terminato in modo anomalo): viene ricreato.")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def _submit_extraction(self, extract_fn: Callable[[Any], Any], job: Any) -> Future:
+        """Invia un job al pool di estrazione, ricreando il pool se risulta rotto."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(extract_fn, job)
+        except BrokenProcessPool:
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._discard_executor_locked()
+            return self._get_executor().submit(extract_fn, job)
+
+    def run(
+        self,
+        jobs: Sequence[Any],
+        extract_fn: Callable[[Any], Any],
+        summarize_fn: Callable[[Any, Any], Any],
+        write_fn: Callable[[Any, Any], Any],
+        cost_fn: Optional[Callable[[Any], float]] = None
+    ) -> List[Any]:
+        """
+        Elabora i job attraverso i tre stadi e restituisce i risultati.
+
+        Args:
+            jobs (Sequence[Any]): Job da elaborare, nell'ordine canonico.
+            extract_fn (Callable): Funzione dello stadio di estrazione (di modulo, serializzabile).
+            summarize_fn (Callable): Funzione dello stadio di riassunto.
+            write_fn (Callable): Funzione dello stadio di scrittura.
+            cost_fn (Optional[Callable]): Stima (economica) del costo di un job. Se fornita,
+                i job vengono avviati dal più costoso; altrimenti nell'ordine canonico.
+
+        Returns:
+            List[Any]: Il risultato di write_fn per ciascun job, nello stesso ordine
+                       dei job. Un job fallito con un'eccezione non gestita ha None.
+        """
+        if not jobs:
+            return []
+
+        jobs = list(jobs)
+        order = longest_first_order(jobs, cost_fn) if cost_fn is not None else list(range(len(jobs)))
+        return self._run(jobs, order, extract_fn, summarize_fn, write_fn)
+
+    def _run(
+        self,
+        jobs: List[Any],
+        order: List[int],
+        extract_fn: Callable[[Any], Any],
+        summarize_fn: Callable[[Any, Any], Any],
+        write_fn: Callable[[Any, Any], Any]
+    ) -> List[Any]:
+        results: List[Any] = [None] * len(jobs)
+        pending_slots = threading.BoundedSemaphore(self.max_pending)
+        extracted_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.max_pending)
+        write_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.summary_workers)
+        use_processes = self._get_executor() is not None
+
+        def on_extracted(index: int, job: Any, future: Future) -> None:
+            extracted_queue.put((index, job, future))
+
+        def producer() -> None:
+            for index in order:
+                job = jobs[index]
+                pending_slots.acquire() # Backpressure: attende che un riassunto liberi uno slot
+                if not use_processes:
+                    future: Future = Future()
+                    try:
+                        future.set_result(extract_fn(job))
+                    except Exception as e:
+                        future.set_exception(e)
+                    on_extracted(index, job, future)
+                else:
+                    try:
+                        future = self._submit_extraction(extract_fn, job)
+                    except RuntimeError as e: # Pool chiuso o non utilizzabile
+                        future = Future()
+                        future.set_exception(e)
+                        on_extracted(index, job, future)
+                        continue
+                    future.add_done_callback(lambda f, i=index, j=job: on_extracted(i, j, f))
+
+        def summary_worker() -> None:
+            while True:
+                item = extracted_queue.get()
+                if item is _STOP:
+                    return
+                index, job, future = item
+                summarized = None
+                failed = False
+                try:
+                    extracted = future.result()
+                    summarized = summarize_fn(job, extracted)
+                except Exception as e:
+                    failed = True
+                    logger.error(f"Errore nella pipeline per il job {index + 1}/{len(jobs)}: {e}")
+                finally:
+                    pending_slots.release()
+                write_queue.put((index, job, summarized, failed))
+
+        def writer() -> None:
+            for _ in range(len(jobs)):
+                index, job, summarized, failed = write_queue.get()
+                if failed:
+                    continue
+                try:
+                    results[index] = write_fn(job, summarized)
+                except Exception as e:
+                    logger.error(f"Errore nello stadio di scrittura per il job {index + 1}/{len(jobs)}: {e}")
+
+        producer_thread = threading.Thread(target=producer, name="pipeline-producer", daemon=True)
+        worker_threads = [
+            threading.Thread(target=summary_worker, name=f"pipeline-summary-{i}", daemon=True)
+            for i in range(self.summary_workers)
+        ]
+        writer_thread = threading.Thread(target=writer, name="pipeline-writer", daemon=True)
+
+        producer_thread.start()
+        for thread in worker_threads:
+            thread.start()
+        writer_thread.start()
+
+        writer_thread.join()
+        producer_thread.join()
+        for _ in worker_threads:
+            extracted_queue.put(_STOP)
+        for thread in worker_threads:
+            thread.join()
+
+        return results
+
+    def shutdown(self) -> None:
+        """Arresta il pool di processi di estrazione."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+            logger.info("Pool di estrazione arrestato.")
+
+    def __enter__(self) -> "LessonPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.shutdown()
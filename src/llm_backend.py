@@ -0,0 +1,452 @@
+"""
+LLM Backend: backend dei modelli configurabili per tipo di contenuto.
+
+Ogni LLMBackend descrive un endpoint compatibile con l'API Chat Completions di
+OpenAI (OpenAI stesso o un server locale come vLLM o llama.cpp): URL base,
+modello, chiave, limite di richieste contemporanee e prezzi per milione di
+token. Il BackendRouter associa a ciascun tipo di contenuto ("vtt", "pdf",
+"html", "orphan_material", "image") e alla dimensione dell'input il backend,
+il modello e i parametri di generazione (max_tokens, temperatura, dettaglio
+delle immagini): il lavoro di massa a basso valore può essere eseguito su
+hardware proprio o su un modello più rapido, mentre le chiamate più importanti
+restano sul modello di punta.
+
+Configurazione (file JSON, opzione --llm-config):
+
+    {
+        "default": "openai",
+        "backends": {
+            "openai": {"model": "gpt-4o-mini", "input_cost_per_million": 0.15, "output_cost_per_million": 0.6,
+                       "cached_input_cost_per_million": 0.075},
+            "local": {"base_url": "http://localhost:8000/v1", "model": "qwen2.5-7b-instruct", "max_concurrent": 4}
+        },
+        "routes": {
+            "pdf": "local",
+            "orphan_material": [
+                {"max_input_size": 4000, "backend": "local", "max_tokens": 400},
+                {"temperature": 0.3, "compress_tokens": 2000}
+            ]
+        }
+    }
+
+Una regola è il nome di un backend o un elenco di regole valutate in ordine
+(vedi RoutingRule). Con "compress_tokens" i testi più lunghi del budget
+vengono prima ridotti localmente alle frasi più rappresentative (vedi
+text_compressor). I backend "openai" (testo) e "openai-vision" (immagini)
+sono sempre disponibili con i valori predefiniti, se non ridefiniti nel file;
+i tipi di contenuto non configurati usano le regole di DEFAULT_ROUTES.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEXT_MODEL = "gpt-4o-mini"
+DEFAULT_VISION_MODEL = "gpt-4o"
+DEFAULT_BACKEND_NAME = "openai"
+VISION_BACKEND_NAME = "openai-vision"
+IMAGE_CONTENT_TYPE = "image"
+
+# I server locali compatibili con OpenAI di norma ignorano la chiave, ma il client ne richiede una
+LOCAL_API_KEY_PLACEHOLDER = "not-needed"
+
+_BACKEND_FIELDS = ("model", "base_url", "api_key", "max_concurrent", "input_cost_per_million", "output_cost_per_million",
+                   "cached_input_cost_per_million")
+
+
+def token_usage_from_response(usage: Any) -> Dict[str, int]:
+    """
+    Converte l'oggetto usage di una risposta Chat Completions nel dizionario dei token.
+
+    Args:
+        usage (Any): L'attributo usage della risposta (o dell'ultimo chunk in streaming).
+
+    Returns:
+        Dict[str, int]: prompt_tokens, completion_tokens e total_tokens; "cached_tokens"
+                        (token del prompt letti dalla cache del provider) se riportati.
+    """
+    token_usage = {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) if details is not None else None
+    if isinstance(cached_tokens, int):
+        token_usage["cached_tokens"] = cached_tokens
+    return token_usage
+
+
+@dataclass
+class LLMBackend:
+    """Un endpoint compatibile con l'API Chat Completions di OpenAI."""
+    name: str
+    model: str
+    base_url: Optional[str] = None # None: API di OpenAI
+    api_key: Optional[str] = None # None: chiave OpenAI del processo (o segnaposto per i server locali)
+    max_concurrent: Optional[int] = None # Limite proprio di richieste in volo (None: limitatore condiviso)
+    input_cost_per_million: float = 0.0
+    output_cost_per_million: float = 0.0
+    cached_input_cost_per_million: Optional[float] = None # Prezzo dei token di prompt letti dalla cache (None: come gli altri)
+    rate_limiter: Optional[RateLimiter] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.model:
+            raise ValueError(f"Il backend '{self.name}' non specifica il modello.")
+        if self.input_cost_per_million < 0 or self.output_cost_per_million < 0 or (self.cached_input_cost_per_million or 0) < 0:
+            raise ValueError(f"I prezzi del backend '{self.name}' non possono essere negativi.")
+        if self.max_concurrent is not None:
+            self.rate_limiter = RateLimiter(max_concurrent=self.max_concurrent)
+
+    @property
+    def is_local(self) -> bool:
+        """True se il backend non è l'API di OpenAI."""
+        return self.base_url is not None
+
+    def resolve_api_key(self, default_api_key: Optional[str]) -> Optional[str]:
+        """
+        Restituisce la chiave da usare per il backend.
+
+        Args:
+            default_api_key (Optional[str]): Chiave OpenAI del processo.
+
+        Returns:
+            Optional[str]: La chiave propria del backend, altrimenti quella del processo;
+                           per un server locale senza chiave, un segnaposto.
+        """
+        if self.api_key:
+            return self.api_key
+        if self.is_local:
+            return LOCAL_API_KEY_PLACEHOLDER
+        return default_api_key
+
+    def select_limiter(self, shared_limiter: Optional[RateLimiter]) -> Optional[RateLimiter]:
+        """
+        Restituisce il limitatore da usare per una chiamata al backend.
+
+        Un backend con max_concurrent ha una capacità propria (es. un server locale)
+        e non consuma gli slot del limitatore condiviso, che rappresenta la quota OpenAI.
+        """
+        return self.rate_limiter if self.rate_limiter is not None else shared_limiter
+
+    def estimate_cost(self, token_usage: Optional[Dict[str, int]]) -> Optional[float]:
+        """
+        Stima il costo di una chiamata in USD.
+
+        Args:
+            token_usage (Optional[Dict[str, int]]): Token di prompt e di completamento; gli eventuali
+                                                    "cached_tokens" sono fatturati a cached_input_cost_per_million.
+
+        Returns:
+            Optional[float]: Costo stimato, o None se l'utilizzo o i prezzi non sono disponibili.
+        """
+        if not token_usage or not (self.input_cost_per_million or self.output_cost_per_million):
+            return None
+        prompt_tokens = token_usage.get("prompt_tokens") or 0
+        completion_tokens = token_usage.get("completion_tokens") or 0
+        cached_tokens = token_usage.get("cached_tokens") or 0
+        if self.cached_input_cost_per_million is None:
+            cached_tokens = 0
+        cost = ((prompt_tokens - cached_tokens) * self.input_cost_per_million
+                + cached_tokens * (self.cached_input_cost_per_million or 0.0)
+                + completion_tokens * self.output_cost_per_million) / 1_000_000
+        return round(cost, 8)
+
+    def describe(self) -> Dict[str, Any]:
+        """Descrizione del backend (senza chiave) per log e metadati delle sessioni."""
+        return {
+            "model": self.model,
+            "base_url": self.base_url,
+            "max_concurrent": self.max_concurrent,
+        }
+
+
+def default_text_backend() -> LLMBackend:
+    """Backend OpenAI per il testo, con il modello di OPENAI_MODEL_NAME (default gpt-4o-mini)."""
+    return LLMBackend(DEFAULT_BACKEND_NAME, os.getenv("OPENAI_MODEL_NAME", DEFAULT_TEXT_MODEL))
+
+
+def default_vision_backend() -> LLMBackend:
+    """Backend OpenAI per la descrizione delle immagini (gpt-4o)."""
+    return LLMBackend(VISION_BACKEND_NAME, DEFAULT_VISION_MODEL)
+
+
+IMAGE_DETAIL_LEVELS = ("low", "high", "auto")
+
+_RULE_FIELDS = ("backend", "max_input_size", "model", "max_tokens", "temperature", "detail", "compress_tokens")
+
+# Regole predefinite: i frammenti orfani brevi non pagano risposte lunghe. Le immagini
+# restano su gpt-4o ad alto dettaglio: la dimensione in byte non dice quanto un'immagine
+# sia leggibile a basso dettaglio, quindi le regole più economiche vanno configurate.
+DEFAULT_ROUTES: Dict[str, List[Dict[str, Any]]] = {
+    "orphan_material": [
+        {"max_input_size": 2000, "max_tokens": 400, "temperature": 0.3},
+    ],
+    IMAGE_CONTENT_TYPE: [
+        {"detail": "high", "max_tokens": 700},
+    ],
+}
+
+
+@dataclass
+class RoutingRule:
+    """
+    Regola di instradamento per un tipo di contenuto.
+
+    La regola si applica agli input di dimensione non superiore a max_input_size
+    (caratteri per il testo, byte per le immagini; None: qualsiasi dimensione).
+    I campi None mantengono i valori del backend o del chiamante.
+    """
+    backend: Optional[str] = None # None: backend del tipo di contenuto
+    max_input_size: Optional[int] = None
+    model: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    detail: Optional[str] = None # Solo immagini: "low", "high" o "auto"
+    compress_tokens: Optional[int] = None # Solo testo: budget (token) della compressione estrattiva locale
+
+    def __post_init__(self):
+        if self.detail is not None and self.detail not in IMAGE_DETAIL_LEVELS:
+            raise ValueError(f"Livello di dettaglio non valido: '{self.detail}' (ammessi: {', '.join(IMAGE_DETAIL_LEVELS)}).")
+        if self.max_tokens is not None and self.max_tokens < 1:
+            raise ValueError(f"max_tokens deve essere positivo (ricevuto {self.max_tokens}).")
+        if self.compress_tokens is not None and self.compress_tokens < 1:
+            raise ValueError(f"compress_tokens deve essere positivo (ricevuto {self.compress_tokens}).")
+
+    def matches(self, input_size: Optional[int]) -> bool:
+        """True se la regola si applica a un input della dimensione indicata (None: sconosciuta)."""
+        return self.max_input_size is None or (input_size is not None and input_size <= self.max_input_size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in _RULE_FIELDS if getattr(self, name) is not None}
+
+
+@dataclass
+class RouteDecision:
+    """Esito dell'instradamento di una chiamata: backend, modello e parametri di generazione."""
+    content_type: str
+    backend: LLMBackend
+    model: str
+    input_size: Optional[int] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    detail: Optional[str] = None
+    compress_tokens: Optional[int] = None
+    rule_index: Optional[int] = None # Indice della regola applicata (None: nessuna regola)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rappresentazione della decisione per Langfuse e i log."""
+        return {
+            "content_type": self.content_type,
+            "backend": self.backend.name,
+            "model": self.model,
+            "input_size": self.input_size,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "detail": self.detail,
+            "compress_tokens": self.compress_tokens,
+            "rule": self.rule_index,
+        }
+
+
+def _parse_rules(content_type: str, route: Union[str, List[Dict[str, Any]]]) -> List[RoutingRule]:
+    """Converte la regola di un tipo di contenuto (nome di un backend o elenco di regole)."""
+    if isinstance(route, str):
+        return [RoutingRule(backend=route)]
+    if not isinstance(route, list):
+        raise ValueError(f"La regola per '{content_type}' deve essere il nome di un backend o un elenco di regole.")
+    rules = []
+    for options in route:
+        if not isinstance(options, dict):
+            raise ValueError(f"Le regole per '{content_type}' devono essere oggetti JSON.")
+        unknown = sorted(set(options) - set(_RULE_FIELDS))
+        if unknown:
+            raise ValueError(f"Opzioni sconosciute nella regola per '{content_type}': {', '.join(unknown)}.")
+        rules.append(RoutingRule(**options))
+    return rules
+
+
+class BackendRouter:
+    """
+    Associa i tipi di contenuto ai backend LLM e ai parametri di generazione.
+
+    Per ogni tipo di contenuto le regole vengono valutate in ordine e si applica
+    la prima compatibile con la dimensione dell'input. Senza regole si usa il
+    backend di default; le immagini, se non instradate esplicitamente, usano il
+    backend "openai-vision".
+    """
+
+    def __init__(
+        self,
+        backends: Dict[str, LLMBackend],
+        routes: Optional[Dict[str, Union[str, List[Dict[str, Any]]]]] = None,
+        default: str = DEFAULT_BACKEND_NAME
+    ):
+        """
+        Inizializza il router.
+
+        Args:
+            backends (Dict[str, LLMBackend]): Backend disponibili, per nome.
+            routes (Optional[Dict]): Per tipo di contenuto, il nome di un backend o un
+                elenco di regole (vedi RoutingRule) valutate in ordine.
+            default (str): Backend dei tipi di contenuto senza regola.
+
+        Raises:
+            ValueError: Se una regola o il default si riferiscono a un backend inesistente
+                        o se una regola non è valida.
+        """
+        self.backends = dict(backends)
+        self.default = default
+        if default not in self.backends:
+            raise ValueError(f"Backend di default '{default}' non definito.")
+        self.rules: Dict[str, List[RoutingRule]] = {
+            content_type: _parse_rules(content_type, route) for content_type, route in (routes or {}).items()
+        }
+        for content_type, rules in self.rules.items():
+            for rule in rules:
+                if rule.backend is not None and rule.backend not in self.backends:
+                    raise ValueError(f"Il tipo di contenuto '{content_type}' usa il backend non definito '{rule.backend}'.")
+
+    @classmethod
+    def default_router(cls) -> "BackendRouter":
+        """Router predefinito: testo su OPENAI_MODEL_NAME, immagini su gpt-4o, regole di DEFAULT_ROUTES."""
+        return cls.from_config({})
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "BackendRouter":
+        """
+        Crea il router da un dizionario di configurazione (vedi la documentazione del modulo).
+
+        Per ciascun backend la chiave può essere indicata direttamente ("api_key") o
+        tramite il nome di una variabile d'ambiente ("api_key_env"), per non salvarla nel file.
+        Le regole di un tipo di contenuto sostituiscono quelle predefinite (DEFAULT_ROUTES).
+
+        Raises:
+            ValueError: Se la configurazione non è valida.
+        """
+        if not isinstance(config, dict):
+            raise ValueError("La configurazione dei backend deve essere un oggetto JSON.")
+        backends: Dict[str, LLMBackend] = {
+            DEFAULT_BACKEND_NAME: default_text_backend(),
+            VISION_BACKEND_NAME: default_vision_backend(),
+        }
+        for name, options in (config.get("backends") or {}).items():
+            if not isinstance(options, dict):
+                raise ValueError(f"La configurazione del backend '{name}' deve essere un oggetto JSON.")
+            options = dict(options)
+            api_key_env = options.pop("api_key_env", None)
+            unknown = sorted(set(options) - set(_BACKEND_FIELDS))
+            if unknown:
+                raise ValueError(f"Opzioni sconosciute per il backend '{name}': {', '.join(unknown)}.")
+            if api_key_env and not options.get("api_key"):
+                options["api_key"] = os.getenv(api_key_env)
+            if "model" not in options and name in backends:
+                options["model"] = backends[name].model # Ridefinizione parziale di un backend predefinito
+            try:
+                backends[name] = LLMBackend(name=name, **options)
+            except TypeError as e:
+                raise ValueError(f"Configurazione del backend '{name}' non valida: {e}")
+        routes: Dict[str, Union[str, List[Dict[str, Any]]]] = dict(DEFAULT_ROUTES)
+        routes.update(config.get("routes") or {})
+        try:
+            return cls(backends, routes=routes, default=config.get("default", DEFAULT_BACKEND_NAME))
+        except TypeError as e:
+            raise ValueError(f"Regola di instradamento non valida: {e}")
+
+    @classmethod
+    def from_file(cls, config_path: Union[str, Path]) -> "BackendRouter":
+        """
+        Crea il router da un file di configurazione JSON.
+
+        Raises:
+            ValueError: Se il file non esiste o non è valido.
+        """
+        path = Path(config_path)
+        try:
+            config = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise ValueError(f"File di configurazione dei backend '{config_path}' non trovato.")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"File di configurazione dei backend '{config_path}' non valido: {e}")
+        router = cls.from_config(config)
+        logger.info(f"Configurazione dei backend LLM caricata da '{path}': {router.describe()}")
+        return router
+
+    def _default_backend(self, content_type: str) -> LLMBackend:
+        if content_type == IMAGE_CONTENT_TYPE and VISION_BACKEND_NAME in self.backends:
+            return self.backends[VISION_BACKEND_NAME]
+        return self.backends[self.default]
+
+    def route(self, content_type: str, input_size: Optional[int] = None) -> RouteDecision:
+        """
+        Sceglie backend, modello e parametri di generazione per una chiamata.
+
+        Args:
+            content_type (str): Tipo di contenuto (es. "vtt", "orphan_material", "image").
+            input_size (Optional[int]): Dimensione dell'input: caratteri per il testo,
+                byte per le immagini. None se sconosciuta (si applicano solo le regole
+                senza limite di dimensione).
+
+        Returns:
+            RouteDecision: La decisione di instradamento.
+        """
+        for index, rule in enumerate(self.rules.get(content_type, [])):
+            if rule.matches(input_size):
+                backend = self.backends[rule.backend] if rule.backend is not None else self._default_backend(content_type)
+                return RouteDecision(
+                    content_type=content_type,
+                    backend=backend,
+                    model=rule.model or backend.model,
+                    input_size=input_size,
+                    max_tokens=rule.max_tokens,
+                    temperature=rule.temperature,
+                    detail=rule.detail,
+                    compress_tokens=rule.compress_tokens,
+                    rule_index=index
+                )
+        backend = self._default_backend(content_type)
+        return RouteDecision(content_type=content_type, backend=backend, model=backend.model, input_size=input_size)
+
+    def for_content_type(self, content_type: str) -> LLMBackend:
+        """
+        Restituisce il backend di un tipo di contenuto per un input di dimensione sconosciuta.
+
+        Args:
+            content_type (str): Tipo di contenuto (es. "vtt", "orphan_material", "image").
+
+        Returns:
+            LLMBackend: Il backend instradato.
+        """
+        return self.route(content_type).backend
+
+    def requires_openai_key(self, content_types: Optional[List[str]] = None) -> bool:
+        """
+        Indica se almeno un tipo di contenuto può essere instradato su un backend che usa la chiave OpenAI.
+
+        Args:
+            content_types (Optional[List[str]]): Tipi di contenuto da considerare
+                (default: tutti quelli elaborati dalla pipeline).
+        """
+        content_types = content_types or ["vtt", "pdf", "html", "orphan_material", IMAGE_CONTENT_TYPE]
+        for content_type in content_types:
+            rules = self.rules.get(content_type, [])
+            candidates = [self.backends[rule.backend] if rule.backend is not None else self._default_backend(content_type) for rule in rules]
+            if not any(rule.max_input_size is None for rule in rules):
+                candidates.append(self._default_backend(content_type)) # Input che nessuna regola copre
+            if any(not backend.is_local and not backend.api_key for backend in candidates):
+                return True
+        return False
+
+    def describe(self) -> Dict[str, Any]:
+        """Backend e regole di instradamento, per log e metadati delle sessioni."""
+        return {
+            "default": self.default,
+            "routes": {content_type: [rule.to_dict() for rule in rules] for content_type, rules in self.rules.items()},
+            "backends": {name: backend.describe() for name, backend in self.backends.items()},
+        }
@@ -5,6 +5,11 @@ class MarkdownFormatter:
     Una classe per aiutare nella formattazione del testo in Markdown.
     """
 
+    VTT_SECTION_TITLE = "Riassunto Video (Trascrizione VTT)"
+    PDF_SECTION_TITLE = "Riassunto Documenti (PDF)"
+    HTML_SECTION_TITLE = "Riassunto Contenuti Web (HTML)"
+    ORPHAN_SECTION_TITLE = "Materiale Aggiuntivo (File Orfani)"
+
     def __init__(self):
         pass
 
@@ -116,51 +121,37 @@ class MarkdownFormatter:
             str: Il contenuto Markdown formattato per il riassunto della lezione.
         """
         parts: List[str] = []
+        sections = [
+            (self.VTT_SECTION_TITLE, vtt_summary),
+            (self.PDF_SECTION_TITLE, pdf_summary),
+            (self.HTML_SECTION_TITLE, html_summary),
+            (self.ORPHAN_SECTION_TITLE, orphan_summary),
+        ]
+        for section_title, summary in sections:
+            parts.append(self.format_lesson_section(section_title, summary))
 
-        if vtt_summary and vtt_summary.strip() and not vtt_summary.startswith("Errore") and not vtt_summary.startswith("Nessun contenuto") :
-            parts.append(self.format_header("Riassunto Video (Trascrizione VTT)", 2))
-            parts.append(self.new_line())
-            parts.append(vtt_summary.strip())
-            parts.append(self.new_line(count=2))
-        elif vtt_summary:
-            parts.append(self.format_header("Riassunto Video (Trascrizione VTT)", 2))
-            parts.append(self.new_line())
-            parts.append(self.format_blockquote(vtt_summary.strip()))
-            parts.append(self.new_line(count=2))
-
-        if pdf_summary and pdf_summary.strip() and not pdf_summary.startswith("Errore") and not pdf_summary.startswith("Nessun contenuto"):
-            parts.append(self.format_header("Riassunto Documenti (PDF)", 2))
-            parts.append(self.new_line())
-            parts.append(pdf_summary.strip())
-            parts.append(self.new_line(count=2))
-        elif pdf_summary:
-            parts.append(self.format_header("Riassunto Documenti (PDF)", 2))
-            parts.append(self.new_line())
-            parts.append(self.format_blockquote(pdf_summary.strip()))
-            parts.append(self.new_line(count=2))
-
-        if html_summary and html_summary.strip() and not html_summary.startswith("Errore") and not html_summary.startswith("Nessun contenuto"):
-            parts.append(self.format_header("Riassunto Contenuti Web (HTML)", 2))
-            parts.append(self.new_line())
-            parts.append(html_summary.strip())
-            parts.append(self.new_line(count=2))
-        elif html_summary:
-            parts.append(self.format_header("Riassunto Contenuti Web (HTML)", 2))
-            parts.append(self.new_line())
-            parts.append(self.format_blockquote(html_summary.strip()))
-            parts.append(self.new_line(count=2))
-        
-        if orphan_summary and orphan_summary.strip() and not orphan_summary.startswith("Errore") and not orphan_summary.startswith("Nessun contenuto"):
-            parts.append(self.format_header("Materiale Aggiuntivo (File Orfani)", 2))
-            parts.append(self.new_line())
-            parts.append(orphan_summary.strip())
-            parts.append(self.new_line(count=2))
-        elif orphan_summary:
-            parts.append(self.format_header("Materiale Aggiuntivo (File Orfani)", 2))
-            parts.append(self.new_line())
-            parts.append(self.format_blockquote(orphan_summary.strip()))
-            parts.append(self.new_line(count=2))
+        return "".join(parts)
+
+    def format_lesson_section(self, section_title: str, summary: Optional[str]) -> str:
+        """Formatta una singola sezione del riassunto di una lezione.
 
+        I messaggi di errore o di contenuto assente vengono resi come blockquote.
+
+        Args:
+            section_title (str): Il titolo della sezione (header di livello 2).
+            summary (Optional[str]): Il riassunto della sezione.
+
+        Returns:
+            str: La sezione formattata, o una stringa vuota se il riassunto è assente.
+        """
+        if not summary:
+            return ""
+        parts: List[str] = [self.format_header(section_title, 2), self.new_line()]
+        if summary.strip() and not summary.startswith("Errore") and not summary.startswith("Nessun contenuto"):
+            parts.append(summary.strip())
+        else:
+            parts.append(self.format_blockquote(summary.strip()))
+        parts.append(self.new_line(count=2))
         return "".join(parts)
 
     def format_chapter_summary(self, summary: str) -> str:
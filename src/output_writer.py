@@ -0,0 +1,556 @@
+"""
+Output Writer: scrittura sicura dei file Markdown generati.
+
+Questo modulo fornisce le primitive per scrivere i file di output in modo
+incrementale su un file temporaneo, rinominandolo atomicamente nella
+destinazione finale solo quando la scrittura è completa. Un'interruzione a
+metà scrittura non lascia mai un file `.md` troncato.
+
+WriteBehindWriter sposta inoltre la scrittura su un thread dedicato, che
+raggruppa le richieste in batch: i file temporanei del batch vengono sincronizzati
+prima delle rinomine, e ogni directory coinvolta una sola volta dopo.
+"""
+import itertools
+import os
+import queue
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, BinaryIO, TextIO
+
+logger = logging.getLogger(__name__)
+
+TEMP_SUFFIX = ".tmp"
+COPY_CHUNK_SIZE = 64 * 1024 # Caratteri letti per blocco durante la copia dei contenuti
+STALE_TEMP_AGE_S = 24 * 3600 # Età oltre la quale un file temporaneo è un residuo anche se il processo risulta attivo
+
+_temp_counter = itertools.count() # Parte univoca dei temporanei di questo processo
+
+
+def temp_path_for(final_path: Path) -> Path:
+    """
+    Restituisce il percorso del file temporaneo usato per scrivere final_path.
+
+    Il file temporaneo è nascosto e si trova nella stessa directory della
+    destinazione, così che la rinomina finale sia atomica. Il nome contiene il
+    pid e un contatore: ogni chiamata restituisce un percorso diverso, anche da
+    più thread che scrivono la stessa destinazione.
+
+    Args:
+        final_path (Path): Percorso finale del file.
+
+    Returns:
+        Path: Percorso del file temporaneo.
+    """
+    return final_path.with_name(f".{final_path.name}.{os.getpid()}.{next(_temp_counter)}{TEMP_SUFFIX}")
+
+
+def _temp_file_pid(path: Path) -> Optional[int]:
+    """
+    Pid del processo che ha creato un file temporaneo di temp_path_for, o None se path non lo è.
+
+    Riconosce anche il formato delle versioni precedenti, senza contatore (.<nome>.<pid>.tmp).
+    """
+    parts = path.name.split(".")
+    if not path.name.startswith(".") or not path.name.endswith(TEMP_SUFFIX) or len(parts) < 4 or not parts[-2].isdigit():
+        return None
+    if len(parts) >= 5 and parts[-3].isdigit():
+        return int(parts[-3])
+    return int(parts[-2])
+
+
+def _is_process_alive(pid: int) -> bool:
+    """Indica se il processo pid è in esecuzione (su Windows si assume di sì: vale solo il limite di età)."""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt": # os.kill(pid, 0) terminerebbe il processo
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # Processo esistente di un altro utente
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def remove_stale_temp_files(directory: Path, skip_dirnames: Iterable[str] = ()) -> int:
+    """
+    Rimuove i file temporanei lasciati da esecuzioni interrotte.
+
+    Vengono rimossi solo i temporanei di processi non più in esecuzione, o più
+    vecchi di STALE_TEMP_AGE_S: quelli di altri job o processi attivi sulla
+    stessa directory (es. un secondo job della modalità --serve, i processi di
+    estrazione) sono scritture in corso.
+
+    Args:
+        directory (Path): Directory (esplorata ricorsivamente) da ripulire.
+        skip_dirnames (Iterable[str]): Nomi delle sottodirectory da non esplorare.
+
+    Returns:
+        int: Numero di file rimossi.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    skip_dirnames = set(skip_dirnames)
+    now = time.time()
+    removed = 0
+    for root, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [name for name in dirnames if name not in skip_dirnames]
+        for filename in filenames:
+            temp_file = Path(root) / filename
+            pid = _temp_file_pid(temp_file)
+            if pid is None:
+                continue
+            try:
+                is_old = now - temp_file.stat().st_mtime > STALE_TEMP_AGE_S
+            except OSError: # Già rinominato o rimosso dal processo che lo scriveva
+                continue
+            if not is_old and _is_process_alive(pid):
+                continue
+            try:
+                temp_file.unlink()
+                removed += 1
+                logger.info(f"Rimosso file temporaneo di un'esecuzione interrotta: {temp_file}")
+            except OSError as e:
+                logger.warning(f"Impossibile rimuovere il file temporaneo '{temp_file}': {e}")
+    return removed
+
+
+def _sync_files(paths: Iterable[Path]) -> None:
+    """Rende persistenti su disco i file indicati (fsync di ciascun file)."""
+    for path in paths:
+        with open(path, "rb+") as f:
+            os.fsync(f.fileno())
+
+
+def _sync_directories(directories: Iterable[Path]) -> None:
+    """
+    Rende persistenti su disco le rinomine nelle directory indicate (fsync delle directory).
+
+    Su Windows le directory non si possono aprire per la sincronizzazione: l'operazione viene saltata.
+    """
+    if os.name == "nt":
+        return
+    for directory in set(directories):
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_text_atomic(final_path: Path, content: str) -> Path:
+    """
+    Scrive un file di testo in modo atomico: file temporaneo, fsync e rinomina.
+
+    Args:
+        final_path (Path): Percorso finale del file.
+        content (str): Contenuto da scrivere.
+
+    Returns:
+        Path: Il percorso finale del file.
+    """
+    final_path = Path(final_path)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = temp_path_for(final_path)
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, final_path)
+        _sync_directories([final_path.parent])
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    return final_path
+
+
+def copy_stripped_text(source: TextIO, write: Callable[[str], None], chunk_size: int = COPY_CHUNK_SIZE) -> int:
+    """
+    Copia il resto di un file di testo a blocchi, senza spazi iniziali e finali.
+
+    Equivale a write(source.read().strip()), ma la memoria usata dipende solo
+    dalla dimensione del blocco (più eventuali spazi consecutivi in attesa),
+    non dalla dimensione del file.
+
+    Args:
+        source (TextIO): File di testo aperto, posizionato all'inizio del contenuto da copiare.
+        write (Callable[[str], None]): Funzione che riceve i blocchi da scrivere.
+        chunk_size (int): Numero di caratteri letti per blocco.
+
+    Returns:
+        int: Numero di caratteri scritti.
+    """
+    written = 0
+    pending_whitespace = "" # Spazi in coda al blocco precedente: scritti solo se seguiti da altro testo
+    leading = True
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if leading:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            leading = False
+        content = chunk.rstrip()
+        if content:
+            write(pending_whitespace + content)
+            written += len(pending_whitespace) + len(content)
+            pending_whitespace = chunk[len(content):]
+        else:
+            pending_whitespace += chunk
+    return written
+
+
+class StreamSection:
+    """
+    Sezione di un file Markdown scritto in streaming.
+
+    Riceve i token man mano che arrivano dall'API e permette di annullarli
+    (ad esempio prima di un nuovo tentativo di chiamata) o di sostituirli con
+    il contenuto definitivo della sezione.
+    """
+
+    def __init__(self, owner: "StreamingMarkdownFile", section_start: int, body_start: int):
+        """
+        Inizializza la sezione.
+
+        Args:
+            owner (StreamingMarkdownFile): File a cui appartiene la sezione.
+            section_start (int): Offset (in byte) di inizio della sezione, header incluso.
+            body_start (int): Offset (in byte) di inizio del corpo della sezione.
+        """
+        self._owner = owner
+        self._section_start = section_start
+        self._body_start = body_start
+
+    def write(self, text: str) -> None:
+        """Accoda un frammento di testo al corpo della sezione."""
+        self._owner.write(text)
+
+    def reset(self) -> None:
+        """Scarta il corpo scritto finora, mantenendo l'header della sezione."""
+        self._owner.truncate(self._body_start)
+
+    def finish(self, content: str) -> None:
+        """
+        Sostituisce l'intera sezione (header incluso) con il contenuto definitivo.
+
+        Args:
+            content (str): Contenuto formattato della sezione. Può essere vuoto.
+        """
+        self._owner.truncate(self._section_start)
+        if content:
+            self._owner.write(content)
+
+
+class StreamingMarkdownFile:
+    """
+    File Markdown scritto in modo incrementale su un file temporaneo.
+
+    Ogni scrittura viene resa subito visibile sul file temporaneo; alla chiusura
+    il file viene sincronizzato su disco e rinominato atomicamente nella
+    destinazione finale. In caso di eccezione il file temporaneo viene rimosso.
+    Usabile come context manager.
+    """
+
+    def __init__(self, final_path: Path):
+        """
+        Inizializza il file in streaming.
+
+        Args:
+            final_path (Path): Percorso finale del file Markdown.
+        """
+        self.final_path = Path(final_path)
+        self.temp_path = temp_path_for(self.final_path)
+        self._file: Optional[BinaryIO] = None
+
+    def open(self) -> "StreamingMarkdownFile":
+        """Crea il file temporaneo (e le directory necessarie)."""
+        self.final_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.temp_path, "w+b")
+        logger.debug(f"Scrittura in streaming avviata su '{self.temp_path}'")
+        return self
+
+    def write(self, text: str) -> None:
+        """
+        Accoda del testo al file temporaneo e lo rende subito visibile su disco.
+
+        Args:
+            text (str): Testo da accodare.
+        """
+        if self._file is None:
+            raise ValueError(f"Il file in streaming '{self.final_path}' non è aperto.")
+        self._file.write(text.encode("utf-8"))
+        self._file.flush()
+
+    def tell(self) -> int:
+        """Restituisce la posizione corrente (in byte) nel file temporaneo."""
+        if self._file is None:
+            raise ValueError(f"Il file in streaming '{self.final_path}' non è aperto.")
+        return self._file.tell()
+
+    def truncate(self, position: int) -> None:
+        """
+        Tronca il file temporaneo alla posizione indicata.
+
+        Args:
+            position (int): Offset (in byte) a cui troncare il file.
+        """
+        if self._file is None:
+            raise ValueError(f"Il file in streaming '{self.final_path}' non è aperto.")
+        self._file.seek(position)
+        self._file.truncate()
+        self._file.flush()
+
+    def begin_section(self, header: str) -> StreamSection:
+        """
+        Scrive l'header di una nuova sezione e restituisce la sezione in streaming.
+
+        Args:
+            header (str): Header (già formattato) della sezione.
+
+        Returns:
+            StreamSection: La sezione su cui scrivere i token in arrivo.
+        """
+        section_start = self.tell()
+        self.write(header)
+        return StreamSection(self, section_start, self.tell())
+
+    def commit(self) -> Path:
+        """
+        Sincronizza il file temporaneo e lo rinomina atomicamente nella destinazione.
+
+        Returns:
+            Path: Il percorso finale del file.
+        """
+        if self._file is None:
+            raise ValueError(f"Il file in streaming '{self.final_path}' non è aperto.")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self.temp_path, self.final_path)
+        _sync_directories([self.final_path.parent])
+        logger.debug(f"File in streaming '{self.final_path}' completato.")
+        return self.final_path
+
+    def detach(self) -> Path:
+        """
+        Chiude il file temporaneo senza rinominarlo, per affidarne il completamento
+        a un WriteBehindWriter (vedi WriteBehindWriter.submit_file).
+
+        Returns:
+            Path: Il percorso del file temporaneo.
+        """
+        if self._file is None:
+            raise ValueError(f"Il file in streaming '{self.final_path}' non è aperto.")
+        self._file.close()
+        self._file = None
+        return self.temp_path
+
+    def abort(self) -> None:
+        """Chiude e rimuove il file temporaneo senza toccare la destinazione."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            self.temp_path.unlink()
+        except FileNotFoundError:
+            pass
+        logger.warning(f"Scrittura in streaming di '{self.final_path}' annullata.")
+
+    def __enter__(self) -> "StreamingMarkdownFile":
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class _WriteRequest:
+    """Richiesta di scrittura accodata a WriteBehindWriter."""
+
+    __slots__ = ("final_path", "content", "temp_path", "future")
+
+    def __init__(self, final_path: Path, content: Optional[str], temp_path: Optional[Path]):
+        self.final_path = Path(final_path)
+        self.content = content
+        self.temp_path = temp_path
+        self.future: Future = Future()
+
+
+class WriteBehindWriter:
+    """
+    Scrittore asincrono dei file di output (write-behind).
+
+    Le richieste vengono accodate e completate da un thread dedicato, così i
+    thread che attendono il modello non eseguono I/O. Ogni batch di richieste
+    viene scritto su file temporanei, sincronizzato su disco e poi rinominato
+    atomicamente nelle destinazioni, di cui si sincronizzano le directory: dopo
+    un crash ogni file finale è completo oppure assente, quindi la ripresa è sicura.
+    Usabile come context manager.
+    """
+
+    def __init__(self, batch_size: int = 32):
+        """
+        Inizializza lo scrittore e avvia il thread di scrittura.
+
+        Args:
+            batch_size (int): Numero massimo di file completati insieme (una sincronizzazione per directory).
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size deve essere almeno 1 (ricevuto {batch_size}).")
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[_WriteRequest]]" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, final_path: Path, content: str) -> Future:
+        """
+        Accoda la scrittura di un file di testo.
+
+        Args:
+            final_path (Path): Percorso finale del file.
+            content (str): Contenuto del file.
+
+        Returns:
+            Future: Risolto con il percorso finale a scrittura completata (o con l'errore).
+        """
+        return self._enqueue(_WriteRequest(final_path, content, None))
+
+    def submit_file(self, temp_path: Path, final_path: Path) -> Future:
+        """
+        Accoda il completamento di un file temporaneo già scritto (es. da StreamingMarkdownFile.detach).
+
+        Args:
+            temp_path (Path): File temporaneo già scritto e chiuso.
+            final_path (Path): Percorso finale del file.
+
+        Returns:
+            Future: Risolto con il percorso finale a rinomina completata (o con l'errore).
+        """
+        return self._enqueue(_WriteRequest(final_path, None, Path(temp_path)))
+
+    def _enqueue(self, request: _WriteRequest) -> Future:
+        if self._closed:
+            raise RuntimeError("WriteBehindWriter è già stato chiuso.")
+        request.future.add_done_callback(lambda f, r=request: self._log_failure(r, f))
+        self._queue.put(request)
+        return request.future
+
+    @staticmethod
+    def _log_failure(request: _WriteRequest, future: Future) -> None:
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Errore durante la scrittura di '{request.final_path}': {error}")
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                self._queue.task_done()
+                return
+            batch = [request]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[_WriteRequest]) -> None:
+        """Scrive i file temporanei del batch, sincronizza una volta e rinomina."""
+        ready: List[_WriteRequest] = []
+        for request in batch:
+            try:
+                if request.content is not None:
+                    request.final_path.parent.mkdir(parents=True, exist_ok=True)
+                    request.temp_path = temp_path_for(request.final_path)
+                    with open(request.temp_path, "w", encoding="utf-8") as f:
+                        f.write(request.content)
+                ready.append(request)
+            except Exception as e:
+                self._discard(request)
+                request.future.set_exception(e)
+
+        try:
+            if ready:
+                _sync_files(request.temp_path for request in ready)
+        except Exception as e:
+            for request in ready:
+                self._discard(request)
+                request.future.set_exception(e)
+            return
+
+        renamed: List[_WriteRequest] = []
+        for request in ready:
+            try:
+                os.replace(request.temp_path, request.final_path)
+                renamed.append(request)
+            except Exception as e:
+                self._discard(request)
+                request.future.set_exception(e)
+
+        # Le rinomine sono persistenti solo dopo la sincronizzazione delle directory
+        try:
+            _sync_directories(request.final_path.parent for request in renamed)
+        except Exception as e:
+            for request in renamed:
+                request.future.set_exception(e)
+            return
+        for request in renamed:
+            request.future.set_result(request.final_path)
+        logger.debug(f"Batch di {len(ready)} file completato dal writer asincrono.")
+
+    @staticmethod
+    def _discard(request: _WriteRequest) -> None:
+        if request.temp_path is None:
+            return
+        try:
+            request.temp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def flush(self) -> None:
+        """Attende il completamento di tutte le scritture accodate finora."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Completa le scritture in coda e arresta il thread di scrittura."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self) -> "WriteBehindWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,119 @@
+"""
+PDF Cleanup: pulizia del testo delle slide prima del riassunto.
+
+Le slide esportate in PDF ripetono su ogni pagina intestazione, piè di pagina e
+numero di pagina, e le animazioni "build" producono una pagina per ogni punto
+aggiunto, ciascuna con tutto il testo della precedente. Questo modulo:
+
+1. individua statisticamente le righe ripetute in cima e in fondo alle pagine
+   (confrontate a meno dei numeri, così "Slide 3 di 20" e "Slide 4 di 20"
+   coincidono) e le rimuove;
+2. elimina le pagine il cui testo è l'inizio di quello della pagina successiva,
+   conservando solo l'ultima pagina di ogni sequenza di build.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Sequence, Set, Tuple
+
+EDGE_LINES = 2 # Righe esaminate in cima e in fondo a ogni pagina
+MIN_PAGES = 3 # Con meno pagine le ripetizioni non sono significative
+REPEATED_LINE_RATIO = 0.6 # Frazione minima delle pagine in cui una riga deve ripetersi
+                          # (più alta della lunghezza tipica delle sequenze di build con lo stesso titolo)
+_CHARS_PER_TOKEN = 4 # Stima approssimativa per i testi in lingue europee
+
+_DIGITS_PATTERN = re.compile(r"\d+")
+
+
+@dataclass
+class PageCleanupStats:
+    """Effetto della pulizia sul testo di un documento."""
+    pages: int = 0
+    pages_kept: int = 0
+    build_pages_removed: int = 0
+    repeated_lines_removed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        """Byte (UTF-8) rimossi dal testo."""
+        return self.bytes_before - self.bytes_after
+
+    @property
+    def tokens_saved(self) -> int:
+        """Stima dei token di prompt risparmiati."""
+        return self.bytes_saved // _CHARS_PER_TOKEN
+
+
+def _line_signature(line: str) -> str:
+    """Forma normalizzata di una riga: spazi compattati, minuscole, numeri sostituiti da '#'."""
+    return _DIGITS_PATTERN.sub("#", " ".join(line.split()).lower())
+
+
+def _edge_indexes(lines: Sequence[str]) -> List[int]:
+    """Indici delle prime e ultime EDGE_LINES righe non vuote di una pagina."""
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(non_empty[:EDGE_LINES] + non_empty[-EDGE_LINES:]))
+
+
+def find_repeated_edge_lines(pages: Sequence[Sequence[str]]) -> Set[str]:
+    """
+    Individua le righe (normalizzate) ripetute in cima o in fondo a molte pagine.
+
+    Args:
+        pages (Sequence[Sequence[str]]): Le righe di ogni pagina.
+
+    Returns:
+        Set[str]: Le forme normalizzate delle intestazioni e dei piè di pagina
+                  (vuoto se il documento ha meno di MIN_PAGES pagine).
+    """
+    if len(pages) < MIN_PAGES:
+        return set()
+    counts = {}
+    for lines in pages:
+        for signature in {_line_signature(lines[i]) for i in _edge_indexes(lines)}:
+            counts[signature] = counts.get(signature, 0) + 1
+    min_count = max(MIN_PAGES, REPEATED_LINE_RATIO * len(pages))
+    return {signature for signature, count in counts.items() if count >= min_count}
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def clean_slide_pages(pages: Sequence[str]) -> Tuple[List[str], PageCleanupStats]:
+    """
+    Rimuove intestazioni, piè di pagina e pagine di build dal testo delle pagine di un PDF.
+
+    Args:
+        pages (Sequence[str]): Il testo estratto da ogni pagina, in ordine.
+
+    Returns:
+        Tuple[List[str], PageCleanupStats]: Il testo delle pagine conservate e le statistiche della pulizia.
+    """
+    stats = PageCleanupStats(pages=len(pages))
+    stats.bytes_before = len("\n\n".join(pages).encode("utf-8"))
+    page_lines = [page.splitlines() for page in pages]
+    repeated = find_repeated_edge_lines(page_lines)
+
+    stripped: List[str] = []
+    for lines in page_lines:
+        edges = set(_edge_indexes(lines)) if repeated else set()
+        kept = [line for i, line in enumerate(lines) if i not in edges or _line_signature(line) not in repeated]
+        stats.repeated_lines_removed += len(lines) - len(kept)
+        stripped.append("\n".join(kept).strip())
+
+    cleaned: List[str] = []
+    for index, page in enumerate(stripped):
+        if not page:
+            continue
+        next_page = next((p for p in stripped[index + 1:] if p), None)
+        # Pagina di build: la successiva ne ripete tutto il testo e aggiunge qualcosa
+        if next_page is not None and _normalize_text(next_page).startswith(_normalize_text(page)):
+            stats.build_pages_removed += 1
+            continue
+        cleaned.append(page)
+
+    stats.pages_kept = len(cleaned)
+    stats.bytes_after = len("\n\n".join(cleaned).encode("utf-8"))
+    return cleaned, stats
@@ -1,35 +1,199 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .prompt_registry import PromptRegistry, PromptTemplate, combine_fingerprints, text_fingerprint
+
+DEFAULT_PROMPTS_DIR = Path(__file__).parent / "prompts"
+SYSTEM_TEMPLATE_PREFIX = "system_" # system_<tipo di lezione>.txt
+DEFAULT_CONTENT_TYPE = "vtt"
+REDUCE_TEMPLATE = "reduce"
+PACKED_TEMPLATE = "packed"
+LESSON_CONTENT_TYPES = ("vtt", "pdf", "html", "orphan_material")
+
+
 class PromptManager:
     """
     Gestisce e fornisce i template dei prompt per la generazione dei riassunti.
+
+    I template sono file di testo caricati una sola volta in un PromptRegistry
+    (directory src/prompts): un prefisso di sistema per tipo di lezione
+    (system_<tipo>.txt), un template per ciascun tipo di contenuto (vtt, pdf,
+    html, orphan_material), il template della fase di unione dei riassunti
+    parziali (reduce) e quello delle richieste con più testi brevi (packed). Le impronte dei template permettono di invalidare i
+    riassunti prodotti con un prompt diverso.
+
+    Ogni prompt è diviso in un prefisso di sistema stabile (le istruzioni di riassunto,
+    identico in tutte le chiamate) e in un suffisso variabile con il testo da
+    riassumere: quando il provider mette in cache il prefisso, la parte comune a
+    migliaia di chiamate viene fatturata a prezzo ridotto.
     """
 
-    # Al momento, questo è l'unico prompt, ma la struttura è pronta per aggiungerne altri.
-    LESSON_PRACTICAL_THEORETICAL_FACE_TO_FACE = """Sei un assistente AI specializzato nel riassumere trascrizioni di lezioni.
-La lezione che stai per analizzare è di tipo "pratico teorica faccia a faccia".
-Questo significa che il contenuto potrebbe includere spiegazioni concettuali, seguite da esempi pratici, dimostrazioni o discussioni interattive.
-Il tuo obiettivo è creare un riassunto chiaro, conciso e ben strutturato che catturi:
-1.  I principali concetti teorici presentati.
-2.  Gli esempi pratici o le dimostrazioni chiave e cosa illustrano.
-3.  Eventuali conclusioni o punti salienti della lezione.
-Mantieni un tono formale ed educativo. Evita informazioni superflue o dettagli troppo specifici che non sono cruciali per la comprensione generale.
-Organizza il riassunto in modo logico, usando elenchi puntati o numerati se appropriato per migliorare la leggibilità.
-Assicurati di estrarre e riformulare le informazioni essenziali dalla trascrizione fornita. Non aggiungere informazioni non presenti nel testo.
-
-Trascrizione della lezione:
----
-{lesson_transcript}
----
-
-Fornisci il riassunto:
-"""
+    def __init__(self, prompts_dir: Optional[Union[str, Path]] = None):
+        """
+        Inizializza PromptManager caricando i template.
+
+        Args:
+            prompts_dir: Directory dei template (default: la directory prompts del package).
+
+        Raises:
+            ValueError: Se la directory non contiene template validi.
+        """
+        self.registry = PromptRegistry.from_directory(prompts_dir or DEFAULT_PROMPTS_DIR)
+        self._system_prompts: Dict[str, str] = {} # Prefissi già composti, per tipo di lezione
+        self._fingerprints: Dict[Tuple[str, str], str] = {} # Impronte per (tipo di contenuto, tipo di lezione)
+
+    def _system_template(self, lesson_type: str) -> PromptTemplate:
+        name = f"{SYSTEM_TEMPLATE_PREFIX}{lesson_type}"
+        if name not in self.registry:
+            raise ValueError(f"Tipo di lezione non supportato: {lesson_type}")
+        return self.registry.get(name)
+
+    def _content_template(self, content_type: str) -> PromptTemplate:
+        # I tipi di contenuto senza un template proprio usano quello delle trascrizioni
+        if content_type in LESSON_CONTENT_TYPES and content_type in self.registry:
+            return self.registry.get(content_type)
+        return self.registry.get(DEFAULT_CONTENT_TYPE)
+
+    def get_system_prompt(self, lesson_type: str = "practical_theoretical_face_to_face") -> str:
+        """
+        Restituisce il prefisso di sistema stabile per un dato tipo di lezione.
+
+        Il prefisso contiene solo le istruzioni ed è identico in tutte le chiamate.
+
+        Args:
+            lesson_type: Il tipo di lezione per cui ottenere il prompt.
+
+        Returns:
+            Il messaggio di sistema.
+
+        Raises:
+            ValueError: Se il tipo di lezione non è supportato.
+        """
+        system_prompt = self._system_prompts.get(lesson_type)
+        if system_prompt is None:
+            system_prompt = self._system_template(lesson_type).render()
+            self._system_prompts[lesson_type] = system_prompt
+        return system_prompt
+
+    def get_lesson_messages(self, lesson_transcript: str, lesson_type: str = "practical_theoretical_face_to_face",
+                            content_type: str = DEFAULT_CONTENT_TYPE) -> List[Dict[str, str]]:
+        """
+        Costruisce i messaggi della richiesta di riassunto: prefisso di sistema stabile e testo variabile.
+
+        Args:
+            lesson_transcript: Il testo da riassumere.
+            lesson_type: Il tipo di lezione per cui ottenere il prompt.
+            content_type: Il tipo di contenuto del testo ("vtt", "pdf", "html", "orphan_material").
+
+        Returns:
+            I messaggi (sistema e utente) per l'API Chat Completions.
+
+        Raises:
+            ValueError: Se il tipo di lezione non è supportato.
+        """
+        return [
+            {"role": "system", "content": self.get_system_prompt(lesson_type)},
+            {"role": "user", "content": self._content_template(content_type).render(lesson_transcript=lesson_transcript)},
+        ]
+
+    def get_reduce_messages(self, partial_summaries: List[str], lesson_type: str = "practical_theoretical_face_to_face") -> List[Dict[str, str]]:
+        """
+        Costruisce i messaggi della fase di unione dei riassunti parziali di un testo diviso in parti.
+
+        Args:
+            partial_summaries: I riassunti parziali, in ordine.
+            lesson_type: Il tipo di lezione per cui ottenere il prompt.
+
+        Returns:
+            I messaggi (sistema e utente) per l'API Chat Completions.
+
+        Raises:
+            ValueError: Se il tipo di lezione non è supportato.
+        """
+        return [
+            {"role": "system", "content": self.get_system_prompt(lesson_type)},
+            {"role": "user", "content": self.registry.get(REDUCE_TEMPLATE).render(partial_summaries="\n\n".join(partial_summaries))},
+        ]
+
+    def get_packed_messages(self, packed_items: str, lesson_type: str = "practical_theoretical_face_to_face") -> List[Dict[str, str]]:
+        """
+        Costruisce i messaggi di una richiesta che riassume più testi brevi con una risposta JSON.
+
+        Args:
+            packed_items: I testi, serializzati come elenco JSON di oggetti con "id", "tipo" e "testo".
+            lesson_type: Il tipo di lezione per cui ottenere il prompt.
+
+        Returns:
+            I messaggi (sistema e utente) per l'API Chat Completions.
+
+        Raises:
+            ValueError: Se il tipo di lezione non è supportato o il template non è disponibile.
+        """
+        return [
+            {"role": "system", "content": self.get_system_prompt(lesson_type)},
+            {"role": "user", "content": self.registry.get(PACKED_TEMPLATE).render(packed_items=packed_items)},
+        ]
+
+    def fingerprint(self, content_type: str = DEFAULT_CONTENT_TYPE, lesson_type: str = "practical_theoretical_face_to_face") -> str:
+        """
+        Impronta dei prompt usati per riassumere un tipo di contenuto.
+
+        Cambia se e solo se cambiano i messaggi inviati al modello per quel tipo di
+        contenuto (prefisso di sistema o template del contenuto).
+
+        Args:
+            content_type: Il tipo di contenuto.
+            lesson_type: Il tipo di lezione.
+
+        Returns:
+            L'impronta, da includere nelle chiavi delle cache dei riassunti.
+
+        Raises:
+            ValueError: Se il tipo di lezione non è supportato.
+        """
+        key = (content_type, lesson_type)
+        fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            fingerprint = combine_fingerprints([
+                text_fingerprint(self.get_system_prompt(lesson_type)),
+                self._content_template(content_type).fingerprint,
+            ])
+            self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def section_fingerprints(self, content_types: Optional[Iterable[str]] = None,
+                             lesson_type: str = "practical_theoretical_face_to_face") -> Dict[str, str]:
+        """
+        Impronte dei prompt delle sezioni di una lezione, per tipo di contenuto.
+
+        Il file di una lezione registra solo le impronte delle sezioni che contiene:
+        modificare il template di un tipo di contenuto rigenera solo le lezioni che
+        hanno quel tipo di contenuto (non cambiano con altri template, es. quello
+        della fase di unione).
+
+        Args:
+            content_types: I tipi di contenuto della lezione (default: tutti, LESSON_CONTENT_TYPES).
+            lesson_type: Il tipo di lezione.
+
+        Returns:
+            L'impronta di ciascun tipo di contenuto, nell'ordine ricevuto.
+        """
+        if content_types is None:
+            content_types = LESSON_CONTENT_TYPES
+        return {content_type: self.fingerprint(content_type, lesson_type) for content_type in content_types}
+
+    @property
+    def version(self) -> str:
+        """Impronta dell'intero registro dei template (versione dei prompt)."""
+        return self.registry.fingerprint()
 
     def get_lesson_prompt(self, lesson_type: str = "practical_theoretical_face_to_face") -> str:
         """
-        Restituisce il template del prompt per un dato tipo di lezione.
+        Restituisce il template di prompt completo (istruzioni seguite dalla trascrizione) in un unico messaggio.
 
         Args:
-            lesson_type: Il tipo di lezione per cui ottenere il prompt. 
-                         Attualmente supporta solo "practical_theoretical_face_to_face".
+            lesson_type: Il tipo di lezione per cui ottenere il prompt.
+                         Attualmente supportato: "practical_theoretical_face_to_face".
 
         Returns:
             Il template del prompt come stringa.
@@ -37,11 +201,7 @@ Fornisci il riassunto:
         Raises:
             ValueError: Se il tipo di lezione non è supportato.
         """
-        if lesson_type == "practical_theoretical_face_to_face":
-            return self.LESSON_PRACTICAL_THEORETICAL_FACE_TO_FACE
-        else:
-            # In futuro, si potranno aggiungere altri tipi di prompt qui
-            raise ValueError(f"Tipo di lezione non supportato: {lesson_type}")
+        return self._system_template(lesson_type).text + "\n" + self.registry.get(DEFAULT_CONTENT_TYPE).text
 
     def format_prompt(self, prompt_template: str, **kwargs) -> str:
         """
@@ -0,0 +1,198 @@
+"""
+Prompt Registry: template dei prompt caricati da file, compilati e con impronta.
+
+Ogni file `<nome>.txt` della directory dei prompt è un template con segnaposto
+nel formato di str.format (es. `{lesson_transcript}`). I template vengono letti
+e analizzati una sola volta, al caricamento: la resa di un template è una
+semplice concatenazione di parti già separate.
+
+Ogni template ha un'impronta (hash SHA-256 del testo) che cambia se e solo se
+cambia il testo: le cache dei riassunti (journal) e la rigenerazione incrementale
+delle lezioni la usano per invalidare i risultati prodotti con un prompt diverso.
+"""
+import hashlib
+import logging
+import string
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIX = ".txt"
+FINGERPRINT_LENGTH = 16 # Caratteri esadecimali dell'impronta (64 bit)
+
+
+def text_fingerprint(text: str) -> str:
+    """
+    Calcola l'impronta di un testo.
+
+    Args:
+        text (str): Il testo.
+
+    Returns:
+        str: I primi FINGERPRINT_LENGTH caratteri dell'hash SHA-256 esadecimale del testo.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def combine_fingerprints(fingerprints: Iterable[str]) -> str:
+    """
+    Combina più impronte in una sola, che cambia se cambia una qualsiasi di esse.
+
+    Args:
+        fingerprints (Iterable[str]): Le impronte, nell'ordine in cui contribuiscono.
+
+    Returns:
+        str: L'impronta combinata.
+    """
+    return text_fingerprint("\n".join(fingerprints))
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Un template di prompt compilato: testo, segnaposto e impronta."""
+    name: str
+    text: str
+    fingerprint: str
+    fields: Tuple[str, ...]
+    # Coppie (testo letterale, segnaposto o None) in cui è scomposto il template
+    parts: Tuple[Tuple[str, Optional[str]], ...] = field(repr=False)
+
+    @classmethod
+    def compile(cls, name: str, text: str) -> "PromptTemplate":
+        """
+        Analizza il testo di un template.
+
+        Args:
+            name (str): Nome del template.
+            text (str): Testo con segnaposto nel formato di str.format ({nome}; {{ e }} per le graffe).
+
+        Returns:
+            PromptTemplate: Il template compilato.
+
+        Raises:
+            ValueError: Se il testo contiene segnaposto posizionali, con attributi,
+                        indici, specifiche di formato o conversioni.
+        """
+        parts: List[Tuple[str, Optional[str]]] = []
+        fields: List[str] = []
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise ValueError(f"Template di prompt '{name}' non valido: {e}") from e
+        for literal, field_name, format_spec, conversion in parsed:
+            if field_name is not None and (not field_name.isidentifier() or format_spec or conversion):
+                raise ValueError(f"Template di prompt '{name}': segnaposto non supportato '{{{field_name}}}'.")
+            parts.append((literal, field_name))
+            if field_name is not None and field_name not in fields:
+                fields.append(field_name)
+        return cls(name, text, text_fingerprint(text), tuple(fields), tuple(parts))
+
+    def render(self, **values: object) -> str:
+        """
+        Sostituisce i segnaposto del template.
+
+        Args:
+            **values: Valore di ciascun segnaposto (i valori in più vengono ignorati).
+
+        Returns:
+            str: Il testo risultante.
+
+        Raises:
+            ValueError: Se manca il valore di un segnaposto.
+        """
+        missing = [name for name in self.fields if name not in values]
+        if missing:
+            raise ValueError(f"Template di prompt '{self.name}': valori mancanti per {', '.join(missing)}.")
+        return "".join(
+            literal if field_name is None else literal + str(values[field_name])
+            for literal, field_name in self.parts
+        )
+
+
+class PromptRegistry:
+    """
+    Raccolta di template di prompt compilati, indicizzati per nome.
+    """
+
+    def __init__(self, templates: Dict[str, PromptTemplate]):
+        """
+        Inizializza il registro.
+
+        Args:
+            templates (Dict[str, PromptTemplate]): Template per nome.
+        """
+        self._templates = dict(sorted(templates.items()))
+
+    @classmethod
+    def from_directory(cls, directory: Union[str, Path]) -> "PromptRegistry":
+        """
+        Carica e compila tutti i template di una directory.
+
+        Args:
+            directory (Union[str, Path]): Directory con i file `<nome>.txt` (UTF-8).
+
+        Returns:
+            PromptRegistry: Il registro dei template.
+
+        Raises:
+            ValueError: Se la directory non esiste, non contiene template o un template non è valido.
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            raise ValueError(f"Directory dei prompt non trovata: {directory}")
+        templates = {
+            path.stem: PromptTemplate.compile(path.stem, path.read_text(encoding="utf-8"))
+            for path in sorted(directory.glob(f"*{TEMPLATE_SUFFIX}"))
+        }
+        if not templates:
+            raise ValueError(f"Nessun template di prompt in {directory}")
+        registry = cls(templates)
+        logger.debug(f"Caricati {len(templates)} template di prompt da {directory} (impronta {registry.fingerprint()}).")
+        return registry
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def names(self) -> List[str]:
+        """Nomi dei template, in ordine alfabetico."""
+        return list(self._templates)
+
+    def get(self, name: str) -> PromptTemplate:
+        """
+        Restituisce un template.
+
+        Args:
+            name (str): Nome del template.
+
+        Returns:
+            PromptTemplate: Il template.
+
+        Raises:
+            ValueError: Se il template non esiste.
+        """
+        template = self._templates.get(name)
+        if template is None:
+            raise ValueError(f"Template di prompt non trovato: {name}")
+        return template
+
+    def fingerprint(self, *names: str) -> str:
+        """
+        Impronta combinata di alcuni template (di tutti, se non indicati).
+
+        Args:
+            *names (str): Nomi dei template.
+
+        Returns:
+            str: Impronta che cambia solo se cambia uno dei template indicati.
+
+        Raises:
+            ValueError: Se uno dei template non esiste.
+        """
+        selected = names or tuple(self._templates)
+        return combine_fingerprints(f"{name}:{self.get(name).fingerprint}" for name in selected)
+
+    def describe(self) -> Dict[str, str]:
+        """Impronte dei template per nome, per log e metadati delle sessioni."""
+        return {name: template.fingerprint for name, template in self._templates.items()}
@@ -0,0 +1,370 @@
+"""
+Rate Limiter: limite condiviso sulle chiamate all'API del modello.
+
+Quando più corsi vengono elaborati insieme (modalità catalogo), tutte le
+chiamate di riassunto e di descrizione delle immagini passano da un unico
+RateLimiter, che limita le richieste in volo e, opzionalmente, le richieste
+al minuto. In questo modo il parallelismo tra corsi non moltiplica il carico
+sull'API né i relativi errori 429.
+
+Il numero giusto di richieste contemporanee dipende dal modello, dall'ora e
+dal livello dell'account. AdaptiveRateLimiter lo cerca da solo con un
+controllo AIMD (aumento additivo, riduzione moltiplicativa): il limite sale di
+uno a ogni finestra di richieste completate con il limite saturo, senza errori
+429 e con il 95° percentile della latenza stabile; viene ridotto in modo
+moltiplicativo a ogni errore 429 e quando la latenza sale oltre la tolleranza.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Limitatore thread-safe delle chiamate all'API.
+
+    Combina un semaforo (richieste contemporanee) con una spaziatura minima tra
+    l'avvio di due richieste consecutive (richieste al minuto). Si usa come
+    context manager attorno alla singola chiamata:
+
+        with rate_limiter:
+            client.chat.completions.create(...)
+    """
+
+    def __init__(self, max_concurrent: int = 8, requests_per_minute: Optional[float] = None):
+        """
+        Inizializza il limitatore.
+
+        Args:
+            max_concurrent (int): Numero massimo di richieste in volo contemporaneamente.
+            requests_per_minute (Optional[float]): Numero massimo di richieste avviate
+                al minuto. None disabilita il limite temporale.
+        """
+        if max_concurrent < 1:
+            raise ValueError(f"Il numero di richieste contemporanee deve essere almeno 1 (ricevuto {max_concurrent}).")
+        if requests_per_minute is not None and requests_per_minute <= 0:
+            raise ValueError(f"Il numero di richieste al minuto deve essere positivo (ricevuto {requests_per_minute}).")
+
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_start = 0.0 # Istante (monotonic) dal quale può partire la prossima richiesta
+        self._requests = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._wait_seconds = 0.0
+
+    def acquire(self) -> float:
+        """
+        Attende che una nuova richiesta possa partire e ne occupa lo slot.
+
+        Returns:
+            float: Secondi di attesa imposti dal limitatore.
+        """
+        start = time.monotonic()
+        self._acquire_slot()
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_start)
+                self._next_start = start_at + self._interval
+            delay = start_at - now
+            if delay > 0:
+                time.sleep(delay)
+        waited = time.monotonic() - start
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+            self._wait_seconds += waited
+        return waited
+
+    def release(self) -> None:
+        """Libera lo slot occupato da una richiesta terminata."""
+        with self._lock:
+            self._in_flight -= 1
+        self._release_slot()
+
+    def _acquire_slot(self) -> None:
+        self._slots.acquire()
+
+    def _release_slot(self) -> None:
+        self._slots.release()
+
+    def __enter__(self) -> "RateLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Restituisce le statistiche di utilizzo del limitatore.
+
+        Returns:
+            Dict[str, float]: Richieste servite, massimo di richieste in volo
+                              e secondi complessivi di attesa.
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "max_in_flight": self._max_in_flight,
+                "wait_seconds": round(self._wait_seconds, 3),
+            }
+
+
+DEFAULT_INITIAL_CONCURRENCY = 4
+MIN_WINDOW_SAMPLES = 10 # Richieste minime di una finestra di osservazione
+LATENCY_TOLERANCE = 2.0 # Picco: p95 della finestra oltre il doppio del riferimento
+RATE_LIMIT_BACKOFF = 0.5 # Riduzione del limite a un errore 429
+LATENCY_BACKOFF = 0.8 # Riduzione del limite a un picco di latenza
+BASELINE_SMOOTHING = 0.2 # Peso della nuova finestra nel p95 di riferimento
+# Dopo un picco il riferimento si sposta a metà strada verso il nuovo p95: se la latenza
+# dipende dal carico di lavoro (testi più lunghi) e non dal sovraccarico, la finestra
+# successiva con la stessa latenza non è più un picco e il limite torna a salire
+SPIKE_BASELINE_SHIFT = 0.5
+
+
+def is_rate_limit_error(error: Optional[BaseException]) -> bool:
+    """True se l'eccezione è un errore 429 dell'API (es. openai.RateLimitError)."""
+    return error is not None and getattr(error, "status_code", None) == 429
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Percentile (metodo del rango più vicino) di una lista non vuota."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Limitatore con limite di richieste contemporanee adattivo (AIMD).
+
+    Si usa come RateLimiter: all'uscita dal context manager osserva la latenza
+    della chiamata e l'eventuale errore 429, e adegua il limite tra
+    min_concurrent e max_concurrent. Le osservazioni delle richieste avviate
+    prima dell'ultima riduzione vengono ignorate: una raffica di 429 dallo
+    stesso sovraccarico riduce il limite una volta sola.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 16,
+        requests_per_minute: Optional[float] = None,
+        initial_concurrent: int = DEFAULT_INITIAL_CONCURRENCY,
+        min_concurrent: int = 1,
+        on_limit_change: Optional[Callable[[int, int, str], None]] = None
+    ):
+        """
+        Inizializza il limitatore.
+
+        Args:
+            max_concurrent (int): Limite massimo di richieste in volo.
+            requests_per_minute (Optional[float]): Numero massimo di richieste avviate al minuto.
+            initial_concurrent (int): Limite iniziale (ridotto a max_concurrent se superiore).
+            min_concurrent (int): Limite minimo.
+            on_limit_change (Optional[Callable[[int, int, str], None]]): Chiamata a ogni variazione
+                del limite con il limite precedente, quello nuovo e il motivo
+                ("latency_stable", "rate_limited" o "latency_spike").
+
+        Raises:
+            ValueError: Se i limiti non sono positivi o min_concurrent supera max_concurrent.
+        """
+        super().__init__(max_concurrent=max_concurrent, requests_per_minute=requests_per_minute)
+        if min_concurrent < 1 or min_concurrent > max_concurrent or initial_concurrent < 1:
+            raise ValueError(f"Limiti di concorrenza non validi: minimo {min_concurrent}, iniziale {initial_concurrent}, massimo {max_concurrent}.")
+        self.min_concurrent = min_concurrent
+        self.on_limit_change = on_limit_change
+        self._limit = float(max(min_concurrent, min(initial_concurrent, max_concurrent)))
+        self._condition = threading.Condition()
+        self._active = 0 # Slot occupati
+        self._local = threading.local()
+        self._window: List[float] = []
+        self._window_saturated = False # Il limite è stato raggiunto durante la finestra
+        self._last_decrease = 0.0 # Istante (monotonic) dell'ultima riduzione
+        self._baseline_p95: Optional[float] = None
+        self._rate_limited = 0
+        self._increases = 0
+        self._decreases = 0
+        self._peak_limit = int(self._limit)
+
+    @property
+    def limit(self) -> int:
+        """Limite corrente di richieste contemporanee."""
+        with self._condition:
+            return int(self._limit)
+
+    def _acquire_slot(self) -> None:
+        with self._condition:
+            while self._active >= int(self._limit):
+                self._window_saturated = True
+                self._condition.wait()
+            self._active += 1
+            if self._active >= int(self._limit):
+                self._window_saturated = True
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def __enter__(self) -> "AdaptiveRateLimiter":
+        self.acquire()
+        if not hasattr(self._local, "started"):
+            self._local.started = []
+        self._local.started.append(time.monotonic())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        started = self._local.started.pop()
+        try:
+            rate_limited = is_rate_limit_error(exc_value)
+            if exc_value is None or rate_limited: # Gli altri errori non dicono nulla sul carico
+                self.observe(time.monotonic() - started, rate_limited, started)
+        finally:
+            self.release()
+
+    def observe(self, latency_s: float, rate_limited: bool = False, started_at: Optional[float] = None) -> None:
+        """
+        Registra l'esito di una chiamata e adegua il limite.
+
+        Args:
+            latency_s (float): Durata della chiamata in secondi.
+            rate_limited (bool): True se la chiamata è stata respinta con un errore 429.
+            started_at (Optional[float]): Istante (monotonic) di avvio della chiamata;
+                le chiamate avviate prima dell'ultima riduzione vengono ignorate.
+        """
+        change = None
+        with self._condition:
+            if rate_limited:
+                self._rate_limited += 1
+            if started_at is not None and started_at < self._last_decrease:
+                return
+            if rate_limited:
+                change = self._set_limit(max(self.min_concurrent, self._limit * RATE_LIMIT_BACKOFF), "rate_limited")
+            else:
+                self._window.append(latency_s)
+                if len(self._window) >= max(MIN_WINDOW_SAMPLES, int(self._limit)):
+                    change = self._close_window()
+        if change is not None and self.on_limit_change is not None:
+            try:
+                self.on_limit_change(*change)
+            except Exception as e:
+                logger.error(f"Errore nella notifica della variazione del limite di concorrenza: {e}")
+
+    def _close_window(self) -> Optional[Tuple[int, int, str]]:
+        # Da chiamare con il lock acquisito
+        p95 = _percentile(self._window, 95)
+        saturated = self._window_saturated
+        self._window = []
+        self._window_saturated = False
+        if self._baseline_p95 is not None and p95 > self._baseline_p95 * LATENCY_TOLERANCE:
+            self._baseline_p95 += SPIKE_BASELINE_SHIFT * (p95 - self._baseline_p95)
+            return self._set_limit(max(self.min_concurrent, self._limit * LATENCY_BACKOFF), "latency_spike")
+        if self._baseline_p95 is None:
+            self._baseline_p95 = p95
+        else:
+            self._baseline_p95 += BASELINE_SMOOTHING * (p95 - self._baseline_p95)
+        if saturated and self._limit < self.max_concurrent:
+            return self._set_limit(min(self.max_concurrent, self._limit + 1), "latency_stable")
+        return None
+
+    def _set_limit(self, limit: float, reason: str) -> Optional[Tuple[int, int, str]]:
+        # Da chiamare con il lock acquisito; restituisce la variazione da notificare
+        previous = int(self._limit)
+        if limit == self._limit:
+            return None
+        if limit < self._limit:
+            self._decreases += 1
+            self._last_decrease = time.monotonic()
+            self._window = []
+            self._window_saturated = False
+        else:
+            self._increases += 1
+        self._limit = limit
+        current = int(limit)
+        self._peak_limit = max(self._peak_limit, current)
+        self._condition.notify_all()
+        if current == previous:
+            return None
+        logger.info(f"Limite di richieste contemporanee: {previous} -> {current} ({reason}).")
+        return previous, current, reason
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Restituisce le statistiche del limitatore, con quelle del controllo adattivo.
+
+        Returns:
+            Dict[str, float]: Le statistiche di RateLimiter, il limite corrente e massimo
+                              raggiunto, gli errori 429, gli aumenti e le riduzioni del
+                              limite e il p95 di riferimento della latenza.
+        """
+        stats = super().get_stats()
+        with self._condition:
+            stats.update({
+                "concurrency_limit": int(self._limit),
+                "peak_concurrency_limit": self._peak_limit,
+                "rate_limited": self._rate_limited,
+                "limit_increases": self._increases,
+                "limit_decreases": self._decreases,
+                "p95_latency_s": round(self._baseline_p95, 3) if self._baseline_p95 is not None else None,
+            })
+        return stats
+
+
+RETRY_BASE_DELAY_S = 2.0 # Attesa prima del secondo tentativo, raddoppiata a ogni tentativo
+RETRY_MAX_DELAY_S = 60.0 # Attesa massima tra due tentativi (anche con Retry-After)
+
+
+def client_max_retries(rate_limiter: Optional[RateLimiter]) -> Optional[int]:
+    """
+    Tentativi interni da concedere al client OpenAI le cui chiamate passano da rate_limiter.
+
+    Con il limitatore adattivo il client non ripete le richieste (0): i tentativi
+    avvengono fuori dallo slot, così ogni 429 arriva subito al limitatore e la
+    latenza osservata è quella di una sola richiesta. Negli altri casi resta il
+    default dell'SDK (None), con la sua attesa esponenziale.
+    """
+    return 0 if isinstance(rate_limiter, AdaptiveRateLimiter) else None
+
+
+def is_retryable_status(status_code: Optional[int]) -> bool:
+    """True per gli stati HTTP per cui ha senso ripetere la richiesta (timeout, conflitto, 429, errori del server)."""
+    return status_code is not None and (status_code in (408, 409, 429) or status_code >= 500)
+
+
+def retry_delay_s(error: Optional[BaseException], attempt: int, base_delay_s: float = RETRY_BASE_DELAY_S,
+                  max_delay_s: float = RETRY_MAX_DELAY_S) -> float:
+    """
+    Attesa prima di ripetere una richiesta fallita.
+
+    Usa l'intestazione Retry-After (o retry-after-ms) della risposta di errore, se
+    presente; altrimenti un'attesa esponenziale. L'attesa non supera mai max_delay_s.
+
+    Args:
+        error (Optional[BaseException]): L'errore della richiesta (es. openai.RateLimitError).
+        attempt (int): Numero del tentativo fallito, da 0.
+        base_delay_s (float): Attesa dopo il primo tentativo.
+        max_delay_s (float): Attesa massima.
+
+    Returns:
+        float: L'attesa in secondi.
+    """
+    delay = base_delay_s * 2 ** attempt
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            if headers.get("retry-after-ms") is not None:
+                delay = float(headers["retry-after-ms"]) / 1000
+            elif headers.get("retry-after") is not None:
+                delay = float(headers["retry-after"])
+        except (TypeError, ValueError): # Retry-After in formato data: vale l'attesa esponenziale
+            pass
+    return max(0.0, min(max_delay_s, delay))
@@ -0,0 +1,314 @@
+"""
+Request Packer: più testi brevi in un'unica richiesta con risposta JSON.
+
+Frammenti orfani, brevi note HTML e lezioni introduttive di pochi minuti
+producono chiamate minuscole, in cui il costo fisso della richiesta e il lungo
+prompt di sistema ripetuto pesano più del testo. Il RequestPacker raccoglie i
+testi brevi inviati in contemporanea dai thread delle lezioni e delle sezioni:
+
+1. il primo testo di un gruppo (stesso backend, modello e parametri) apre un
+   lotto e ne diventa il responsabile; i successivi vi si aggiungono finché il
+   lotto non raggiunge il budget di token o il numero massimo di testi;
+2. il responsabile attende al più linger_s secondi, poi chiude il lotto e invia
+   un'unica richiesta che chiede un oggetto JSON con un riassunto per ogni id;
+3. la risposta viene validata e ogni riassunto torna al thread che lo attende,
+   con la sua quota dei token della richiesta. I testi senza un riassunto
+   valido nella risposta (o di un lotto con un solo testo) ricevono None: il
+   chiamante li riassume con una richiesta singola.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PACK_TOKEN_BUDGET = 3000 # Token (stimati) dei testi di una richiesta
+DEFAULT_MAX_ITEM_TOKENS = 500 # Testi più lunghi: richiesta singola
+DEFAULT_MAX_ITEMS = 20
+DEFAULT_LINGER_S = 0.5 # Attesa massima di altri testi prima di inviare un lotto
+# Attesa di un testo senza altri testi in corso: basta per i testi avviati insieme
+# (es. le sezioni di una stessa lezione) e non rallenta un testo isolato
+DEFAULT_LONE_LINGER_S = 0.02
+_CHARS_PER_TOKEN = 4 # Stima approssimativa per i testi in lingue europee
+
+_CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+TokenUsage = Dict[str, int]
+
+
+@dataclass
+class PackedItem:
+    """Un testo di un lotto e, dopo la richiesta, il suo riassunto."""
+    item_id: str
+    content_type: str
+    text: str
+    summary: Optional[str] = None
+    usage: Optional[TokenUsage] = None
+
+
+@dataclass
+class _Batch:
+    group: Hashable
+    context: Any
+    items: List[PackedItem] = field(default_factory=list)
+    tokens: int = 0
+    closed: threading.Event = field(default_factory=threading.Event)
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+def estimate_tokens(text: str) -> int:
+    """Stima approssimativa dei token di un testo."""
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def build_packed_input(items: Sequence[PackedItem]) -> str:
+    """
+    Serializza i testi di un lotto per il prompt.
+
+    Args:
+        items (Sequence[PackedItem]): I testi.
+
+    Returns:
+        str: Elenco JSON di oggetti con "id", "tipo" e "testo".
+    """
+    return json.dumps(
+        [{"id": item.item_id, "tipo": item.content_type, "testo": item.text} for item in items],
+        ensure_ascii=False, indent=1
+    )
+
+
+def parse_packed_response(response: Optional[str], item_ids: Sequence[str]) -> Dict[str, str]:
+    """
+    Valida la risposta a una richiesta con più testi.
+
+    Args:
+        response (Optional[str]): Il testo della risposta (un oggetto JSON, eventualmente in un blocco di codice).
+        item_ids (Sequence[str]): Gli id dei testi inviati.
+
+    Returns:
+        Dict[str, str]: I riassunti validi (stringhe non vuote), per id; vuoto se la risposta non è un oggetto JSON.
+    """
+    if not response:
+        return {}
+    try:
+        data = json.loads(_CODE_FENCE_PATTERN.sub("", response.strip()))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    summaries = {}
+    for item_id in item_ids:
+        value = data.get(item_id)
+        if isinstance(value, str) and value.strip():
+            summaries[item_id] = value.strip()
+    return summaries
+
+
+def split_usage(usage: Optional[TokenUsage], items: Sequence[PackedItem]) -> List[Optional[TokenUsage]]:
+    """
+    Ripartisce i token di una richiesta tra i suoi testi.
+
+    I token del prompt sono divisi in proporzione alla lunghezza dei testi, quelli
+    del completamento in proporzione alla lunghezza dei riassunti.
+
+    Args:
+        usage (Optional[TokenUsage]): I token della richiesta.
+        items (Sequence[PackedItem]): I testi, con i riassunti ottenuti.
+
+    Returns:
+        List[Optional[TokenUsage]]: La quota di ciascun testo (None se usage è None).
+    """
+    if not usage:
+        return [None] * len(items)
+    prompt_shares = _proportional_shares(usage.get("prompt_tokens", 0), [len(item.text) for item in items])
+    completion_shares = _proportional_shares(usage.get("completion_tokens", 0), [len(item.summary or "") for item in items])
+    return [
+        {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+        for prompt, completion in zip(prompt_shares, completion_shares)
+    ]
+
+
+def _proportional_shares(total: int, weights: Sequence[int]) -> List[int]:
+    """Divide un intero in parti proporzionali ai pesi, con somma esatta (quote cumulative arrotondate)."""
+    weight_sum = sum(weights)
+    if not weight_sum:
+        return [0] * len(weights)
+    shares = []
+    allocated = 0
+    cumulative = 0
+    for weight in weights:
+        cumulative += weight
+        share = total * cumulative // weight_sum - allocated
+        shares.append(share)
+        allocated += share
+    return shares
+
+
+def merge_usage(first: Optional[TokenUsage], second: Optional[TokenUsage]) -> Optional[TokenUsage]:
+    """Somma due conteggi di token (None se entrambi mancano)."""
+    if not first:
+        return second
+    if not second:
+        return first
+    return {key: first.get(key, 0) + second.get(key, 0) for key in set(first) | set(second)}
+
+
+class RequestPacker:
+    """
+    Raggruppa i testi brevi riassunti in contemporanea in richieste con più testi.
+
+    Sicuro per l'uso da più thread: summarize è bloccante e restituisce il
+    riassunto del testo quando la richiesta del suo lotto è completata.
+
+    Il primo testo di un lotto attende gli altri fino a linger_s solo mentre altri
+    testi sono in corso nel packer (in altri gruppi o in richieste in volo); un testo
+    isolato attende al massimo lone_linger_s e segue subito il percorso normale.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any, List[PackedItem]], Tuple[Optional[str], Optional[TokenUsage]]],
+        token_budget: int = DEFAULT_PACK_TOKEN_BUDGET,
+        max_item_tokens: int = DEFAULT_MAX_ITEM_TOKENS,
+        max_items: int = DEFAULT_MAX_ITEMS,
+        linger_s: float = DEFAULT_LINGER_S,
+        lone_linger_s: float = DEFAULT_LONE_LINGER_S
+    ):
+        """
+        Inizializza il packer.
+
+        Args:
+            send (Callable): Invia la richiesta di un lotto: riceve il contesto del gruppo
+                (es. la decisione di instradamento) e i testi, restituisce il testo della
+                risposta e i token usati. Le eccezioni fanno ricadere i testi sulle richieste singole.
+            token_budget (int): Token (stimati) massimi dei testi di una richiesta.
+            max_item_tokens (int): Token (stimati) massimi di un testo da raggruppare.
+            max_items (int): Numero massimo di testi per richiesta.
+            linger_s (float): Attesa massima di altri testi prima di inviare un lotto.
+            lone_linger_s (float): Attesa massima quando nessun altro testo è in corso.
+
+        Raises:
+            ValueError: Se i limiti non sono positivi o il testo massimo supera il budget.
+        """
+        if token_budget < 1 or max_item_tokens < 1 or max_items < 2 or linger_s < 0 or lone_linger_s < 0:
+            raise ValueError("I limiti del raggruppamento delle richieste devono essere positivi (almeno 2 testi per richiesta).")
+        if max_item_tokens > token_budget:
+            raise ValueError(f"Il testo massimo ({max_item_tokens} token) supera il budget della richiesta ({token_budget} token).")
+        self._send = send
+        self.token_budget = token_budget
+        self.max_item_tokens = max_item_tokens
+        self.max_items = max_items
+        self.linger_s = linger_s
+        self.lone_linger_s = lone_linger_s
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock) # Notificata quando cambiano i testi in corso o un lotto si chiude
+        self._active = 0 # Chiamate a summarize in corso
+        self._open_batches: Dict[Hashable, _Batch] = {}
+        self.requests = 0 # Richieste con più testi inviate
+        self.items_packed = 0 # Testi riassunti da una richiesta con più testi
+        self.items_fallback = 0 # Testi ricaduti su una richiesta singola
+
+    def accepts(self, text: str) -> bool:
+        """True se il testo è abbastanza breve da essere raggruppato."""
+        return bool(text.strip()) and estimate_tokens(text) <= self.max_item_tokens
+
+    def _close(self, batch: _Batch) -> None:
+        # Da chiamare con il lock acquisito
+        if self._open_batches.get(batch.group) is batch:
+            del self._open_batches[batch.group]
+        batch.closed.set()
+        self._changed.notify_all()
+
+    def _wait_for_batch(self, batch: _Batch) -> None:
+        """Attende altri testi per il lotto del leader, poi lo chiude (da chiamare con il lock acquisito)."""
+        started = time.monotonic()
+        while not batch.closed.is_set():
+            # Attesa piena solo se qualche altro testo è in corso fuori da questo lotto
+            others_active = self._active > len(batch.items)
+            remaining = started + (self.linger_s if others_active else min(self.linger_s, self.lone_linger_s)) - time.monotonic()
+            if remaining <= 0:
+                break
+            self._changed.wait(remaining)
+        self._close(batch)
+
+    def summarize(self, text: str, content_type: str, group: Hashable, context: Any = None) -> Tuple[Optional[str], Optional[TokenUsage]]:
+        """
+        Riassume un testo breve insieme agli altri del suo gruppo.
+
+        Args:
+            text (str): Il testo (vedi accepts).
+            content_type (str): Tipo di contenuto del testo.
+            group (Hashable): Chiave del gruppo: i testi di una richiesta condividono backend, modello e parametri.
+            context (Any): Contesto del gruppo passato a send (es. la decisione di instradamento).
+
+        Returns:
+            Tuple[Optional[str], Optional[TokenUsage]]: Il riassunto (None se il testo va riassunto
+                con una richiesta singola) e la quota dei token della richiesta con più testi.
+        """
+        tokens = estimate_tokens(text)
+        with self._lock:
+            self._active += 1
+            self._changed.notify_all()
+            batch = self._open_batches.get(group)
+            if batch is not None and (batch.tokens + tokens > self.token_budget or len(batch.items) >= self.max_items):
+                self._close(batch)
+                batch = None
+            is_leader = batch is None
+            if is_leader:
+                batch = _Batch(group, context)
+                self._open_batches[group] = batch
+            item = PackedItem(str(len(batch.items) + 1), content_type, text)
+            batch.items.append(item)
+            batch.tokens += tokens
+            if batch.tokens >= self.token_budget or len(batch.items) >= self.max_items:
+                self._close(batch)
+
+        try:
+            if is_leader:
+                with self._lock:
+                    self._wait_for_batch(batch)
+                self._execute(batch)
+            else:
+                batch.done.wait()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._changed.notify_all()
+        return item.summary, item.usage
+
+    def _execute(self, batch: _Batch) -> None:
+        """Invia la richiesta di un lotto chiuso e distribuisce i riassunti."""
+        try:
+            if len(batch.items) < 2:
+                return # Nessun vantaggio: il testo segue il percorso normale
+            try:
+                response, usage = self._send(batch.context, batch.items)
+            except Exception as e:
+                logger.warning(f"Richiesta con {len(batch.items)} testi fallita ({e}): ogni testo verrà riassunto singolarmente.")
+                response, usage = None, None
+            summaries = parse_packed_response(response, [item.item_id for item in batch.items])
+            for item in batch.items:
+                item.summary = summaries.get(item.item_id)
+            for item, share in zip(batch.items, split_usage(usage, batch.items)):
+                item.usage = share
+            missing = len(batch.items) - len(summaries)
+            with self._lock:
+                self.requests += 1
+                self.items_packed += len(summaries)
+                self.items_fallback += missing
+            if missing:
+                logger.warning(f"Risposta con {len(summaries)} riassunti validi su {len(batch.items)}: "
+                               f"{missing} testi verranno riassunti singolarmente.")
+            else:
+                logger.info(f"Riassunti {len(batch.items)} testi brevi con un'unica richiesta.")
+        finally:
+            batch.done.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Richieste con più testi, testi riassunti in questo modo e testi ricaduti su richieste singole."""
+        with self._lock:
+            return {"requests": self.requests, "items_packed": self.items_packed, "items_fallback": self.items_fallback}
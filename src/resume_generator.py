@@ -6,30 +6,62 @@ Questo script analizza una struttura di cartelle del corso, estrae testo da file
 e genera riassunti intelligenti utilizzando l'API di OpenAI.
 """
 import argparse
+import json
 import os
 import logging
+import sqlite3
 import time
+import threading
 from pathlib import Path
-import webvtt # type: ignore
-import PyPDF2 # type: ignore
-from typing import List, Optional, Union, Dict, Tuple, Callable # Union potrebbe essere necessario per coerenza con altre funzioni, lo lascio per ora
-from langchain_text_splitters import RecursiveCharacterTextSplitter # type: ignore
+from typing import TYPE_CHECKING, List, Optional, Union, Dict, Set, Tuple, Callable, TextIO, Sequence # Union potrebbe essere necessario per coerenza con altre funzioni, lo lascio per ora
 from .api_key_manager import APIKeyManager # IMPORT AGGIUNTO
 from .langfuse_tracker import LangfuseTracker # NUOVO IMPORT
 # from dotenv import load_dotenv
 # import hashlib
-import openai # type: ignore
 import re # Necessario per find_related_pdf
 from dotenv import load_dotenv # IMPORT AGGIUNTO
 from .markdown_formatter import MarkdownFormatter # NUOVO IMPORT
 from .prompt_manager import PromptManager # NUOVO IMPORT PER PROMPT_MANAGER
 from .html_parser import extract_text_and_images_from_html # NUOVO IMPORT PER HTML
-from .image_describer import ImageDescriber # NUOVO IMPORT PER IMMAGINI
+from .pdf_cleanup import clean_slide_pages
+from .text_compressor import compress_text
+from .output_writer import StreamingMarkdownFile, StreamSection, WriteBehindWriter, copy_stripped_text, remove_stale_temp_files, write_text_atomic
+from .lesson_pipeline import LessonPipeline
+from .job_journal import JobJournal, JOURNAL_FILENAME
+from .extraction_cache import ExtractionCache, EXTRACTION_CACHE_DIRNAME, UncacheableExtractionError
+from .shared_materials import SharedMaterial, SharedMaterialIndex, SHARED_MATERIALS_DIRNAME, SUMMARY_TOKENS_KEY
+from .similarity_index import DEFAULT_SIMILARITY_THRESHOLD, SimilarityIndex, minhash_signature
+from .singleflight import SingleFlight, request_fingerprint
+from .request_packer import DEFAULT_MAX_ITEM_TOKENS, DEFAULT_PACK_TOKEN_BUDGET, PackedItem, RequestPacker, build_packed_input, merge_usage
+from .rate_limiter import (DEFAULT_INITIAL_CONCURRENCY, AdaptiveRateLimiter, RateLimiter, client_max_retries,
+                           is_retryable_status, retry_delay_s)
+from .llm_backend import BackendRouter, LLMBackend, RouteDecision, IMAGE_CONTENT_TYPE, default_text_backend, token_usage_from_response
+from .catalog_runner import CourseReport, discover_courses, run_catalog, write_catalog_report
+from .course_watcher import CourseWatcher
+from .job_service import JobService, create_server, is_unix_socket
 from datetime import datetime # IMPORT AGGIUNTO
+from dataclasses import dataclass, field, replace
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from .lazy_import import lazy_import
+
+# Dipendenze pesanti importate al primo utilizzo (vedi lazy_import)
+webvtt = lazy_import("webvtt")
+PyPDF2 = lazy_import("PyPDF2")
+openai = lazy_import("openai")
+langchain_text_splitters = lazy_import("langchain_text_splitters")
+
+if TYPE_CHECKING:
+    from .image_describer import ImageDescriber
 
 # Configurazione del logger
 logger = logging.getLogger(__name__)
 
+# Prefisso delle chiavi del frontmatter delle lezioni con le impronte dei prompt usati,
+# una per sezione (es. "prompt_fingerprint_pdf")
+PROMPT_FINGERPRINT_KEY = "prompt_fingerprint"
+
 def configure_logging():
     """
     Configura il sistema di logging di base.
@@ -56,7 +88,9 @@ def parse_arguments():
     parser.add_argument(
         "course_dir",
         type=str,
-        help="Directory contenente il corso da processare."
+        nargs="?",
+        help="Directory contenente il corso da processare (con --catalog, la directory "
+             "che contiene i corsi). Non necessaria con --serve."
     )
     
     parser.add_argument(
@@ -66,8 +100,161 @@ def parse_arguments():
         help="Directory di output per i riassunti generati. Se non specificata, "
              "verrà creata una directory 'resume_[nome_corso]' nella directory corrente."
     )
-    
-    return parser.parse_args()
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Riceve i riassunti in streaming e li scrive progressivamente su un file "
+             "temporaneo, rinominato nella destinazione finale a lezione completata."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Numero di lezioni riassunte in parallelo dalla pipeline a stadi (default: 4). "
+             "Con 0 le lezioni vengono elaborate in sequenza, senza pipeline."
+    )
+
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=None,
+        help="Numero di processi usati per estrarre il testo da VTT/PDF/HTML "
+             "(default: numero di CPU; 0 per estrarre senza pool di processi)."
+    )
+
+    parser.add_argument(
+        "--catalog",
+        action="store_true",
+        help="Tratta course_dir come un catalogo: ogni sottodirectory con capitoli è un corso. "
+             "I corsi condividono pool e rate limiter; l'output di ciascuno va in "
+             "'resume_[nome_corso]' dentro --output_dir, insieme a un report del catalogo."
+    )
+
+    parser.add_argument(
+        "--catalog-workers",
+        type=int,
+        default=2,
+        help="Numero di corsi elaborati contemporaneamente in modalità catalogo (default: 2)."
+    )
+
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        default=16,
+        help="Numero massimo di richieste all'API in volo contemporaneamente (default: 16)."
+    )
+
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="Adegua automaticamente il numero di richieste all'API in volo (controllo AIMD su latenza ed errori 429), "
+             f"partendo da {DEFAULT_INITIAL_CONCURRENCY} e fino a --max-concurrent-requests."
+    )
+
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=None,
+        help="Numero massimo di richieste all'API avviate al minuto (default: nessun limite)."
+    )
+
+    parser.add_argument(
+        "--llm-config",
+        type=str,
+        default=None,
+        help="File JSON con i backend LLM (OpenAI o server locali compatibili) e il backend da usare per tipo di contenuto (default: OpenAI)."
+    )
+
+    parser.add_argument(
+        "--similarity-index",
+        type=str,
+        default=None,
+        help="Database SQLite (creato se assente) con le trascrizioni già riassunte, anche di altri corsi: "
+             "una trascrizione quasi identica a una già indicizzata ne riutilizza il riassunto (default: disattivato)."
+    )
+
+    parser.add_argument(
+        "--similarity-threshold",
+        type=float,
+        default=DEFAULT_SIMILARITY_THRESHOLD,
+        help=f"Similarità stimata (Jaccard sugli shingle di parole) oltre la quale un riassunto viene "
+             f"riutilizzato con --similarity-index (default: {DEFAULT_SIMILARITY_THRESHOLD})."
+    )
+
+    parser.add_argument(
+        "--pack-small-inputs",
+        action="store_true",
+        help="Riassume i testi brevi (materiale orfano, note HTML, lezioni di pochi minuti) elaborati in contemporanea "
+             "a gruppi, con un'unica richiesta e una risposta JSON per gruppo; i testi mancanti nella risposta "
+             "vengono riassunti singolarmente."
+    )
+
+    parser.add_argument(
+        "--pack-token-budget",
+        type=int,
+        default=DEFAULT_PACK_TOKEN_BUDGET,
+        help=f"Token (stimati) massimi dei testi di una richiesta con --pack-small-inputs (default: {DEFAULT_PACK_TOKEN_BUDGET})."
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Dopo l'elaborazione iniziale resta in ascolto sulla directory del corso e "
+             "rigenera solo le lezioni i cui file cambiano (Ctrl-C per terminare)."
+    )
+
+    parser.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=5.0,
+        help="Secondi senza nuove modifiche dopo i quali una raffica di file viene elaborata (default: 5)."
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Avvia un servizio locale (HTTP/JSON) che riceve corsi e lezioni come job, "
+             "mantenendo attivi client e pool di worker tra un job e l'altro."
+    )
+
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Indirizzo su cui ascolta il servizio dei job (default: 127.0.0.1)."
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Porta TCP del servizio dei job (default: 8765)."
+    )
+
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Percorso di un socket Unix su cui esporre il servizio dei job, al posto della porta TCP."
+    )
+
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=2,
+        help="Numero di job eseguiti contemporaneamente dal servizio (default: 2)."
+    )
+
+    args = parser.parse_args()
+    if args.watch and args.catalog:
+        parser.error("--watch non può essere usato insieme a --catalog.")
+    if args.serve and (args.watch or args.catalog):
+        parser.error("--serve non può essere usato insieme a --watch o --catalog.")
+    if not args.serve and not args.course_dir:
+        parser.error("course_dir è obbligatorio (tranne che con --serve).")
+    return args
 
 def setup_output_directory(course_dir: str, output_dir: Optional[str] = None) -> Path:
     """
@@ -319,19 +506,24 @@ def extract_text_from_vtt(vtt_file_path: Union[str, Path]) -> str:
     except Exception as e:
         raise Exception(f"Errore durante l'estrazione del testo dal file VTT '{vtt_file_path}': {str(e)}")
 
-def extract_text_from_pdf(pdf_file_path: Union[str, Path]) -> str:
+def extract_text_from_pdf(pdf_file_path: Union[str, Path], raise_on_error: bool = False) -> str:
     """
     Estrae il testo da un file PDF.
     Utilizza la libreria PyPDF2 per estrarre il testo da tutte le pagine del documento PDF.
+    Intestazioni e piè di pagina ripetuti e pagine di build delle slide vengono
+    rimossi (vedi pdf_cleanup.clean_slide_pages).
 
     Args:
         pdf_file_path (Union[str, Path]): Percorso del file PDF da processare.
+        raise_on_error (bool): Se True, un file protetto o illeggibile solleva UncacheableExtractionError
+            invece di restituire un testo vuoto (per non memorizzarlo nella cache di estrazione).
             
     Returns:
         str: Il testo estratto dal file PDF. Vuoto se il file è protetto o illeggibile.
         
     Raises:
-        ValueError: Se il file non esiste o non è un file PDF valido.
+        ValueError: Se il file non esiste o non è un file PDF valido (UncacheableExtractionError se
+            non è leggibile e raise_on_error è True).
     """
     pdf_path = Path(pdf_file_path)
     logger.debug(f"Tentativo di estrazione del testo dal file PDF: {pdf_path}")
@@ -353,6 +545,8 @@ def extract_text_from_pdf(pdf_file_path: Union[str, Path]) -> str:
                     logger.warning(f"Il file PDF '{pdf_path}' era criptato ed è stato decriptato con una password vuota.")
                 except Exception as decrypt_error:
                     logger.error(f"Il file PDF '{pdf_path}' è criptato e non può essere decriptato con una password vuota. Errore: {decrypt_error}")
+                    if raise_on_error:
+                        raise UncacheableExtractionError(f"Il file PDF '{pdf_file_path}' è criptato: {decrypt_error}") from decrypt_error
                     return ""
 
             all_text: List[str] = []
@@ -366,7 +560,15 @@ def extract_text_from_pdf(pdf_file_path: Union[str, Path]) -> str:
                 except Exception as page_extract_error:
                     logger.error(f"Errore durante l'estrazione del testo dalla pagina {page_num + 1} del PDF '{pdf_path}': {page_extract_error}")
             
-            extracted_text = "\n\n".join(all_text).strip()
+            pages, cleanup_stats = clean_slide_pages(all_text)
+            if cleanup_stats.bytes_saved > 0:
+                logger.info(
+                    f"Pulizia del PDF '{pdf_path.name}': rimosse {cleanup_stats.build_pages_removed} pagine di build e "
+                    f"{cleanup_stats.repeated_lines_removed} righe di intestazione/piè di pagina; "
+                    f"{cleanup_stats.bytes_saved} byte (circa {cleanup_stats.tokens_saved} token) in meno "
+                    f"({cleanup_stats.bytes_saved / cleanup_stats.bytes_before:.0%})."
+                )
+            extracted_text = "\n\n".join(pages).strip()
             
             if not extracted_text:
                 logger.warning(f"Nessun testo estratto dal PDF '{pdf_path}'.")
@@ -374,14 +576,20 @@ def extract_text_from_pdf(pdf_file_path: Union[str, Path]) -> str:
                 logger.info(f"Testo estratto con successo dal PDF '{pdf_path}' ({len(extracted_text)} caratteri).")
             return extracted_text
         
+    except ValueError:
+        raise
     except PyPDF2.errors.PdfReadError as e:
         logger.error(f"Errore di lettura PyPDF2 per il file PDF '{pdf_path}': {e}.")
+        if raise_on_error:
+            raise UncacheableExtractionError(f"Il file PDF '{pdf_file_path}' non è leggibile: {e}") from e
         return ""
     except FileNotFoundError:
         logger.error(f"File PDF non trovato: '{pdf_path}'.")
         raise ValueError(f"Il file PDF '{pdf_file_path}' non è stato trovato.")
     except Exception as e:
         logger.error(f"Errore generico durante l'estrazione del testo dal file PDF '{pdf_path}': {e}")
+        if raise_on_error:
+            raise UncacheableExtractionError(f"Errore durante l'estrazione del testo dal file PDF '{pdf_file_path}': {e}") from e
         return ""
 
 def chunk_text(text: str, max_chunk_size: int = 4000, overlap: int = 200) -> List[str]: # Ripristinato List[str]
@@ -415,7 +623,7 @@ def chunk_text(text: str, max_chunk_size: int = 4000, overlap: int = 200) -> Lis
     try:
         logging.debug(f"Divisione del testo ({len(text)} caratteri) in chunks di massimo {max_chunk_size} caratteri.")
         
-        text_splitter = RecursiveCharacterTextSplitter(
+        text_splitter = langchain_text_splitters.RecursiveCharacterTextSplitter(
             separators=["\n\n", "\n", ". ", " ", ""],
             chunk_size=max_chunk_size,
             chunk_overlap=overlap,
@@ -433,6 +641,112 @@ def chunk_text(text: str, max_chunk_size: int = 4000, overlap: int = 200) -> Lis
         logging.error(f"Errore durante la divisione del testo in chunks: {e}")
         raise Exception(f"Errore durante la divisione del testo in chunks: {e}")
 
+def create_image_describer(
+    api_key: str,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    backend_router: Optional[BackendRouter] = None
+) -> "ImageDescriber":
+    """
+    Crea un ImageDescriber, importando il modulo (e il client OpenAI) solo al primo utilizzo.
+
+    Args:
+        api_key (str): Chiave API OpenAI.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        rate_limiter (Optional[RateLimiter]): Limitatore condiviso delle chiamate all'API.
+        backend_router (Optional[BackendRouter]): Router da cui ottenere il backend delle immagini.
+                                                  Se None, OpenAI con gpt-4o.
+
+    Returns:
+        ImageDescriber: Il descrittore di immagini.
+    """
+    from .image_describer import ImageDescriber
+    backend = backend_router.for_content_type(IMAGE_CONTENT_TYPE) if backend_router is not None else None
+    return ImageDescriber(api_key=api_key, langfuse_tracker=langfuse_tracker, rate_limiter=rate_limiter, backend=backend)
+
+_openai_clients: Dict[Tuple[object, str, Optional[str], Optional[int]], "openai.OpenAI"] = {}
+_openai_clients_lock = threading.Lock()
+_summary_flights = SingleFlight() # Richieste di riassunto identiche in corso, condivise tra i thread
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> "openai.OpenAI":
+    """
+    Restituisce un client OpenAI riutilizzabile per la chiave indicata.
+
+    Il client è thread-safe e mantiene il proprio pool di connessioni HTTP: le
+    chiamate successive (e i job del servizio, vedi serve_jobs) evitano di
+    ricreare il client e di ripetere l'handshake TLS. La cache è indicizzata
+    anche sul costruttore, così un costruttore sostituito (es. nei test) non
+    riceve un client creato in precedenza.
+
+    Args:
+        api_key (str): La chiave API di OpenAI.
+        base_url (Optional[str]): URL base di un endpoint compatibile con OpenAI
+                                  (es. un server vLLM locale). None per l'API di OpenAI.
+        max_retries (Optional[int]): Tentativi interni del client (vedi client_max_retries);
+                                     None per il default dell'SDK.
+
+    Returns:
+        openai.OpenAI: Il client associato alla chiave e all'endpoint.
+    """
+    cache_key = (openai.OpenAI, api_key, base_url, max_retries)
+    with _openai_clients_lock:
+        client = _openai_clients.get(cache_key)
+        if client is None:
+            options: Dict[str, object] = {"api_key": api_key}
+            if base_url:
+                options["base_url"] = base_url
+            if max_retries is not None:
+                options["max_retries"] = max_retries
+            client = openai.OpenAI(**options)
+            _openai_clients[cache_key] = client
+        return client
+
+def _stream_completion(
+    client: "openai.OpenAI",
+    model_name: str,
+    messages: List[Dict[str, str]],
+    stream_sink: StreamSection,
+    start_time: float,
+    generation_options: Optional[Dict[str, object]] = None
+) -> Tuple[str, Optional[object]]:
+    """
+    Esegue una chat completion in streaming scrivendo ogni token su stream_sink.
+
+    Args:
+        client (openai.OpenAI): Client OpenAI da utilizzare.
+        model_name (str): Nome del modello.
+        messages (List[Dict[str, str]]): Messaggi della richiesta.
+        stream_sink (StreamSection): Sezione su cui scrivere i token ricevuti.
+        start_time (float): Istante di inizio del tentativo (per la latenza del primo token).
+        generation_options (Optional[Dict[str, object]]): Parametri di generazione
+            (temperature, max_tokens); default temperature=0.5.
+
+    Returns:
+        Tuple[str, Optional[object]]: Il testo completo ricevuto e l'oggetto usage
+                                      restituito nell'ultimo chunk (se disponibile).
+    """
+    stream_sink.reset() # Scarta eventuali token di un tentativo precedente
+    response_stream = client.chat.completions.create(
+        model=model_name,
+        messages=messages, # type: ignore
+        **(generation_options or {"temperature": 0.5}),
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    summary_parts: List[str] = []
+    usage = None
+    for chunk in response_stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not summary_parts:
+                    logger.debug(f"Primo token ricevuto in {time.time() - start_time:.2f} secondi.")
+                summary_parts.append(delta)
+                stream_sink.write(delta)
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+    return "".join(summary_parts), usage
+
 def summarize_with_openai(
     text_content: str, 
     api_key: str, 
@@ -442,7 +756,11 @@ def summarize_with_openai(
     chapter_name: Optional[str] = None,
     lesson_name: Optional[str] = None,
     content_type: str = "vtt",
-    lesson_type_for_prompt: str = "practical_theoretical_face_to_face" # AGGIUNTO per tracciamento
+    lesson_type_for_prompt: str = "practical_theoretical_face_to_face", # AGGIUNTO per tracciamento
+    stream_sink: Optional[StreamSection] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    backend: Optional[LLMBackend] = None,
+    route: Optional[RouteDecision] = None
 ) -> Tuple[str, Optional[Dict[str, int]]]:
     """
     Invia una richiesta di riassunto all'API di OpenAI.
@@ -451,6 +769,11 @@ def summarize_with_openai(
     un riassunto del testo fornito. Gestisce le eccezioni comuni dell'API.
     Traccia la chiamata con Langfuse se un tracker è fornito.
 
+    Le richieste non in streaming identiche (stesso backend, modello, parametri,
+    prompt e testo) presentate mentre una è già in corso non vengono ripetute:
+    attendono la risposta di quella in corso e la condividono. I token vengono
+    contabilizzati una sola volta, dalla richiesta effettivamente eseguita.
+
     Args:
         text_content (str): Il testo da riassumere.
         api_key (str): La chiave API di OpenAI.
@@ -462,33 +785,107 @@ def summarize_with_openai(
         lesson_name (Optional[str], optional): Nome della lezione (per Langfuse).
         content_type (str): Tipo di contenuto (es. "vtt", "pdf", per Langfuse).
         lesson_type_for_prompt (str): Tipo di lezione usato per selezionare il prompt (per Langfuse).
+        stream_sink (Optional[StreamSection]): Se fornito, la risposta viene ricevuta in streaming
+                                               e ogni token viene scritto sulla sezione man mano che arriva.
+                                               La sezione viene azzerata all'inizio di ogni tentativo.
+        rate_limiter (Optional[RateLimiter]): Limitatore condiviso delle chiamate all'API.
+                                              Ogni tentativo occupa uno slot per la sua durata.
+        backend (Optional[LLMBackend]): Endpoint e modello da usare. Se None, l'API di OpenAI
+                                        con il modello di OPENAI_MODEL_NAME (default gpt-4o-mini).
+        route (Optional[RouteDecision]): Decisione di instradamento (vedi BackendRouter.route):
+                                         se fornita, ne usa backend, modello, max_tokens e temperatura.
 
     Returns:
         str: Il riassunto generato da OpenAI, o una stringa di errore in caso di fallimento.
-        Tuple[str, Optional[Dict[str, int]]]: Riassunto e informazioni sull'uso dei token.
+        Tuple[str, Optional[Dict[str, int]]]: Riassunto e informazioni sull'uso dei token
+                                              (None per le richieste che hanno condiviso una risposta).
+    """
+    call = partial(
+        _request_summary, text_content, api_key, prompt_manager, system_prompt_content, langfuse_tracker,
+        chapter_name, lesson_name, content_type, lesson_type_for_prompt, stream_sink, rate_limiter, backend, route
+    )
+    if stream_sink is not None:
+        return call() # Lo streaming scrive sulla sezione della singola lezione: niente condivisione
+    try:
+        flight_key = _summary_request_key(text_content, prompt_manager, content_type, lesson_type_for_prompt, backend, route)
+    except ValueError:
+        return call() # Prompt non valido: l'errore viene gestito e riportato dalla richiesta
+    (summary, usage), shared = _summary_flights.do(flight_key, call)
+    if shared:
+        logger.info(f"Riassunto condiviso con una richiesta identica già in corso: lezione='{lesson_name}', tipo='{content_type}'.")
+        return summary, None
+    return summary, usage
+
+def _summary_request_key(
+    text_content: str,
+    prompt_manager: PromptManager,
+    content_type: str,
+    lesson_type_for_prompt: str,
+    backend: Optional[LLMBackend],
+    route: Optional[RouteDecision]
+) -> str:
     """
+    Impronta di una richiesta di riassunto, per riconoscere le richieste identiche in corso.
+
+    Raises:
+        ValueError: Se il prompt per il tipo di lezione o di contenuto non esiste.
+    """
+    if route is not None:
+        backend = route.backend
+    elif backend is None:
+        backend = default_text_backend()
+    return request_fingerprint(
+        backend.name, backend.base_url,
+        route.model if route is not None else backend.model,
+        route.temperature if route is not None else None,
+        route.max_tokens if route is not None else None,
+        prompt_manager.fingerprint(content_type, lesson_type_for_prompt),
+        content_type, lesson_type_for_prompt, text_content
+    )
+
+def _request_summary(
+    text_content: str, 
+    api_key: str, 
+    prompt_manager: PromptManager, # AGGIUNTO prompt_manager
+    system_prompt_content: Optional[str] = None, # Questo potrebbe diventare obsoleto o gestito diversamente
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    chapter_name: Optional[str] = None,
+    lesson_name: Optional[str] = None,
+    content_type: str = "vtt",
+    lesson_type_for_prompt: str = "practical_theoretical_face_to_face", # AGGIUNTO per tracciamento
+    stream_sink: Optional[StreamSection] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    backend: Optional[LLMBackend] = None,
+    route: Optional[RouteDecision] = None
+) -> Tuple[str, Optional[Dict[str, int]]]:
+    """Esegue una richiesta di riassunto, con i tentativi (vedi summarize_with_openai)."""
     # openai.api_key = api_key # Rimosso perché la chiave è passata direttamente alla chiamata client
     max_retries = 3
-    retry_delay = 5  # secondi
-    # Legge il nome del modello dalla variabile d'ambiente o usa un default
-    model_name = os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini") 
+    retry_delay = 0.0 # secondi, vedi retry_delay_s
+    # Senza un backend esplicito, il modello viene letto da OPENAI_MODEL_NAME
+    if route is not None:
+        backend = route.backend
+    elif backend is None:
+        backend = default_text_backend()
+    model_name = route.model if route is not None else backend.model
+    call_limiter = backend.select_limiter(rate_limiter)
+    generation_options: Dict[str, object] = {"temperature": 0.5}
+    if route is not None:
+        if route.temperature is not None:
+            generation_options["temperature"] = route.temperature
+        if route.max_tokens is not None:
+            generation_options["max_tokens"] = route.max_tokens
 
     # Ottenere e formattare il prompt usando PromptManager
     # Per ora, usiamo il tipo di default. In futuro, potremmo voler passare un lesson_type specifico.
     try:
-        current_prompt_template = prompt_manager.get_lesson_prompt(lesson_type=lesson_type_for_prompt) # USA lesson_type_for_prompt
-        user_prompt_content = prompt_manager.format_prompt(current_prompt_template, lesson_transcript=text_content)
+        # Prefisso di sistema stabile (messo in cache dal provider) seguito dal testo variabile
+        messages = prompt_manager.get_lesson_messages(text_content, lesson_type=lesson_type_for_prompt, content_type=content_type) # USA lesson_type_for_prompt
+        prompt_fingerprint = prompt_manager.fingerprint(content_type, lesson_type_for_prompt)
     except ValueError as e:
         logger.error(f"Errore nel recuperare o formattare il prompt: {e}")
         return f"Errore nella configurazione del prompt: {e}", None
-
-    # Il system_prompt_content potrebbe non essere più necessario se il prompt principale è completo.
-    # Se ancora necessario, dovrà essere integrato nella logica di PromptManager o passato separatamente.
-    # Per ora, lo commentiamo se il prompt da PromptManager è inteso come prompt utente completo.
-    messages = [
-        # {"role": "system", "content": system_prompt_content if system_prompt_content else "Sei un assistente utile che riassume testi."}, # COMMENTATO/MODIFICABILE
-        {"role": "user", "content": user_prompt_content}
-    ]
+    user_prompt_content = messages[-1]["content"]
     
     for attempt in range(max_retries):
         start_time_attempt = time.time() # Per la latenza di questo tentativo
@@ -499,31 +896,32 @@ def summarize_with_openai(
         try:
             logger.info(f"Tentativo {attempt + 1} di chiamata API OpenAI per riassumere: lezione='{lesson_name}', tipo='{content_type}'.")
             
-            client = openai.OpenAI(api_key=api_key)
-            completion = client.chat.completions.create(
-                model=model_name, # Utilizza la variabile model_name
-                messages=messages, # type: ignore
-                temperature=0.5,
-            )
+            client = get_openai_client(backend.resolve_api_key(api_key), backend.base_url, client_max_retries(call_limiter))
+            with call_limiter if call_limiter is not None else nullcontext():
+                if stream_sink is not None:
+                    summary, usage = _stream_completion(client, model_name, messages, stream_sink, start_time_attempt, generation_options)
+                else:
+                    completion = client.chat.completions.create(
+                        model=model_name, # Utilizza la variabile model_name
+                        messages=messages, # type: ignore
+                        **generation_options,
+                    )
+                    summary = completion.choices[0].message.content
+                    usage = completion.usage
             
             duration_attempt = time.time() - start_time_attempt
             logger.info(f"Chiamata API OpenAI completata in {duration_attempt:.2f} secondi.")
 
-            summary = completion.choices[0].message.content
             summary_for_langfuse = summary if summary else ""
             
-            if completion.usage:
-                token_usage_for_langfuse = {
-                    "prompt_tokens": completion.usage.prompt_tokens,
-                    "completion_tokens": completion.usage.completion_tokens,
-                    "total_tokens": completion.usage.total_tokens
-                }
+            if usage:
+                token_usage_for_langfuse = token_usage_from_response(usage)
 
             if summary:
                 logger.info(f"Riassunto generato con successo per: lezione='{lesson_name}', tipo='{content_type}'. Lunghezza: {len(summary)} caratteri.")
                 # Chiamata a LangfuseTracker in caso di successo
                 if langfuse_tracker:
-                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
                     langfuse_tracker.track_llm_call(
                         input_text=user_prompt_content, 
                         output_text=summary_for_langfuse,
@@ -534,7 +932,8 @@ def summarize_with_openai(
                         token_usage=token_usage_for_langfuse,
                         latency_ms=duration_attempt * 1000,
                         error=None,
-                        prompt_info=prompt_info_for_langfuse # PASSATO prompt_info
+                        prompt_info=prompt_info_for_langfuse, # PASSATO prompt_info
+                        cost_usd=backend.estimate_cost(token_usage_for_langfuse)
                     )
                 return summary.strip(), token_usage_for_langfuse
             else:
@@ -543,7 +942,7 @@ def summarize_with_openai(
                 error_for_langfuse = "Empty summary returned by API" # Per Langfuse
                 # Chiamata a LangfuseTracker in caso di riassunto vuoto (trattato come un "warning" o "errore logico")
                 if langfuse_tracker:
-                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
                     langfuse_tracker.track_llm_call(
                         input_text=user_prompt_content,
                         output_text=summary_for_langfuse, 
@@ -559,40 +958,44 @@ def summarize_with_openai(
                 return summary_for_langfuse, token_usage_for_langfuse
 
         except openai.APIConnectionError as e:
+            retry_delay = retry_delay_s(e, attempt)
             error_message = f"Errore di connessione API OpenAI dopo {attempt + 1} tentativi: {e}"
             logger.error(f"Errore di connessione API OpenAI (tentativo {attempt + 1}/{max_retries}): {e}")
             error_for_langfuse = f"APIConnectionError: {e}"
             if attempt == max_retries - 1:
                 if langfuse_tracker:
-                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
                     langfuse_tracker.track_llm_call(input_text=user_prompt_content, output_text="", model=model_name, chapter_name=chapter_name, lesson_name=lesson_name, content_type=content_type, latency_ms=(time.time() - start_time_attempt) * 1000, error=error_for_langfuse, prompt_info=prompt_info_for_langfuse)
                 return error_message, None
         except openai.RateLimitError as e:
+            retry_delay = retry_delay_s(e, attempt)
             error_message = f"Errore di rate limit API OpenAI dopo {attempt + 1} tentativi: {e}"
             logger.warning(f"Rate limit API OpenAI raggiunto (tentativo {attempt + 1}/{max_retries}): {e}. Riprovo tra {retry_delay}s...")
             error_for_langfuse = f"RateLimitError: {e}"
             if attempt == max_retries - 1:
                 if langfuse_tracker:
-                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
                     langfuse_tracker.track_llm_call(input_text=user_prompt_content, output_text="", model=model_name, chapter_name=chapter_name, lesson_name=lesson_name, content_type=content_type, latency_ms=(time.time() - start_time_attempt) * 1000, error=error_for_langfuse, prompt_info=prompt_info_for_langfuse)
                 return error_message, None
         except openai.APIStatusError as e: 
             error_message = f"Errore API OpenAI (Status {e.status_code}) dopo {attempt + 1} tentativi: {e.message}"
             logger.error(f"Errore API OpenAI (Status {e.status_code}) (tentativo {attempt + 1}/{max_retries}): {e.message}")
             error_for_langfuse = f"APIStatusError {e.status_code}: {e.message}"
-            if attempt == max_retries - 1:
+            retry_delay = retry_delay_s(e, attempt)
+            if attempt == max_retries - 1 or not is_retryable_status(e.status_code): # Es. 400 o 401: un nuovo tentativo fallirebbe allo stesso modo
                 if langfuse_tracker:
-                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
                     langfuse_tracker.track_llm_call(input_text=user_prompt_content, output_text="", model=model_name, chapter_name=chapter_name, lesson_name=lesson_name, content_type=content_type, latency_ms=(time.time() - start_time_attempt) * 1000, error=error_for_langfuse, prompt_info=prompt_info_for_langfuse)
                 return error_message, None
         except Exception as e: # Qualsiasi altra eccezione
             error_message = f"Errore imprevisto durante la chiamata API OpenAI: {e}"
             logger.error(f"Errore imprevisto durante la chiamata API OpenAI (tentativo {attempt + 1}/{max_retries}): {e}")
             error_for_langfuse = f"Unexpected error: {str(e)}" # str(e) per assicurare stringa
+            retry_delay = retry_delay_s(None, attempt)
             if attempt == max_retries - 1:
                 # Traccia l'errore finale con Langfuse
                 if langfuse_tracker:
-                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+                    prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
                     langfuse_tracker.track_llm_call(
                         input_text=user_prompt_content,
                         output_text="",
@@ -612,7 +1015,7 @@ def summarize_with_openai(
     final_error_message = "Fallimento nella generazione del riassunto dopo tutti i tentativi."
     # Traccia il fallimento finale se tutti i tentativi sono esauriti
     if langfuse_tracker:
-        prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name} # INFO PROMPT
+        prompt_info_for_langfuse = {"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name, "route": route.to_dict() if route is not None else None, "prompt_fingerprint": prompt_fingerprint} # INFO PROMPT
         langfuse_tracker.track_llm_call(
             input_text=user_prompt_content,
             output_text="",
@@ -627,6 +1030,108 @@ def summarize_with_openai(
         )
     return final_error_message, None
 
+def summarize_packed_items(
+    route: Optional[RouteDecision],
+    items: List[PackedItem],
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    lesson_type_for_prompt: str = "practical_theoretical_face_to_face"
+) -> Tuple[Optional[str], Optional[Dict[str, int]]]:
+    """
+    Invia un'unica richiesta con più testi brevi, chiedendo un oggetto JSON con un riassunto per id.
+
+    Usata da RequestPacker: non ripete i tentativi, perché i testi senza un riassunto
+    valido vengono comunque riassunti singolarmente da summarize_with_openai.
+
+    Args:
+        route (Optional[RouteDecision]): Decisione di instradamento comune ai testi (None: backend di default).
+        items (List[PackedItem]): I testi da riassumere.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Istanza di PromptManager.
+        langfuse_tracker (Optional[LangfuseTracker]): Istanza di LangfuseTracker.
+        rate_limiter (Optional[RateLimiter]): Limitatore condiviso delle chiamate all'API.
+        lesson_type_for_prompt (str): Tipo di lezione usato per selezionare il prompt.
+
+    Returns:
+        Tuple[Optional[str], Optional[Dict[str, int]]]: Il testo della risposta e i token usati.
+
+    Raises:
+        ValueError: Se il prompt non è disponibile.
+        Exception: Gli errori della chiamata all'API.
+    """
+    backend = route.backend if route is not None else default_text_backend()
+    model_name = route.model if route is not None else backend.model
+    generation_options: Dict[str, object] = {"temperature": 0.5}
+    if route is not None:
+        if route.temperature is not None:
+            generation_options["temperature"] = route.temperature
+        if route.max_tokens is not None:
+            generation_options["max_tokens"] = route.max_tokens * len(items) # Il limite vale per ogni riassunto
+    messages = prompt_manager.get_packed_messages(build_packed_input(items), lesson_type=lesson_type_for_prompt)
+    call_limiter = backend.select_limiter(rate_limiter)
+
+    start_time = time.time()
+    client = get_openai_client(backend.resolve_api_key(api_key), backend.base_url, client_max_retries(call_limiter))
+    with call_limiter if call_limiter is not None else nullcontext():
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=messages, # type: ignore
+            response_format={"type": "json_object"},
+            **generation_options,
+        )
+    duration = time.time() - start_time
+    response = completion.choices[0].message.content
+    token_usage = token_usage_from_response(completion.usage) if completion.usage else None
+    logger.info(f"Richiesta con {len(items)} testi brevi completata in {duration:.2f} secondi.")
+    if langfuse_tracker:
+        langfuse_tracker.track_llm_call(
+            input_text=messages[-1]["content"],
+            output_text=response or "",
+            model=model_name,
+            content_type="packed",
+            token_usage=token_usage,
+            latency_ms=duration * 1000,
+            prompt_info={"lesson_type_used": lesson_type_for_prompt, "model_used": model_name, "backend": backend.name,
+                         "route": route.to_dict() if route is not None else None, "packed_items": len(items)},
+            cost_usd=backend.estimate_cost(token_usage)
+        )
+    return response, token_usage
+
+def _precompress_text(
+    text: str,
+    token_budget: int,
+    content_type: str,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    chapter_name: Optional[str] = None,
+    lesson_name: Optional[str] = None
+) -> str:
+    """
+    Riduce localmente un testo alle frasi più rappresentative, se supera il budget di token.
+
+    Args:
+        text (str): Il testo da riassumere.
+        token_budget (int): Budget (stimato) di token del testo da inviare al modello.
+        content_type (str): Tipo di contenuto.
+        langfuse_tracker (Optional[LangfuseTracker]): Istanza di LangfuseTracker.
+        chapter_name (Optional[str]): Nome del capitolo.
+        lesson_name (Optional[str]): Nome della lezione.
+
+    Returns:
+        str: Il testo compresso (o quello originale, se già entro il budget).
+    """
+    start_time = time.monotonic()
+    compressed, stats = compress_text(text, token_budget)
+    if not stats.sentences:
+        return text
+    logger.info(f"Testo '{content_type}' per '{lesson_name}' compresso localmente in {time.monotonic() - start_time:.2f}s: "
+                f"{stats.sentences_kept}/{stats.sentences} frasi, {stats.ratio:.1%} del testo originale "
+                f"(~{stats.tokens_saved} token risparmiati).")
+    if langfuse_tracker:
+        langfuse_tracker.track_text_compression(content_type, stats.to_dict(), chapter_name=chapter_name, lesson_name=lesson_name)
+    return compressed
+
 def summarize_long_text(
     text: str, 
     api_key: str, 
@@ -637,7 +1142,11 @@ def summarize_long_text(
     chapter_name: Optional[str] = None,
     lesson_name: Optional[str] = None,
     content_type: str = "vtt",
-    lesson_type_for_prompt: str = "practical_theoretical_face_to_face" # AGGIUNTO esplicitamente
+    lesson_type_for_prompt: str = "practical_theoretical_face_to_face", # AGGIUNTO esplicitamente
+    stream_sink: Optional[StreamSection] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    backend: Optional[LLMBackend] = None,
+    route: Optional[RouteDecision] = None
 ) -> Tuple[str, Optional[Dict[str, int]]]:
     """
     Gestisce il riassunto di testi lunghi dividendoli in chunk.
@@ -645,6 +1154,8 @@ def summarize_long_text(
     Utilizza RecursiveCharacterTextSplitter per dividere il testo. 
     Attualmente, riassume solo il primo chunk se il testo supera max_chunk_size.
     TODO: Implementare una strategia di riassunto map-reduce o refine per testi lunghi.
+    Se la regola di instradamento prevede un budget di compressione (compress_tokens),
+    il testo viene prima ridotto localmente alle frasi più rappresentative.
 
     Args:
         text (str): Testo completo da riassumere.
@@ -657,11 +1168,18 @@ def summarize_long_text(
         lesson_name (Optional[str]): Nome della lezione.
         content_type (str): Tipo di contenuto.
         lesson_type_for_prompt (str): Tipo di lezione usato per selezionare il prompt.
+        stream_sink (Optional[StreamSection]): Sezione su cui scrivere la risposta in streaming.
+        rate_limiter (Optional[RateLimiter]): Limitatore condiviso delle chiamate all'API.
+        backend (Optional[LLMBackend]): Endpoint e modello da usare (default: OpenAI).
+        route (Optional[RouteDecision]): Decisione di instradamento (sostituisce backend).
 
     Returns:
         str: Riassunto generato (o del primo chunk se il testo è troppo lungo).
         Tuple[str, Optional[Dict[str, int]]]: Riassunto e informazioni sull'uso dei token.
     """
+    if route is not None and route.compress_tokens:
+        text = _precompress_text(text, route.compress_tokens, content_type, langfuse_tracker, chapter_name, lesson_name)
+
     # text_splitter = RecursiveCharacterTextSplitter(chunk_size=max_chunk_size, chunk_overlap=overlap)
     # chunks = text_splitter.split_text(text)
     
@@ -739,7 +1257,11 @@ def summarize_long_text(
             chapter_name=chapter_name,
             lesson_name=lesson_name,
             content_type=content_type,
-            lesson_type_for_prompt=lesson_type_for_prompt # PROPAGATO esplicitamente
+            lesson_type_for_prompt=lesson_type_for_prompt, # PROPAGATO esplicitamente
+            stream_sink=stream_sink,
+            rate_limiter=rate_limiter,
+            backend=backend,
+            route=route
             # system_prompt_content va gestito da summarize_with_openai o PromptManager
         )
 
@@ -753,10 +1275,53 @@ def summarize_long_text(
             chapter_name=chapter_name,
             lesson_name=lesson_name,
             content_type=content_type,
-            lesson_type_for_prompt=lesson_type_for_prompt # PROPAGATO esplicitamente
+            lesson_type_for_prompt=lesson_type_for_prompt, # PROPAGATO esplicitamente
+            stream_sink=stream_sink,
+            rate_limiter=rate_limiter,
+            backend=backend,
+            route=route
             # system_prompt_content va gestito da summarize_with_openai o PromptManager
         )
 
+def build_lesson_frontmatter(formatter: MarkdownFormatter, lesson_title: str, user_score_placeholder: bool = False,
+                             prompt_fingerprints: Optional[Dict[str, str]] = None,
+                             extra_fields: Optional[Dict[str, object]] = None) -> str:
+    """
+    Costruisce il frontmatter YAML del file di riassunto di una lezione,
+    seguito da una riga vuota.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        lesson_title (str): Titolo della lezione.
+        user_score_placeholder (bool): Se True, aggiunge "user_score:" al frontmatter.
+        prompt_fingerprints (Optional[Dict[str, str]]): Impronte dei prompt usati per ciascuna sezione
+            (vedi PromptManager.section_fingerprints), per rigenerare la lezione quando cambiano.
+        extra_fields (Optional[Dict[str, object]]): Campi aggiuntivi (es. i token di un allegato condiviso).
+
+    Returns:
+        str: Il frontmatter formattato.
+    """
+    frontmatter_data = {
+        "title": lesson_title,
+        "source_type": "lesson_summary",
+        "generated_at": datetime.now().isoformat()
+    }
+    for content_type, fingerprint in (prompt_fingerprints or {}).items():
+        frontmatter_data[f"{PROMPT_FINGERPRINT_KEY}_{content_type}"] = fingerprint
+    frontmatter_data.update(extra_fields or {})
+    if user_score_placeholder:
+        frontmatter_data["user_score"] = "" # Placeholder per valutazione manuale
+
+    # Utilizza il formatter per creare il frontmatter YAML
+    frontmatter_str = formatter.format_frontmatter(frontmatter_data)
+    # Assicurati che ci sia una riga vuota dopo il frontmatter
+    if not frontmatter_str.endswith("\n\n"):
+        if frontmatter_str.endswith("\n"):
+            frontmatter_str += "\n"
+        else:
+            frontmatter_str += "\n\n"
+    return frontmatter_str
+
 def write_lesson_summary(
     formatter: MarkdownFormatter, 
     lesson_title: str, 
@@ -765,8 +1330,11 @@ def write_lesson_summary(
     html_summary: Optional[str], 
     orphan_summary: Optional[str], # AGGIUNTO orphan_summary
     output_file_path: Path,
-    user_score_placeholder: bool = False # AGGIUNTO per step 2.3
-) -> None:
+    user_score_placeholder: bool = False, # AGGIUNTO per step 2.3
+    writer: Optional[WriteBehindWriter] = None,
+    prompt_fingerprints: Optional[Dict[str, str]] = None,
+    extra_frontmatter: Optional[Dict[str, object]] = None
+) -> Optional[Future]:
     """
     Scrive il riassunto di una lezione (che può includere VTT, PDF, HTML e materiale orfano) 
     in un file Markdown.
@@ -781,26 +1349,19 @@ def write_lesson_summary(
         orphan_summary (Optional[str]): Riassunto del contenuto dei file orfani associati.
         output_file_path (Path): Percorso del file Markdown di output.
         user_score_placeholder (bool): Se True, aggiunge "user_score:" al frontmatter.
+        writer (Optional[WriteBehindWriter]): Se fornito, la scrittura viene accodata al
+                                              thread di scrittura invece di avvenire subito.
+                                              In entrambi i casi il file viene scritto atomicamente.
+        prompt_fingerprints (Optional[Dict[str, str]]): Impronte dei prompt delle sezioni, registrate nel frontmatter.
+        extra_frontmatter (Optional[Dict[str, object]]): Campi aggiuntivi del frontmatter.
+
+    Returns:
+        Optional[Future]: Con un writer, la scrittura accodata (risolta a file su disco,
+                          o con l'errore); None se il file è già stato scritto.
     """
     logger.debug(f"Preparazione scrittura riassunto per: {lesson_title} in {output_file_path}")
 
-    # Prepara il frontmatter
-    frontmatter_data = {
-        "title": lesson_title,
-        "source_type": "lesson_summary",
-        "generated_at": datetime.now().isoformat()
-    }
-    if user_score_placeholder:
-        frontmatter_data["user_score"] = "" # Placeholder per valutazione manuale
-
-    # Utilizza il formatter per creare il frontmatter YAML
-    frontmatter_str = formatter.format_frontmatter(frontmatter_data)
-    # Assicurati che ci sia una riga vuota dopo il frontmatter se format_frontmatter non la include già come desiderato
-    if not frontmatter_str.endswith("\\n\\n"):
-        if frontmatter_str.endswith("\\n"):
-            frontmatter_str += "\\n"
-        else:
-            frontmatter_str += "\\n\\n"
+    frontmatter_str = build_lesson_frontmatter(formatter, lesson_title, user_score_placeholder, prompt_fingerprints, extra_frontmatter)
 
     # Utilizza il formatter per creare il contenuto Markdown del corpo della lezione
     lesson_content = formatter.format_lesson_summary(
@@ -813,10 +1374,13 @@ def write_lesson_summary(
     
     full_content = frontmatter_str + lesson_content
 
+    if writer is not None:
+        future = writer.submit(output_file_path, full_content)
+        logger.info(f"Riassunto della lezione '{lesson_title}' accodato per la scrittura in '{output_file_path}'")
+        return future
+
     try:
-        output_file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            f.write(full_content)
+        write_text_atomic(output_file_path, full_content)
         logger.info(f"Riassunto della lezione '{lesson_title}' scritto con successo in '{output_file_path}'")
     except IOError as e:
         logger.error(f"Errore di I/O durante la scrittura del file '{output_file_path}': {e}")
@@ -896,288 +1460,1025 @@ def find_related_files(vtt_file_path: Path, chapter_dir: Path) -> Dict[str, List
         
     return related_files
 
-def process_lesson(
-    formatter: MarkdownFormatter, 
-    vtt_file: Path, 
-    chapter_dir: Path, 
-    base_output_dir: Path, 
-    api_key: str,
-    prompt_manager: PromptManager, # AGGIUNTO prompt_manager
-    langfuse_tracker: Optional[LangfuseTracker] = None,
-    image_describer: Optional[ImageDescriber] = None, # AGGIUNTO ImageDescriber
-    associated_orphan_files: Optional[List[Path]] = None # AGGIUNTO per file orfani
-) -> Tuple[Optional[Path], int]: # MODIFICATO TIPO DI RITORNO
+def _emit_stream_section(
+    lesson_stream: Optional[StreamingMarkdownFile],
+    section: Optional[StreamSection],
+    formatter: MarkdownFormatter,
+    section_title: str,
+    summary: Optional[str]
+) -> None:
     """
-    Elabora una singola lezione: estrae testo da VTT, PDF correlati, HTML correlati (e orfani associati),
-    genera riassunti e scrive il file Markdown.
+    Completa una sezione del file di lezione scritto in streaming.
+
+    Sostituisce i token ricevuti con la sezione formattata in modo definitivo
+    (identica a quella prodotta da write_lesson_summary), oppure la accoda se
+    per quella sezione non è stata avviata alcuna chiamata in streaming.
 
     Args:
+        lesson_stream (Optional[StreamingMarkdownFile]): File in streaming della lezione (None se non attivo).
+        section (Optional[StreamSection]): Sezione avviata per la chiamata in streaming, se presente.
         formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
-        vtt_file (Path): Percorso del file VTT della lezione.
-        chapter_dir (Path): Percorso della directory del capitolo.
-        base_output_dir (Path): Directory di output base per il corso.
-        api_key (str): Chiave API OpenAI.
-        prompt_manager (PromptManager): Gestore dei prompt.
-        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
-        image_describer (Optional[ImageDescriber]): Istanza di ImageDescriber.
-        associated_orphan_files (Optional[List[Path]]): Lista di file orfani associati a questa lezione.
+        section_title (str): Titolo della sezione.
+        summary (Optional[str]): Riassunto definitivo della sezione.
+    """
+    if lesson_stream is None:
+        return
+    section_content = formatter.format_lesson_section(section_title, summary)
+    if section is not None:
+        section.finish(section_content)
+    elif section_content:
+        lesson_stream.write(section_content)
+
+def _begin_stream_section(
+    lesson_stream: Optional[StreamingMarkdownFile],
+    formatter: MarkdownFormatter,
+    section_title: str
+) -> Optional[StreamSection]:
+    """
+    Avvia una sezione in streaming nel file della lezione, se lo streaming è attivo.
+
+    Args:
+        lesson_stream (Optional[StreamingMarkdownFile]): File in streaming della lezione (None se non attivo).
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        section_title (str): Titolo della sezione.
 
     Returns:
-        Tuple[Optional[Path], int]: Una tupla contenente il percorso del file di riassunto 
-                                     generato (o None se fallisce) e il numero totale di token 
-                                     utilizzati per la lezione.
+        Optional[StreamSection]: La sezione avviata, o None se lo streaming non è attivo.
     """
-    lesson_name = vtt_file.stem
-    chapter_name = chapter_dir.name # Per Langfuse
+    if lesson_stream is None:
+        return None
+    return lesson_stream.begin_section(formatter.format_header(section_title, 2) + formatter.new_line())
+
+@dataclass
+class LessonJob:
+    """Una lezione da elaborare: file VTT, directory del capitolo e file orfani associati."""
+    vtt_file: Path
+    chapter_dir: Path
+    associated_orphan_files: List[Path] = field(default_factory=list)
+    extraction_cache: Optional[ExtractionCache] = None # Cache delle estrazioni (None: nessuna cache)
+    shared_materials: Optional[SharedMaterialIndex] = None # Allegati già riassunti una volta per il corso
+
+@dataclass(frozen=True)
+class RunServices:
+    """
+    Servizi condivisi da un'esecuzione, passati insieme lungo corso, capitolo, lezione e sezione.
 
-    # Determina il percorso di output previsto per il file di riassunto della lezione
-    lesson_output_dir = base_output_dir / chapter_dir.name
-    # Sanitize filename from lesson_name (e.g. vtt_file.stem)
-    safe_lesson_name = re.sub(r'[^\w\-. ]', '_', lesson_name) # Sostituisce caratteri non validi
-    output_file_name = f"{safe_lesson_name}.md"
-    # Questo è il percorso che useremo per controllare e, se necessario, per scrivere
-    output_file_path = lesson_output_dir / output_file_name
+    Ogni servizio è opzionale: None disattiva la funzionalità corrispondente.
+    writer, rate_limiter, backend_router, similarity_index e request_packer valgono
+    per l'intera esecuzione e vengono creati in main(); journal, extraction_cache e
+    shared_materials appartengono a un corso e vengono aggiunti da process_course
+    (vedi for_course).
+    """
+    writer: Optional[WriteBehindWriter] = None # Writer asincrono dei file (None: scrittura nel thread chiamante)
+    rate_limiter: Optional[RateLimiter] = None # Limitatore condiviso delle chiamate all'API
+    backend_router: Optional[BackendRouter] = None # Backend LLM per tipo di contenuto (None: OpenAI)
+    similarity_index: Optional[SimilarityIndex] = None # Riassunti riutilizzabili di trascrizioni quasi identiche
+    request_packer: Optional[RequestPacker] = None # Raggruppa i testi brevi in richieste con più testi
+    journal: Optional[JobJournal] = None # Unità completate del corso, per riprendere un'esecuzione interrotta
+    extraction_cache: Optional[ExtractionCache] = None # Cache del testo estratto dai file del corso
+    shared_materials: Optional[SharedMaterialIndex] = None # Allegati riassunti una sola volta per il corso
+
+    def for_course(
+        self,
+        journal: Optional[JobJournal],
+        extraction_cache: Optional[ExtractionCache],
+        shared_materials: Optional[SharedMaterialIndex]
+    ) -> "RunServices":
+        """Copia dei servizi con quelli propri di un corso (journal, cache delle estrazioni, allegati condivisi)."""
+        return replace(self, journal=journal, extraction_cache=extraction_cache, shared_materials=shared_materials)
+
+@dataclass
+class ExtractedDocument:
+    """Testo (e immagini, per gli HTML) estratto da un file di supporto della lezione."""
+    file_path: Path
+    text: str = ""
+    images: List[Dict[str, str]] = field(default_factory=list)
+    error: Optional[str] = None
+    shared_material: Optional[SharedMaterial] = None # Allegato condiviso: non estratto, la lezione vi rimanda con un link
+
+@dataclass
+class LessonInputs:
+    """Contenuti estratti di una lezione, pronti per la fase di riassunto."""
+    vtt_file: Path
+    chapter_dir: Path
+    vtt_text: str = ""
+    vtt_error: Optional[str] = None
+    pdf_documents: List[ExtractedDocument] = field(default_factory=list)
+    html_documents: List[ExtractedDocument] = field(default_factory=list)
+    orphan_documents: List[ExtractedDocument] = field(default_factory=list)
+    extraction_seconds: float = 0.0
+
+@dataclass
+class LessonResult:
+    """
+    Risultato dell'elaborazione di una lezione, tenuto in memoria per l'assemblaggio del capitolo.
 
-    # Verifica se il file di riassunto esiste già
-    if output_file_path.exists():
-        logger.info(f"Il file di riassunto '{output_file_path}' per la lezione '{lesson_name}' esiste già. Salto la generazione.")
-        return output_file_path, 0 # Restituisce il percorso del file esistente e 0 token usati
-    
-    total_tokens_lesson = 0
-    
-    # Tracciamento Langfuse per la lezione - RIMOSSA CHIAMATA A START_LESSON_SPAN
-    # if langfuse_tracker:
-    #     langfuse_tracker.start_lesson_span(lesson_name, chapter_name)
-    
-    start_time_lesson = time.time() # Per Langfuse
+    summaries è None per le lezioni saltate perché già presenti su disco: in quel
+    caso il riepilogo del capitolo legge il contenuto da output_path.
+    timings contiene la durata (in secondi) delle fasi "extraction", "summary" e "write".
+    write_future è la scrittura del file affidata al WriteBehindWriter (None se il
+    file è già su disco): vedi wait_written.
+    """
+    __slots__ = ("title", "output_path", "summaries", "tokens_used", "timings", "write_future")
+    title: str
+    output_path: Path
+    summaries: Optional[Dict[str, Optional[str]]]
+    tokens_used: int
+    timings: Dict[str, float]
+
+    def __post_init__(self):
+        self.write_future: Optional[Future] = None
+
+    def wait_written(self) -> bool:
+        """
+        Attende la scrittura accodata del file della lezione, se presente.
+
+        Returns:
+            bool: True se il file è su disco, False se la scrittura in background è fallita.
+        """
+        if self.write_future is None:
+            return True
+        try:
+            self.write_future.result()
+            return True
+        except Exception as e:
+            logger.error(f"Scrittura del riassunto della lezione '{self.title}' fallita: {e}")
+            return False
+
+    @property
+    def skipped(self) -> bool:
+        """True se la lezione non è stata rigenerata perché il file esisteva già."""
+        return self.summaries is None
+
+    @classmethod
+    def from_existing_file(cls, lesson_name: str, output_path: Path) -> "LessonResult":
+        """Crea il risultato di una lezione saltata perché già presente su disco."""
+        return cls(lesson_name, output_path, None, 0, {})
+
+def read_prompt_fingerprints(output_file_path: Path) -> Dict[str, str]:
+    """
+    Legge le impronte dei prompt dal frontmatter del file di una lezione.
 
-    # LOGGING INIZIO ELABORAZIONE LEZIONE
-    logger.info(f"Inizio elaborazione lezione: {lesson_name} nel capitolo {chapter_name}")
+    Args:
+        output_file_path (Path): Percorso del file della lezione.
 
-    # Estrazione testo da VTT
-    vtt_text_content = ""
-    vtt_summary_text: Optional[str] = None
+    Returns:
+        Dict[str, str]: Impronta per tipo di contenuto (vuoto se il file non ne contiene o non è leggibile).
+    """
+    prefix = f"{PROMPT_FINGERPRINT_KEY}_"
+    fingerprints: Dict[str, str] = {}
     try:
-        logger.info(f"Estrazione testo da VTT: {vtt_file.name}")
-        vtt_text_content = extract_text_from_vtt(vtt_file)
-        if vtt_text_content.strip():
-            logger.info(f"Testo estratto da VTT '{vtt_file.name}', lunghezza: {len(vtt_text_content)} caratteri. Inizio riassunto.")
-            summary, usage = summarize_long_text(
-                text=vtt_text_content, 
-                api_key=api_key, 
-                prompt_manager=prompt_manager,
-                langfuse_tracker=langfuse_tracker, 
-                chapter_name=chapter_name, 
-                lesson_name=lesson_name, 
-                content_type="vtt"
-            )
-            vtt_summary_text = summary
-            if usage and usage.get("total_tokens") is not None:
-                total_tokens_lesson += usage["total_tokens"]
-            logger.info(f"Riassunto VTT generato per '{vtt_file.name}'. Lunghezza: {len(vtt_summary_text) if vtt_summary_text else 'N/A'}")
-        else:
-            logger.info(f"Nessun contenuto testuale estratto da VTT '{vtt_file.name}' o contenuto vuoto.")
-            vtt_summary_text = "Nessun contenuto VTT fornito o contenuto vuoto."
-    except Exception as e:
-        logger.error(f"Errore durante l'elaborazione del file VTT '{vtt_file.name}': {e}")
-        vtt_summary_text = f"Errore durante l'elaborazione del file VTT: {e}"
+        with open(output_file_path, "r", encoding="utf-8") as f:
+            if f.readline().strip() != "---":
+                return {}
+            for line in f:
+                if line.strip() == "---":
+                    break
+                key, separator, value = line.partition(":")
+                key = key.strip()
+                if separator and key.startswith(prefix) and value.strip():
+                    fingerprints[key[len(prefix):]] = value.strip()
+    except (OSError, UnicodeDecodeError) as e:
+        logger.debug(f"Impossibile leggere il frontmatter di '{output_file_path}': {e}")
+    return fingerprints
+
+def is_lesson_output_current(output_file_path: Path, prompt_fingerprints: Optional[Dict[str, str]]) -> bool:
+    """
+    Verifica se il file di una lezione esiste ed è stato generato con i prompt attuali.
 
-    # Gestione dei file correlati (PDF, HTML) come da implementazione precedente
-    related_files = find_related_files(vtt_file, chapter_dir)
-    pdf_files = related_files.get('pdf', [])
-    html_files = related_files.get('html', [])
+    Si confrontano solo le sezioni registrate nel file: una lezione senza PDF non
+    viene rigenerata se cambia il template dei PDF. I file generati prima
+    dell'introduzione delle impronte (senza impronte nel frontmatter) sono
+    considerati aggiornati.
 
-    # Estrazione e riassunto testo da PDF correlati
-    pdf_summary_text: Optional[str] = None
-    if pdf_files:
-        all_pdf_text = ""
-        for pdf_file in pdf_files:
-            try:
-                logger.info(f"Estrazione testo da PDF correlato: {pdf_file.name}")
-                pdf_text = extract_text_from_pdf(pdf_file)
-                if pdf_text.strip():
-                    all_pdf_text += pdf_text + "\n\n" # Aggiungi separatore
-                    logger.info(f"Testo estratto da PDF '{pdf_file.name}', lunghezza: {len(pdf_text)} caratteri.")
-                else:
-                    logger.info(f"Nessun contenuto testuale estratto da PDF '{pdf_file.name}' o contenuto vuoto.")
-            except Exception as e:
-                logger.error(f"Errore nell'estrazione del testo dal PDF '{pdf_file.name}': {e}")
-                all_pdf_text += f"Errore durante l'elaborazione del file PDF {pdf_file.name}: {e}\n\n"
-        
-        if all_pdf_text.strip():
-            logger.info(f"Testo PDF aggregato per la lezione '{lesson_name}'. Inizio riassunto.")
-            summary, usage = summarize_long_text(
-                text=all_pdf_text, 
-                api_key=api_key, 
-                prompt_manager=prompt_manager,
-                langfuse_tracker=langfuse_tracker, 
-                chapter_name=chapter_name, 
-                lesson_name=lesson_name, 
-                content_type="pdf"
-            )
-            pdf_summary_text = summary
-            if usage and usage.get("total_tokens") is not None:
-                total_tokens_lesson += usage["total_tokens"]
-            logger.info(f"Riassunto PDF generato per '{lesson_name}'. Lunghezza: {len(pdf_summary_text) if pdf_summary_text else 'N/A'}")
-        else:
+    Args:
+        output_file_path (Path): Percorso del file della lezione.
+        prompt_fingerprints (Optional[Dict[str, str]]): Impronte attuali per tipo di contenuto
+            (vedi PromptManager.section_fingerprints; None: non verificate).
+
+    Returns:
+        bool: True se la lezione non va rigenerata.
+    """
+    if not output_file_path.exists():
+        return False
+    if prompt_fingerprints is None:
+        return True
+    changed = [
+        content_type for content_type, fingerprint in read_prompt_fingerprints(output_file_path).items()
+        if prompt_fingerprints.get(content_type) != fingerprint
+    ]
+    if changed:
+        logger.info(f"Il file '{output_file_path}' è stato generato con prompt diversi per {', '.join(changed)}: verrà rigenerato.")
+        return False
+    return True
+
+def lesson_prompt_content_types(inputs: LessonInputs) -> List[str]:
+    """
+    Tipi di contenuto di una lezione riassunti con i prompt della lezione.
+
+    Le sezioni composte solo da allegati condivisi non contano: il loro riassunto
+    (e la relativa impronta) sta nel file dell'allegato.
+
+    Args:
+        inputs (LessonInputs): Contenuti estratti della lezione.
+
+    Returns:
+        List[str]: I tipi di contenuto, nell'ordine delle sezioni.
+    """
+    content_types = ["vtt"] if inputs.vtt_error is None and inputs.vtt_text.strip() else []
+    for content_type, documents in (("pdf", inputs.pdf_documents), ("html", inputs.html_documents),
+                                    ("orphan_material", inputs.orphan_documents)):
+        if any(document.shared_material is None for document in documents):
+            content_types.append(content_type)
+    return content_types
+
+def get_lesson_output_path(base_output_dir: Path, chapter_dir: Path, vtt_file: Path) -> Path:
+    """
+    Calcola il percorso del file di riassunto di una lezione.
+
+    Args:
+        base_output_dir (Path): Directory di output base per il corso.
+        chapter_dir (Path): Percorso della directory del capitolo.
+        vtt_file (Path): Percorso del file VTT della lezione.
+
+    Returns:
+        Path: Percorso del file Markdown della lezione.
+    """
+    # Sanitize filename from lesson_name (e.g. vtt_file.stem)
+    safe_lesson_name = re.sub(r'[^\w\-. ]', '_', vtt_file.stem) # Sostituisce caratteri non validi
+    return base_output_dir / chapter_dir.name / f"{safe_lesson_name}.md"
+
+def _extract_vtt_file(file_path: Path) -> Tuple[str, List[Dict[str, str]]]:
+    """Estrattore VTT nel formato della cache di estrazione (testo, immagini)."""
+    return extract_text_from_vtt(file_path), []
+
+def _extract_pdf_file(file_path: Path) -> Tuple[str, List[Dict[str, str]]]:
+    """Estrattore PDF nel formato della cache di estrazione (testo, immagini); gli errori non vengono memorizzati."""
+    return extract_text_from_pdf(file_path, raise_on_error=True), []
+
+def _extract_html_file(file_path: Path) -> Tuple[str, List[Dict[str, str]]]:
+    """Estrattore HTML nel formato della cache di estrazione (testo, immagini)."""
+    with open(file_path, 'r', encoding='utf-8') as f_html:
+        html_content_str = f_html.read()
+    return extract_text_and_images_from_html(html_content_str)
+
+def _extract_cached(file_path: Path, kind: str, extract: Callable[[Path], Tuple[str, List[Dict[str, str]]]],
+                    extraction_cache: Optional[ExtractionCache]) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Esegue un estrattore passando dalla cache di estrazione, se presente.
+
+    Un file illeggibile (UncacheableExtractionError) non viene memorizzato e risulta
+    privo di testo: la sezione lo ignora, senza inviarne l'errore al modello.
+    """
+    try:
+        if extraction_cache is None:
+            return extract(file_path)
+        return extraction_cache.get_or_extract(file_path, kind, extract)
+    except UncacheableExtractionError as e:
+        logger.warning(f"File '{file_path.name}' ignorato: {e}")
+        return "", []
+
+def _extract_document(file_path: Path, extraction_cache: Optional[ExtractionCache] = None) -> ExtractedDocument:
+    """
+    Estrae il testo (e le immagini, per gli HTML) da un file PDF o HTML.
+
+    Gli errori vengono registrati nel documento restituito invece di essere
+    sollevati, così che la fase di riassunto possa riportarli nel testo inviato al modello.
+
+    Args:
+        file_path (Path): Percorso del file PDF o HTML.
+        extraction_cache (Optional[ExtractionCache]): Cache delle estrazioni delle esecuzioni precedenti.
+
+    Returns:
+        ExtractedDocument: Il documento estratto.
+    """
+    document = ExtractedDocument(file_path=file_path)
+    try:
+        if file_path.suffix.lower() == '.pdf':
+            logger.info(f"Estrazione testo da PDF: {file_path.name}")
+            document.text, _ = _extract_cached(file_path, "pdf", _extract_pdf_file, extraction_cache)
+        elif file_path.suffix.lower() in ('.html', '.htm'):
+            logger.info(f"Estrazione testo e immagini da HTML: {file_path.name}")
+            document.text, document.images = _extract_cached(file_path, "html", _extract_html_file, extraction_cache)
+    except Exception as e:
+        logger.error(f"Errore nell'estrazione del testo dal file '{file_path.name}': {e}")
+        document.error = str(e)
+    return document
+
+def _extract_attachment(file_path: Path, job: LessonJob) -> ExtractedDocument:
+    """Estrae un allegato della lezione, salvo che sia un documento condiviso già riassunto per il corso."""
+    shared_material = job.shared_materials.get(file_path) if job.shared_materials is not None else None
+    if shared_material is not None:
+        logger.info(f"'{file_path.name}' è un allegato condiviso: la lezione rimanderà a '{shared_material.output_path.name}'.")
+        return ExtractedDocument(file_path=file_path, shared_material=shared_material)
+    return _extract_document(file_path, job.extraction_cache)
+
+def extract_lesson_inputs(job: LessonJob) -> LessonInputs:
+    """
+    Fase di estrazione di una lezione: legge VTT, PDF/HTML correlati e file orfani.
+
+    Non effettua chiamate di rete, quindi può essere eseguita su un pool di processi
+    (vedi LessonPipeline) in parallelo ai riassunti delle altre lezioni. Con una cache
+    di estrazione (job.extraction_cache) i file invariati non vengono analizzati di nuovo;
+    gli allegati condivisi da più lezioni (job.shared_materials) non vengono estratti affatto.
+
+    Args:
+        job (LessonJob): La lezione da estrarre.
+
+    Returns:
+        LessonInputs: I contenuti estratti della lezione.
+    """
+    start_time = time.time()
+    inputs = LessonInputs(vtt_file=job.vtt_file, chapter_dir=job.chapter_dir)
+    try:
+        logger.info(f"Estrazione testo da VTT: {job.vtt_file.name}")
+        inputs.vtt_text, _ = _extract_cached(job.vtt_file, "vtt", _extract_vtt_file, job.extraction_cache)
+    except Exception as e:
+        logger.error(f"Errore durante l'elaborazione del file VTT '{job.vtt_file.name}': {e}")
+        inputs.vtt_error = str(e)
+
+    # Gestione dei file correlati (PDF, HTML) come da implementazione precedente
+    related_files = find_related_files(job.vtt_file, job.chapter_dir)
+    inputs.pdf_documents = [_extract_attachment(pdf_file, job) for pdf_file in related_files.get('pdf', [])]
+    inputs.html_documents = [_extract_attachment(html_file, job) for html_file in related_files.get('html', [])]
+    inputs.orphan_documents = [_extract_attachment(orphan_file, job) for orphan_file in job.associated_orphan_files]
+    inputs.extraction_seconds = time.time() - start_time
+    return inputs
+
+# Stima del costo di una lezione, in caratteri di testo equivalenti inviati al modello
+VTT_TEXT_RATIO = 0.6 # Nei VTT il resto dei byte sono tempi e numerazione dei sottotitoli
+PDF_TEXT_RATIO = 0.05 # Nei PDF di slide il testo è una piccola parte del file
+HTML_TEXT_RATIO = 0.3 # Negli HTML il resto dei byte sono tag, script e stili
+IMAGE_COST_CHARS = 4000 # Una descrizione d'immagine (chiamata al modello di visione)
+_IMG_TAG_PATTERN = re.compile(rb"<img\b", re.IGNORECASE)
+
+def _count_html_images(html_file: Path) -> int:
+    """Numero di tag <img> di un file HTML (0 se il file non è leggibile)."""
+    try:
+        return len(_IMG_TAG_PATTERN.findall(html_file.read_bytes()))
+    except OSError:
+        return 0
+
+def estimate_lesson_cost(job: LessonJob) -> float:
+    """
+    Stima il costo di una lezione, per avviare per prime le lezioni più lunghe (vedi LessonPipeline).
+
+    Usa solo informazioni economiche, senza estrarre i file: le dimensioni di
+    trascrizione e allegati dall'indice della directory e il numero di immagini
+    degli HTML. Gli allegati condivisi, riassunti una volta per il corso, non contano.
+
+    Args:
+        job (LessonJob): La lezione.
+
+    Returns:
+        float: Costo stimato, in caratteri di testo equivalenti inviati al modello.
+    """
+    cost = (_local_file_size(job.vtt_file) or 0) * VTT_TEXT_RATIO
+    related_files = find_related_files(job.vtt_file, job.chapter_dir)
+    attachments = related_files.get('pdf', []) + related_files.get('html', []) + list(job.associated_orphan_files)
+    for attachment in attachments:
+        if job.shared_materials is not None and job.shared_materials.get(attachment) is not None:
+            continue
+        size = _local_file_size(attachment) or 0
+        suffix = attachment.suffix.lower()
+        if suffix == '.pdf':
+            cost += size * PDF_TEXT_RATIO
+        elif suffix in ('.html', '.htm'):
+            cost += size * HTML_TEXT_RATIO + _count_html_images(attachment) * IMAGE_COST_CHARS
+    return cost
+
+def _is_successful_result(text: Optional[str]) -> bool:
+    """Indica se un riassunto o una descrizione è un risultato valido (non un messaggio di errore)."""
+    return bool(text) and not text.startswith(("Errore", "Riassunto non disponibile"))
+
+def _local_file_size(path: Union[str, Path]) -> Optional[int]:
+    """Dimensione in byte di un file locale, o None per URL remoti e file non leggibili."""
+    if str(path).startswith(('http://', 'https://', 'data:')):
+        return None
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return None
+
+def _describe_document_images(
+    document: ExtractedDocument,
+    image_describer: Optional["ImageDescriber"],
+    chapter_name: str,
+    lesson_name: str,
+    journal: Optional[JobJournal] = None,
+    backend_router: Optional[BackendRouter] = None,
+    langfuse_tracker: Optional[LangfuseTracker] = None
+) -> Tuple[str, int]:
+    """
+    Arricchisce il testo di un documento HTML con le descrizioni delle sue immagini.
+
+    Con un router, modello e livello di dettaglio di ogni immagine dipendono dalla
+    dimensione del file (le immagini remote, di dimensione sconosciuta, usano la
+    regola senza limite).
+
+    Args:
+        document (ExtractedDocument): Documento HTML estratto.
+        image_describer (Optional[ImageDescriber]): Istanza di ImageDescriber (None per saltare le immagini).
+        chapter_name (str): Nome del capitolo (per Langfuse).
+        lesson_name (str): Nome della lezione (per Langfuse).
+        journal (Optional[JobJournal]): Journal da cui riprendere e in cui registrare le descrizioni.
+        backend_router (Optional[BackendRouter]): Router che sceglie modello e dettaglio delle immagini.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker su cui registrare le decisioni di instradamento.
+
+    Returns:
+        Tuple[str, int]: Il testo arricchito e i token usati per le descrizioni.
+    """
+    enriched_content = document.text
+    tokens_used = 0
+    if image_describer and document.images:
+        logger.info(f"Trovate {len(document.images)} immagini in {document.file_path.name}. Inizio descrizione.")
+        for image in document.images:
+            img_url = image['src']
+            # La base per gli URL relativi è la directory del file HTML
+            full_image_path = document.file_path.parent / img_url if not img_url.startswith(('http', '/', 'data:')) else img_url
+            journal_key = JobJournal.make_key("image", str(full_image_path), image.get('alt') or "") if journal is not None else None
+            journal_entry = journal.get(journal_key) if journal is not None else None
+            if journal_entry:
+                logger.info(f"Descrizione dell'immagine '{img_url}' ripresa dal journal.")
+                desc_text, usage_img = journal_entry["result"], None
+            else:
+                route = None
+                if backend_router is not None:
+                    route = backend_router.route(IMAGE_CONTENT_TYPE, _local_file_size(full_image_path))
+                    if langfuse_tracker:
+                        langfuse_tracker.track_routing_decision(route.to_dict(), chapter_name=chapter_name, lesson_name=lesson_name)
+                desc_text, usage_img = image_describer.describe_image_url_with_usage(
+                    str(full_image_path),
+                    chapter_name=chapter_name,
+                    lesson_name=lesson_name,
+                    original_alt=image.get('alt'),
+                    route=route
+                )
+                if journal is not None and _is_successful_result(desc_text):
+                    journal.record("image", journal_key, desc_text, usage_img)
+            if desc_text:
+                enriched_content += f"\n\nContenuto immagine ({img_url}): {desc_text}"
+            if usage_img and usage_img.get("total_tokens") is not None:
+                tokens_used += usage_img["total_tokens"]
+    return enriched_content, tokens_used
+
+def format_shared_material_links(formatter: MarkdownFormatter, materials: Sequence[SharedMaterial]) -> str:
+    """
+    Formatta i rimandi di una sezione della lezione ai riassunti dei documenti condivisi.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        materials (Sequence[SharedMaterial]): Documenti condivisi allegati alla lezione.
+
+    Returns:
+        str: Un elemento di lista con il link per ogni documento.
+    """
+    return "\n".join(
+        formatter.format_list_item(f"Materiale condiviso: {formatter.format_link(material.title, material.link)}")
+        for material in materials
+    )
+
+@dataclass
+class _SectionSummaryTask:
+    """Una sezione della lezione da riassumere: tipo di contenuto, titolo e testo aggregato."""
+    content_type: str
+    section_title: str
+    text: str
+    label: str
+
+def _run_section_summary(
+    task: _SectionSummaryTask,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker],
+    chapter_name: str,
+    lesson_name: str,
+    stream_sink: Optional[StreamSection] = None,
+    services: Optional[RunServices] = None
+) -> Tuple[Optional[str], Optional[Dict[str, int]]]:
+    """
+    Esegue il riassunto di una sezione (eseguita in parallelo alle altre sezioni della lezione).
+
+    Se il journal contiene già il riassunto dello stesso testo (da un'esecuzione
+    interrotta), viene riutilizzato senza chiamare il modello e senza consumare token.
+    Backend, modello e parametri di generazione sono scelti dal router in base al
+    tipo di contenuto e alla lunghezza del testo della sezione. Con un indice di
+    similarità, una trascrizione quasi identica a una già riassunta (ad es. la
+    riedizione di un corso) riutilizza quel riassunto. Con un RequestPacker, un
+    testo breve viene riassunto in un'unica richiesta insieme ad altri testi brevi
+    e, se la risposta non ne contiene un riassunto valido, con una richiesta singola.
+    """
+    services = services or RunServices()
+    journal, backend_router = services.journal, services.backend_router
+    similarity_index, request_packer = services.similarity_index, services.request_packer
+    route = backend_router.route(task.content_type, len(task.text)) if backend_router is not None else None
+    model_name = route.model if route is not None else default_text_backend().model
+    journal_key = None
+    if journal is not None:
+        # L'impronta del prompt invalida i riassunti registrati con un prompt diverso
+        journal_key = JobJournal.make_key("section", task.content_type, model_name, prompt_manager.fingerprint(task.content_type), task.text)
+        journal_entry = journal.get(journal_key)
+        if journal_entry:
+            logger.info(f"Riassunto {task.label} per '{lesson_name}' ripreso dal journal.")
+            return journal_entry["result"], None
+
+    signature = None
+    similarity_scope = None
+    if similarity_index is not None and task.content_type == "vtt":
+        signature = minhash_signature(task.text)
+        if signature is not None:
+            similarity_scope = SimilarityIndex.make_scope(task.content_type, model_name, prompt_manager.fingerprint(task.content_type))
+            match = similarity_index.lookup(signature, similarity_scope)
+            if match is not None:
+                summary, similarity, source = match
+                logger.info(f"Riassunto {task.label} per '{lesson_name}' riutilizzato da una trascrizione simile al {similarity:.0%} ({source}).")
+                return summary, None
+
+    if route is not None:
+        logger.debug(f"Instradamento del riassunto {task.label} per '{lesson_name}': {route.to_dict()}")
+        if langfuse_tracker:
+            langfuse_tracker.track_routing_decision(route.to_dict(), chapter_name=chapter_name, lesson_name=lesson_name)
+
+    summary, usage = None, None
+    # I testi brevi (non in streaming) vengono riassunti insieme ad altri in un'unica richiesta
+    if request_packer is not None and stream_sink is None and request_packer.accepts(task.text):
+        pack_group = (route.backend.name, route.model, route.max_tokens, route.temperature) if route is not None else (None, model_name)
+        summary, usage = request_packer.summarize(task.text, task.content_type, pack_group, context=route)
+    if summary is None:
+        summary, call_usage = summarize_long_text(
+            text=task.text,
+            api_key=api_key,
+            prompt_manager=prompt_manager,
+            langfuse_tracker=langfuse_tracker,
+            chapter_name=chapter_name,
+            lesson_name=lesson_name,
+            content_type=task.content_type,
+            stream_sink=stream_sink,
+            rate_limiter=services.rate_limiter,
+            route=route
+        )
+        usage = merge_usage(usage, call_usage) # Quota della richiesta con più testi, se il testo vi è ricaduto
+    logger.info(f"Riassunto {task.label} generato per '{lesson_name}'. Lunghezza: {len(summary) if summary else 'N/A'}")
+    if journal is not None and _is_successful_result(summary):
+        journal.record("section", journal_key, summary, usage)
+    if signature is not None and _is_successful_result(summary):
+        similarity_index.add(signature, similarity_scope, summary, source=f"{chapter_name}/{lesson_name}")
+    return summary, usage
+
+def summarize_lesson_inputs(
+    inputs: LessonInputs,
+    formatter: MarkdownFormatter,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    image_describer: Optional["ImageDescriber"] = None,
+    lesson_stream: Optional[StreamingMarkdownFile] = None,
+    services: Optional[RunServices] = None
+) -> Tuple[Dict[str, Optional[str]], int]:
+    """
+    Fase di riassunto di una lezione: genera i riassunti di VTT, PDF, HTML e materiale orfano.
+
+    I testi delle quattro sezioni vengono prima aggregati (incluse le descrizioni
+    delle immagini HTML), poi le chiamate a summarize_long_text, indipendenti tra
+    loro, vengono eseguite in parallelo: la latenza della lezione diventa quella
+    della chiamata più lenta. In streaming, solo la prima sezione riassunta viene
+    scritta progressivamente; le successive sono accodate, in ordine, al termine.
+    Gli allegati condivisi con altre lezioni non vengono riassunti: la sezione
+    riporta un link al loro riassunto (vedi SharedMaterialIndex).
+
+    Args:
+        inputs (LessonInputs): Contenuti estratti della lezione.
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter (per le sezioni in streaming).
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        image_describer (Optional[ImageDescriber]): Istanza di ImageDescriber.
+        lesson_stream (Optional[StreamingMarkdownFile]): File della lezione scritto in streaming, se attivo.
+        services (Optional[RunServices]): Servizi condivisi (journal, limitatore, router, indice di similarità, ...).
+
+    Returns:
+        Tuple[Dict[str, Optional[str]], int]: I riassunti per tipo di contenuto
+            ("vtt", "pdf", "html", "orphan_material"; None se la sezione è assente)
+            e il numero totale di token utilizzati.
+    """
+    services = services or RunServices()
+    lesson_name = inputs.vtt_file.stem
+    chapter_name = inputs.chapter_dir.name # Per Langfuse
+    total_tokens_lesson = 0
+
+    # Riassunti per tipo di contenuto: None se la sezione è assente, un messaggio se non c'è nulla da riassumere
+    summaries: Dict[str, Optional[str]] = {"vtt": None, "pdf": None, "html": None, "orphan_material": None}
+    section_titles = {
+        "vtt": formatter.VTT_SECTION_TITLE,
+        "pdf": formatter.PDF_SECTION_TITLE,
+        "html": formatter.HTML_SECTION_TITLE,
+        "orphan_material": formatter.ORPHAN_SECTION_TITLE,
+    }
+    tasks: List[_SectionSummaryTask] = []
+    # Allegati condivisi, per sezione: riassunti una sola volta per il corso
+    shared_links: Dict[str, List[SharedMaterial]] = {"pdf": [], "html": [], "orphan_material": []}
+
+    # Testo VTT
+    if inputs.vtt_error is not None:
+        summaries["vtt"] = f"Errore durante l'elaborazione del file VTT: {inputs.vtt_error}"
+    elif inputs.vtt_text.strip():
+        logger.info(f"Testo estratto da VTT '{inputs.vtt_file.name}', lunghezza: {len(inputs.vtt_text)} caratteri. Inizio riassunto.")
+        tasks.append(_SectionSummaryTask("vtt", section_titles["vtt"], inputs.vtt_text, "VTT"))
+    else:
+        logger.info(f"Nessun contenuto testuale estratto da VTT '{inputs.vtt_file.name}' o contenuto vuoto.")
+        summaries["vtt"] = "Nessun contenuto VTT fornito o contenuto vuoto."
+
+    # Testo aggregato dei PDF correlati
+    if inputs.pdf_documents:
+        all_pdf_text = ""
+        for document in inputs.pdf_documents:
+            if document.shared_material is not None:
+                shared_links["pdf"].append(document.shared_material)
+            elif document.error is not None:
+                all_pdf_text += f"Errore durante l'elaborazione del file PDF {document.file_path.name}: {document.error}\n\n"
+            elif document.text.strip():
+                all_pdf_text += document.text + "\n\n" # Aggiungi separatore
+                logger.info(f"Testo estratto da PDF '{document.file_path.name}', lunghezza: {len(document.text)} caratteri.")
+            else:
+                logger.info(f"Nessun contenuto testuale estratto da PDF '{document.file_path.name}' o contenuto vuoto.")
+
+        if all_pdf_text.strip():
+            logger.info(f"Testo PDF aggregato per la lezione '{lesson_name}'. Inizio riassunto.")
+            tasks.append(_SectionSummaryTask("pdf", section_titles["pdf"], all_pdf_text, "PDF"))
+        elif shared_links["pdf"]:
+            summaries["pdf"] = format_shared_material_links(formatter, shared_links["pdf"])
+        else:
             logger.info(f"Nessun contenuto testuale aggregato dai PDF per la lezione '{lesson_name}'.")
-            pdf_summary_text = "Nessun contenuto PDF fornito o contenuto vuoto."
+            summaries["pdf"] = "Nessun contenuto PDF fornito o contenuto vuoto."
 
-    # Estrazione e riassunto testo da HTML correlati
-    html_summary_text: Optional[str] = None
-    if html_files:
+    # Testo degli HTML correlati, arricchito con le descrizioni delle immagini
+    if inputs.html_documents:
         all_html_text_enriched = ""
-        for html_file in html_files:
+        for document in inputs.html_documents:
+            if document.shared_material is not None:
+                shared_links["html"].append(document.shared_material)
+                continue
+            if document.error is not None:
+                all_html_text_enriched += f"Errore durante l'elaborazione del file HTML {document.file_path.name}: {document.error}\n\n"
+                continue
             try:
-                logger.info(f"Estrazione testo e immagini da HTML correlato: {html_file.name}")
-                text_content, image_urls = extract_text_and_images_from_html(html_file)
-                enriched_html_content = text_content
-                if image_describer and image_urls:
-                    logger.info(f"Trovate {len(image_urls)} immagini in {html_file.name}. Inizio descrizione.")
-                    for img_url in image_urls:
-                        # Assumendo che image_describer.describe_image_url gestisca URL relativi/assoluti
-                        # e che la base per i relativi sia la directory del file HTML
-                        full_image_path = html_file.parent / img_url if not img_url.startswith(('http', '/')) else img_url
-                        desc_text, 비용 = image_describer.describe_image_url(str(full_image_path), lesson_name, chapter_name, html_file.name)
-                        if desc_text:
-                            enriched_html_content += f"\n\nContenuto immagine ({img_url}): {desc_text}"
-                        if 비용 and 비용.get("total_tokens") is not None:
-                             total_tokens_lesson += 비용["total_tokens"]
-                
+                enriched_html_content, image_tokens = _describe_document_images(
+                    document, image_describer, chapter_name, lesson_name, services.journal, services.backend_router, langfuse_tracker
+                )
+                total_tokens_lesson += image_tokens
                 if enriched_html_content.strip():
                     all_html_text_enriched += enriched_html_content + "\n\n"
-                    logger.info(f"Testo HTML arricchito estratto da '{html_file.name}', lunghezza: {len(enriched_html_content)} caratteri.")
+                    logger.info(f"Testo HTML arricchito estratto da '{document.file_path.name}', lunghezza: {len(enriched_html_content)} caratteri.")
                 else:
-                    logger.info(f"Nessun contenuto testuale/immagine estratto da HTML '{html_file.name}' o contenuto vuoto.")
-
+                    logger.info(f"Nessun contenuto testuale/immagine estratto da HTML '{document.file_path.name}' o contenuto vuoto.")
             except Exception as e:
-                logger.error(f"Errore nell'elaborazione del file HTML '{html_file.name}': {e}")
-                all_html_text_enriched += f"Errore durante l'elaborazione del file HTML {html_file.name}: {e}\n\n"
-        
+                logger.error(f"Errore nell'elaborazione del file HTML '{document.file_path.name}': {e}")
+                all_html_text_enriched += f"Errore durante l'elaborazione del file HTML {document.file_path.name}: {e}\n\n"
+
         if all_html_text_enriched.strip():
             logger.info(f"Testo HTML arricchito aggregato per la lezione '{lesson_name}'. Inizio riassunto.")
-            summary, usage = summarize_long_text(
-                text=all_html_text_enriched, 
-                api_key=api_key, 
-                prompt_manager=prompt_manager,
-                langfuse_tracker=langfuse_tracker, 
-                chapter_name=chapter_name, 
-                lesson_name=lesson_name, 
-                content_type="html"
-            )
-            html_summary_text = summary
-            if usage and usage.get("total_tokens") is not None:
-                total_tokens_lesson += usage["total_tokens"]
-            logger.info(f"Riassunto HTML generato per '{lesson_name}'. Lunghezza: {len(html_summary_text) if html_summary_text else 'N/A'}")
+            tasks.append(_SectionSummaryTask("html", section_titles["html"], all_html_text_enriched, "HTML"))
+        elif shared_links["html"]:
+            summaries["html"] = format_shared_material_links(formatter, shared_links["html"])
         else:
             logger.info(f"Nessun contenuto HTML arricchito aggregato per la lezione '{lesson_name}'.")
-            html_summary_text = "Nessun contenuto HTML fornito o contenuto vuoto."
+            summaries["html"] = "Nessun contenuto HTML fornito o contenuto vuoto."
 
-    # NUOVA SEZIONE: Elaborazione file orfani associati
-    orphan_summary_text: Optional[str] = None
-    if associated_orphan_files:
-        logger.info(f"Inizio elaborazione di {len(associated_orphan_files)} file orfani associati a {lesson_name}.")
+    # Testo aggregato dei file orfani associati
+    if inputs.orphan_documents:
+        logger.info(f"Inizio elaborazione di {len(inputs.orphan_documents)} file orfani associati a {lesson_name}.")
         all_orphan_content_text = ""
-        for orphan_file in associated_orphan_files:
-            logger.info(f"Elaborazione file orfano: {orphan_file.name}")
+        for document in inputs.orphan_documents:
+            if document.shared_material is not None:
+                shared_links["orphan_material"].append(document.shared_material)
+                continue
+            if document.error is not None:
+                all_orphan_content_text += f"Errore durante l'elaborazione del file orfano {document.file_path.name}: {document.error}\n\n"
+                continue
             try:
-                if orphan_file.suffix.lower() == '.pdf':
-                    text = extract_text_from_pdf(orphan_file)
-                    logger.info(f"Testo estratto da PDF orfano '{orphan_file.name}', lunghezza: {len(text)}.")
-                    all_orphan_content_text += f"Contenuto da {orphan_file.name}:\n{text}\n\n"
-                elif orphan_file.suffix.lower() == '.html':
-                    # CORREZIONE: Leggere il contenuto del file HTML prima di passarlo
-                    with open(orphan_file, 'r', encoding='utf-8') as f_html_orphan:
-                        html_content_str = f_html_orphan.read()
-                    text, image_urls = extract_text_and_images_from_html(html_content_str)
-                    enriched_content = text
-                    if image_describer and image_urls:
-                        logger.info(f"Trovate {len(image_urls)} immagini in HTML orfano {orphan_file.name}. Inizio descrizione.")
-                        for img_url in image_urls:
-                            full_image_path = orphan_file.parent / img_url if not img_url.startswith(('http', '/')) else img_url
-                            desc, usage_img = image_describer.describe_image_url(str(full_image_path), lesson_name, chapter_name, orphan_file.name)
-                            if desc:
-                                enriched_content += f"\n\nContenuto immagine ({img_url}): {desc}"
-                            if usage_img and usage_img.get("total_tokens") is not None:
-                                total_tokens_lesson += usage_img["total_tokens"]
-                    logger.info(f"Testo HTML arricchito da HTML orfano '{orphan_file.name}', lunghezza: {len(enriched_content)}.")
-                    all_orphan_content_text += f"Contenuto da {orphan_file.name}:\n{enriched_content}\n\n"
+                if document.file_path.suffix.lower() == '.pdf':
+                    logger.info(f"Testo estratto da PDF orfano '{document.file_path.name}', lunghezza: {len(document.text)}.")
+                    all_orphan_content_text += f"Contenuto da {document.file_path.name}:\n{document.text}\n\n"
+                elif document.file_path.suffix.lower() == '.html':
+                    enriched_content, image_tokens = _describe_document_images(
+                        document, image_describer, chapter_name, lesson_name, services.journal, services.backend_router, langfuse_tracker
+                    )
+                    total_tokens_lesson += image_tokens
+                    logger.info(f"Testo HTML arricchito da HTML orfano '{document.file_path.name}', lunghezza: {len(enriched_content)}.")
+                    all_orphan_content_text += f"Contenuto da {document.file_path.name}:\n{enriched_content}\n\n"
             except Exception as e:
-                logger.error(f"Errore durante l'elaborazione del file orfano '{orphan_file.name}': {e}")
-                all_orphan_content_text += f"Errore durante l'elaborazione del file orfano {orphan_file.name}: {e}\n\n"
-        
+                logger.error(f"Errore durante l'elaborazione del file orfano '{document.file_path.name}': {e}")
+                all_orphan_content_text += f"Errore durante l'elaborazione del file orfano {document.file_path.name}: {e}\n\n"
+
         if all_orphan_content_text.strip():
             logger.info(f"Testo aggregato da file orfani per '{lesson_name}' (lunghezza: {len(all_orphan_content_text)}). Inizio riassunto del materiale aggiuntivo.")
-            summary, usage = summarize_long_text(
-                text=all_orphan_content_text,
-                api_key=api_key,
-                prompt_manager=prompt_manager, # Assumendo che esista un prompt adatto o si usi quello di default
-                langfuse_tracker=langfuse_tracker,
-                chapter_name=chapter_name,
-                lesson_name=lesson_name,
-                content_type="orphan_material" # Nuovo tipo di contenuto per tracciamento
-            )
-            orphan_summary_text = summary
-            if usage and usage.get("total_tokens") is not None:
-                total_tokens_lesson += usage["total_tokens"]
-            logger.info(f"Riassunto del materiale orfano generato per '{lesson_name}'. Lunghezza: {len(orphan_summary_text) if orphan_summary_text else 'N/A'}")
+            tasks.append(_SectionSummaryTask("orphan_material", section_titles["orphan_material"], all_orphan_content_text, "del materiale orfano"))
+        elif shared_links["orphan_material"]:
+            summaries["orphan_material"] = format_shared_material_links(formatter, shared_links["orphan_material"])
         else:
             logger.info(f"Nessun contenuto testuale aggregato dai file orfani per '{lesson_name}'.")
-            # Non impostare orphan_summary_text a un messaggio di errore qui, lascialo None se non c'è contenuto.
+            # Non impostare il riassunto orfano a un messaggio di errore qui, lascialo None se non c'è contenuto.
+
+    # In streaming, le sezioni che precedono il primo riassunto vengono scritte subito
+    # e il primo riassunto riceve i token in tempo reale.
+    content_types = list(summaries.keys())
+    streamed_task = tasks[0] if tasks and lesson_stream else None
+    streamed_section: Optional[StreamSection] = None
+    next_section_to_emit = 0
+    if streamed_task:
+        while content_types[next_section_to_emit] != streamed_task.content_type:
+            content_type = content_types[next_section_to_emit]
+            _emit_stream_section(lesson_stream, None, formatter, section_titles[content_type], summaries[content_type])
+            next_section_to_emit += 1
+        streamed_section = _begin_stream_section(lesson_stream, formatter, streamed_task.section_title)
+
+    # Le chiamate per i diversi tipi di contenuto sono indipendenti: vengono eseguite in parallelo
+    futures: Dict[str, Future] = {}
+    if tasks:
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix=f"summary-{lesson_name}") as executor:
+            for task in tasks:
+                futures[task.content_type] = executor.submit(
+                    _run_section_summary,
+                    task,
+                    api_key,
+                    prompt_manager,
+                    langfuse_tracker,
+                    chapter_name,
+                    lesson_name,
+                    streamed_section if task is streamed_task else None,
+                    services
+                )
 
-    # Scrittura del riassunto della lezione
-    # Determina il percorso di output del file di riassunto della lezione
-    # lesson_output_dir = base_output_dir / chapter_dir.name # GIÀ CALCOLATO SOPRA
-    # lesson_output_dir.mkdir(parents=True, exist_ok=True) # LA CREAZIONE DELLA DIR È GESTITA DA write_lesson_summary
-    # Sanitize filename from lesson_name (e.g. vtt_file.stem)
-    # safe_lesson_name = re.sub(r'[^\w\-. ]', '_', lesson_name) # GIÀ CALCOLATO SOPRA
-    # output_file_name = f"{safe_lesson_name}.md" # GIÀ CALCOLATO SOPRA
-    # output_file_path = lesson_output_dir / output_file_name # GIÀ CALCOLATO SOPRA E USATO PER IL CONTROLLO
+    # Raccolta dei risultati nell'ordine canonico delle sezioni
+    for content_type, future in futures.items():
+        try:
+            summary, usage = future.result()
+        except Exception as e:
+            if content_type != "vtt":
+                raise
+            logger.error(f"Errore durante l'elaborazione del file VTT '{inputs.vtt_file.name}': {e}")
+            summary, usage = f"Errore durante l'elaborazione del file VTT: {e}", None
+        if summary and shared_links.get(content_type):
+            summary = f"{summary.strip()}\n\n{format_shared_material_links(formatter, shared_links[content_type])}"
+        summaries[content_type] = summary
+        if usage and usage.get("total_tokens") is not None:
+            total_tokens_lesson += usage["total_tokens"]
+
+    for content_type in content_types[next_section_to_emit:]:
+        section = streamed_section if streamed_task and content_type == streamed_task.content_type else None
+        _emit_stream_section(lesson_stream, section, formatter, section_titles[content_type], summaries[content_type])
+
+    return summaries, total_tokens_lesson
+
+def _open_lesson_stream(formatter: MarkdownFormatter, lesson_name: str, output_file_path: Path,
+                        prompt_fingerprints: Optional[Dict[str, str]] = None) -> Optional[StreamingMarkdownFile]:
+    """
+    Apre il file in streaming di una lezione e vi scrive il frontmatter.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        lesson_name (str): Nome della lezione.
+        output_file_path (Path): Percorso finale del file della lezione.
+        prompt_fingerprints (Optional[Dict[str, str]]): Impronte dei prompt delle sezioni, registrate nel frontmatter.
+
+    Returns:
+        Optional[StreamingMarkdownFile]: Il file aperto, o None se non è stato possibile crearlo.
+    """
+    lesson_stream: Optional[StreamingMarkdownFile] = None
+    try:
+        lesson_stream = StreamingMarkdownFile(output_file_path).open()
+        lesson_stream.write(build_lesson_frontmatter(formatter, lesson_name, user_score_placeholder=True, prompt_fingerprints=prompt_fingerprints))
+        return lesson_stream
+    except OSError as e:
+        logger.error(f"Impossibile avviare la scrittura in streaming di '{output_file_path}': {e}. Continuo senza streaming.")
+        if lesson_stream:
+            lesson_stream.abort()
+        return None
+
+def _write_lesson_output(
+    formatter: MarkdownFormatter,
+    lesson_name: str,
+    summaries: Dict[str, Optional[str]],
+    output_file_path: Path,
+    lesson_stream: Optional[StreamingMarkdownFile] = None,
+    writer: Optional[WriteBehindWriter] = None,
+    prompt_fingerprints: Optional[Dict[str, str]] = None
+) -> Tuple[Optional[Path], Optional[Future]]:
+    """
+    Fase di scrittura di una lezione: completa il file in streaming o scrive il file Markdown.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        lesson_name (str): Nome della lezione.
+        summaries (Dict[str, Optional[str]]): Riassunti per tipo di contenuto.
+        output_file_path (Path): Percorso del file della lezione.
+        lesson_stream (Optional[StreamingMarkdownFile]): File in streaming da completare, se attivo.
+        writer (Optional[WriteBehindWriter]): Writer asincrono a cui affidare la scrittura, se presente.
+        prompt_fingerprints (Optional[Dict[str, str]]): Impronte dei prompt delle sezioni, registrate nel
+                                                        frontmatter (il file in streaming le contiene già).
+
+    Returns:
+        Tuple[Optional[Path], Optional[Future]]: Il percorso del file scritto (o accodato), o None
+            in caso di errore, e la scrittura accodata al writer asincrono (None se già completata).
+    """
+    if lesson_stream:
+        try:
+            if writer is not None:
+                return output_file_path, writer.submit_file(lesson_stream.detach(), output_file_path)
+            lesson_stream.commit()
+            logger.info(f"Riassunto della lezione '{lesson_name}' scritto in streaming su '{output_file_path}'.")
+            return output_file_path, None
+        except OSError as e:
+            logger.error(f"Errore durante il completamento del file in streaming '{output_file_path}': {e}")
+            lesson_stream.abort()
+            return None, None
 
     try:
         logger.info(f"Scrittura del riassunto della lezione su: {output_file_path}")
-        write_lesson_summary(
+        write_future = write_lesson_summary(
             formatter=formatter,
             lesson_title=lesson_name, 
-            vtt_summary=vtt_summary_text, 
-            pdf_summary=pdf_summary_text, 
-            html_summary=html_summary_text,
-            orphan_summary=orphan_summary_text, # AGGIUNTO orphan_summary
+            vtt_summary=summaries.get("vtt"), 
+            pdf_summary=summaries.get("pdf"), 
+            html_summary=summaries.get("html"),
+            orphan_summary=summaries.get("orphan_material"),
             output_file_path=output_file_path,
-            user_score_placeholder=True # Aggiunge placeholder per user_score come da step 2.3
+            user_score_placeholder=True, # Aggiunge placeholder per user_score come da step 2.3
+            writer=writer,
+            prompt_fingerprints=prompt_fingerprints
         )
-        logger.info(f"Riassunto della lezione '{lesson_name}' scritto con successo.")
+        if write_future is None:
+            logger.info(f"Riassunto della lezione '{lesson_name}' scritto con successo.")
+        return output_file_path, write_future
     except Exception as e:
         logger.error(f"Errore durante la scrittura del riassunto della lezione '{lesson_name}' su '{output_file_path}': {e}")
-        output_file_path = None # Indica fallimento
-
-    # Fine tracciamento Langfuse per la lezione - RIMOSSA CHIAMATA A END_LESSON_SPAN
-    # Le informazioni sulla lezione sono già tracciate in ogni track_llm_call
-    # e le metriche aggregate per la lezione possono essere calcolate se necessario
-    # al di fuori di uno span specifico di lezione, o aggiunte allo span del capitolo.
-    # if langfuse_tracker:
-    #     lesson_processing_time = time.time() - start_time_lesson
-    #     # Qui potresti voler raccogliere metadati più specifici sulla lezione
-    #     metadata = {
-    #         "vtt_processed": bool(vtt_text_content.strip()),
-    #         "pdf_processed": bool(pdf_files),
-    #         "html_processed": bool(html_files),
-    #         "orphans_processed": len(associated_orphan_files) if associated_orphan_files else 0,
-    #         "vtt_summary_length": len(vtt_summary_text) if vtt_summary_text else 0,
-    #         "pdf_summary_length": len(pdf_summary_text) if pdf_summary_text else 0,
-    #         "html_summary_length": len(html_summary_text) if html_summary_text else 0,
-    #         "orphan_summary_length": len(orphan_summary_text) if orphan_summary_text else 0,
-    #     }
-    #     langfuse_tracker.end_lesson_span(
-    #         output={"summary_file": str(output_file_path) if output_file_path else "Error"},
-    #         metadata=metadata,
-    #         total_tokens_used=total_tokens_lesson,
-    #         processing_time_seconds=lesson_processing_time,
-    #         status="SUCCESS" if output_file_path else "ERROR"
-    #     )
-
-    logger.info(f"Completata elaborazione lezione: {lesson_name}. Token usati: {total_tokens_lesson}")
-    return output_file_path, total_tokens_lesson
+        return None, None
+
+def _finish_lesson(
+    formatter: MarkdownFormatter,
+    lesson_name: str,
+    summaries: Dict[str, Optional[str]],
+    tokens_used: int,
+    timings: Dict[str, float],
+    output_file_path: Path,
+    lesson_stream: Optional[StreamingMarkdownFile] = None,
+    writer: Optional[WriteBehindWriter] = None,
+    prompt_fingerprints: Optional[Dict[str, str]] = None
+) -> Optional[LessonResult]:
+    """
+    Scrive il file della lezione e ne costruisce il LessonResult.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        lesson_name (str): Nome della lezione.
+        summaries (Dict[str, Optional[str]]): Riassunti per tipo di contenuto.
+        tokens_used (int): Token utilizzati per la lezione.
+        timings (Dict[str, float]): Durate delle fasi già completate (estrazione, riassunto).
+        output_file_path (Path): Percorso del file della lezione.
+        lesson_stream (Optional[StreamingMarkdownFile]): File in streaming da completare, se attivo.
+        writer (Optional[WriteBehindWriter]): Writer asincrono a cui affidare la scrittura, se presente.
+        prompt_fingerprints (Optional[Dict[str, str]]): Impronte dei prompt delle sezioni, registrate nel frontmatter.
+
+    Returns:
+        Optional[LessonResult]: Il risultato della lezione, o None se la scrittura è fallita.
+    """
+    start_time = time.time()
+    written_path, write_future = _write_lesson_output(formatter, lesson_name, summaries, output_file_path, lesson_stream, writer, prompt_fingerprints)
+    timings["write"] = time.time() - start_time
+    logger.info(f"Completata elaborazione lezione: {lesson_name}. Token usati: {tokens_used}")
+    if written_path is None:
+        return None
+    result = LessonResult(lesson_name, written_path, summaries, tokens_used, timings)
+    result.write_future = write_future # Lo stato della scrittura in background viene verificato prima di considerare la lezione completata
+    return result
+
+def process_lesson(
+    formatter: MarkdownFormatter, 
+    vtt_file: Path, 
+    chapter_dir: Path, 
+    base_output_dir: Path, 
+    api_key: str,
+    prompt_manager: PromptManager, # AGGIUNTO prompt_manager
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    image_describer: Optional["ImageDescriber"] = None, # AGGIUNTO ImageDescriber
+    associated_orphan_files: Optional[List[Path]] = None, # AGGIUNTO per file orfani
+    stream_output: bool = False,
+    force: bool = False,
+    services: Optional[RunServices] = None
+) -> Optional[LessonResult]:
+    """
+    Elabora una singola lezione: estrae testo da VTT, PDF correlati, HTML correlati (e orfani associati),
+    genera riassunti e scrive il file Markdown.
+
+    Esegue in sequenza le tre fasi (extract_lesson_inputs, summarize_lesson_inputs,
+    scrittura) che LessonPipeline esegue invece in parallelo su più lezioni.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        vtt_file (Path): Percorso del file VTT della lezione.
+        chapter_dir (Path): Percorso della directory del capitolo.
+        base_output_dir (Path): Directory di output base per il corso.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        image_describer (Optional[ImageDescriber]): Istanza di ImageDescriber.
+        associated_orphan_files (Optional[List[Path]]): Lista di file orfani associati a questa lezione.
+        stream_output (bool): Se True, i riassunti vengono ricevuti in streaming e scritti
+                              progressivamente su un file temporaneo, rinominato atomicamente
+                              nella destinazione al termine della lezione.
+        force (bool): Se True, la lezione viene rigenerata anche se il file di riassunto
+                      esiste già (es. i suoi file di input sono cambiati in modalità watch).
+        services (Optional[RunServices]): Servizi condivisi. Senza services.writer il file viene
+                                          scritto (atomicamente) nel thread chiamante.
+
+    Returns:
+        Optional[LessonResult]: Il risultato della lezione (titolo, riassunti, token e tempi),
+                                o None se la scrittura del file fallisce. Se il file esiste
+                                già, il risultato non contiene riassunti (vedi LessonResult.skipped).
+    """
+    services = services or RunServices()
+    lesson_name = vtt_file.stem
+    chapter_name = chapter_dir.name
+    output_file_path = get_lesson_output_path(base_output_dir, chapter_dir, vtt_file)
+
+    # Verifica se il file di riassunto esiste già (generato con gli stessi prompt)
+    if not force and is_lesson_output_current(output_file_path, prompt_manager.section_fingerprints()):
+        logger.info(f"Il file di riassunto '{output_file_path}' per la lezione '{lesson_name}' esiste già. Salto la generazione.")
+        return LessonResult.from_existing_file(lesson_name, output_file_path) # 0 token usati
+
+    logger.info(f"Inizio elaborazione lezione: {lesson_name} nel capitolo {chapter_name}")
+    inputs = extract_lesson_inputs(LessonJob(vtt_file, chapter_dir, list(associated_orphan_files or []),
+                                             services.extraction_cache, services.shared_materials))
+    prompt_fingerprints = prompt_manager.section_fingerprints(lesson_prompt_content_types(inputs))
+
+    summary_start_time = time.time()
+    lesson_stream = _open_lesson_stream(formatter, lesson_name, output_file_path, prompt_fingerprints) if stream_output else None
+    try:
+        summaries, total_tokens_lesson = summarize_lesson_inputs(
+            inputs,
+            formatter=formatter,
+            api_key=api_key,
+            prompt_manager=prompt_manager,
+            langfuse_tracker=langfuse_tracker,
+            image_describer=image_describer,
+            lesson_stream=lesson_stream,
+            services=services
+        )
+    except BaseException:
+        # Interruzione imprevista (es. Ctrl-C): nessun file parziale resta nella destinazione
+        if lesson_stream:
+            lesson_stream.abort()
+        raise
+
+    timings = {"extraction": inputs.extraction_seconds, "summary": time.time() - summary_start_time}
+    return _finish_lesson(formatter, lesson_name, summaries, total_tokens_lesson, timings, output_file_path, lesson_stream, services.writer, prompt_fingerprints)
+
+def _summarize_pipeline_job(
+    job: LessonJob,
+    inputs: LessonInputs,
+    formatter: MarkdownFormatter,
+    base_output_dir: Path,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker],
+    image_describer: Optional["ImageDescriber"],
+    stream_output: bool,
+    services: Optional[RunServices] = None
+) -> Tuple[Dict[str, Optional[str]], int, Dict[str, float], Optional[StreamingMarkdownFile], Dict[str, str]]:
+    """Stadio di riassunto di LessonPipeline per una lezione (vedi summarize_lesson_inputs)."""
+    summary_start_time = time.time()
+    output_file_path = get_lesson_output_path(base_output_dir, job.chapter_dir, job.vtt_file)
+    prompt_fingerprints = prompt_manager.section_fingerprints(lesson_prompt_content_types(inputs))
+    lesson_stream = _open_lesson_stream(formatter, job.vtt_file.stem, output_file_path, prompt_fingerprints) if stream_output else None
+    try:
+        summaries, tokens = summarize_lesson_inputs(
+            inputs,
+            formatter=formatter,
+            api_key=api_key,
+            prompt_manager=prompt_manager,
+            langfuse_tracker=langfuse_tracker,
+            image_describer=image_describer,
+            lesson_stream=lesson_stream,
+            services=services
+        )
+    except BaseException:
+        if lesson_stream:
+            lesson_stream.abort()
+        raise
+    timings = {"extraction": inputs.extraction_seconds, "summary": time.time() - summary_start_time}
+    return summaries, tokens, timings, lesson_stream, prompt_fingerprints
+
+def _write_pipeline_job(
+    job: LessonJob,
+    summarized: Tuple[Dict[str, Optional[str]], int, Dict[str, float], Optional[StreamingMarkdownFile], Dict[str, str]],
+    formatter: MarkdownFormatter,
+    base_output_dir: Path,
+    writer: Optional[WriteBehindWriter] = None
+) -> Optional[LessonResult]:
+    """Stadio di scrittura di LessonPipeline per una lezione."""
+    summaries, tokens, timings, lesson_stream, prompt_fingerprints = summarized
+    output_file_path = get_lesson_output_path(base_output_dir, job.chapter_dir, job.vtt_file)
+    return _finish_lesson(formatter, job.vtt_file.stem, summaries, tokens, timings, output_file_path, lesson_stream, writer, prompt_fingerprints)
 
 def process_chapter(
     formatter: MarkdownFormatter, 
@@ -1185,12 +2486,21 @@ def process_chapter(
     base_output_dir: Path, 
     api_key: str,
     prompt_manager: PromptManager, # AGGIUNTO prompt_manager
-    langfuse_tracker: Optional[LangfuseTracker] = None
-) -> Tuple[List[Optional[Path]], int]: # MODIFICATO TIPO DI RITORNO
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    stream_output: bool = False,
+    pipeline: Optional[LessonPipeline] = None,
+    services: Optional[RunServices] = None
+) -> Tuple[List[LessonResult], int]: # MODIFICATO TIPO DI RITORNO
     """
     Processa tutti i file VTT e i relativi file PDF/HTML (inclusi gli orfani associati) in una directory di capitolo.
     Genera riassunti per ogni lezione e li salva in file Markdown.
 
+    Se viene fornita una LessonPipeline, le lezioni vengono elaborate a stadi:
+    l'estrazione delle lezioni successive avviene mentre quelle precedenti
+    attendono il modello, e i file vengono scritti da un thread dedicato. Le
+    lezioni vengono avviate dalla più costosa (vedi estimate_lesson_cost), così
+    una lezione lunga in fondo al capitolo non lo rallenta da sola.
+
     Args:
         formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
         chapter_dir (Path): Percorso della directory del capitolo.
@@ -1198,12 +2508,18 @@ def process_chapter(
         api_key (str): Chiave API OpenAI.
         prompt_manager (PromptManager): Gestore dei prompt.
         langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        stream_output (bool): Se True, i riassunti delle lezioni vengono scritti in streaming.
+        pipeline (Optional[LessonPipeline]): Pipeline a stadi da usare. Se None, le lezioni
+                                             vengono elaborate in sequenza.
+        services (Optional[RunServices]): Servizi condivisi dalle lezioni del capitolo (writer, journal,
+                                          limitatore, router, cache delle estrazioni, ...).
 
     Returns:
-        Tuple[List[Optional[Path]], int]: Una tupla contenente la lista dei percorsi dei file 
-                                           Markdown dei riassunti delle lezioni generati e il 
-                                           numero totale di token utilizzati per il capitolo.
+        Tuple[List[LessonResult], int]: Una tupla contenente la lista dei risultati delle lezioni
+                                        (nell'ordine delle lezioni, incluse quelle già presenti
+                                        su disco) e il numero totale di token utilizzati per il capitolo.
     """
+    services = services or RunServices()
     chapter_name = chapter_dir.name
     chapter_output_dir = base_output_dir / chapter_name
     try:
@@ -1232,33 +2548,80 @@ def process_chapter(
     orphan_files = identify_orphan_files(chapter_dir, vtt_files)
     orphans_map = map_orphans_to_lessons(vtt_files, orphan_files)
 
-    lesson_summary_files: List[Optional[Path]] = []
+    lesson_results: List[LessonResult] = []
     total_tokens_chapter = 0
 
     # Inizializza ImageDescriber se necessario (potrebbe essere fatto una volta per corso)
-    image_describer = ImageDescriber(api_key=api_key, langfuse_tracker=langfuse_tracker) 
-
-    for vtt_file in vtt_files:
-        logger.info(f"Inizio elaborazione lezione VTT: {vtt_file.name}")
-        # Recupera i file orfani associati a questo VTT
-        associated_orphan_files = orphans_map.get(vtt_file, [])
-        if associated_orphan_files:
-            logger.info(f"File orfani associati a {vtt_file.name}: {[o.name for o in associated_orphan_files]}")
-        
-        summary_file_path, tokens_lesson = process_lesson(
-            formatter=formatter,
-            vtt_file=vtt_file,
-            chapter_dir=chapter_dir, # Passato per coerenza, ma find_related_files ora è più mirato
-            base_output_dir=base_output_dir,
-            api_key=api_key,
-            prompt_manager=prompt_manager,
-            langfuse_tracker=langfuse_tracker,
-            image_describer=image_describer, # Passa ImageDescriber
-            associated_orphan_files=associated_orphan_files # Passa i file orfani associati
+    image_describer = create_image_describer(api_key, langfuse_tracker, services.rate_limiter, services.backend_router)
+
+    if pipeline is not None:
+        prompt_fingerprints = prompt_manager.section_fingerprints()
+        jobs: List[LessonJob] = []
+        for vtt_file in vtt_files:
+            output_file_path = get_lesson_output_path(base_output_dir, chapter_dir, vtt_file)
+            if is_lesson_output_current(output_file_path, prompt_fingerprints):
+                logger.info(f"Il file di riassunto '{output_file_path}' per la lezione '{vtt_file.stem}' esiste già. Salto la generazione.")
+                continue
+            associated_orphan_files = orphans_map.get(vtt_file, [])
+            if associated_orphan_files:
+                logger.info(f"File orfani associati a {vtt_file.name}: {[o.name for o in associated_orphan_files]}")
+            jobs.append(LessonJob(vtt_file, chapter_dir, list(associated_orphan_files),
+                                  services.extraction_cache, services.shared_materials))
+
+        logger.info(f"Elaborazione a stadi di {len(jobs)} lezioni del capitolo '{chapter_name}'.")
+        pipeline_results = pipeline.run(
+            jobs,
+            extract_lesson_inputs,
+            partial(
+                _summarize_pipeline_job,
+                formatter=formatter,
+                base_output_dir=base_output_dir,
+                api_key=api_key,
+                prompt_manager=prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                image_describer=image_describer,
+                stream_output=stream_output,
+                services=services
+            ),
+            partial(_write_pipeline_job, formatter=formatter, base_output_dir=base_output_dir, writer=services.writer),
+            cost_fn=estimate_lesson_cost # Le lezioni più lunghe vengono avviate per prime
         )
-        if summary_file_path:
-            lesson_summary_files.append(summary_file_path)
-        total_tokens_chapter += tokens_lesson
+        pipeline_results_by_vtt = {job.vtt_file: result for job, result in zip(jobs, pipeline_results)}
+
+        # I risultati vengono raccolti nell'ordine canonico delle lezioni
+        for vtt_file in vtt_files:
+            if vtt_file not in pipeline_results_by_vtt:
+                output_file_path = get_lesson_output_path(base_output_dir, chapter_dir, vtt_file)
+                lesson_results.append(LessonResult.from_existing_file(vtt_file.stem, output_file_path))
+                continue
+            lesson_result = pipeline_results_by_vtt[vtt_file]
+            if lesson_result:
+                lesson_results.append(lesson_result)
+                total_tokens_chapter += lesson_result.tokens_used
+    else:
+        for vtt_file in vtt_files:
+            logger.info(f"Inizio elaborazione lezione VTT: {vtt_file.name}")
+            # Recupera i file orfani associati a questo VTT
+            associated_orphan_files = orphans_map.get(vtt_file, [])
+            if associated_orphan_files:
+                logger.info(f"File orfani associati a {vtt_file.name}: {[o.name for o in associated_orphan_files]}")
+        
+            lesson_result = process_lesson(
+                formatter=formatter,
+                vtt_file=vtt_file,
+                chapter_dir=chapter_dir, # Passato per coerenza, ma find_related_files ora è più mirato
+                base_output_dir=base_output_dir,
+                api_key=api_key,
+                prompt_manager=prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                image_describer=image_describer, # Passa ImageDescriber
+                associated_orphan_files=associated_orphan_files, # Passa i file orfani associati
+                stream_output=stream_output,
+                services=services
+            )
+            if lesson_result:
+                lesson_results.append(lesson_result)
+                total_tokens_chapter += lesson_result.tokens_used
 
     # Log metriche capitolo per Langfuse
     if langfuse_tracker:
@@ -1268,137 +2631,238 @@ def process_chapter(
             "total_lessons_processed": len(vtt_files),
             "total_tokens_used": total_tokens_chapter,
             "processing_time_seconds": chapter_processing_time,
+            # Somma dei tempi per fase delle lezioni (con la pipeline le fasi si sovrappongono)
+            "extraction_seconds": sum(r.timings.get("extraction", 0.0) for r in lesson_results),
+            "summary_seconds": sum(r.timings.get("summary", 0.0) for r in lesson_results),
+            "write_seconds": sum(r.timings.get("write", 0.0) for r in lesson_results),
             # chapter_name è già parte dello span, non serve ripeterlo qui
             # se non specificamente richiesto dalla logica di end_chapter_span.
             # Dalla definizione di end_chapter_span, non sembra necessario.
         }
         langfuse_tracker.end_chapter_span(output=chapter_metrics, status="OK")
 
-    logger.info(f"Completata elaborazione del capitolo: {chapter_name}. File di riassunto generati: {len(lesson_summary_files)}")
-    return lesson_summary_files, total_tokens_chapter
+    logger.info(f"Completata elaborazione del capitolo: {chapter_name}. File di riassunto generati: {len(lesson_results)}")
+    return lesson_results, total_tokens_chapter
 
-def create_chapter_summary(formatter: MarkdownFormatter, chapter_dir: Path, lesson_summary_files: List[Optional[Path]], base_output_dir: Path) -> Optional[Path]: # Modificata firma
+def read_lesson_frontmatter(lesson_file: TextIO) -> Optional[Dict[str, str]]:
     """
-    Crea un file Markdown di riepilogo per un capitolo, incorporando i contenuti delle lezioni.
+    Legge il frontmatter di un file di lezione senza caricare il resto del file.
+
+    Vengono lette solo le righe comprese tra i due delimitatori '---'; al ritorno
+    il file è posizionato all'inizio del corpo della lezione. Se il file non
+    inizia con un frontmatter completo, viene riposizionato all'inizio.
 
     Args:
-        formatter (MarkdownFormatter): Istanza del formattatore Markdown.
-        chapter_dir (Path): Percorso della directory del capitolo.
-        lesson_summary_files (List[Optional[Path]]): Lista dei percorsi ai file di riassunto delle lezioni.
-        base_output_dir (Path): Directory di output base per il corso.
+        lesson_file (TextIO): File della lezione aperto in lettura, posizionato all'inizio.
 
     Returns:
-        Optional[Path]: Percorso del file di riepilogo del capitolo creato, o None se fallisce.
+        Optional[Dict[str, str]]: Le coppie chiave/valore del frontmatter, o None se assente.
     """
-    chapter_name = chapter_dir.name
-    # Rimuove prefissi numerici comuni come '01-', '01_', '01.', '01 '
-    # per un titolo di capitolo più pulito
-    clean_chapter_name = re.sub(r"^\d+[-_\.\s]*", "", chapter_name)
-    chapter_title = f"Capitolo: {clean_chapter_name}"
-    
-    # Sostituisce gli spazi con underscore e normalizza il nome per il file
-    safe_chapter_name = chapter_name.replace(" ", "_").lower()
-    # Rimuove caratteri non alfanumerici eccetto underscore
-    safe_chapter_name = re.sub(r'[^a-z0-9_]', '', safe_chapter_name)
-    chapter_summary_filename = f"CAPITOLO_{safe_chapter_name}.md"
-    
-    # Il file di riepilogo del capitolo va nella directory del capitolo specifica dentro l'output base
-    chapter_output_dir = base_output_dir / chapter_dir.name # Mantiene la struttura originale
-    chapter_output_dir.mkdir(parents=True, exist_ok=True)
-    chapter_summary_path = chapter_output_dir / chapter_summary_filename
+    if lesson_file.readline().strip() != "---":
+        lesson_file.seek(0)
+        return None
 
-    logger.info(f"Creazione del riassunto del capitolo: {chapter_summary_path}")
+    frontmatter: Dict[str, str] = {}
+    for line in iter(lesson_file.readline, ""):
+        if line.strip() == "---":
+            return frontmatter
+        key, separator, value = line.partition(":")
+        if separator:
+            frontmatter[key.strip()] = value.strip()
 
-    content_parts = []
-    content_parts.append(formatter.format_header(chapter_title, level=1))
-    content_parts.append(formatter.new_line())
+    # Frontmatter non chiuso: il file viene trattato come privo di frontmatter
+    lesson_file.seek(0)
+    return None
+
+def get_chapter_summary_path(base_output_dir: Path, chapter_dir: Path) -> Path:
+    """
+    Calcola il percorso del file di riepilogo di un capitolo.
+
+    Args:
+        base_output_dir (Path): Directory di output base per il corso.
+        chapter_dir (Path): Percorso della directory del capitolo.
+
+    Returns:
+        Path: Percorso del file CAPITOLO_<nome>.md.
+    """
+    # Sostituisce gli spazi con underscore e normalizza il nome per il file
+    safe_chapter_name = chapter_dir.name.replace(" ", "_").lower()
+    # Rimuove caratteri non alfanumerici eccetto underscore
+    safe_chapter_name = re.sub(r'[^a-z0-9_]', '', safe_chapter_name)
+    # Il file di riepilogo del capitolo va nella directory del capitolo specifica dentro l'output base
+    return base_output_dir / chapter_dir.name / f"CAPITOLO_{safe_chapter_name}.md"
+
+def is_chapter_summary_current(chapter_summary_path: Path, lesson_results: Sequence[LessonResult]) -> bool:
+    """
+    Indica se il riepilogo di un capitolo può essere riutilizzato senza ricostruirlo.
+
+    Vale solo se nessuna lezione è stata rigenerata in questa esecuzione e il
+    riepilogo esistente è più recente di tutti i file delle lezioni.
+
+    Args:
+        chapter_summary_path (Path): Percorso del riepilogo del capitolo.
+        lesson_results (Sequence[LessonResult]): Risultati delle lezioni del capitolo.
+
+    Returns:
+        bool: True se il riepilogo esistente è aggiornato.
+    """
+    if not lesson_results or not all(result.skipped for result in lesson_results):
+        return False
+    try:
+        chapter_mtime = chapter_summary_path.stat().st_mtime
+        return all(result.output_path.stat().st_mtime <= chapter_mtime for result in lesson_results)
+    except OSError:
+        return False
+
+def _write_chapter_lesson_heading(chapter_file: StreamingMarkdownFile, formatter: MarkdownFormatter, lesson_title: str) -> None:
+    """Scrive l'ancora e l'header H2 di una lezione nel riepilogo del capitolo."""
+    # Crea un'ancora per il link dell'indice
+    lesson_anchor = re.sub(r"^\d+[-_\.\s]*", "", lesson_title).replace(" ", "-").lower()
+
+    chapter_file.write(f'<a id="{lesson_anchor}"></a>') # Aggiunge l'ancora HTML
+    chapter_file.write(formatter.new_line())
+
+    # Aggiungiamo l'header H2 per la lezione, preso dal frontmatter o dal nome del file
+    chapter_file.write(formatter.format_header(lesson_title, level=2))
+    chapter_file.write(formatter.new_line())
+
+def _write_chapter_lesson_footer(chapter_file: StreamingMarkdownFile, formatter: MarkdownFormatter) -> None:
+    """Chiude la sezione di una lezione nel riepilogo del capitolo."""
+    # Aggiunge una riga vuota prima della linea orizzontale per separazione
+    # (senza, l'ultima riga del corpo diventerebbe un'intestazione setext)
+    chapter_file.write(formatter.new_line(2))
+    chapter_file.write(formatter.horizontal_rule())
+    chapter_file.write(formatter.new_line())
+
+def create_chapter_summary(formatter: MarkdownFormatter, chapter_dir: Path, lesson_summaries: Sequence[Union[LessonResult, Path, None]], base_output_dir: Path, writer: Optional[WriteBehindWriter] = None, pending_writes: Optional[List[Future]] = None) -> Optional[Path]: # Modificata firma
+    """
+    Crea un file Markdown di riepilogo per un capitolo, incorporando i contenuti delle lezioni.
+
+    Le lezioni elaborate in questa esecuzione vengono rese direttamente dai
+    riassunti in memoria; solo le lezioni saltate (già presenti su disco) o
+    passate come percorso vengono lette dal file, a blocchi.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza del formattatore Markdown.
+        chapter_dir (Path): Percorso della directory del capitolo.
+        lesson_summaries (Sequence[Union[LessonResult, Path, None]]): Risultati delle lezioni
+            (o percorsi dei file di riassunto), nell'ordine delle lezioni.
+        base_output_dir (Path): Directory di output base per il corso.
+        writer (Optional[WriteBehindWriter]): Writer asincrono a cui affidare la rinomina finale del file.
+        pending_writes (Optional[List[Future]]): Se fornita, riceve il Future della scrittura accodata al writer.
+
+    Returns:
+        Optional[Path]: Percorso del file di riepilogo del capitolo creato, o None se fallisce.
+    """
+    chapter_name = chapter_dir.name
+    # Rimuove prefissi numerici comuni come '01-', '01_', '01.', '01 '
+    # per un titolo di capitolo più pulito
+    clean_chapter_name = re.sub(r"^\d+[-_\.\s]*", "", chapter_name)
+    chapter_title = f"Capitolo: {clean_chapter_name}"
+
+    chapter_summary_path = get_chapter_summary_path(base_output_dir, chapter_dir)
+    chapter_summary_path.parent.mkdir(parents=True, exist_ok=True)
+
+    logger.info(f"Creazione del riassunto del capitolo: {chapter_summary_path}")
+
+    # Coppie (percorso del file, risultato in memoria o None se va letto da disco)
+    lesson_entries: List[Tuple[Path, Optional[LessonResult]]] = []
+    for entry in lesson_summaries:
+        if isinstance(entry, LessonResult):
+            lesson_entries.append((entry.output_path, None if entry.skipped else entry))
+        elif entry:
+            lesson_entries.append((entry, None))
+
+    content_parts = []
+    content_parts.append(formatter.format_header(chapter_title, level=1))
+    content_parts.append(formatter.new_line())
 
     # Creazione di un piccolo indice per le lezioni
-    if lesson_summary_files:
+    if lesson_entries:
         content_parts.append(formatter.format_header("Indice delle Lezioni", level=2))
         content_parts.append(formatter.new_line()) # Assicura una nuova riga dopo l'header dell'indice
 
-        for i, lesson_file_path in enumerate(lesson_summary_files):
-            if lesson_file_path:
-                lesson_title = lesson_file_path.stem # Nome del file senza estensione
-                # Pulisce il titolo della lezione da prefissi numerici e lo usa per l'ancora
-                clean_lesson_title_for_anchor = re.sub(r"^\d+[-_\.\s]*", "", lesson_title).replace(" ", "-").lower()
-                clean_lesson_title_for_display = re.sub(r"^\d+[-_\.\s]*", "", lesson_title)
-                # Sostituisce "SUMMARY_" se presente nel nome del file per il display
-                clean_lesson_title_for_display = clean_lesson_title_for_display.replace("SUMMARY_", "").replace("_", " ")
-
-                link_text = formatter.format_link(f"Lezione: {clean_lesson_title_for_display}", f"#{clean_lesson_title_for_anchor}")
-                content_parts.append(formatter.format_list_item(link_text, ordered=False))
-                content_parts.append(formatter.new_line()) # Assicura che ogni elemento della lista sia su una nuova riga
+        for lesson_file_path, _ in lesson_entries:
+            lesson_title = lesson_file_path.stem # Nome del file senza estensione
+            # Pulisce il titolo della lezione da prefissi numerici e lo usa per l'ancora
+            clean_lesson_title_for_anchor = re.sub(r"^\d+[-_\.\s]*", "", lesson_title).replace(" ", "-").lower()
+            clean_lesson_title_for_display = re.sub(r"^\d+[-_\.\s]*", "", lesson_title)
+            # Sostituisce "SUMMARY_" se presente nel nome del file per il display
+            clean_lesson_title_for_display = clean_lesson_title_for_display.replace("SUMMARY_", "").replace("_", " ")
+
+            link_text = formatter.format_link(f"Lezione: {clean_lesson_title_for_display}", f"#{clean_lesson_title_for_anchor}")
+            content_parts.append(formatter.format_list_item(link_text, ordered=False))
+            content_parts.append(formatter.new_line()) # Assicura che ogni elemento della lista sia su una nuova riga
         
         # La riga seguente non è più necessaria perché ogni elemento della lista ora ha il suo new_line()
         # content_parts.append(formatter.new_line()) 
         content_parts.append(formatter.horizontal_rule())
         content_parts.append(formatter.new_line())
 
-    # Incorpora il contenuto di ogni lezione
-    for lesson_file_path in lesson_summary_files:
-        if lesson_file_path and lesson_file_path.exists():
-            try:
-                with open(lesson_file_path, "r", encoding="utf-8") as f_lesson:
-                    lesson_content = f_lesson.read()
-                
-                # Estrae il titolo dal frontmatter del file lezione per usarlo come H2
-                # e rimuove il frontmatter dal contenuto da includere
-                match = re.search(r"^---\s*$\n(.*?)^---\s*$\n(.*?)$", lesson_content, re.MULTILINE | re.DOTALL)
-                lesson_title_from_frontmatter = chapter_name # Fallback se non trova il titolo
-                actual_lesson_content_to_embed = lesson_content # Fallback
-
-                if match:
-                    frontmatter_str = match.group(1)
-                    actual_lesson_content_to_embed = match.group(2).strip()
-                    # Cerca il titolo nel frontmatter
-                    title_match = re.search(r"^title:\s*(.+)$", frontmatter_str, re.MULTILINE)
-                    if title_match:
-                        lesson_title_from_frontmatter = title_match.group(1).strip()
-                else:
-                    # Se non c'è frontmatter, prova a usare il nome del file come titolo H2
-                    # e includi tutto il contenuto
-                    lesson_title_from_frontmatter = lesson_file_path.stem.replace("SUMMARY_","").replace("_", " ")
-                    lesson_title_from_frontmatter = re.sub(r"^\d+[-_\.\s]*", "", lesson_title_from_frontmatter)
-                
-                # Crea un'ancora per il link dell'indice
-                lesson_anchor = re.sub(r"^\d+[-_\.\s]*", "", lesson_title_from_frontmatter).replace(" ", "-").lower()
-
-                content_parts.append(f'<a id="{lesson_anchor}"></a>') # Aggiunge l'ancora HTML
-                content_parts.append(formatter.new_line())
-
-                # Aggiungiamo l'header H2 per la lezione, preso dal frontmatter o dal nome del file
-                content_parts.append(formatter.format_header(lesson_title_from_frontmatter, level=2))
-                content_parts.append(formatter.new_line())
-
-                # E poi il contenuto effettivo della lezione (post-frontmatter),
-                # che dovrebbe già contenere le sue intestazioni di sezione (es. "## Riassunto Video (VTT)")
-                # e il corpo del riassunto.
-                content_parts.append(actual_lesson_content_to_embed)
-                
-                # Aggiunge una nuova riga prima della linea orizzontale per separazione
-                content_parts.append(formatter.new_line())
-                content_parts.append(formatter.horizontal_rule())
-                content_parts.append(formatter.new_line())
-
-            except IOError as e:
-                logger.warning(f"Impossibile leggere il file di riassunto della lezione {lesson_file_path}: {e}")
-        elif lesson_file_path:
-            logger.warning(f"File di riassunto della lezione non trovato: {lesson_file_path}")
-
-    final_content = "".join(content_parts)
-
+    chapter_file = StreamingMarkdownFile(chapter_summary_path)
     try:
-        with open(chapter_summary_path, "w", encoding="utf-8") as f:
-            f.write(final_content)
+        chapter_file.open()
+        chapter_file.write("".join(content_parts))
+
+        # Incorpora il contenuto di ogni lezione
+        for lesson_file_path, lesson_result in lesson_entries:
+            if lesson_result is not None:
+                # Lezione elaborata in questa esecuzione: il corpo viene reso dai riassunti in memoria
+                _write_chapter_lesson_heading(chapter_file, formatter, lesson_result.title)
+                lesson_content = formatter.format_lesson_summary(
+                    lesson_result.title,
+                    lesson_result.summaries.get("vtt"),
+                    lesson_result.summaries.get("pdf"),
+                    lesson_result.summaries.get("html"),
+                    lesson_result.summaries.get("orphan_material")
+                )
+                chapter_file.write(lesson_content.strip())
+                _write_chapter_lesson_footer(chapter_file, formatter)
+            elif lesson_file_path.exists():
+                # Lezione già presente su disco: il corpo viene copiato a blocchi senza caricarlo in memoria
+                try:
+                    with open(lesson_file_path, "r", encoding="utf-8") as f_lesson:
+                        # Legge solo le righe del frontmatter: il file resta posizionato all'inizio del corpo
+                        frontmatter = read_lesson_frontmatter(f_lesson)
+                        lesson_title_from_frontmatter = chapter_name # Fallback se non trova il titolo
+
+                        if frontmatter is not None:
+                            if frontmatter.get("title"):
+                                lesson_title_from_frontmatter = frontmatter["title"]
+                        else:
+                            # Se non c'è frontmatter, prova a usare il nome del file come titolo H2
+                            # e includi tutto il contenuto
+                            lesson_title_from_frontmatter = lesson_file_path.stem.replace("SUMMARY_","").replace("_", " ")
+                            lesson_title_from_frontmatter = re.sub(r"^\d+[-_\.\s]*", "", lesson_title_from_frontmatter)
+
+                        _write_chapter_lesson_heading(chapter_file, formatter, lesson_title_from_frontmatter)
+
+                        # E poi il contenuto effettivo della lezione (post-frontmatter),
+                        # che dovrebbe già contenere le sue intestazioni di sezione (es. "## Riassunto Video (VTT)")
+                        # e il corpo del riassunto.
+                        copy_stripped_text(f_lesson, chapter_file.write)
+
+                    _write_chapter_lesson_footer(chapter_file, formatter)
+
+                except (IOError, UnicodeDecodeError) as e:
+                    logger.warning(f"Impossibile leggere il file di riassunto della lezione {lesson_file_path}: {e}")
+            else:
+                logger.warning(f"File di riassunto della lezione non trovato: {lesson_file_path}")
+
+        if writer is not None:
+            future = writer.submit_file(chapter_file.detach(), chapter_summary_path)
+            if pending_writes is not None:
+                pending_writes.append(future)
+        else:
+            chapter_file.commit()
         logger.info(f"Riepilogo del capitolo '{chapter_name}' scritto con successo in {chapter_summary_path}")
         return chapter_summary_path
     except IOError as e:
+        chapter_file.abort()
         logger.error(f"Errore durante la scrittura del file di riepilogo del capitolo per '{chapter_name}': {e}")
         return None
 
-def create_main_index(formatter: MarkdownFormatter, course_name: str, chapter_summary_files: List[Optional[Path]], base_output_dir: Path) -> Optional[Path]: # Modificata firma
+def create_main_index(formatter: MarkdownFormatter, course_name: str, chapter_summary_files: List[Optional[Path]], base_output_dir: Path, writer: Optional[WriteBehindWriter] = None, pending_writes: Optional[List[Future]] = None) -> Optional[Path]: # Modificata firma
     """
     Crea un file index.md principale per il corso, usando MarkdownFormatter.
     # ... (docstring unchanged) ...
@@ -1445,8 +2909,12 @@ def create_main_index(formatter: MarkdownFormatter, course_name: str, chapter_su
         content.append(formatter.new_line())
         content.append(f"*Indice generato per il corso '{course_name}'.*")
 
-        with open(index_file_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(content))
+        if writer is not None:
+            future = writer.submit(index_file_path, "\n".join(content))
+            if pending_writes is not None:
+                pending_writes.append(future)
+        else:
+            write_text_atomic(index_file_path, "\n".join(content))
         
         logger.info(f"File indice principale '{index_file_path}' creato con successo.")
         return index_file_path
@@ -1457,84 +2925,256 @@ def create_main_index(formatter: MarkdownFormatter, course_name: str, chapter_su
         
     return None
 
-def main():
+def build_shared_material_index(course_dir: Union[str, Path], course_output_dir: Path) -> SharedMaterialIndex:
     """
-    Funzione principale per orchestrare il processo di generazione dei riassunti.
+    Individua gli allegati (PDF, HTML, file orfani) con lo stesso contenuto allegati a più lezioni del corso.
+
+    Args:
+        course_dir (Union[str, Path]): Directory del corso.
+        course_output_dir (Path): Directory di output del corso.
+
+    Returns:
+        SharedMaterialIndex: L'indice degli allegati condivisi.
     """
-    configure_logging()
-    load_dotenv() # Carica variabili da .env se presente
+    lesson_attachments: List[Tuple[Path, List[Path]]] = []
+    for chapter_dir in list_chapter_directories(course_dir):
+        vtt_files = list_vtt_files(chapter_dir)
+        orphans_map = map_orphans_to_lessons(vtt_files, identify_orphan_files(chapter_dir, vtt_files))
+        for vtt_file in vtt_files:
+            related_files = find_related_files(vtt_file, chapter_dir)
+            attachments = related_files.get('pdf', []) + related_files.get('html', []) + orphans_map.get(vtt_file, [])
+            lesson_attachments.append((vtt_file, attachments))
+    return SharedMaterialIndex.build(lesson_attachments, course_output_dir / SHARED_MATERIALS_DIRNAME)
+
+def read_summary_tokens(output_file_path: Path) -> int:
+    """
+    Legge dal frontmatter i token usati per il riassunto di un allegato condiviso.
 
-    args = parse_arguments()
-    
-    # Inizializza LangfuseTracker se le variabili d'ambiente sono impostate
-    langfuse_tracker: Optional[LangfuseTracker] = None
+    Args:
+        output_file_path (Path): Percorso del riassunto dell'allegato.
+
+    Returns:
+        int: I token registrati (0 se il file non li contiene o non è leggibile).
+    """
     try:
-        if os.getenv("LANGFUSE_SECRET_KEY") and os.getenv("LANGFUSE_PUBLIC_KEY"):
-            langfuse_tracker = LangfuseTracker()
-            logger.info("LangfuseTracker inizializzato.")
-            # Creiamo una sessione per questa esecuzione
-            # langfuse_tracker.create_session(name="resume_generator_run") # O un nome più specifico
+        with open(output_file_path, "r", encoding="utf-8") as f:
+            frontmatter = read_lesson_frontmatter(f) or {}
+        return int(frontmatter.get(SUMMARY_TOKENS_KEY) or 0)
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        logger.debug(f"Impossibile leggere i token del riassunto '{output_file_path}': {e}")
+        return 0
+
+def process_shared_materials(
+    shared_materials: SharedMaterialIndex,
+    formatter: MarkdownFormatter,
+    base_output_dir: Path,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    services: Optional[RunServices] = None,
+    pending_lessons: Optional[Set[Path]] = None
+) -> int:
+    """
+    Estrae e riassume una sola volta ogni allegato condiviso, in un file dedicato.
+
+    Un documento il cui riassunto è già su disco (generato con gli stessi prompt)
+    non viene rielaborato: i token usati per generarlo, registrati nel frontmatter,
+    restano nella stima dei token risparmiati. I documenti allegati solo a lezioni già generate, e
+    quelli il cui riassunto non può essere scritto, vengono rimossi dall'indice:
+    nel secondo caso le lezioni li riassumeranno come allegati ordinari.
+
+    Args:
+        shared_materials (SharedMaterialIndex): Allegati condivisi del corso.
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        base_output_dir (Path): Directory di output base per il corso.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        services (Optional[RunServices]): Servizi condivisi del corso (writer, journal, limitatore, ...).
+        pending_lessons (Optional[Set[Path]]): File VTT delle lezioni che verranno rigenerate anche se
+                                               il loro file è aggiornato (modalità watch).
+
+    Returns:
+        int: Token utilizzati per i riassunti dei documenti condivisi.
+    """
+    services = services or RunServices()
+    prompt_fingerprints = prompt_manager.section_fingerprints()
+    section_titles = {"pdf": formatter.PDF_SECTION_TITLE, "html": formatter.HTML_SECTION_TITLE}
+    image_describer: Optional["ImageDescriber"] = None
+    total_tokens = 0
+    pending_writes: List[Tuple[SharedMaterial, Future]] = []
+
+    for material in list(shared_materials.materials.values()):
+        if is_lesson_output_current(material.output_path, prompt_fingerprints):
+            logger.info(f"Il riassunto dell'allegato condiviso '{material.title}' esiste già: {material.output_path}")
+            material.summary_tokens = read_summary_tokens(material.output_path)
+            continue
+        # Un riassunto esistente ma con prompt diversi va rigenerato: le lezioni aggiornate vi rimandano
+        if not material.output_path.exists() and all(
+                vtt_file not in (pending_lessons or ()) and
+                is_lesson_output_current(get_lesson_output_path(base_output_dir, vtt_file.parent, vtt_file), prompt_fingerprints)
+                for vtt_file in material.lessons):
+            logger.debug(f"Le lezioni che allegano '{material.title}' sono già generate: il documento non viene riassunto.")
+            shared_materials.discard(material.key)
+            continue
+
+        logger.info(f"Elaborazione dell'allegato condiviso '{material.title}' ({len(material.lessons)} lezioni).")
+        document = _extract_document(material.source_file, services.extraction_cache)
+        kind = material.content_type.upper()
+        if document.error is not None:
+            summary = f"Errore durante l'elaborazione del file {kind} {material.title}: {document.error}"
         else:
-            logger.info("Variabili d'ambiente Langfuse non trovate. LangfuseTracker non attivo.")
-    except Exception as e:
-        logger.error(f"Errore durante l'inizializzazione di LangfuseTracker: {e}. Continuerà senza tracciamento Langfuse.")
-        langfuse_tracker = None # Assicura che sia None in caso di errore
+            text = document.text
+            if material.content_type == "html":
+                if image_describer is None:
+                    image_describer = create_image_describer(api_key, langfuse_tracker, services.rate_limiter, services.backend_router)
+                text, image_tokens = _describe_document_images(
+                    document, image_describer, SHARED_MATERIALS_DIRNAME, material.title,
+                    services.journal, services.backend_router, langfuse_tracker
+                )
+                material.tokens_used += image_tokens
+            if text.strip():
+                task = _SectionSummaryTask(material.content_type, section_titles[material.content_type], text, f"dell'allegato condiviso {kind}")
+                summary, usage = _run_section_summary(
+                    task, api_key, prompt_manager, langfuse_tracker, SHARED_MATERIALS_DIRNAME, material.title,
+                    services=services
+                )
+                if usage and usage.get("total_tokens") is not None:
+                    material.tokens_used += usage["total_tokens"]
+            else:
+                summary = f"Nessun contenuto {kind} fornito o contenuto vuoto."
+        material.summary_tokens = material.tokens_used
 
-    # Inizializza APIKeyManager e ottieni la chiave
-    # La gestione della chiave OpenAI è stata spostata qui per essere centrale
-    api_key_manager = APIKeyManager()
-    openai_api_key = api_key_manager.get_key()
+        try:
+            write_future = write_lesson_summary(
+                formatter=formatter,
+                lesson_title=material.title,
+                vtt_summary=None,
+                pdf_summary=summary if material.content_type == "pdf" else None,
+                html_summary=summary if material.content_type == "html" else None,
+                orphan_summary=None,
+                output_file_path=material.output_path,
+                writer=services.writer,
+                prompt_fingerprints=prompt_manager.section_fingerprints([material.content_type]),
+                extra_frontmatter={SUMMARY_TOKENS_KEY: material.tokens_used}
+            )
+            if write_future is not None:
+                pending_writes.append((material, write_future))
+        except Exception as e:
+            logger.error(f"Impossibile scrivere il riassunto dell'allegato condiviso '{material.title}': {e}. Verrà riassunto in ogni lezione.")
+            shared_materials.discard(material.key)
+        total_tokens += material.tokens_used
+
+    # Le lezioni rimandano ai riassunti condivisi: devono essere su disco prima che le lezioni vengano scritte
+    for material, write_future in pending_writes:
+        try:
+            write_future.result()
+        except Exception as e:
+            logger.error(f"Impossibile scrivere il riassunto dell'allegato condiviso '{material.title}': {e}. Verrà riassunto in ogni lezione.")
+            shared_materials.discard(material.key)
 
-    if not openai_api_key:
-        logger.error("Chiave API OpenAI non trovata. Impossibile procedere con i riassunti.")
-        # Qui potremmo decidere di uscire o continuare senza API, a seconda dei requisiti.
-        # Per ora, usciamo se la chiave non è disponibile, poiché è essenziale.
-        if langfuse_tracker: langfuse_tracker.shutdown() # Assicura lo shutdown se usciamo presto
-        return
+    return total_tokens
 
-    # Inizializza PromptManager
-    prompt_manager = PromptManager() # ISTANZIATO PROMPT_MANAGER
-    logger.info("PromptManager inizializzato.")
+def process_course(
+    course_dir: Union[str, Path],
+    output_dir: Optional[str],
+    formatter: MarkdownFormatter,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    stream_output: bool = False,
+    pipeline: Optional[LessonPipeline] = None,
+    session_metadata: Optional[Dict[str, str]] = None,
+    services: Optional[RunServices] = None
+) -> CourseReport:
+    """
+    Elabora un corso completo: lezioni, riassunti dei capitoli e indice principale.
+
+    La pipeline e i servizi dell'esecuzione (writer, rate limiter, ...) possono
+    essere condivisi tra più corsi elaborati contemporaneamente (modalità
+    catalogo); il journal, la cache delle estrazioni, gli allegati condivisi e la
+    sessione Langfuse sono invece propri del corso.
+
+    Args:
+        course_dir (Union[str, Path]): Directory del corso.
+        output_dir (Optional[str]): Directory di output del corso. Se None, viene usata 'resume_[nome_corso]'.
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse del corso.
+        stream_output (bool): Se True, i riassunti delle lezioni vengono scritti in streaming.
+        pipeline (Optional[LessonPipeline]): Pipeline a stadi. Se None, le lezioni vengono elaborate in sequenza.
+        session_metadata (Optional[Dict[str, str]]): Metadati aggiuntivi per la sessione Langfuse.
+        services (Optional[RunServices]): Servizi dell'esecuzione; quelli propri del corso vengono creati qui.
+
+    Returns:
+        CourseReport: L'esito dell'elaborazione del corso.
+    """
+    services = services or RunServices()
+    writer = services.writer
+    course_name = Path(course_dir).name
+    report = CourseReport(course_name=course_name, course_dir=Path(course_dir))
+    journal: Optional[JobJournal] = None
+    start_time_course = time.time() # Per il tempo totale di elaborazione del corso
 
     try:
-        output_dir = setup_output_directory(args.course_dir, args.output_dir)
-        course_name = Path(args.course_dir).name
-        start_time_course = time.time() # Per il tempo totale di elaborazione del corso
-        course_processing_time_s = 0.0 # INIZIALIZZAZIONE DI DEFAULT
-        total_tokens_course = 0 # Per i token totali del corso
-        lessons_processed_course = 0 # Contatore lezioni processate per il corso
-        lessons_failed_course = 0 # Contatore lezioni fallite per il corso
-        
-        # Inizializza MarkdownFormatter
-        formatter = MarkdownFormatter()
-        logger.info("MarkdownFormatter inizializzato.")
+        course_output_dir = setup_output_directory(str(course_dir), output_dir)
+        report.output_dir = course_output_dir
+        # Residui di un'esecuzione interrotta (i file finali sono sempre completi); la cache dell'estrazione
+        # può essere scritta in questo momento dai processi di estrazione e non viene esplorata
+        remove_stale_temp_files(course_output_dir, skip_dirnames=(EXTRACTION_CACHE_DIRNAME,))
+        # Journal delle unità completate: un'esecuzione interrotta riprende dalle chiamate già concluse
+        journal = JobJournal(course_output_dir / JOURNAL_FILENAME)
+        # Cache del testo estratto: una nuova esecuzione non ripete il parsing dei file invariati
+        extraction_cache = ExtractionCache(course_output_dir / EXTRACTION_CACHE_DIRNAME)
+        # Allegati identici in più lezioni: estratti e riassunti una sola volta
+        shared_materials = build_shared_material_index(course_dir, course_output_dir)
+        course_services = services.for_course(journal, extraction_cache, shared_materials)
 
         # Inizializza una traccia principale per l'intero corso con Langfuse
         if langfuse_tracker:
             # MODIFICATO: Chiamata a start_session invece di get_trace_or_span
             # AGGIUNTO: prompt_info basilare per la sessione
-            session_prompt_info = {"default_prompt_type": "practical_theoretical_face_to_face", "prompt_manager_version": "1.0"} # Esempio
+            session_prompt_info = {
+                "default_prompt_type": "practical_theoretical_face_to_face",
+                "prompt_manager_version": prompt_manager.version,
+                "prompt_templates": prompt_manager.registry.describe(),
+            }
+            metadata = {"course_directory": str(course_dir), "output_directory": str(course_output_dir)}
+            metadata.update(session_metadata or {})
+            if services.backend_router is not None:
+                metadata["llm_backends"] = json.dumps(services.backend_router.describe())
             langfuse_tracker.start_session(
                 course_name=course_name, 
-                session_metadata={"course_directory": args.course_dir, "output_directory": str(output_dir)},
+                session_metadata=metadata,
                 prompt_info=session_prompt_info 
             )
             logger.info(f"Sessione Langfuse avviata per il corso: {course_name}")
 
-        chapter_dirs = list_chapter_directories(args.course_dir)
+        chapter_dirs = list_chapter_directories(course_dir)
         if not chapter_dirs:
-            logger.warning(f"Nessun capitolo trovato in {args.course_dir}. L'indice principale potrebbe essere vuoto.")
-            # Potremmo comunque voler creare un index.md vuoto o con un messaggio.
-            # create_main_index(formatter, course_name, [], output_dir) # Crea un indice vuoto
-            # return # O esce se non ci sono capitoli
+            logger.warning(f"Nessun capitolo trovato in {course_dir}. L'indice principale potrebbe essere vuoto.")
+
+        if shared_materials.materials:
+            report.total_tokens += process_shared_materials(
+                shared_materials,
+                formatter,
+                course_output_dir,
+                api_key,
+                prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                services=course_services
+            )
 
         all_chapter_summary_files: List[Optional[Path]] = [] # Per l'indice principale
+        course_lesson_results: List[LessonResult] = [] # Per verificare le scritture accodate delle lezioni
+        pending_writes: List[Future] = [] # Scritture accodate di riepiloghi dei capitoli e indice
 
         for chapter_dir in chapter_dirs:
             chapter_name = chapter_dir.name # Ottieni il nome del capitolo
-            logger.info(f"Creazione directory di output per il capitolo: {chapter_name} in {output_dir}")
-            # Assicura che la sottodirectory per il capitolo esista in output_dir
-            chapter_output_dir = output_dir / chapter_name
+            logger.info(f"Creazione directory di output per il capitolo: {chapter_name} in {course_output_dir}")
+            # Assicura che la sottodirectory per il capitolo esista in course_output_dir
+            chapter_output_dir = course_output_dir / chapter_name
             try:
                 chapter_output_dir.mkdir(parents=True, exist_ok=True)
                 logger.info(f"Directory di output del capitolo '{chapter_output_dir}' assicurata.")
@@ -1543,34 +3183,43 @@ def main():
                 continue # Salta al prossimo capitolo
 
             # Elabora le lezioni del capitolo
-            lesson_summary_paths, tokens_chapter = process_chapter( # MODIFICATO: cattura tokens_chapter
+            lesson_results, tokens_chapter = process_chapter( # MODIFICATO: cattura tokens_chapter
                 formatter, 
                 chapter_dir, 
-                output_dir, # Passa la directory di output base, process_chapter gestirà la sottocartella del capitolo
-                openai_api_key,
+                course_output_dir, # Passa la directory di output base, process_chapter gestirà la sottocartella del capitolo
+                api_key,
                 prompt_manager, # PASSATO prompt_manager
-                langfuse_tracker=langfuse_tracker
+                langfuse_tracker=langfuse_tracker,
+                stream_output=stream_output,
+                pipeline=pipeline,
+                services=course_services
             )
-            total_tokens_course += tokens_chapter # Accumula token del capitolo
+            report.total_tokens += tokens_chapter # Accumula token del capitolo
             
-            # Contare lezioni processate/fallite basandosi sui path restituiti
-            # Un path non None indica un successo (anche se il riassunto potrebbe essere un messaggio di errore)
+            # Contare lezioni processate/fallite basandosi sui risultati restituiti
+            # Un risultato indica un successo (anche se il riassunto potrebbe essere un messaggio di errore)
             # Per una metrica più precisa di "fallimento elaborazione lezione", process_lesson dovrebbe indicarlo.
             # Per ora, contiamo i file generati come "processati".
-            current_chapter_lessons_processed = sum(1 for p in lesson_summary_paths if p is not None)
-            lessons_processed_course += current_chapter_lessons_processed
-            # Questa è una stima, potremmo voler tracciare i fallimenti più esplicitamente da process_lesson
-            # lessons_failed_course += (len(vtt_files) - current_chapter_lessons_processed) # se vtt_files è disponibile qui
-
-            # Creazione del riassunto del capitolo
-            # Filtra i None dalla lista prima di passarla
-            valid_lesson_summary_paths = [path for path in lesson_summary_paths if path is not None]
-            if valid_lesson_summary_paths: # Solo se ci sono riassunti di lezioni validi
+            current_chapter_lessons_processed = len(lesson_results)
+            report.lessons_processed += current_chapter_lessons_processed
+            # Le lezioni senza risultato sono fallite: il journal conserva le loro unità già completate
+            report.lessons_failed += len(list_vtt_files(chapter_dir)) - current_chapter_lessons_processed
+            course_lesson_results.extend(result for result in lesson_results if isinstance(result, LessonResult))
+
+            # Creazione del riassunto del capitolo, dai risultati in memoria
+            existing_chapter_summary = get_chapter_summary_path(course_output_dir, chapter_dir)
+            if is_chapter_summary_current(existing_chapter_summary, lesson_results):
+                # Ripresa: nessuna lezione rigenerata, il riepilogo esistente è già aggiornato
+                logger.info(f"Riassunto del capitolo '{chapter_name}' già aggiornato: {existing_chapter_summary}")
+                all_chapter_summary_files.append(existing_chapter_summary)
+            elif lesson_results: # Solo se ci sono riassunti di lezioni validi
                 chapter_summary_file = create_chapter_summary(
                     formatter, 
                     chapter_dir, 
-                    valid_lesson_summary_paths, 
-                    output_dir # Directory base dove verrà creato _CHAPTER_SUMMARY_<NOME_CAPITOLO>.md
+                    lesson_results, 
+                    course_output_dir, # Directory base dove verrà creato _CHAPTER_SUMMARY_<NOME_CAPITOLO>.md
+                    writer=writer,
+                    pending_writes=pending_writes
                 )
                 if chapter_summary_file:
                     all_chapter_summary_files.append(chapter_summary_file)
@@ -1589,41 +3238,72 @@ def main():
         # Filtra i None anche qui
         valid_chapter_summary_files = [path for path in all_chapter_summary_files if path is not None]
         if valid_chapter_summary_files:
-            main_index_file = create_main_index(formatter, course_name, valid_chapter_summary_files, output_dir)
+            main_index_file = create_main_index(formatter, course_name, valid_chapter_summary_files, course_output_dir, writer=writer, pending_writes=pending_writes)
             if main_index_file:
+                report.index_file = main_index_file
                 logger.info(f"Indice principale del corso creato: {main_index_file}")
             else:
                 logger.error("Fallimento nella creazione dell'indice principale del corso.")
         else:
             logger.warning("Nessun riassunto di capitolo valido disponibile per creare l'indice principale.")
             # Crea un indice vuoto se non ci sono capitoli o riassunti di capitoli
-            empty_index_file = create_main_index(formatter, course_name, [], output_dir)
+            empty_index_file = create_main_index(formatter, course_name, [], course_output_dir, writer=writer, pending_writes=pending_writes)
             if empty_index_file:
+                report.index_file = empty_index_file
                 logger.info(f"Creato un indice principale vuoto o con intestazione: {empty_index_file}")
             else:
                 logger.error("Fallimento anche nella creazione di un indice principale vuoto.")
 
-        course_processing_time_s = time.time() - start_time_course # Calcola tempo totale
-        logger.info(f"Elaborazione del corso completata in {course_processing_time_s:.2f} secondi. Token totali usati: {total_tokens_course}.")
-        # if course_trace: course_trace.update(status_message="Course processing completed successfully.") # RIMOSSO, gestito da end_session o metriche
+        # Le scritture di lezioni, capitoli e indice possono essere ancora in coda:
+        # il journal si scarta solo quando sono tutte su disco
+        if writer is not None:
+            writer.flush()
+        failed_lesson_writes = sum(1 for result in course_lesson_results if not result.wait_written())
+        report.lessons_processed -= failed_lesson_writes
+        report.lessons_failed += failed_lesson_writes
+        failed_writes = 0
+        for future in pending_writes:
+            try:
+                future.result()
+            except Exception as e:
+                failed_writes += 1
+                logger.error(f"Scrittura di un riepilogo del corso '{course_name}' fallita: {e}")
+        if report.lessons_failed == 0 and failed_writes == 0:
+            journal.discard() # Lezioni, capitoli e indice sono su disco: il journal non serve più
+        else:
+            logger.warning(
+                f"{report.lessons_failed} lezioni non completate e {failed_writes} riepiloghi non scritti: "
+                f"il journal '{journal.path}' viene conservato per la prossima esecuzione."
+            )
+        if journal.replayed:
+            logger.info(f"Unità riprese dal journal in questa esecuzione: {journal.replayed}.")
+        shared_stats = shared_materials.get_stats()
+        report.shared_materials = shared_stats["documents"]
+        report.shared_material_reuses = shared_stats["reuses"]
+        report.shared_material_tokens_saved = shared_stats["tokens_saved"]
+
+        report.processing_time_s = time.time() - start_time_course # Calcola tempo totale
+        logger.info(f"Elaborazione del corso '{course_name}' completata in {report.processing_time_s:.2f} secondi. Token totali usati: {report.total_tokens}.")
 
     except ValueError as e: # Ad esempio, da setup_output_directory o list_chapter_directories
         logger.error(f"Errore di configurazione o di I/O: {e}")
-        # if 'course_trace' in locals() and course_trace: course_trace.update(level='ERROR', status_message=f"Configuration or I/O error: {e}") # RIMOSSO
+        report.error = str(e)
     except Exception as e:
         logger.error(f"Errore imprevisto durante l'elaborazione del corso: {e}", exc_info=True) # Aggiunto exc_info per traceback
-        # if 'course_trace' in locals() and course_trace: course_trace.update(level='ERROR', status_message=f"Unexpected error: {e}") # RIMOSSO
+        report.error = str(e)
     finally:
+        if journal is not None:
+            journal.close()
         if langfuse_tracker:
             logger.info("Spegnimento di LangfuseTracker...")
             # Traccia le metriche finali del corso
-            # Nota: lessons_failed_course è una stima. Potrebbe essere migliorata.
+            # Nota: lessons_failed è una stima. Potrebbe essere migliorata.
             # estimated_cost non viene calcolato qui come da discussione
             langfuse_tracker.track_processing_metrics(
-                lessons_processed=lessons_processed_course,
-                lessons_failed=lessons_failed_course, # Questo valore andrebbe calcolato più precisamente
-                total_tokens_used=total_tokens_course,
-                total_processing_time_s=course_processing_time_s 
+                lessons_processed=report.lessons_processed,
+                lessons_failed=report.lessons_failed, # Questo valore andrebbe calcolato più precisamente
+                total_tokens_used=report.total_tokens,
+                total_processing_time_s=report.processing_time_s 
             )
             
             # MODIFICATO: Chiamata a end_session() e flush()
@@ -1631,5 +3311,747 @@ def main():
             langfuse_tracker.flush()
             logger.info("LangfuseTracker: sessione terminata e dati inviati.")
 
+    return report
+
+def _course_tracker(langfuse_tracker: Optional[LangfuseTracker]) -> Optional[LangfuseTracker]:
+    """Crea un tracker per un corso del catalogo, con una sessione propria ma la stessa connessione."""
+    if langfuse_tracker is None or not langfuse_tracker.is_enabled():
+        return langfuse_tracker
+    return LangfuseTracker(langfuse_client=langfuse_tracker.langfuse)
+
+def process_catalog(
+    catalog_dir: str,
+    output_dir: Optional[str],
+    formatter: MarkdownFormatter,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    stream_output: bool = False,
+    pipeline: Optional[LessonPipeline] = None,
+    max_parallel_courses: int = 2,
+    services: Optional[RunServices] = None
+) -> List[CourseReport]:
+    """
+    Elabora tutti i corsi di un catalogo e scrive il report del catalogo.
+
+    I corsi vengono elaborati in parallelo (al più max_parallel_courses alla volta)
+    condividendo la pipeline di estrazione e i servizi dell'esecuzione. L'output
+    di ogni corso viene scritto in 'resume_[nome_corso]' dentro la directory di output.
+
+    Args:
+        catalog_dir (str): Directory del catalogo (una sottodirectory per corso).
+        output_dir (Optional[str]): Directory di output del catalogo. Se None, la directory corrente.
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse (la sua connessione è condivisa tra i corsi).
+        stream_output (bool): Se True, i riassunti delle lezioni vengono scritti in streaming.
+        pipeline (Optional[LessonPipeline]): Pipeline a stadi condivisa.
+        max_parallel_courses (int): Numero massimo di corsi elaborati contemporaneamente.
+        services (Optional[RunServices]): Servizi dell'esecuzione, condivisi tra i corsi.
+
+    Returns:
+        List[CourseReport]: I report dei corsi, in ordine di nome.
+    """
+    services = services or RunServices()
+    catalog_start_time = time.time()
+    catalog_name = Path(catalog_dir).resolve().name
+    course_dirs = discover_courses(catalog_dir)
+    output_root = Path(output_dir) if output_dir else Path(".")
+    output_root.mkdir(parents=True, exist_ok=True)
+
+    def run_course(course_dir: Path) -> CourseReport:
+        return process_course(
+            course_dir,
+            str(output_root / f"resume_{course_dir.name}"),
+            formatter,
+            api_key,
+            prompt_manager,
+            langfuse_tracker=_course_tracker(langfuse_tracker),
+            stream_output=stream_output,
+            pipeline=pipeline,
+            session_metadata={"catalog": catalog_name},
+            services=services
+        )
+
+    reports = run_catalog(course_dirs, run_course, max_parallel_courses=max_parallel_courses)
+    write_catalog_report(
+        formatter,
+        catalog_name,
+        reports,
+        output_root,
+        time.time() - catalog_start_time,
+        rate_limiter_stats=services.rate_limiter.get_stats() if services.rate_limiter is not None else None,
+        writer=services.writer
+    )
+    failed_courses = [r.course_name for r in reports if not r.succeeded]
+    if failed_courses:
+        logger.warning(f"Corsi con errori o lezioni fallite: {', '.join(failed_courses)}")
+    logger.info(f"Elaborazione del catalogo '{catalog_name}' completata: {len(reports)} corsi.")
+    return reports
+
+WATCHED_SUFFIXES = (".vtt", ".pdf", ".html", ".htm")
+
+def get_lesson_input_files(chapter_dir: Path) -> Dict[Path, Tuple[List[Path], List[Path]]]:
+    """
+    Individua, per ogni lezione di un capitolo, i file da cui dipende il suo riassunto.
+
+    Args:
+        chapter_dir (Path): Directory del capitolo.
+
+    Returns:
+        Dict[Path, Tuple[List[Path], List[Path]]]: Per ogni file VTT, la lista di tutti
+            i file di input della lezione (VTT, PDF/HTML correlati e orfani associati)
+            e la lista dei soli file orfani associati.
+    """
+    vtt_files = list_vtt_files(chapter_dir)
+    orphans_map = map_orphans_to_lessons(vtt_files, identify_orphan_files(chapter_dir, vtt_files))
+    lesson_inputs: Dict[Path, Tuple[List[Path], List[Path]]] = {}
+    for vtt_file in vtt_files:
+        related_files = find_related_files(vtt_file, chapter_dir)
+        orphan_files = list(orphans_map.get(vtt_file, []))
+        lesson_inputs[vtt_file] = ([vtt_file] + related_files["pdf"] + related_files["html"] + orphan_files, orphan_files)
+    return lesson_inputs
+
+def _fingerprint_files(paths: Sequence[Path]) -> Tuple[Tuple[str, int, int], ...]:
+    """Impronta di un insieme di file: percorso, dimensione e data di modifica di ciascuno."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            fingerprint.append((str(path), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            fingerprint.append((str(path), -1, -1)) # File rimosso nel frattempo
+    return tuple(sorted(fingerprint))
+
+def snapshot_lesson_inputs(chapter_dir: Path) -> Dict[Path, Tuple[Tuple[str, int, int], ...]]:
+    """
+    Calcola l'impronta dei file di input di ogni lezione di un capitolo.
+
+    Args:
+        chapter_dir (Path): Directory del capitolo.
+
+    Returns:
+        Dict[Path, Tuple]: Impronta dei file di input per ogni file VTT del capitolo.
+    """
+    return {vtt_file: _fingerprint_files(files) for vtt_file, (files, _) in get_lesson_input_files(chapter_dir).items()}
+
+def refresh_course(
+    course_dir: Path,
+    output_dir: Path,
+    changed_paths: Set[Path],
+    fingerprints: Dict[Path, Dict[Path, Tuple[Tuple[str, int, int], ...]]],
+    formatter: MarkdownFormatter,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    stream_output: bool = False,
+    services: Optional[RunServices] = None
+) -> List[LessonResult]:
+    """
+    Aggiorna i riassunti di un corso dopo una raffica di modifiche ai suoi file.
+
+    Vengono rigenerate solo le lezioni i cui file di input sono cambiati rispetto
+    alle impronte registrate (o il cui riassunto manca), e vengono riscritti solo
+    i riassunti dei capitoli coinvolti e l'indice principale.
+
+    Args:
+        course_dir (Path): Directory del corso.
+        output_dir (Path): Directory di output del corso.
+        changed_paths (Set[Path]): File e capitoli modificati (vedi CourseWatcher.wait_for_changes).
+        fingerprints (Dict): Impronte degli input per capitolo e lezione; aggiornate sul posto.
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        stream_output (bool): Se True, i riassunti delle lezioni vengono scritti in streaming.
+        services (Optional[RunServices]): Servizi dell'esecuzione; la cache delle estrazioni e gli
+                                          allegati condivisi del corso vengono creati qui.
+
+    Returns:
+        List[LessonResult]: I risultati delle lezioni rigenerate.
+    """
+    services = services or RunServices()
+    writer = services.writer
+    course_dir = Path(course_dir)
+    chapter_dirs = list_chapter_directories(course_dir)
+    if course_dir in changed_paths:
+        affected_chapters = chapter_dirs # Eventi persi: si ricontrollano tutti i capitoli
+    else:
+        relevant_paths = [p for p in changed_paths if p.suffix.lower() in WATCHED_SUFFIXES or p.parent == course_dir]
+        affected_names = {p.name if p.parent == course_dir else p.parent.name for p in relevant_paths}
+        affected_chapters = [chapter_dir for chapter_dir in chapter_dirs if chapter_dir.name in affected_names]
+
+    regenerated: List[LessonResult] = []
+    prompt_fingerprints = prompt_manager.section_fingerprints()
+    extraction_cache = ExtractionCache(output_dir / EXTRACTION_CACHE_DIRNAME)
+
+    # Prima si individuano le lezioni da rigenerare, per riassumere una sola volta i loro allegati condivisi
+    chapter_plans: List[Tuple[Path, Dict, Dict, Dict, List]] = []
+    pending_lessons: Set[Path] = set()
+    for chapter_dir in affected_chapters:
+        lesson_inputs = get_lesson_input_files(chapter_dir)
+        previous_fingerprints = fingerprints.get(chapter_dir, {})
+        current_fingerprints: Dict[Path, Tuple[Tuple[str, int, int], ...]] = {}
+        changed: List[Tuple[Path, List[Path], Tuple[Tuple[str, int, int], ...]]] = []
+        for vtt_file, (input_files, orphan_files) in lesson_inputs.items():
+            fingerprint = _fingerprint_files(input_files)
+            output_file_path = get_lesson_output_path(output_dir, chapter_dir, vtt_file)
+            if previous_fingerprints.get(vtt_file) == fingerprint and is_lesson_output_current(output_file_path, prompt_fingerprints):
+                current_fingerprints[vtt_file] = fingerprint
+            else:
+                changed.append((vtt_file, orphan_files, fingerprint))
+                pending_lessons.add(vtt_file)
+        chapter_plans.append((chapter_dir, lesson_inputs, previous_fingerprints, current_fingerprints, changed))
+
+    shared_materials: Optional[SharedMaterialIndex] = None
+    image_describer: Optional["ImageDescriber"] = None
+    if pending_lessons:
+        image_describer = create_image_describer(api_key, langfuse_tracker, services.rate_limiter, services.backend_router)
+        shared_materials = build_shared_material_index(course_dir, output_dir)
+    course_services = services.for_course(None, extraction_cache, shared_materials)
+    if shared_materials is not None and shared_materials.materials:
+        process_shared_materials(
+            shared_materials,
+            formatter,
+            output_dir,
+            api_key,
+            prompt_manager,
+            langfuse_tracker=langfuse_tracker,
+            services=course_services,
+            pending_lessons=pending_lessons
+        )
+
+    for chapter_dir, lesson_inputs, previous_fingerprints, current_fingerprints, changed in chapter_plans:
+        chapter_results: Dict[Path, LessonResult] = {}
+        for vtt_file, orphan_files, fingerprint in changed:
+            logger.info(f"Input della lezione '{vtt_file.stem}' modificati: rigenerazione del riassunto.")
+            (output_dir / chapter_dir.name).mkdir(parents=True, exist_ok=True)
+            lesson_result = process_lesson(
+                formatter=formatter,
+                vtt_file=vtt_file,
+                chapter_dir=chapter_dir,
+                base_output_dir=output_dir,
+                api_key=api_key,
+                prompt_manager=prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                image_describer=image_describer,
+                associated_orphan_files=orphan_files,
+                stream_output=stream_output,
+                force=True,
+                services=course_services
+            )
+            if lesson_result:
+                chapter_results[vtt_file] = lesson_result
+                regenerated.append(lesson_result)
+                current_fingerprints[vtt_file] = fingerprint # Una lezione fallita verrà ritentata alla prossima modifica
+
+        removed_lessons = set(previous_fingerprints) - set(lesson_inputs)
+        fingerprints[chapter_dir] = current_fingerprints
+        if not changed and not removed_lessons:
+            continue
+
+        lesson_results: List[LessonResult] = []
+        for vtt_file in lesson_inputs:
+            if vtt_file in chapter_results:
+                lesson_results.append(chapter_results[vtt_file])
+            else:
+                output_file_path = get_lesson_output_path(output_dir, chapter_dir, vtt_file)
+                if output_file_path.exists():
+                    lesson_results.append(LessonResult.from_existing_file(vtt_file.stem, output_file_path))
+        if lesson_results:
+            create_chapter_summary(formatter, chapter_dir, lesson_results, output_dir, writer=writer)
+
+    if affected_chapters:
+        chapter_summary_files = [
+            get_chapter_summary_path(output_dir, chapter_dir) for chapter_dir in chapter_dirs
+        ]
+        if writer is not None:
+            writer.flush() # I riassunti dei capitoli appena accodati devono essere su disco
+        create_main_index(
+            formatter,
+            course_dir.name,
+            [path for path in chapter_summary_files if path.exists()],
+            output_dir,
+            writer=writer
+        )
+        if writer is not None:
+            writer.flush()
+    logger.info(f"Aggiornamento completato: {len(regenerated)} lezioni rigenerate in {len(affected_chapters)} capitoli.")
+    return regenerated
+
+def watch_course(
+    course_dir: str,
+    output_dir: Optional[str],
+    formatter: MarkdownFormatter,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    stream_output: bool = False,
+    pipeline: Optional[LessonPipeline] = None,
+    debounce_seconds: float = 5.0,
+    watcher: Optional[CourseWatcher] = None,
+    max_refreshes: Optional[int] = None,
+    services: Optional[RunServices] = None
+) -> None:
+    """
+    Elabora un corso e poi ne aggiorna i riassunti man mano che i file cambiano.
+
+    Dopo un'elaborazione completa iniziale, la directory del corso viene osservata
+    (vedi CourseWatcher): a ogni raffica di modifiche vengono rigenerate solo le
+    lezioni coinvolte, con i relativi riassunti dei capitoli e l'indice.
+    Termina con Ctrl-C.
+
+    Args:
+        course_dir (str): Directory del corso.
+        output_dir (Optional[str]): Directory di output. Se None, viene usata 'resume_[nome_corso]'.
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse.
+        stream_output (bool): Se True, i riassunti delle lezioni vengono scritti in streaming.
+        pipeline (Optional[LessonPipeline]): Pipeline a stadi per l'elaborazione iniziale.
+        debounce_seconds (float): Secondi di quiete dopo i quali una raffica di modifiche viene elaborata.
+        watcher (Optional[CourseWatcher]): Watcher da usare (default: uno nuovo sulla directory del corso).
+        max_refreshes (Optional[int]): Numero massimo di aggiornamenti prima di terminare (None: nessun limite).
+        services (Optional[RunServices]): Servizi dell'esecuzione, condivisi dall'elaborazione iniziale e dagli aggiornamenti.
+    """
+    services = services or RunServices()
+    # Il watcher viene avviato prima dell'elaborazione iniziale per non perdere i file che arrivano nel frattempo
+    if watcher is None:
+        watcher = CourseWatcher(course_dir, debounce_seconds=debounce_seconds)
+    try:
+        # Le impronte di riferimento sono prese prima dell'elaborazione iniziale: un file che arriva
+        # o cambia durante l'elaborazione risulta modificato e la sua lezione viene rigenerata
+        try:
+            initial_fingerprints = {
+                chapter_dir: snapshot_lesson_inputs(chapter_dir) for chapter_dir in list_chapter_directories(course_dir)
+            }
+        except ValueError:
+            initial_fingerprints = {} # L'errore viene riportato da process_course
+        report = process_course(
+            course_dir,
+            output_dir,
+            formatter,
+            api_key,
+            prompt_manager,
+            langfuse_tracker=langfuse_tracker,
+            stream_output=stream_output,
+            pipeline=pipeline,
+            services=services
+        )
+        if report.output_dir is None:
+            logger.error(f"Elaborazione iniziale del corso fallita ({report.error}): modalità watch non avviata.")
+            return
+        if services.writer is not None:
+            services.writer.flush()
+
+        fingerprints = {
+            chapter_dir: {
+                vtt_file: fingerprint
+                for vtt_file, fingerprint in lesson_fingerprints.items()
+                if get_lesson_output_path(report.output_dir, chapter_dir, vtt_file).exists()
+            }
+            for chapter_dir, lesson_fingerprints in initial_fingerprints.items()
+        }
+
+        logger.info(f"Modalità watch attiva su '{course_dir}' ({watcher.backend_name}). Premi Ctrl-C per terminare.")
+        refreshes = 0
+        while max_refreshes is None or refreshes < max_refreshes:
+            changed_paths = watcher.wait_for_changes()
+            if not changed_paths:
+                continue
+            refreshes += 1
+            logger.info(f"Rilevate modifiche a {len(changed_paths)} file: aggiornamento dei riassunti.")
+            try:
+                refresh_course(
+                    Path(course_dir),
+                    report.output_dir,
+                    changed_paths,
+                    fingerprints,
+                    formatter,
+                    api_key,
+                    prompt_manager,
+                    langfuse_tracker=langfuse_tracker,
+                    stream_output=stream_output,
+                    services=services
+                )
+            except Exception as e:
+                logger.error(f"Errore durante l'aggiornamento dei riassunti: {e}", exc_info=True)
+    except KeyboardInterrupt:
+        logger.info("Modalità watch terminata dall'utente.")
+    finally:
+        watcher.close()
+
+def _lesson_result_to_dict(lesson_result: Optional[LessonResult]) -> Dict[str, object]:
+    """Rappresentazione JSON del risultato di una lezione (per il servizio dei job)."""
+    if lesson_result is None:
+        return {"written": False}
+    return {
+        "written": True,
+        "title": lesson_result.title,
+        "output_path": str(lesson_result.output_path),
+        "skipped": lesson_result.skipped,
+        "tokens_used": lesson_result.tokens_used,
+        "timings": lesson_result.timings,
+    }
+
+def get_course_progress(course_dir: Union[str, Path], output_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    Calcola l'avanzamento di un corso come numero di lezioni con riassunto su disco.
+
+    Args:
+        course_dir (Union[str, Path]): Directory del corso.
+        output_dir (Optional[str]): Directory di output (default: 'resume_[nome_corso]').
+
+    Returns:
+        Dict[str, int]: Lezioni totali ("lessons_total") e lezioni completate ("lessons_done").
+    """
+    base_output_dir = Path(output_dir) if output_dir else Path(f"resume_{Path(course_dir).name}")
+    total = done = 0
+    for chapter_dir in list_chapter_directories(course_dir):
+        for vtt_file in list_vtt_files(chapter_dir):
+            total += 1
+            if get_lesson_output_path(base_output_dir, chapter_dir, vtt_file).exists():
+                done += 1
+    return {"lessons_total": total, "lessons_done": done}
+
+def serve_jobs(
+    formatter: MarkdownFormatter,
+    api_key: str,
+    prompt_manager: PromptManager,
+    langfuse_tracker: Optional[LangfuseTracker] = None,
+    stream_output: bool = False,
+    pipeline: Optional[LessonPipeline] = None,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[str] = None,
+    max_concurrent_jobs: int = 2,
+    services: Optional[RunServices] = None
+) -> None:
+    """
+    Avvia il servizio locale dei job (vedi job_service) e resta in ascolto fino a Ctrl-C.
+
+    I job condividono le risorse già inizializzate: client OpenAI, ImageDescriber,
+    pipeline con il pool di estrazione e i servizi dell'esecuzione. Tipi di job:
+
+    - "course": {"course_dir": ..., "output_dir": ... (opzionale)}, come un'esecuzione
+      della riga di comando sul corso.
+    - "lesson": {"vtt_file": ..., "output_dir": ..., "force": false}, una singola lezione;
+      output_dir è la directory di output del corso.
+
+    Args:
+        formatter (MarkdownFormatter): Istanza di MarkdownFormatter.
+        api_key (str): Chiave API OpenAI.
+        prompt_manager (PromptManager): Gestore dei prompt.
+        langfuse_tracker (Optional[LangfuseTracker]): Tracker Langfuse (la sua connessione è condivisa tra i job).
+        stream_output (bool): Se True, i riassunti delle lezioni vengono scritti in streaming.
+        pipeline (Optional[LessonPipeline]): Pipeline a stadi condivisa per i job dei corsi.
+        host (str): Indirizzo su cui ascoltare.
+        port (int): Porta TCP.
+        unix_socket (Optional[str]): Percorso del socket Unix (sostituisce host e porta).
+        max_concurrent_jobs (int): Numero massimo di job eseguiti contemporaneamente.
+        services (Optional[RunServices]): Servizi dell'esecuzione, condivisi tra i job.
+    """
+    services = services or RunServices()
+    writer, rate_limiter, backend_router = services.writer, services.rate_limiter, services.backend_router
+    image_describer = create_image_describer(api_key, langfuse_tracker, rate_limiter, backend_router)
+    # Client creati subito: il primo job non paga l'inizializzazione
+    for backend in (backend_router.backends.values() if backend_router is not None else [default_text_backend()]):
+        get_openai_client(backend.resolve_api_key(api_key), backend.base_url, client_max_retries(backend.select_limiter(rate_limiter)))
+
+    def run_course_job(params: Dict[str, object]) -> Dict[str, object]:
+        course_dir = params.get("course_dir")
+        if not course_dir:
+            raise ValueError("Parametro 'course_dir' mancante.")
+        report = process_course(
+            str(course_dir),
+            str(params["output_dir"]) if params.get("output_dir") else None,
+            formatter,
+            api_key,
+            prompt_manager,
+            langfuse_tracker=_course_tracker(langfuse_tracker),
+            stream_output=stream_output,
+            pipeline=pipeline,
+            services=services
+        )
+        if writer is not None:
+            writer.flush() # Il job è completato solo quando i file sono su disco
+        if report.error:
+            raise RuntimeError(report.error)
+        return {
+            "course_name": report.course_name,
+            "output_dir": str(report.output_dir),
+            "index_file": str(report.index_file) if report.index_file else None,
+            "lessons_processed": report.lessons_processed,
+            "lessons_failed": report.lessons_failed,
+            "total_tokens": report.total_tokens,
+            "processing_time_s": report.processing_time_s,
+        }
+
+    def run_lesson_job(params: Dict[str, object]) -> Dict[str, object]:
+        if not params.get("vtt_file") or not params.get("output_dir"):
+            raise ValueError("Parametri 'vtt_file' e 'output_dir' obbligatori.")
+        vtt_file = Path(str(params["vtt_file"]))
+        if not vtt_file.is_file():
+            raise ValueError(f"Il file VTT '{vtt_file}' non esiste.")
+        chapter_dir = vtt_file.parent
+        base_output_dir = Path(str(params["output_dir"]))
+        (base_output_dir / chapter_dir.name).mkdir(parents=True, exist_ok=True)
+        lesson_inputs = get_lesson_input_files(chapter_dir)
+        _, orphan_files = lesson_inputs.get(vtt_file, ([], []))
+        lesson_result = process_lesson(
+            formatter=formatter,
+            vtt_file=vtt_file,
+            chapter_dir=chapter_dir,
+            base_output_dir=base_output_dir,
+            api_key=api_key,
+            prompt_manager=prompt_manager,
+            langfuse_tracker=langfuse_tracker,
+            image_describer=image_describer,
+            associated_orphan_files=orphan_files,
+            stream_output=stream_output,
+            force=bool(params.get("force", False)),
+            services=services.for_course(None, ExtractionCache(base_output_dir / EXTRACTION_CACHE_DIRNAME), None)
+        )
+        if writer is not None:
+            writer.flush()
+        if lesson_result is None:
+            raise RuntimeError(f"Scrittura del riassunto della lezione '{vtt_file.stem}' fallita.")
+        return _lesson_result_to_dict(lesson_result)
+
+    def course_progress(params: Dict[str, object]) -> Dict[str, int]:
+        return get_course_progress(str(params["course_dir"]), str(params["output_dir"]) if params.get("output_dir") else None)
+
+    service = JobService(
+        {"course": run_course_job, "lesson": run_lesson_job},
+        max_concurrent_jobs=max_concurrent_jobs,
+        progress_functions={"course": course_progress}
+    )
+    try:
+        server = create_server(service, host=host, port=port, unix_socket=unix_socket)
+    except (ValueError, OSError):
+        service.shutdown(wait=True) # Es. --socket indica un file che non è un socket
+        raise
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Servizio dei job terminato dall'utente.")
+    finally:
+        server.server_close()
+        service.shutdown(wait=True)
+        if unix_socket and is_unix_socket(unix_socket):
+            os.unlink(unix_socket)
+
+def log_shared_material_savings(reports: Sequence[CourseReport]) -> None:
+    """
+    Riporta nel log i risparmi ottenuti riassumendo una sola volta gli allegati condivisi.
+
+    Args:
+        reports (Sequence[CourseReport]): I report dei corsi elaborati.
+    """
+    documents = sum(report.shared_materials for report in reports)
+    if not documents:
+        return
+    reuses = sum(report.shared_material_reuses for report in reports)
+    tokens_saved = sum(report.shared_material_tokens_saved for report in reports)
+    logger.info(
+        f"Allegati condivisi: {documents} documenti estratti e riassunti una sola volta; "
+        f"evitate {reuses} estrazioni e {reuses} riassunti duplicati (circa {tokens_saved} token risparmiati)."
+    )
+
+def main():
+    """
+    Funzione principale per orchestrare il processo di generazione dei riassunti.
+    """
+    configure_logging()
+    load_dotenv() # Carica variabili da .env se presente
+
+    args = parse_arguments()
+    
+    # Inizializza LangfuseTracker se le variabili d'ambiente sono impostate
+    langfuse_tracker: Optional[LangfuseTracker] = None
+    try:
+        if os.getenv("LANGFUSE_SECRET_KEY") and os.getenv("LANGFUSE_PUBLIC_KEY"):
+            langfuse_tracker = LangfuseTracker()
+            logger.info("LangfuseTracker inizializzato.")
+            # Creiamo una sessione per questa esecuzione
+            # langfuse_tracker.create_session(name="resume_generator_run") # O un nome più specifico
+        else:
+            logger.info("Variabili d'ambiente Langfuse non trovate. LangfuseTracker non attivo.")
+    except Exception as e:
+        logger.error(f"Errore durante l'inizializzazione di LangfuseTracker: {e}. Continuerà senza tracciamento Langfuse.")
+        langfuse_tracker = None # Assicura che sia None in caso di errore
+
+    # Backend LLM per tipo di contenuto: OpenAI, salvo diversa configurazione
+    try:
+        backend_router = BackendRouter.from_file(args.llm_config) if args.llm_config else BackendRouter.default_router()
+    except ValueError as e:
+        logger.error(f"Configurazione dei backend LLM non valida: {e}")
+        return
+
+    # Inizializza APIKeyManager e ottieni la chiave
+    # La gestione della chiave OpenAI è stata spostata qui per essere centrale
+    api_key_manager = APIKeyManager()
+    try:
+        openai_api_key = api_key_manager.get_key()
+    except ValueError as e:
+        # Senza chiave si procede solo se nessun tipo di contenuto è instradato sull'API di OpenAI
+        if backend_router.requires_openai_key():
+            logger.error(str(e))
+        openai_api_key = ""
+
+    if not openai_api_key and backend_router.requires_openai_key():
+        logger.error("Chiave API OpenAI non trovata. Impossibile procedere con i riassunti.")
+        # Qui potremmo decidere di uscire o continuare senza API, a seconda dei requisiti.
+        # Per ora, usciamo se la chiave non è disponibile, poiché è essenziale.
+        if langfuse_tracker: langfuse_tracker.shutdown() # Assicura lo shutdown se usciamo presto
+        return
+
+    # Inizializza PromptManager
+    prompt_manager = PromptManager() # ISTANZIATO PROMPT_MANAGER
+    logger.info("PromptManager inizializzato.")
+
+    # Il formatter non ha stato: viene condiviso da tutti i corsi e le lezioni
+    formatter = MarkdownFormatter()
+    logger.info("MarkdownFormatter inizializzato.")
+
+    # Limite condiviso sulle chiamate all'API (riassunti e descrizioni delle immagini)
+    try:
+        if args.adaptive_concurrency:
+            rate_limiter = AdaptiveRateLimiter(
+                max_concurrent=args.max_concurrent_requests,
+                requests_per_minute=args.requests_per_minute,
+                on_limit_change=langfuse_tracker.track_concurrency_limit if langfuse_tracker else None
+            )
+        else:
+            rate_limiter = RateLimiter(max_concurrent=args.max_concurrent_requests, requests_per_minute=args.requests_per_minute)
+    except ValueError as e:
+        logger.error(f"Configurazione del rate limiter non valida: {e}.")
+        return
+
+    # Indice delle trascrizioni già riassunte (anche in esecuzioni e corsi precedenti)
+    similarity_index: Optional[SimilarityIndex] = None
+    if args.similarity_index:
+        try:
+            similarity_index = SimilarityIndex(args.similarity_index, threshold=args.similarity_threshold)
+            logger.info(f"Indice di similarità delle trascrizioni: {args.similarity_index} ({similarity_index.count()} trascrizioni).")
+        except (ValueError, OSError, sqlite3.Error) as e:
+            logger.error(f"Impossibile aprire l'indice di similarità '{args.similarity_index}': {e}.")
+            return
+
+    # Testi brevi riassunti a gruppi, con un'unica richiesta e risposta JSON
+    request_packer: Optional[RequestPacker] = None
+    if args.pack_small_inputs:
+        try:
+            request_packer = RequestPacker(
+                partial(summarize_packed_items, api_key=openai_api_key, prompt_manager=prompt_manager,
+                        langfuse_tracker=langfuse_tracker, rate_limiter=rate_limiter),
+                token_budget=args.pack_token_budget,
+                max_item_tokens=min(DEFAULT_MAX_ITEM_TOKENS, args.pack_token_budget)
+            )
+        except ValueError as e:
+            logger.error(f"Configurazione del raggruppamento delle richieste non valida: {e}.")
+            return
+
+    # Tutti i file di output vengono scritti atomicamente da un thread dedicato
+    write_behind = WriteBehindWriter()
+
+    # Pipeline a stadi: estrazione su pool di processi, riassunti concorrenti, scrittura dedicata
+    lesson_pipeline: Optional[LessonPipeline] = None
+    if args.workers > 0:
+        try:
+            lesson_pipeline = LessonPipeline(extraction_workers=args.extract_workers, summary_workers=args.workers)
+            logger.info(f"Pipeline delle lezioni configurata con {args.workers} worker di riassunto.")
+        except ValueError as e:
+            logger.error(f"Configurazione della pipeline non valida: {e}. Le lezioni verranno elaborate in sequenza.")
+
+    # Servizi condivisi da tutti i corsi, i capitoli e le lezioni dell'esecuzione
+    services = RunServices(
+        writer=write_behind,
+        rate_limiter=rate_limiter,
+        backend_router=backend_router,
+        similarity_index=similarity_index,
+        request_packer=request_packer
+    )
+
+    reports: List[CourseReport] = []
+    try:
+        if args.serve:
+            serve_jobs(
+                formatter,
+                openai_api_key,
+                prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                stream_output=args.stream,
+                pipeline=lesson_pipeline,
+                host=args.host,
+                port=args.port,
+                unix_socket=args.socket,
+                max_concurrent_jobs=args.max_jobs,
+                services=services
+            )
+        elif args.catalog:
+            reports = process_catalog(
+                args.course_dir,
+                args.output_dir,
+                formatter,
+                openai_api_key,
+                prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                stream_output=args.stream,
+                pipeline=lesson_pipeline,
+                max_parallel_courses=args.catalog_workers,
+                services=services
+            )
+        elif args.watch:
+            watch_course(
+                args.course_dir,
+                args.output_dir,
+                formatter,
+                openai_api_key,
+                prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                stream_output=args.stream,
+                pipeline=lesson_pipeline,
+                debounce_seconds=args.watch_debounce,
+                services=services
+            )
+        else:
+            reports = [process_course(
+                args.course_dir,
+                args.output_dir,
+                formatter,
+                openai_api_key,
+                prompt_manager,
+                langfuse_tracker=langfuse_tracker,
+                stream_output=args.stream,
+                pipeline=lesson_pipeline,
+                services=services
+            )]
+        log_shared_material_savings(reports)
+    except ValueError as e: # Ad esempio, da discover_courses
+        logger.error(f"Errore di configurazione o di I/O: {e}")
+    finally:
+        if lesson_pipeline:
+            lesson_pipeline.shutdown()
+        write_behind.close() # Attende il completamento delle scritture in coda
+        if request_packer is not None:
+            pack_stats = request_packer.get_stats()
+            logger.info(f"Richieste con più testi brevi: {pack_stats['requests']} ({pack_stats['items_packed']} testi riassunti, "
+                        f"{pack_stats['items_fallback']} ricaduti su richieste singole).")
+        if isinstance(rate_limiter, AdaptiveRateLimiter):
+            limiter_stats = rate_limiter.get_stats()
+            p95_latency = f"{limiter_stats['p95_latency_s']} s" if limiter_stats['p95_latency_s'] is not None else "n/d"
+            logger.info(f"Limite adattivo di richieste contemporanee: {limiter_stats['concurrency_limit']} "
+                        f"(massimo raggiunto: {limiter_stats['peak_concurrency_limit']}, errori 429: {limiter_stats['rate_limited']}, "
+                        f"p95 della latenza: {p95_latency}).")
+        if _summary_flights.coalesced:
+            logger.info(f"Richieste di riassunto identiche unificate con una già in corso: {_summary_flights.coalesced}.")
+        if similarity_index is not None:
+            if similarity_index.hits:
+                logger.info(f"Riassunti riutilizzati da trascrizioni quasi identiche: {similarity_index.hits}.")
+            similarity_index.close()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,177 @@
+"""
+Shared Materials: allegati identici condivisi da più lezioni di un corso.
+
+I corsi Udemy allegano spesso lo stesso PDF o HTML (dispense, cheat sheet,
+slide dell'intero corso) a molte lezioni. Gli allegati vengono raggruppati per
+contenuto (hash SHA-256, indipendente da nome e posizione del file): un
+documento allegato a più lezioni viene estratto e riassunto una sola volta in
+un file dedicato, a cui ogni lezione rimanda con un link invece di ripeterne il testo.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .extraction_cache import file_content_hash
+
+logger = logging.getLogger(__name__)
+
+SHARED_MATERIALS_DIRNAME = "materiale_condiviso"
+SUMMARY_TOKENS_KEY = "summary_tokens" # Chiave del frontmatter con i token usati per il riassunto del documento
+
+_CONTENT_TYPES = {".pdf": "pdf", ".html": "html", ".htm": "html"}
+_KEY_PREFIX_LENGTH = 8 # Caratteri dell'hash aggiunti al nome del file condiviso
+
+
+def attachment_content_type(path: Path) -> Optional[str]:
+    """
+    Tipo di contenuto di un allegato, in base all'estensione.
+
+    Args:
+        path (Path): Percorso dell'allegato.
+
+    Returns:
+        Optional[str]: "pdf", "html" o None se il file non è un allegato supportato.
+    """
+    return _CONTENT_TYPES.get(path.suffix.lower())
+
+
+@dataclass
+class SharedMaterial:
+    """Un documento con lo stesso contenuto allegato a più lezioni del corso."""
+    key: str # Hash SHA-256 del contenuto
+    content_type: str # "pdf" o "html"
+    files: List[Path] # Percorsi (anche diversi tra loro) con questo contenuto, ordinati
+    lessons: List[Path] # File VTT delle lezioni che lo allegano
+    output_path: Path # File Markdown con il riassunto del documento
+    tokens_used: int = 0 # Token usati per riassumerlo in questa esecuzione
+    summary_tokens: int = 0 # Token del riassunto su disco, anche se generato da un'esecuzione precedente
+
+    @property
+    def source_file(self) -> Path:
+        """Il file da cui il documento viene estratto."""
+        return self.files[0]
+
+    @property
+    def title(self) -> str:
+        """Titolo del documento (nome del primo file)."""
+        return self.source_file.name
+
+    @property
+    def link(self) -> str:
+        """Link relativo al riassunto, valido dai file delle lezioni e dei capitoli."""
+        return f"../{SHARED_MATERIALS_DIRNAME}/{self.output_path.name}"
+
+    @property
+    def reuses(self) -> int:
+        """Estrazioni e riassunti evitati: uno per ogni lezione oltre la prima."""
+        return len(self.lessons) - 1
+
+
+@dataclass
+class SharedMaterialIndex:
+    """
+    Indice degli allegati condivisi di un corso, per percorso del file.
+
+    Contiene solo dati serializzabili, così può viaggiare con i job delle lezioni
+    verso i processi di estrazione di LessonPipeline.
+    """
+    materials: Dict[str, SharedMaterial] = field(default_factory=dict)
+    _by_path: Dict[Path, str] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        for key, material in self.materials.items():
+            for path in material.files:
+                self._by_path[path.resolve()] = key
+
+    @classmethod
+    def build(cls, lesson_attachments: Iterable[Tuple[Path, Sequence[Path]]], output_dir: Path) -> "SharedMaterialIndex":
+        """
+        Individua gli allegati con lo stesso contenuto allegati a più di una lezione.
+
+        Args:
+            lesson_attachments (Iterable[Tuple[Path, Sequence[Path]]]): Per ogni lezione, il file VTT
+                e gli allegati (PDF, HTML e file orfani associati).
+            output_dir (Path): Directory in cui verranno scritti i riassunti dei documenti condivisi.
+
+        Returns:
+            SharedMaterialIndex: L'indice dei documenti condivisi (vuoto se non ce ne sono).
+        """
+        hashes: Dict[Path, str] = {}
+        files: Dict[str, List[Path]] = {}
+        lessons: Dict[str, List[Path]] = {}
+        for vtt_file, attachments in lesson_attachments:
+            for path in attachments:
+                content_type = attachment_content_type(path)
+                if content_type is None:
+                    continue
+                resolved = path.resolve()
+                if resolved not in hashes:
+                    try:
+                        hashes[resolved] = f"{content_type}-{file_content_hash(path)}"
+                    except OSError as e:
+                        logger.warning(f"Impossibile leggere l'allegato '{path}' per la deduplicazione: {e}")
+                        continue
+                key = hashes[resolved]
+                if path not in files.setdefault(key, []):
+                    files[key].append(path)
+                if vtt_file not in lessons.setdefault(key, []):
+                    lessons[key].append(vtt_file)
+
+        materials: Dict[str, SharedMaterial] = {}
+        for key, key_lessons in lessons.items():
+            if len(key_lessons) < 2:
+                continue
+            key_files = sorted(files[key])
+            content_type, content_hash = key.split("-", 1)
+            safe_stem = re.sub(r'[^\w\-. ]', '_', key_files[0].stem)
+            output_path = Path(output_dir) / f"{safe_stem}_{content_hash[:_KEY_PREFIX_LENGTH]}.md"
+            materials[key] = SharedMaterial(key, content_type, key_files, key_lessons, output_path)
+        if materials:
+            logger.info(f"Trovati {len(materials)} allegati condivisi da più lezioni: verranno estratti e riassunti una sola volta.")
+        return cls(materials)
+
+    def get(self, path: Path) -> Optional[SharedMaterial]:
+        """
+        Restituisce il documento condiviso corrispondente a un allegato.
+
+        Args:
+            path (Path): Percorso dell'allegato.
+
+        Returns:
+            Optional[SharedMaterial]: Il documento condiviso, o None se l'allegato non è condiviso.
+        """
+        if not self.materials:
+            return None
+        key = self._by_path.get(path.resolve())
+        return self.materials.get(key) if key is not None else None
+
+    def discard(self, key: str) -> None:
+        """
+        Rimuove un documento dall'indice: le lezioni torneranno a estrarlo e riassumerlo.
+
+        Args:
+            key (str): Chiave del documento.
+        """
+        material = self.materials.pop(key, None)
+        if material is not None:
+            for path in material.files:
+                self._by_path.pop(path.resolve(), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Statistiche dei risparmi ottenuti con la deduplicazione.
+
+        Returns:
+            Dict[str, int]: Documenti condivisi, riferimenti delle lezioni, estrazioni e
+                            riassunti evitati e stima dei token risparmiati. I token di un
+                            riassunto ripreso da disco sono quelli registrati nel suo frontmatter
+                            (vedi SUMMARY_TOKENS_KEY).
+        """
+        return {
+            "documents": len(self.materials),
+            "references": sum(len(m.lessons) for m in self.materials.values()),
+            "reuses": sum(m.reuses for m in self.materials.values()),
+            "tokens_saved": sum(m.summary_tokens * m.reuses for m in self.materials.values()),
+        }
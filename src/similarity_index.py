@@ -0,0 +1,252 @@
+"""
+Similarity Index: indice MinHash/LSH delle trascrizioni già riassunte.
+
+Le riedizioni di un corso (es. "edizione 2024") hanno trascrizioni quasi
+identiche a quelle di corsi già elaborati, ma basta una parola diversa perché
+journal e cache per hash esatto non le riconoscano. Questo modulo stima la
+similarità di Jaccard tra trascrizioni con le firme MinHash dei loro shingle
+(sequenze di SHINGLE_SIZE parole) e trova i candidati con la tecnica LSH: la
+firma è divisa in bande e due trascrizioni sono candidate se coincidono in
+almeno una banda.
+
+L'indice è un database SQLite su disco, condivisibile tra esecuzioni e corsi:
+ogni banda è una riga di una tabella indicizzata, quindi una ricerca costa
+LSH_BANDS accessi all'indice B-tree più il confronto con i pochi candidati,
+anche con centinaia di migliaia di lezioni. Le bande includono tipo di contenuto,
+modello e impronta del prompt: un riassunto viene riutilizzato solo se è stato
+prodotto nelle stesse condizioni.
+"""
+import hashlib
+import logging
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Union
+
+from .lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5 # Parole per shingle
+NUM_PERMUTATIONS = 128 # Valori della firma MinHash
+LSH_BANDS = 16 # Bande della firma (righe per banda: NUM_PERMUTATIONS // LSH_BANDS)
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+MIN_SHINGLES = 50 # Trascrizioni più corte: similarità troppo incerta, non indicizzate
+_SHINGLE_BLOCK = 4096 # Shingle elaborati insieme: limita la memoria delle matrici permutazioni x shingle
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_ROWS_PER_BAND = NUM_PERMUTATIONS // LSH_BANDS
+_SIGNATURE_FORMAT = f"<{NUM_PERMUTATIONS}Q"
+_WORD_PATTERN = re.compile(r"\w+")
+# Permutazioni (a * x + b) mod p, fisse: le firme devono restare confrontabili tra esecuzioni
+_rng = random.Random(20240501)
+_PERMUTATIONS = tuple((_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS))
+del _rng
+
+Signature = Tuple[int, ...]
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _mod_mersenne(values: "np.ndarray") -> "np.ndarray":
+    """Riduce modulo 2^61 - 1 valori uint64 minori di 2^63 (2^61 ≡ 1)."""
+    values = (values & _MERSENNE_PRIME) + (values >> 61)
+    return np.where(values >= _MERSENNE_PRIME, values - _MERSENNE_PRIME, values)
+
+
+def _permute(a: "np.ndarray", b: "np.ndarray", x: "np.ndarray") -> "np.ndarray":
+    """
+    Calcola (a * x + b) mod 2^61 - 1 per ogni permutazione (righe) e shingle (colonne).
+
+    Il prodotto (fino a 122 bit) è scomposto in parti da 32 bit, perché i calcoli
+    in uint64 siano esatti: le firme coincidono con quelle calcolate con gli interi Python.
+    """
+    low_mask = np.uint64(0xFFFFFFFF)
+    shift32, shift29 = np.uint64(32), np.uint64(29)
+    a_hi, a_lo = a >> shift32, a & low_mask
+    x_hi, x_lo = x >> shift32, x & low_mask
+    high = (a_hi * x_hi) << np.uint64(3) # 2^64 ≡ 2^3
+    middle = a_hi * x_lo + a_lo * x_hi # < 2^62
+    middle = (middle >> shift29) + ((middle & np.uint64((1 << 29) - 1)) << shift32) # middle * 2^32, con 2^61 ≡ 1
+    low = a_lo * x_lo
+    low = (low & np.uint64(_MERSENNE_PRIME)) + (low >> np.uint64(61))
+    return _mod_mersenne(high + middle + low + b)
+
+
+def minhash_signature(text: str) -> Optional[Signature]:
+    """
+    Calcola la firma MinHash degli shingle di parole di un testo.
+
+    Il testo viene normalizzato (minuscole, solo parole), quindi punteggiatura,
+    maiuscole e spaziatura non influiscono sulla firma.
+
+    Args:
+        text (str): Il testo.
+
+    Returns:
+        Optional[Signature]: NUM_PERMUTATIONS valori, o None se il testo ha meno di MIN_SHINGLES shingle.
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    shingles = {
+        _hash64(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 0))
+    }
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    # (a * x + b) mod p non cambia riducendo prima x modulo p; il minimo per permutazione
+    # è calcolato in NumPy, a blocchi di shingle, senza trattenere il GIL nel ciclo
+    x = np.fromiter((value % _MERSENNE_PRIME for value in shingles), dtype=np.uint64, count=len(shingles))
+    a = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    b = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    signature = np.full(NUM_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, len(x), _SHINGLE_BLOCK):
+        np.minimum(signature, _permute(a, b, x[None, start:start + _SHINGLE_BLOCK]).min(axis=1), out=signature)
+    return tuple(int(value) for value in signature)
+
+
+def estimate_similarity(first: Signature, second: Signature) -> float:
+    """
+    Stima la similarità di Jaccard di due testi dalle loro firme MinHash.
+
+    Args:
+        first (Signature): Firma del primo testo.
+        second (Signature): Firma del secondo testo.
+
+    Returns:
+        float: Frazione dei valori coincidenti, tra 0 e 1.
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _band_keys(signature: Signature, scope: str) -> Sequence[int]:
+    """Chiavi LSH (interi a 64 bit con segno, come gli INTEGER di SQLite) delle bande di una firma."""
+    keys = []
+    for band in range(LSH_BANDS):
+        values = signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND]
+        data = f"{scope}\0{band}\0".encode("utf-8") + struct.pack(f"<{_ROWS_PER_BAND}Q", *values)
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+
+class SimilarityIndex:
+    """
+    Indice persistente (SQLite) delle trascrizioni riassunte, interrogabile per similarità.
+
+    Sicuro per l'uso da più thread; più processi possono usare lo stesso file.
+    """
+
+    def __init__(self, path: Union[str, Path], threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        """
+        Apre (o crea) l'indice.
+
+        Args:
+            path (Union[str, Path]): Percorso del database SQLite.
+            threshold (float): Similarità di Jaccard stimata minima per riutilizzare un riassunto.
+
+        Raises:
+            ValueError: Se la soglia non è compresa tra 0 (escluso) e 1.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"La soglia di similarità deve essere compresa tra 0 e 1 (ricevuta {threshold}).")
+        self.path = Path(path)
+        self.threshold = threshold
+        self.hits = 0 # Riassunti riutilizzati in questa esecuzione
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, signature BLOB NOT NULL, "
+                "summary TEXT NOT NULL, source TEXT, created_at REAL)"
+            )
+            self._connection.execute("CREATE TABLE IF NOT EXISTS bands (band_key INTEGER NOT NULL, entry_id INTEGER NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS bands_by_key ON bands (band_key)")
+
+    @staticmethod
+    def make_scope(content_type: str, model: str, prompt_fingerprint: str) -> str:
+        """
+        Ambito dei riassunti confrontabili: stesso tipo di contenuto, modello e prompt.
+
+        Args:
+            content_type (str): Tipo di contenuto (es. "vtt").
+            model (str): Modello che ha prodotto il riassunto.
+            prompt_fingerprint (str): Impronta del prompt usato.
+
+        Returns:
+            str: L'ambito.
+        """
+        return f"{content_type}|{model}|{prompt_fingerprint}"
+
+    def lookup(self, signature: Signature, scope: str) -> Optional[Tuple[str, float, Optional[str]]]:
+        """
+        Cerca il riassunto della trascrizione più simile nello stesso ambito.
+
+        Args:
+            signature (Signature): Firma MinHash della trascrizione.
+            scope (str): Ambito (vedi make_scope).
+
+        Returns:
+            Optional[Tuple[str, float, Optional[str]]]: Riassunto, similarità stimata e origine
+                della trascrizione più simile, se supera la soglia; altrimenti None.
+        """
+        keys = _band_keys(signature, scope)
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, signature, summary, source FROM entries WHERE id IN "
+                f"(SELECT DISTINCT entry_id FROM bands WHERE band_key IN ({placeholders})) AND scope = ?",
+                (*keys, scope)
+            ).fetchall()
+        best: Optional[Tuple[str, float, Optional[str]]] = None
+        for _, blob, summary, source in rows:
+            try:
+                similarity = estimate_similarity(signature, struct.unpack(_SIGNATURE_FORMAT, blob))
+            except struct.error:
+                continue # Firma di un formato diverso
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (summary, similarity, source)
+        if best is not None:
+            with self._lock:
+                self.hits += 1
+        return best
+
+    def add(self, signature: Signature, scope: str, summary: str, source: Optional[str] = None) -> None:
+        """
+        Registra il riassunto di una trascrizione.
+
+        Args:
+            signature (Signature): Firma MinHash della trascrizione.
+            scope (str): Ambito (vedi make_scope).
+            summary (str): Il riassunto.
+            source (Optional[str]): Origine della trascrizione (per i log).
+        """
+        keys = _band_keys(signature, scope)
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO entries (scope, signature, summary, source, created_at) VALUES (?, ?, ?, ?, ?)",
+                (scope, struct.pack(_SIGNATURE_FORMAT, *signature), summary, source, time.time())
+            )
+            self._connection.executemany(
+                "INSERT INTO bands (band_key, entry_id) VALUES (?, ?)",
+                [(key, cursor.lastrowid) for key in keys]
+            )
+
+    def count(self) -> int:
+        """Numero di trascrizioni registrate."""
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self) -> None:
+        """Chiude il database."""
+        with self._lock:
+            self._connection.close()
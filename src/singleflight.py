@@ -0,0 +1,96 @@
+"""
+Singleflight: unificazione delle richieste identiche in corso.
+
+Con più lezioni elaborate in contemporanea, la stessa richiesta al modello può
+essere in volo più volte nello stesso momento: lo stesso PDF allegato a più
+lezioni, la stessa immagine in più pagine, lo stesso testo ripreso dopo un
+errore. Con SingleFlight, i chiamanti che presentano la stessa chiave mentre una
+chiamata è in corso ne attendono il risultato invece di ripeterla. La chiave
+viene rimossa al termine della chiamata: le richieste successive vengono
+eseguite di nuovo (la memorizzazione dei risultati spetta a journal e cache).
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    """Una chiamata in corso e il suo esito."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """
+    Impronta di una richiesta, a partire dai suoi parametri.
+
+    Args:
+        *parts (Any): Parametri della richiesta (serializzabili in JSON; gli altri valori come stringa).
+
+    Returns:
+        str: Hash SHA-256 esadecimale dei parametri.
+    """
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Esegue una sola volta le chiamate con la stessa chiave presentate in contemporanea.
+
+    Sicuro per l'uso da più thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0 # Chiamate che hanno atteso il risultato di un'altra
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Esegue la funzione, o attende l'esito della chiamata in corso con la stessa chiave.
+
+        Args:
+            key (Hashable): Chiave della richiesta (es. request_fingerprint).
+            function (Callable[[], Any]): La chiamata da eseguire.
+
+        Returns:
+            Tuple[Any, bool]: Il risultato e True se è stato condiviso con una chiamata già in corso.
+
+        Raises:
+            BaseException: L'eccezione sollevata dalla chiamata, anche per i chiamanti in attesa.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """Numero di chiamate in corso."""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,190 @@
+"""
+Text Compressor: compressione estrattiva locale dei testi lunghi.
+
+Le trascrizioni di lezioni di più ore superano di molto quanto serve al modello
+per un riassunto. Prima della chiamata, compress_text conserva le frasi più
+rappresentative del testo fino a un budget di token:
+
+1. il testo viene diviso in frasi (le frasi troppo lunghe, tipiche delle
+   trascrizioni senza punteggiatura, in finestre di MAX_SENTENCE_WORDS parole);
+2. ogni frase diventa un vettore TF-IDF normalizzato, memorizzato come matrice
+   sparsa in formato coordinate (array NumPy di righe, colonne e valori);
+3. le frasi sono ordinate con TextRank: PageRank sul grafo delle similarità
+   del coseno. La matrice delle similarità (frasi x frasi) non viene mai
+   costruita: ogni iterazione calcola X (X^T r) con due prodotti sparsi;
+4. le frasi migliori entrano nel budget e vengono restituite nell'ordine originale.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from .lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+MAX_SENTENCE_WORDS = 40 # Le frasi più lunghe vengono divise in finestre di parole
+MIN_WORD_LENGTH = 3 # Parole più corte (articoli, preposizioni) ignorate nei vettori
+DAMPING = 0.85 # Fattore di smorzamento di PageRank
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+_CHARS_PER_TOKEN = 4 # Stima approssimativa per i testi in lingue europee
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@dataclass
+class CompressionStats:
+    """Effetto della compressione su un testo."""
+    sentences: int = 0
+    sentences_kept: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Frazione del testo conservata (1.0: testo invariato)."""
+        return self.chars_after / self.chars_before if self.chars_before else 1.0
+
+    @property
+    def tokens_saved(self) -> int:
+        """Stima dei token di prompt risparmiati."""
+        return (self.chars_before - self.chars_after) // _CHARS_PER_TOKEN
+
+    def to_dict(self) -> dict:
+        return {
+            "sentences": self.sentences,
+            "sentences_kept": self.sentences_kept,
+            "chars_before": self.chars_before,
+            "chars_after": self.chars_after,
+            "ratio": round(self.ratio, 4),
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Divide un testo in frasi.
+
+    Le righe vengono prima unite (nelle trascrizioni VTT una frase occupa più
+    sottotitoli); le frasi con più di MAX_SENTENCE_WORDS parole vengono divise
+    in finestre di MAX_SENTENCE_WORDS parole.
+
+    Args:
+        text (str): Il testo.
+
+    Returns:
+        List[str]: Le frasi, in ordine.
+    """
+    sentences = []
+    for sentence in _SENTENCE_END.split(" ".join(text.split())):
+        words = sentence.split()
+        for start in range(0, len(words), MAX_SENTENCE_WORDS):
+            sentences.append(" ".join(words[start:start + MAX_SENTENCE_WORDS]))
+    return sentences
+
+
+def _tfidf_matrix(sentences: List[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", int]:
+    """
+    Costruisce la matrice TF-IDF delle frasi, con righe a norma unitaria, in formato coordinate.
+
+    Returns:
+        Tuple: Array delle righe, delle colonne e dei valori, e numero di colonne (parole distinte).
+    """
+    vocabulary = {}
+    rows, cols = [], []
+    for index, sentence in enumerate(sentences):
+        for word in _WORD_PATTERN.findall(sentence.lower()):
+            if len(word) >= MIN_WORD_LENGTH:
+                rows.append(index)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), 0
+
+    # Conteggi per coppia (frase, parola)
+    keys = np.asarray(rows, dtype=np.int64) * len(vocabulary) + np.asarray(cols, dtype=np.int64)
+    keys, counts = np.unique(keys, return_counts=True)
+    rows, cols = np.divmod(keys, len(vocabulary))
+
+    document_frequency = np.bincount(cols, minlength=len(vocabulary))
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+    values = (1 + np.log(counts)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(sentences)))
+    values = values / norms[rows]
+    return rows, cols, values, len(vocabulary)
+
+
+def rank_sentences(sentences: List[str]) -> "np.ndarray":
+    """
+    Calcola il punteggio TextRank delle frasi.
+
+    Args:
+        sentences (List[str]): Le frasi.
+
+    Returns:
+        np.ndarray: Un punteggio per frase (somma 1); le frasi senza parole significative hanno punteggio minimo.
+    """
+    count = len(sentences)
+    rows, cols, values, vocabulary_size = _tfidf_matrix(sentences)
+    if vocabulary_size == 0:
+        return np.full(count, 1 / count) if count else np.zeros(0)
+
+    has_words = np.bincount(rows, minlength=count) > 0 # Righe a norma 1: la diagonale di X X^T
+
+    def similarity_product(vector):
+        # (X X^T - I) v: similarità del coseno tra frasi diverse, senza costruire la matrice
+        projected = np.bincount(cols, weights=values * vector[rows], minlength=vocabulary_size)
+        product = np.bincount(rows, weights=values * projected[cols], minlength=count)
+        return product - vector * has_words
+
+    degree = similarity_product(np.ones(count))
+    inverse_degree = np.divide(1.0, degree, out=np.zeros(count), where=degree > 1e-12)
+    scores = np.full(count, 1 / count)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / count + DAMPING * similarity_product(scores * inverse_degree)
+        # Il peso delle frasi senza collegamenti viene ridistribuito uniformemente
+        updated += DAMPING * scores[inverse_degree == 0].sum() / count
+        converged = np.abs(updated - scores).sum() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def compress_text(text: str, token_budget: int) -> Tuple[str, CompressionStats]:
+    """
+    Riduce un testo alle sue frasi più rappresentative entro un budget di token.
+
+    Args:
+        text (str): Il testo da comprimere.
+        token_budget (int): Numero massimo (stimato) di token del testo compresso.
+
+    Returns:
+        Tuple[str, CompressionStats]: Le frasi conservate, nell'ordine originale, e le
+            statistiche. Un testo già entro il budget viene restituito invariato.
+
+    Raises:
+        ValueError: Se il budget non è positivo.
+    """
+    if token_budget < 1:
+        raise ValueError(f"Il budget di token deve essere positivo (ricevuto {token_budget}).")
+    stats = CompressionStats(chars_before=len(text), chars_after=len(text))
+    max_chars = token_budget * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text, stats
+
+    sentences = split_sentences(text)
+    scores = rank_sentences(sentences)
+    kept = []
+    used_chars = 0
+    for index in np.argsort(-scores, kind="stable"):
+        length = len(sentences[index]) + 1 # Spazio di separazione
+        if used_chars + length <= max_chars:
+            kept.append(int(index))
+            used_chars += length
+    compressed = " ".join(sentences[index] for index in sorted(kept))
+
+    stats.sentences = len(sentences)
+    stats.sentences_kept = len(kept)
+    stats.chars_after = len(compressed)
+    return compressed, stats
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo catalog_runner.py.
+
+Verifica l'individuazione dei corsi di un catalogo, l'elaborazione parallela
+dei corsi con la raccolta dei report e la generazione del report del catalogo.
+"""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from src.catalog_runner import (
+    CATALOG_REPORT_FILENAME,
+    CourseReport,
+    discover_courses,
+    render_catalog_report,
+    run_catalog,
+    write_catalog_report,
+)
+from src.markdown_formatter import MarkdownFormatter
+
+
+class TestCatalogRunner(unittest.TestCase):
+    """Classe di test per le funzioni del catalog runner."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.catalog_dir = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_course(self, name):
+        chapter_dir = self.catalog_dir / name / "01 - Introduzione"
+        chapter_dir.mkdir(parents=True)
+        (chapter_dir / "01_Benvenuto.vtt").write_text("WEBVTT\n", encoding="utf-8")
+        return self.catalog_dir / name
+
+    def test_discover_courses(self):
+        """Solo le directory con capitoli contenenti VTT sono corsi, in ordine di nome."""
+        course_b = self._make_course("Corso B")
+        course_a = self._make_course("Corso A")
+        (self.catalog_dir / "resume_Corso A" / "01 - Introduzione").mkdir(parents=True) # Output precedente
+        (self.catalog_dir / ".nascosta" / "01").mkdir(parents=True)
+        (self.catalog_dir / "note.txt").write_text("non un corso", encoding="utf-8")
+
+        self.assertEqual(discover_courses(self.catalog_dir), [course_a, course_b])
+
+    def test_discover_courses_missing_catalog(self):
+        """Un catalogo inesistente solleva ValueError."""
+        with self.assertRaises(ValueError):
+            discover_courses(self.catalog_dir / "inesistente")
+
+    def test_run_catalog_parallel_and_ordered(self):
+        """I corsi sono elaborati in parallelo e i report restano nell'ordine dei corsi."""
+        barrier = threading.Barrier(2, timeout=5)
+        course_dirs = [Path("/catalogo/A"), Path("/catalogo/B")]
+
+        def process_course(course_dir):
+            barrier.wait() # Fallisce per timeout se i corsi fossero elaborati in sequenza
+            return CourseReport(course_name=course_dir.name, course_dir=course_dir, lessons_processed=1)
+
+        reports = run_catalog(course_dirs, process_course, max_parallel_courses=2)
+
+        self.assertEqual([r.course_name for r in reports], ["A", "B"])
+        self.assertTrue(all(r.succeeded for r in reports))
+
+    def test_run_catalog_course_error(self):
+        """Un corso che solleva un'eccezione non interrompe gli altri."""
+        def process_course(course_dir):
+            if course_dir.name == "A":
+                raise RuntimeError("disco pieno")
+            return CourseReport(course_name=course_dir.name, course_dir=course_dir)
+
+        reports = run_catalog([Path("A"), Path("B")], process_course, max_parallel_courses=1)
+
+        self.assertEqual(reports[0].error, "disco pieno")
+        self.assertFalse(reports[0].succeeded)
+        self.assertTrue(reports[1].succeeded)
+
+    def test_write_catalog_report(self):
+        """Il report riassume i corsi e collega gli indici con percorsi relativi."""
+        output_root = self.catalog_dir
+        reports = [
+            CourseReport(
+                course_name="Corso A",
+                course_dir=Path("Corso A"),
+                output_dir=output_root / "resume_Corso A",
+                index_file=output_root / "resume_Corso A" / "index.md",
+                lessons_processed=3,
+                total_tokens=120,
+                processing_time_s=1.5,
+            ),
+            CourseReport(course_name="Corso B", course_dir=Path("Corso B"), lessons_processed=1, lessons_failed=1, total_tokens=30),
+        ]
+
+        report_path = write_catalog_report(
+            MarkdownFormatter(), "Catalogo", reports, output_root, 2.0,
+            rate_limiter_stats={"requests": 5, "max_in_flight": 2, "wait_seconds": 0.5}
+        )
+
+        self.assertEqual(report_path, output_root / CATALOG_REPORT_FILENAME)
+        content = report_path.read_text(encoding="utf-8")
+        self.assertIn("# Report del Catalogo: Catalogo", content)
+        self.assertIn("- Lezioni elaborate: 4", content)
+        self.assertIn("- Token totali utilizzati: 150", content)
+        self.assertIn("- Richieste all'API: 5", content)
+        self.assertIn("| [Corso A](resume_Corso A/index.md) | 3 | 0 | 120 | 1.50 | OK |", content)
+        self.assertIn("| Corso B | 1 | 1 | 30 | 0.00 | Incompleto |", content)
+        self.assertNotIn("Limite adattivo", content)
+
+    def test_catalog_report_with_adaptive_limit(self):
+        """Con il limitatore adattivo il report riporta il limite di concorrenza raggiunto."""
+        stats = {"requests": 5, "max_in_flight": 4, "wait_seconds": 0.0, "concurrency_limit": 6,
+                 "peak_concurrency_limit": 9, "rate_limited": 2, "limit_decreases": 1}
+        content = render_catalog_report(MarkdownFormatter(), "Catalogo", [], self.catalog_dir, 1.0, stats)
+        self.assertIn("- Limite adattivo di richieste contemporanee: 6 (massimo raggiunto: 9, errori 429: 2, riduzioni: 1)", content)
+
+
+if __name__ == '__main__':
+    unittest.main()
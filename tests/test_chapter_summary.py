@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test per la creazione del riepilogo di capitolo (create_chapter_summary).
+
+Verifica la lettura del solo frontmatter delle lezioni e l'inclusione
+completa del corpo di ciascuna lezione nel file del capitolo.
+"""
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.markdown_formatter import MarkdownFormatter
+from src.resume_generator import LessonResult, create_chapter_summary, read_lesson_frontmatter, write_lesson_summary
+
+
+class TestReadLessonFrontmatter(unittest.TestCase):
+    """Classe di test per read_lesson_frontmatter."""
+
+    def test_frontmatter_leaves_file_at_body(self):
+        """Il frontmatter viene letto e il file resta posizionato all'inizio del corpo."""
+        lesson_file = io.StringIO("---\ntitle: 01_Intro\nuser_score:\n---\n\n## Sezione\ntesto\n")
+        frontmatter = read_lesson_frontmatter(lesson_file)
+        self.assertEqual(frontmatter, {"title": "01_Intro", "user_score": ""})
+        self.assertEqual(lesson_file.read(), "\n## Sezione\ntesto\n")
+
+    def test_missing_or_unclosed_frontmatter(self):
+        """Senza frontmatter (o se non è chiuso) il file viene riposizionato all'inizio."""
+        for content in ("## Solo corpo\n", "---\ntitle: senza chiusura\n"):
+            lesson_file = io.StringIO(content)
+            self.assertIsNone(read_lesson_frontmatter(lesson_file))
+            self.assertEqual(lesson_file.read(), content)
+
+
+class TestCreateChapterSummary(unittest.TestCase):
+    """Classe di test per create_chapter_summary."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.test_dir.name)
+        self.chapter_dir = Path("01 - Introduzione")
+        self.formatter = MarkdownFormatter()
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_embeds_full_lesson_bodies(self):
+        """Il corpo di ogni lezione viene incluso per intero, senza frontmatter."""
+        lesson_dir = self.output_dir / self.chapter_dir.name
+        lesson_dir.mkdir(parents=True)
+        lesson_path = lesson_dir / "01_Benvenuto.md"
+        body = "## Riassunto Video (Trascrizione VTT)\nPrima riga.\n\nSeconda riga." + " parola" * 20000
+        lesson_path.write_text(f"---\ntitle: 01_Benvenuto\n---\n\n{body}\n\n", encoding="utf-8")
+
+        chapter_path = create_chapter_summary(self.formatter, self.chapter_dir, [lesson_path], self.output_dir)
+
+        content = chapter_path.read_text(encoding="utf-8")
+        self.assertIn('<a id="benvenuto"></a>\n## 01_Benvenuto\n' + body + "\n\n---\n", content)
+        self.assertNotIn("title:", content)
+        self.assertEqual(list(lesson_dir.glob(".*.tmp")), [])
+
+    def test_in_memory_results_match_disk_fallback(self):
+        """Il capitolo reso dai LessonResult coincide con quello letto dai file su disco."""
+        summaries = {
+            "vtt": "Riassunto del video.",
+            "pdf": "Nessun contenuto PDF fornito o contenuto vuoto.",
+            "html": None,
+            "orphan_material": "Materiale extra.",
+        }
+        lesson_path = self.output_dir / self.chapter_dir.name / "02_Concetti.md"
+        write_lesson_summary(
+            self.formatter, "02_Concetti", summaries["vtt"], summaries["pdf"],
+            summaries["html"], summaries["orphan_material"], lesson_path, user_score_placeholder=True
+        )
+        in_memory = LessonResult("02_Concetti", lesson_path, summaries, 42, {"summary": 1.5})
+
+        from_memory = create_chapter_summary(self.formatter, self.chapter_dir, [in_memory], self.output_dir).read_text(encoding="utf-8")
+        skipped = LessonResult.from_existing_file("02_Concetti", lesson_path)
+        from_disk = create_chapter_summary(self.formatter, self.chapter_dir, [skipped], self.output_dir).read_text(encoding="utf-8")
+
+        self.assertTrue(skipped.skipped)
+        self.assertEqual(from_memory, from_disk)
+        self.assertIn("Materiale extra.", from_memory)
+
+    def test_lesson_result_uses_slots(self):
+        """LessonResult non ha un __dict__ per istanza."""
+        result = LessonResult.from_existing_file("01_Intro", Path("01_Intro.md"))
+        self.assertFalse(hasattr(result, "__dict__"))
+
+
+if __name__ == '__main__':
+    unittest.main()
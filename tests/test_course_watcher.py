@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo course_watcher.py e per l'aggiornamento incrementale (refresh_course).
+
+Verifica il raggruppamento degli eventi (debounce) con entrambi i backend,
+l'esclusione dei file nascosti e la rigenerazione delle sole lezioni modificate.
+"""
+
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from src.course_watcher import CourseWatcher
+from src.markdown_formatter import MarkdownFormatter
+from src.prompt_manager import PromptManager
+from src.catalog_runner import CourseReport
+from src.resume_generator import LessonResult, refresh_course, snapshot_lesson_inputs, watch_course
+
+
+class TestCourseWatcher(unittest.TestCase):
+    """Classe di test per CourseWatcher."""
+
+    use_inotify = False
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.course_dir = Path(self.temp_dir.name)
+        self.chapter_dir = self.course_dir / "01 - Introduzione"
+        self.chapter_dir.mkdir()
+        self.watcher = CourseWatcher(self.course_dir, debounce_seconds=0.2, poll_interval=0.05, use_inotify=self.use_inotify)
+
+    def tearDown(self):
+        self.watcher.close()
+        self.temp_dir.cleanup()
+
+    def _write_later(self, delays_and_paths):
+        def writer():
+            for delay, path in delays_and_paths:
+                time.sleep(delay)
+                path.parent.mkdir(exist_ok=True)
+                path.write_text("WEBVTT\n", encoding="utf-8")
+        thread = threading.Thread(target=writer)
+        thread.start()
+        return thread
+
+    def test_timeout_without_changes(self):
+        """Senza modifiche, l'attesa termina al timeout con un insieme vuoto."""
+        self.assertEqual(self.watcher.wait_for_changes(timeout=0.2), set())
+
+    def test_burst_is_debounced(self):
+        """I file scritti in rapida successione sono restituiti in un'unica raffica."""
+        first = self.chapter_dir / "01_Benvenuto.vtt"
+        second = self.chapter_dir / "02_Seconda.vtt"
+        thread = self._write_later([(0.05, first), (0.1, second)])
+
+        changed = self.watcher.wait_for_changes(timeout=5)
+        thread.join()
+
+        self.assertEqual(changed, {first, second})
+
+    def test_hidden_files_ignored(self):
+        """I file nascosti (download parziali) non generano eventi."""
+        thread = self._write_later([(0.05, self.chapter_dir / ".01_Benvenuto.vtt.part")])
+        changed = self.watcher.wait_for_changes(timeout=0.5)
+        thread.join()
+
+        self.assertEqual(changed, set())
+
+    def test_new_chapter_detected(self):
+        """I file di un capitolo creato dopo l'avvio vengono rilevati."""
+        new_file = self.course_dir / "02 - Nuovo" / "01_Lezione.vtt"
+        thread = self._write_later([(0.05, new_file)])
+
+        changed = self.watcher.wait_for_changes(timeout=5)
+        thread.join()
+
+        self.assertIn(new_file, changed)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify disponibile solo su Linux")
+class TestCourseWatcherInotify(TestCourseWatcher):
+    """Gli stessi test con il backend inotify."""
+
+    use_inotify = True
+
+    def test_backend_is_inotify(self):
+        """Su Linux viene usato inotify."""
+        self.assertEqual(self.watcher.backend_name, "inotify")
+
+
+class TestRefreshCourse(unittest.TestCase):
+    """Classe di test per refresh_course."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = Path(self.temp_dir.name)
+        self.course_dir = root / "corso"
+        self.chapter_dir = self.course_dir / "01 - Introduzione"
+        self.chapter_dir.mkdir(parents=True)
+        self.output_dir = root / "output"
+        (self.output_dir / self.chapter_dir.name).mkdir(parents=True)
+        for name in ("01_Benvenuto", "02_Seconda"):
+            (self.chapter_dir / f"{name}.vtt").write_text("WEBVTT\n", encoding="utf-8")
+            (self.output_dir / self.chapter_dir.name / f"{name}.md").write_text(f"---\ntitle: {name}\n---\nRiassunto", encoding="utf-8")
+        self.fingerprints = {self.chapter_dir: snapshot_lesson_inputs(self.chapter_dir)}
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _fake_process_lesson(self, **kwargs):
+        output_path = self.output_dir / kwargs["chapter_dir"].name / f"{kwargs['vtt_file'].stem}.md"
+        output_path.write_text("Nuovo riassunto", encoding="utf-8")
+        return LessonResult(kwargs["vtt_file"].stem, output_path, {"vtt": "Nuovo riassunto"}, 5, {})
+
+    def _refresh(self, changed_paths):
+        with patch("src.resume_generator.process_lesson", side_effect=self._fake_process_lesson) as mock_process, \
+             patch("src.resume_generator.create_chapter_summary") as mock_chapter, \
+             patch("src.resume_generator.create_main_index") as mock_index, \
+             patch("src.resume_generator.create_image_describer"):
+            regenerated = refresh_course(
+                self.course_dir, self.output_dir, changed_paths, self.fingerprints,
+                MarkdownFormatter(), "test_key", PromptManager()
+            )
+        return regenerated, mock_process, mock_chapter, mock_index
+
+    def test_only_changed_lessons_regenerated(self):
+        """Solo la lezione con input modificati viene rigenerata; capitolo e indice vengono aggiornati."""
+        pdf_file = self.chapter_dir / "02_Slide.pdf"
+        pdf_file.write_bytes(b"%PDF-1.4")
+
+        regenerated, mock_process, mock_chapter, mock_index = self._refresh({pdf_file})
+
+        self.assertEqual([r.title for r in regenerated], ["02_Seconda"])
+        self.assertTrue(mock_process.call_args.kwargs["force"])
+        lesson_results = mock_chapter.call_args.args[2]
+        self.assertEqual([r.title for r in lesson_results], ["01_Benvenuto", "02_Seconda"])
+        self.assertTrue(lesson_results[0].skipped)
+        mock_index.assert_called_once()
+
+    def test_unchanged_inputs_not_regenerated(self):
+        """Un evento su file invariati non rigenera nulla."""
+        regenerated, mock_process, mock_chapter, _ = self._refresh({self.chapter_dir / "01_Benvenuto.vtt"})
+
+        self.assertEqual(regenerated, [])
+        mock_process.assert_not_called()
+        mock_chapter.assert_not_called()
+
+    def test_shared_attachments_passed_to_lessons(self):
+        """Le lezioni rigenerate ricevono l'indice degli allegati condivisi del corso."""
+        for name in ("01_Benvenuto", "02_Seconda"):
+            (self.chapter_dir / f"{name}.pdf").write_bytes(b"%PDF-1.4 dispensa comune")
+
+        with patch("src.resume_generator.process_shared_materials") as mock_shared:
+            _, mock_process, _, _ = self._refresh({self.chapter_dir / "01_Benvenuto.pdf", self.chapter_dir / "02_Seconda.pdf"})
+
+        self.assertEqual(mock_process.call_count, 2)
+        shared_materials = mock_process.call_args.kwargs["services"].shared_materials
+        self.assertEqual(len(shared_materials.materials), 1)
+        self.assertIsNotNone(shared_materials.get(self.chapter_dir / "02_Seconda.pdf"))
+        self.assertIs(mock_shared.call_args.args[0], shared_materials)
+        self.assertEqual(mock_shared.call_args.kwargs["pending_lessons"], {self.chapter_dir / "01_Benvenuto.vtt", self.chapter_dir / "02_Seconda.vtt"})
+
+    def test_attachment_changed_during_initial_pass(self):
+        """Un allegato modificato durante l'elaborazione iniziale fa rigenerare la lezione al primo aggiornamento."""
+        pdf_file = self.chapter_dir / "02_Slide.pdf"
+        pdf_file.write_bytes(b"%PDF-1.4")
+
+        def initial_pass(course_dir, output_dir, *args, **kwargs):
+            # L'allegato cambia mentre le lezioni vengono elaborate; i riassunti sono già su disco
+            pdf_file.write_bytes(b"%PDF-1.4 versione aggiornata")
+            return CourseReport(course_name=self.course_dir.name, course_dir=self.course_dir, output_dir=self.output_dir)
+
+        watcher = MagicMock(backend_name="polling")
+        watcher.wait_for_changes.return_value = {pdf_file}
+        with patch("src.resume_generator.process_course", side_effect=initial_pass), \
+             patch("src.resume_generator.process_lesson", side_effect=self._fake_process_lesson) as mock_process, \
+             patch("src.resume_generator.create_chapter_summary"), \
+             patch("src.resume_generator.create_main_index"), \
+             patch("src.resume_generator.create_image_describer"):
+            watch_course(str(self.course_dir), str(self.output_dir), MarkdownFormatter(), "test_key", PromptManager(),
+                         watcher=watcher, max_refreshes=1)
+
+        self.assertEqual([c.kwargs["vtt_file"].stem for c in mock_process.call_args_list], ["02_Seconda"])
+        watcher.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo extraction_cache.py.
+
+Verifica il riutilizzo delle estrazioni tra esecuzioni, l'indicizzazione per
+contenuto (file toccati o copiati), l'invalidazione al cambio di versione
+dell'estrattore e l'integrazione con la fase di estrazione delle lezioni.
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from src.extraction_cache import EXTRACTOR_VERSIONS, ExtractionCache, UncacheableExtractionError
+from src.resume_generator import LessonJob, extract_lesson_inputs, extract_text_from_pdf
+
+
+class TestExtractionCache(unittest.TestCase):
+    """Classe di test per ExtractionCache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.source = self.root / "slide.pdf"
+        self.source.write_bytes(b"%PDF-1.4 contenuto")
+        self.cache_dir = self.root / "cache"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_second_extraction_is_cached(self):
+        """Lo stesso file viene estratto una sola volta, anche da un'istanza (esecuzione) successiva."""
+        extract = MagicMock(return_value=("testo estratto", [{"src": "a.png", "alt": "diagramma"}]))
+        first = ExtractionCache(self.cache_dir).get_or_extract(self.source, "html", extract)
+        cache = ExtractionCache(self.cache_dir)
+        second = cache.get_or_extract(self.source, "html", extract)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second, ("testo estratto", [{"src": "a.png", "alt": "diagramma"}]))
+        extract.assert_called_once()
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_touched_or_copied_file_reuses_content_entry(self):
+        """Un file toccato (data di modifica diversa) o copiato altrove riusa l'estrazione per contenuto."""
+        extract = MagicMock(return_value=("testo", []))
+        cache = ExtractionCache(self.cache_dir)
+        cache.get_or_extract(self.source, "pdf", extract)
+        os.utime(self.source, ns=(1_000_000_000, 1_000_000_000))
+        copy = self.root / "copia.pdf"
+        copy.write_bytes(self.source.read_bytes())
+
+        cache.get_or_extract(self.source, "pdf", extract)
+        cache.get_or_extract(copy, "pdf", extract)
+        extract.assert_called_once()
+
+    def test_changed_content_is_extracted_again(self):
+        """Un file modificato viene estratto di nuovo."""
+        extract = MagicMock(side_effect=[("vecchio", []), ("nuovo", [])])
+        cache = ExtractionCache(self.cache_dir)
+        cache.get_or_extract(self.source, "pdf", extract)
+        self.source.write_bytes(b"%PDF-1.4 contenuto modificato")
+        self.assertEqual(cache.get_or_extract(self.source, "pdf", extract), ("nuovo", []))
+
+    def test_extractor_version_invalidates_entries(self):
+        """Incrementando la versione dell'estrattore le vecchie estrazioni vengono ignorate."""
+        extract = MagicMock(return_value=("testo", []))
+        cache = ExtractionCache(self.cache_dir)
+        cache.get_or_extract(self.source, "pdf", extract)
+        with patch.dict(EXTRACTOR_VERSIONS, {"pdf": EXTRACTOR_VERSIONS["pdf"] + 1}):
+            cache.get_or_extract(self.source, "pdf", extract)
+        self.assertEqual(extract.call_count, 2)
+
+    def test_errors_are_not_cached(self):
+        """Le eccezioni dell'estrattore vengono propagate e l'estrazione viene ritentata."""
+        extract = MagicMock(side_effect=[ValueError("file malformato"), ("testo", [])])
+        cache = ExtractionCache(self.cache_dir)
+        with self.assertRaises(ValueError):
+            cache.get_or_extract(self.source, "pdf", extract)
+        self.assertEqual(cache.get_or_extract(self.source, "pdf", extract), ("testo", []))
+
+    def test_corrupted_entry_is_ignored(self):
+        """Una voce corrotta è trattata come assente."""
+        extract = MagicMock(return_value=("testo", []))
+        cache = ExtractionCache(self.cache_dir)
+        cache.get_or_extract(self.source, "pdf", extract)
+        for entry in (self.cache_dir / "data").rglob("*.json.z"):
+            entry.write_bytes(b"non compresso")
+        self.assertEqual(cache.get_or_extract(self.source, "pdf", extract), ("testo", []))
+        self.assertEqual(extract.call_count, 2)
+
+    def test_lesson_extraction_uses_cache(self):
+        """extract_lesson_inputs non rianalizza VTT e PDF invariati."""
+        chapter_dir = self.root / "01 - Intro"
+        chapter_dir.mkdir()
+        vtt_file = chapter_dir / "01_Lezione.vtt"
+        vtt_file.write_text("WEBVTT\n\n00:00:01.000 --> 00:00:05.000\nCiao a tutti\n", encoding="utf-8")
+        (chapter_dir / "01_Lezione.pdf").write_bytes(b"%PDF-1.4")
+        job = LessonJob(vtt_file, chapter_dir, [], ExtractionCache(self.cache_dir))
+
+        with patch("src.resume_generator.extract_text_from_pdf", return_value="testo PDF") as mock_pdf:
+            first = extract_lesson_inputs(job)
+            second = extract_lesson_inputs(job)
+
+        mock_pdf.assert_called_once()
+        self.assertEqual(second.vtt_text, first.vtt_text)
+        self.assertEqual(second.vtt_text, "Ciao a tutti")
+        self.assertEqual([d.text for d in second.pdf_documents], ["testo PDF"])
+        self.assertEqual(job.extraction_cache.hits, 2)
+
+    def test_unreadable_pdf_is_not_cached(self):
+        """Un PDF illeggibile non viene memorizzato e risulta privo di testo, senza errori inviati al modello."""
+        chapter_dir = self.root / "01 - Intro"
+        chapter_dir.mkdir()
+        vtt_file = chapter_dir / "01_Lezione.vtt"
+        vtt_file.write_text("WEBVTT\n\n00:00:01.000 --> 00:00:05.000\nCiao a tutti\n", encoding="utf-8")
+        pdf_file = chapter_dir / "01_Lezione.pdf"
+        pdf_file.write_bytes(b"non un PDF")
+        job = LessonJob(vtt_file, chapter_dir, [], ExtractionCache(self.cache_dir))
+
+        first = extract_lesson_inputs(job)
+        second = extract_lesson_inputs(job)
+
+        for inputs in (first, second):
+            self.assertIsNone(inputs.pdf_documents[0].error)
+            self.assertEqual(inputs.pdf_documents[0].text, "")
+        self.assertEqual(job.extraction_cache.misses, 3) # VTT una volta, PDF a ogni estrazione
+        self.assertEqual(extract_text_from_pdf(pdf_file), "") # Senza cache il comportamento resta invariato
+        with self.assertRaises(UncacheableExtractionError):
+            extract_text_from_pdf(pdf_file, raise_on_error=True)
+
+if __name__ == '__main__':
+    unittest.main()
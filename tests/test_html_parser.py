@@ -100,5 +100,72 @@ class TestHTMLParser(unittest.TestCase):
         self.assertEqual(text, "Testo con spazi\nAltro testo")
         self.assertEqual(len(images), 0)
 
+
+PARAGRAPH = ("Le liste in Python sono sequenze mutabili, ordinate e indicizzabili, "
+             "e possono contenere elementi di tipo diverso.")
+
+
+class TestMainContentExtraction(unittest.TestCase):
+    """Classe di test per l'estrazione del contenuto principale da pagine con contorno."""
+
+    def test_boilerplate_is_removed(self):
+        """Banner dei cookie, barra laterale di link, articoli correlati e commenti vengono scartati con le loro immagini."""
+        html_content = f"""<html><head><title>Le liste</title></head><body>
+            <div class="cookie-banner">Usiamo i cookie per migliorare la tua esperienza. <a href="#">Accetta</a>
+                <img src="cookie.png"></div>
+            <div id="page" class="layout has-sidebar">
+                <div class="col-left"><a href="/1">Lezione 1</a><a href="/2">Lezione 2</a><a href="/3">Lezione 3</a>
+                    <img src="logo.png"></div>
+                <div class="post"><h1>Le liste</h1><p>{PARAGRAPH}</p>
+                    <img src="diagramma.png" alt="Struttura di una lista"><p>{PARAGRAPH}</p><p>{PARAGRAPH}</p></div>
+                <div class="related-posts"><h3>Articoli correlati</h3>
+                    <ul><li><a href="/a">Le tuple</a></li><li><a href="/b">I set</a></li></ul></div>
+                <section id="comments"><p>Ottimo articolo, grazie mille per la spiegazione chiara!</p>
+                    <img src="avatar.png"></section>
+            </div></body></html>"""
+        text, images = extract_text_and_images_from_html(html_content)
+        self.assertEqual(text, "\n".join(["Le liste"] + [PARAGRAPH] * 3))
+        self.assertEqual(images, [{'src': 'diagramma.png', 'alt': 'Struttura di una lista'}])
+
+    def test_heading_and_sibling_paragraphs_are_kept(self):
+        """Il titolo e i paragrafi lunghi accanto al contenitore migliore fanno parte del contenuto."""
+        html_content = (f"<body><div class='menu-top'><a href='/'>Home</a></div><h2>Introduzione</h2>"
+                        f"<div><p>{PARAGRAPH}</p><p>{PARAGRAPH}</p></div><p>{PARAGRAPH} In conclusione.</p>"
+                        f"<div><a href='/x'>Pagina successiva</a><a href='/y'>Indice</a></div></body>")
+        text, _ = extract_text_and_images_from_html(html_content)
+        self.assertEqual(text, "\n".join(["Introduzione", PARAGRAPH, PARAGRAPH, f"{PARAGRAPH} In conclusione."]))
+
+    def test_hidden_blocks_are_removed(self):
+        """I blocchi nascosti non fanno parte del testo."""
+        html_content = ("<p>Testo visibile</p><div style='display: none'>Popup nascosto</div>"
+                        "<div hidden>Altro</div><div aria-hidden='true'>Icone</div>")
+        text, _ = extract_text_and_images_from_html(html_content)
+        self.assertEqual(text, "Testo visibile")
+
+    def test_page_of_links_is_kept(self):
+        """Una risorsa fatta solo di link (es. un elenco di letture) non viene svuotata."""
+        html_content = ("<ul><li><a href='https://docs.python.org'>Documentazione di Python</a></li>"
+                        "<li><a href='https://peps.python.org'>Elenco delle PEP</a></li></ul>")
+        text, _ = extract_text_and_images_from_html(html_content)
+        self.assertEqual(text, "Documentazione di Python\nElenco delle PEP")
+
+    def test_highlighted_code_is_kept(self):
+        """I commenti del codice evidenziato (Prism, highlight.js) non vengono scambiati per contorno."""
+        html_content = (f"<div class='post'><p>{PARAGRAPH}</p>"
+                        "<pre><code class='language-python'><span class='token comment'># crea una lista</span>\n"
+                        "numeri = [1, 2, 3]</code></pre>"
+                        "<pre><code class='hljs'><span class='hljs-comment'># aggiunge un elemento</span>\n"
+                        "numeri.append(4)</code></pre></div>")
+        text, _ = extract_text_and_images_from_html(html_content)
+        self.assertIn("# crea una lista", text)
+        self.assertIn("# aggiunge un elemento", text)
+
+    def test_inline_spans_are_kept(self):
+        """Gli span in linea con classi come "share" o "menu" restano nel paragrafo."""
+        html_content = ("<p>Per salvare il file usa il <span class='menu'>menu File</span> e poi "
+                        "<span class='share'>Condividi</span> per inviarlo ai colleghi del corso.</p>")
+        text, _ = extract_text_and_images_from_html(html_content)
+        self.assertEqual(text, "Per salvare il file usa il\nmenu File\ne poi\nCondividi\nper inviarlo ai colleghi del corso.")
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -35,6 +35,10 @@ class TestImageDescriber(unittest.TestCase):
         # che respx andrà a intercettare.
         if "OPENAI_API_BASE_URL" in os.environ:
             del os.environ["OPENAI_API_BASE_URL"]
+        # Le attese tra un tentativo e l'altro non rallentano i test
+        sleep_patcher = patch('src.image_describer.time.sleep')
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
 
     @patch('src.image_describer.OpenAI')
     def test_initialization_with_api_key(self, mock_openai_constructor):
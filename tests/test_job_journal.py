@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo job_journal.py.
+
+Verifica la registrazione e la rilettura delle unità completate e la ripresa
+dei riassunti di sezione da un journal di un'esecuzione interrotta.
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.job_journal import JOURNAL_FILENAME, JobJournal
+from src.markdown_formatter import MarkdownFormatter
+from src.output_writer import WriteBehindWriter
+from src.prompt_manager import PromptManager
+from src.resume_generator import LessonInputs, RunServices, process_course, summarize_lesson_inputs
+
+
+class TestJobJournal(unittest.TestCase):
+    """Classe di test per JobJournal."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.journal_path = Path(self.test_dir.name) / "journal.jsonl"
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_record_and_replay(self):
+        """Le unità registrate sono disponibili a una nuova istanza del journal."""
+        key = JobJournal.make_key("section", "vtt", "gpt-4o-mini", "testo")
+        journal = JobJournal(self.journal_path)
+        journal.record("section", key, "Riassunto", {"total_tokens": 12})
+        journal.close()
+
+        replayed = JobJournal(self.journal_path)
+        self.assertEqual(len(replayed), 1)
+        self.assertEqual(replayed.get(key)["result"], "Riassunto")
+        self.assertEqual(replayed.replayed, 1)
+        self.assertIsNone(replayed.get(JobJournal.make_key("section", "pdf", "gpt-4o-mini", "testo")))
+
+    def test_truncated_line_is_ignored(self):
+        """Una riga troncata da un crash non impedisce la rilettura delle altre."""
+        journal = JobJournal(self.journal_path)
+        journal.record("image", "k1", "Descrizione")
+        journal.close()
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"kind": "section", "key": "k2", "res')
+
+        replayed = JobJournal(self.journal_path)
+        self.assertEqual(len(replayed), 1)
+        self.assertIsNotNone(replayed.get("k1"))
+
+    def test_discard_removes_file(self):
+        """discard() rimuove il journal a elaborazione completata."""
+        journal = JobJournal(self.journal_path)
+        journal.record("image", "k1", "Descrizione")
+        journal.discard()
+        self.assertFalse(self.journal_path.exists())
+
+
+class TestJournalReplay(unittest.TestCase):
+    """Ripresa dei riassunti di sezione dal journal."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.journal_path = Path(self.test_dir.name) / "journal.jsonl"
+        chapter_dir = Path("/corso/01 - Intro")
+        self.inputs = LessonInputs(vtt_file=chapter_dir / "01_Lezione.vtt", chapter_dir=chapter_dir, vtt_text="testo video")
+        self.prompt_manager = PromptManager()
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def _summarize(self, journal):
+        return summarize_lesson_inputs(self.inputs, MarkdownFormatter(), "test_key", self.prompt_manager, services=RunServices(journal=journal))
+
+    def test_completed_sections_are_not_requested_again(self):
+        """Dopo un riavvio, le sezioni già riassunte vengono riprese senza chiamare il modello."""
+        with patch("src.resume_generator.summarize_long_text", return_value=("Riassunto VTT", {"total_tokens": 20})):
+            summaries, tokens = self._summarize(JobJournal(self.journal_path))
+        self.assertEqual(tokens, 20)
+
+        with patch("src.resume_generator.summarize_long_text") as mock_summarize:
+            replayed_summaries, replayed_tokens = self._summarize(JobJournal(self.journal_path))
+
+        mock_summarize.assert_not_called()
+        self.assertEqual(replayed_summaries, summaries)
+        self.assertEqual(replayed_tokens, 0)
+
+    def test_error_results_are_not_recorded(self):
+        """I messaggi di errore non vengono registrati, così la chiamata viene ripetuta."""
+        journal = JobJournal(self.journal_path)
+        with patch("src.resume_generator.summarize_long_text", return_value=("Errore di connessione API OpenAI", None)):
+            self._summarize(journal)
+        self.assertEqual(len(journal), 0)
+
+
+class TestJournalDiscard(unittest.TestCase):
+    """Il journal del corso viene scartato solo quando tutti i file di output sono su disco."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.test_dir.name)
+        chapter_dir = self.root / "corso" / "01 - Intro"
+        chapter_dir.mkdir(parents=True)
+        (chapter_dir / "01_Lezione.vtt").write_text("WEBVTT\n\n00:00:01.000 --> 00:00:05.000\nCiao a tutti\n", encoding="utf-8")
+        self.output_dir = self.root / "out"
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def _process(self, failing_name=None):
+        real_replace = os.replace
+
+        def replace(source, destination):
+            if Path(destination).name == failing_name:
+                raise OSError("disco pieno")
+            return real_replace(source, destination)
+
+        with patch("src.resume_generator.summarize_long_text", return_value=("Riassunto", {"total_tokens": 10})), \
+             patch("src.resume_generator.create_image_describer", return_value=None), \
+             patch("src.output_writer.os.replace", side_effect=replace), \
+             WriteBehindWriter() as writer:
+            return process_course(str(self.root / "corso"), str(self.output_dir), MarkdownFormatter(), "chiave", PromptManager(), services=RunServices(writer=writer))
+
+    def test_journal_discarded_after_writes(self):
+        """Con tutte le scritture accodate completate, il journal viene rimosso."""
+        report = self._process()
+        self.assertEqual((report.lessons_processed, report.lessons_failed), (1, 0))
+        self.assertTrue((self.output_dir / "01 - Intro" / "01_Lezione.md").exists())
+        self.assertFalse((self.output_dir / JOURNAL_FILENAME).exists())
+
+    def test_failed_lesson_write_keeps_journal(self):
+        """Una scrittura in background fallita conta come lezione fallita e conserva il journal."""
+        report = self._process(failing_name="01_Lezione.md")
+        self.assertEqual((report.lessons_processed, report.lessons_failed), (0, 1))
+        self.assertTrue((self.output_dir / JOURNAL_FILENAME).exists())
+
+    def test_failed_index_write_keeps_journal(self):
+        """Anche un indice non scritto conserva il journal."""
+        report = self._process(failing_name="index.md")
+        self.assertEqual(report.lessons_failed, 0)
+        self.assertTrue((self.output_dir / JOURNAL_FILENAME).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
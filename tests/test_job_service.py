@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo job_service.py.
+
+Verifica il ciclo di vita dei job (accodato, in esecuzione, completato o
+fallito), il calcolo dell'avanzamento e l'API HTTP su TCP e su socket Unix.
+"""
+
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from src.job_service import JobService, create_server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """Connessione HTTP su socket Unix, per i test."""
+
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def _wait_for(service, job_id, timeout=5):
+    """Attende che un job termini e ne restituisce lo stato."""
+    for _ in range(int(timeout / 0.01)):
+        state = service.get(job_id)
+        if state["status"] in ("completed", "failed"):
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"Il job {job_id} non è terminato entro {timeout}s")
+
+
+class TestJobService(unittest.TestCase):
+    """Classe di test per JobService."""
+
+    def setUp(self):
+        self.release = threading.Event()
+
+        def slow_handler(params):
+            self.release.wait(timeout=5)
+            return {"echo": params["value"]}
+
+        def failing_handler(params):
+            raise RuntimeError("corso non trovato")
+
+        self.service = JobService(
+            {"slow": slow_handler, "fail": failing_handler},
+            max_concurrent_jobs=1,
+            progress_functions={"slow": lambda params: {"lessons_done": 1, "lessons_total": 2}}
+        )
+
+    def tearDown(self):
+        self.release.set()
+        self.service.shutdown()
+
+    def test_job_lifecycle_and_progress(self):
+        """Un job passa da running a completed; l'avanzamento è riportato durante l'esecuzione."""
+        first = self.service.submit("slow", {"value": 1})
+        second = self.service.submit("slow", {"value": 2})
+
+        for _ in range(500):
+            if self.service.get(first.job_id)["status"] == "running":
+                break
+            time.sleep(0.01)
+        running = self.service.get(first.job_id)
+        self.assertEqual(running["status"], "running")
+        self.assertEqual(running["progress"], {"lessons_done": 1, "lessons_total": 2})
+        self.assertEqual(self.service.get(second.job_id)["status"], "queued") # Un solo job alla volta
+
+        self.release.set()
+        self.assertEqual(_wait_for(self.service, first.job_id)["result"], {"echo": 1})
+        self.assertEqual(_wait_for(self.service, second.job_id)["result"], {"echo": 2})
+        self.assertEqual([job["id"] for job in self.service.list_jobs()], [first.job_id, second.job_id])
+
+    def test_failed_job(self):
+        """Un'eccezione del gestore rende il job 'failed' con il messaggio d'errore."""
+        job = self.service.submit("fail", {})
+        state = _wait_for(self.service, job.job_id)
+
+        self.assertEqual(state["status"], "failed")
+        self.assertEqual(state["error"], "corso non trovato")
+
+    def test_unknown_job_type(self):
+        """Un tipo di job non registrato solleva ValueError."""
+        with self.assertRaises(ValueError):
+            self.service.submit("sconosciuto", {})
+        self.assertIsNone(self.service.get("inesistente"))
+
+
+class TestJobServiceHTTP(unittest.TestCase):
+    """Classe di test per l'API HTTP del servizio."""
+
+    def setUp(self):
+        self.service = JobService({"echo": lambda params: {"echo": params.get("value")}})
+
+    def tearDown(self):
+        self.service.shutdown()
+
+    def _serve(self, server):
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def _request(self, connection, method, path, body=None):
+        payload = json.dumps(body) if body is not None else None
+        connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def _exercise_api(self, connection):
+        self.assertEqual(self._request(connection, "GET", "/health"), (200, {"status": "ok"}))
+
+        status, job = self._request(connection, "POST", "/jobs", {"type": "echo", "value": 42})
+        self.assertEqual(status, 202)
+        state = _wait_for(self.service, job["id"])
+        self.assertEqual(state["result"], {"echo": 42})
+
+        status, fetched = self._request(connection, "GET", f"/jobs/{job['id']}")
+        self.assertEqual((status, fetched["status"]), (200, "completed"))
+        status, listing = self._request(connection, "GET", "/jobs")
+        self.assertEqual([j["id"] for j in listing["jobs"]], [job["id"]])
+
+        self.assertEqual(self._request(connection, "POST", "/jobs", {"type": "sconosciuto"})[0], 400)
+        self.assertEqual(self._request(connection, "GET", "/jobs/inesistente")[0], 404)
+
+    def test_tcp_api(self):
+        """L'API risponde su una porta TCP locale."""
+        server = create_server(self.service, host="127.0.0.1", port=0)
+        self._serve(server)
+        self._exercise_api(http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5))
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Socket Unix non disponibili")
+    def test_unix_socket_api(self):
+        """L'API risponde su un socket Unix."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        socket_path = os.path.join(temp_dir.name, "jobs.sock")
+        server = create_server(self.service, unix_socket=socket_path)
+        self._serve(server)
+        self._exercise_api(_UnixHTTPConnection(socket_path))
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Socket Unix non disponibili")
+    def test_unix_socket_path_must_be_a_socket(self):
+        """Un file esistente indicato come socket non viene cancellato; un socket residuo sì."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        regular_file = os.path.join(temp_dir.name, "dati.txt")
+        with open(regular_file, "w", encoding="utf-8") as f:
+            f.write("da non cancellare")
+        with self.assertRaises(ValueError):
+            create_server(self.service, unix_socket=regular_file)
+        with open(regular_file, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "da non cancellare")
+
+        socket_path = os.path.join(temp_dir.name, "jobs.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close() # Il file del socket resta, come dopo un'interruzione
+        server = create_server(self.service, unix_socket=socket_path)
+        self._serve(server)
+        self.assertEqual(self._request(_UnixHTTPConnection(socket_path), "GET", "/health"), (200, {"status": "ok"}))
+
+    def test_negative_content_length_is_rejected(self):
+        """Un Content-Length negativo riceve subito 400 invece di bloccare il thread in lettura."""
+        server = create_server(self.service, host="127.0.0.1", port=0)
+        self._serve(server)
+        with socket.create_connection(("127.0.0.1", server.server_address[1]), timeout=5) as client:
+            client.sendall(b"POST /jobs HTTP/1.1\r\nHost: localhost\r\nContent-Length: -1\r\n\r\n")
+            status_line = client.makefile("rb").readline()
+        self.assertIn(b" 400 ", status_line)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo lesson_pipeline.py.
+
+Verifica l'ordine dei risultati, il limite sulle lezioni in attesa
+(backpressure), la gestione degli errori, l'estrazione su pool di processi e
+l'avvio delle lezioni dalla più costosa (longest job first).
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from src.lesson_pipeline import LessonPipeline, longest_first_order
+from src.resume_generator import IMAGE_COST_CHARS, LessonJob, estimate_lesson_cost
+
+
+def _square(job):
+    """Funzione di estrazione di modulo (serializzabile per il pool di processi)."""
+    return job * job
+
+
+def _fail_on_three(job):
+    if job == 3:
+        raise ValueError("estrazione fallita")
+    return job
+
+
+def _crash_on_three(job):
+    """Termina il processo di estrazione, come un crash del parser nativo."""
+    if job == 3:
+        os._exit(1)
+    return job
+
+
+class TestLessonPipeline(unittest.TestCase):
+    """Classe di test per LessonPipeline."""
+
+    def test_results_keep_job_order(self):
+        """I risultati rispettano l'ordine dei job anche se i riassunti terminano in ordine sparso."""
+        def summarize(job, extracted):
+            time.sleep(0.01 * (5 - job))
+            return extracted + 1
+
+        with LessonPipeline(extraction_workers=0, summary_workers=3) as pipeline:
+            results = pipeline.run(list(range(5)), _square, summarize, lambda job, summarized: (job, summarized))
+
+        self.assertEqual(results, [(0, 1), (1, 2), (2, 5), (3, 10), (4, 17)])
+
+    def test_backpressure_bounds_pending_jobs(self):
+        """Le lezioni estratte ma non ancora riassunte non superano max_pending."""
+        lock = threading.Lock()
+        state = {"pending": 0, "max_pending": 0}
+
+        def extract(job):
+            with lock:
+                state["pending"] += 1
+                state["max_pending"] = max(state["max_pending"], state["pending"])
+            return job
+
+        def summarize(job, extracted):
+            time.sleep(0.005)
+            with lock:
+                state["pending"] -= 1
+            return extracted
+
+        with LessonPipeline(extraction_workers=0, summary_workers=2, max_pending=3) as pipeline:
+            results = pipeline.run(list(range(20)), extract, summarize, lambda job, summarized: summarized)
+
+        self.assertEqual(results, list(range(20)))
+        self.assertLessEqual(state["max_pending"], 3)
+
+    def test_failed_job_yields_none(self):
+        """Un errore in uno stadio non interrompe gli altri job."""
+        written = []
+
+        def write(job, summarized):
+            written.append(job)
+            return summarized
+
+        with LessonPipeline(extraction_workers=0, summary_workers=2) as pipeline:
+            results = pipeline.run([1, 2, 3, 4], _fail_on_three, lambda job, extracted: extracted, write)
+
+        self.assertEqual(results, [1, 2, None, 4])
+        self.assertNotIn(3, written)
+
+    def test_process_pool_extraction(self):
+        """L'estrazione può essere eseguita su un pool di processi riutilizzato tra più run."""
+        with LessonPipeline(extraction_workers=2, summary_workers=2) as pipeline:
+            first = pipeline.run([1, 2, 3], _square, lambda job, extracted: extracted, lambda job, summarized: summarized)
+            second = pipeline.run([4], _square, lambda job, extracted: extracted, lambda job, summarized: summarized)
+
+        self.assertEqual(first, [1, 4, 9])
+        self.assertEqual(second, [16])
+
+    def test_broken_pool_is_recreated(self):
+        """Un processo di estrazione terminato fa fallire i suoi job, non le esecuzioni successive."""
+        with LessonPipeline(extraction_workers=1, summary_workers=1, max_pending=1) as pipeline:
+            crashed = pipeline.run([3], _crash_on_three, lambda job, extracted: extracted, lambda job, summarized: summarized)
+            after_crash = pipeline.run([1, 2], _square, lambda job, extracted: extracted, lambda job, summarized: summarized)
+
+        self.assertEqual(crashed, [None])
+        self.assertEqual(after_crash, [1, 4])
+
+    def test_invalid_configuration(self):
+        """Una configurazione non valida solleva ValueError."""
+        with self.assertRaises(ValueError):
+            LessonPipeline(summary_workers=0)
+        with self.assertRaises(ValueError):
+            LessonPipeline(extraction_workers=-1)
+
+
+class TestLongestJobFirst(unittest.TestCase):
+    """Avvio delle lezioni dalla più costosa e stima del costo delle lezioni."""
+
+    def setUp(self):
+        self.chapter_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.chapter_dir)
+
+    def test_costly_jobs_start_first(self):
+        """Con cost_fn i job partono dal più costoso, ma i risultati restano nell'ordine canonico."""
+        started = []
+
+        def extract(job):
+            started.append(job)
+            return job
+
+        costs = {"a": 1, "b": 90, "c": 5, "d": 90}
+        with LessonPipeline(extraction_workers=0, summary_workers=1) as pipeline:
+            results = pipeline.run(list(costs), extract, lambda job, extracted: extracted.upper(),
+                                   lambda job, summarized: summarized, cost_fn=costs.get)
+
+        self.assertEqual(started, ["b", "d", "c", "a"])
+        self.assertEqual(results, ["A", "B", "C", "D"])
+
+    def test_cost_estimation_errors(self):
+        """Un job con stima del costo non riuscita viene avviato per ultimo."""
+        def cost(job):
+            if job == 2:
+                raise OSError("file non leggibile")
+            return job
+        self.assertEqual(longest_first_order([1, 2, 3], cost), [2, 0, 1])
+
+    def test_estimate_lesson_cost(self):
+        """Il costo cresce con la trascrizione, gli allegati e le immagini degli HTML."""
+        short_vtt = self.chapter_dir / "01_Intro.vtt"
+        short_vtt.write_text("WEBVTT\n\n00:00:01.000 --> 00:00:05.000\nCiao\n", encoding="utf-8")
+        long_vtt = self.chapter_dir / "02_Lezione.vtt"
+        long_vtt.write_text("WEBVTT\n\n" + "00:00:01.000 --> 00:00:05.000\nTesto della lezione\n\n" * 500, encoding="utf-8")
+        base_cost = estimate_lesson_cost(LessonJob(long_vtt, self.chapter_dir))
+        self.assertGreater(base_cost, estimate_lesson_cost(LessonJob(short_vtt, self.chapter_dir)))
+
+        (self.chapter_dir / "02_note.html").write_text('<p>Note</p><img src="a.png"><IMG src="b.png">', encoding="utf-8")
+        with_images = estimate_lesson_cost(LessonJob(long_vtt, self.chapter_dir))
+        self.assertGreater(with_images - base_cost, 2 * IMAGE_COST_CHARS)
+
+
+if __name__ == '__main__':
+    unittest.main()
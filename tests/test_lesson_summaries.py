@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test per la fase di riassunto delle lezioni (summarize_lesson_inputs).
+
+Verifica che i riassunti dei diversi tipi di contenuto vengano richiesti in
+parallelo, mantenendo il conteggio dei token e i messaggi di fallback.
+"""
+
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from src.markdown_formatter import MarkdownFormatter
+from src.resume_generator import ExtractedDocument, LessonInputs, summarize_lesson_inputs
+
+
+def _lesson_inputs(**kwargs):
+    chapter_dir = Path("/corso/01 - Intro")
+    return LessonInputs(vtt_file=chapter_dir / "01_Lezione.vtt", chapter_dir=chapter_dir, **kwargs)
+
+
+class TestSummarizeLessonInputs(unittest.TestCase):
+    """Classe di test per summarize_lesson_inputs."""
+
+    def setUp(self):
+        self.formatter = MarkdownFormatter()
+        self.prompt_manager = MagicMock()
+
+    def _summarize(self, inputs):
+        return summarize_lesson_inputs(inputs, self.formatter, "test_key", self.prompt_manager)
+
+    def test_content_types_summarized_concurrently(self):
+        """Le chiamate per VTT, PDF e HTML sono in volo contemporaneamente."""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_summarize(text, content_type, **kwargs):
+            barrier.wait() # Fallisce per timeout se le chiamate fossero sequenziali
+            return f"Riassunto {content_type}", {"total_tokens": 10}
+
+        inputs = _lesson_inputs(
+            vtt_text="testo video",
+            pdf_documents=[ExtractedDocument(Path("slide.pdf"), text="testo pdf")],
+            html_documents=[ExtractedDocument(Path("note.html"), text="testo html")],
+        )
+        with patch("src.resume_generator.summarize_long_text", side_effect=fake_summarize):
+            summaries, tokens = self._summarize(inputs)
+
+        self.assertEqual(summaries, {
+            "vtt": "Riassunto vtt",
+            "pdf": "Riassunto pdf",
+            "html": "Riassunto html",
+            "orphan_material": None,
+        })
+        self.assertEqual(tokens, 30)
+
+    def test_vtt_error_fallback(self):
+        """Un errore nel riassunto VTT produce il messaggio di fallback senza bloccare le altre sezioni."""
+        def fake_summarize(text, content_type, **kwargs):
+            if content_type == "vtt":
+                raise RuntimeError("timeout")
+            return "Riassunto PDF", {"total_tokens": 7}
+
+        inputs = _lesson_inputs(
+            vtt_text="testo video",
+            pdf_documents=[ExtractedDocument(Path("slide.pdf"), text="testo pdf")],
+        )
+        with patch("src.resume_generator.summarize_long_text", side_effect=fake_summarize):
+            summaries, tokens = self._summarize(inputs)
+
+        self.assertEqual(summaries["vtt"], "Errore durante l'elaborazione del file VTT: timeout")
+        self.assertEqual(summaries["pdf"], "Riassunto PDF")
+        self.assertEqual(tokens, 7)
+
+    def test_empty_contents_are_not_summarized(self):
+        """Senza testo non viene effettuata alcuna chiamata e restano i messaggi di fallback."""
+        inputs = _lesson_inputs(
+            vtt_text="   ",
+            pdf_documents=[ExtractedDocument(Path("vuoto.pdf"), text="")],
+        )
+        with patch("src.resume_generator.summarize_long_text") as mock_summarize:
+            summaries, tokens = self._summarize(inputs)
+
+        mock_summarize.assert_not_called()
+        self.assertEqual(summaries["vtt"], "Nessun contenuto VTT fornito o contenuto vuoto.")
+        self.assertEqual(summaries["pdf"], "Nessun contenuto PDF fornito o contenuto vuoto.")
+        self.assertIsNone(summaries["html"])
+        self.assertEqual(tokens, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
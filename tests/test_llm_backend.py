@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo llm_backend.py.
+
+Verifica l'instradamento dei tipi di contenuto sui backend (anche in base
+alla dimensione dell'input), il caricamento della configurazione, la stima dei
+costi e l'uso del backend da parte di summarize_with_openai e di ImageDescriber.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from src.image_describer import ImageDescriber
+from src.llm_backend import BackendRouter, LLMBackend, LOCAL_API_KEY_PLACEHOLDER
+from src.prompt_manager import PromptManager
+from src.rate_limiter import RateLimiter
+from src.resume_generator import RunServices, _SectionSummaryTask, _run_section_summary, summarize_with_openai
+
+# Regole opzionali per le immagini: le piccole al modello rapido a basso dettaglio
+_LOW_DETAIL_IMAGE_RULES = [
+    {"max_input_size": 150_000, "model": "gpt-4o-mini", "detail": "low", "max_tokens": 300},
+    {"detail": "high", "max_tokens": 700},
+]
+
+def _completion(content: str = "Riassunto"):
+    usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=500, total_tokens=1500)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+class TestLLMBackend(unittest.TestCase):
+    """Classe di test per LLMBackend."""
+
+    def test_estimate_cost(self):
+        """Il costo è calcolato dai prezzi per milione di token."""
+        backend = LLMBackend("openai", "gpt-4o-mini", input_cost_per_million=0.15, output_cost_per_million=0.6)
+        cost = backend.estimate_cost({"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500})
+        self.assertAlmostEqual(cost, 0.00045)
+
+    def test_estimate_cost_with_cached_tokens(self):
+        """I token del prompt letti dalla cache sono fatturati al prezzo ridotto, se configurato."""
+        usage = {"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500, "cached_tokens": 800}
+        backend = LLMBackend("openai", "gpt-4o-mini", input_cost_per_million=0.15, output_cost_per_million=0.6,
+                             cached_input_cost_per_million=0.075)
+        self.assertAlmostEqual(backend.estimate_cost(usage), 0.00039)
+        without_cache_price = LLMBackend("openai", "gpt-4o-mini", input_cost_per_million=0.15, output_cost_per_million=0.6)
+        self.assertAlmostEqual(without_cache_price.estimate_cost(usage), 0.00045)
+
+    def test_estimate_cost_without_prices_or_usage(self):
+        """Senza prezzi configurati o senza utilizzo il costo non è stimato."""
+        self.assertIsNone(LLMBackend("local", "qwen").estimate_cost({"prompt_tokens": 10, "completion_tokens": 5}))
+        self.assertIsNone(LLMBackend("openai", "gpt-4o-mini", input_cost_per_million=1.0).estimate_cost(None))
+
+    def test_resolve_api_key(self):
+        """Un server locale senza chiave riceve un segnaposto; OpenAI usa la chiave del processo."""
+        self.assertEqual(LLMBackend("openai", "gpt-4o-mini").resolve_api_key("chiave"), "chiave")
+        self.assertEqual(LLMBackend("local", "qwen", base_url="http://localhost:8000/v1").resolve_api_key("chiave"), LOCAL_API_KEY_PLACEHOLDER)
+        self.assertEqual(LLMBackend("altro", "m", api_key="propria").resolve_api_key("chiave"), "propria")
+
+    def test_own_limiter_replaces_shared_one(self):
+        """Un backend con max_concurrent usa un limitatore proprio."""
+        shared = RateLimiter(max_concurrent=8)
+        local = LLMBackend("local", "qwen", base_url="http://localhost:8000/v1", max_concurrent=2)
+        self.assertIsNot(local.select_limiter(shared), shared)
+        self.assertEqual(local.select_limiter(shared).max_concurrent, 2)
+        self.assertIs(LLMBackend("openai", "gpt-4o-mini").select_limiter(shared), shared)
+
+    def test_invalid_backend(self):
+        """Modello mancante o prezzi negativi sollevano ValueError."""
+        with self.assertRaises(ValueError):
+            LLMBackend("openai", "")
+        with self.assertRaises(ValueError):
+            LLMBackend("openai", "gpt-4o-mini", input_cost_per_million=-1)
+
+
+class TestBackendRouter(unittest.TestCase):
+    """Classe di test per BackendRouter."""
+
+    def test_default_router(self):
+        """Il router predefinito usa OPENAI_MODEL_NAME per il testo e gpt-4o per le immagini."""
+        with patch.dict(os.environ, {"OPENAI_MODEL_NAME": "gpt-test"}):
+            router = BackendRouter.default_router()
+        self.assertEqual(router.for_content_type("vtt").model, "gpt-test")
+        self.assertEqual(router.for_content_type("image").model, "gpt-4o")
+        self.assertFalse(router.for_content_type("orphan_material").is_local)
+
+    def test_routes_from_config(self):
+        """I tipi di contenuto vengono instradati secondo le regole, gli altri sul default."""
+        router = BackendRouter.from_config({
+            "backends": {"local": {"base_url": "http://localhost:8000/v1", "model": "qwen"}},
+            "routes": {"orphan_material": "local"},
+        })
+        self.assertEqual(router.for_content_type("orphan_material").name, "local")
+        self.assertEqual(router.for_content_type("vtt").name, "openai")
+        self.assertEqual(router.for_content_type("image").name, "openai-vision")
+
+    def test_partial_override_of_default_backend(self):
+        """Un backend predefinito può essere ridefinito solo in parte (es. i prezzi)."""
+        router = BackendRouter.from_config({"backends": {"openai-vision": {"input_cost_per_million": 2.5}}})
+        backend = router.for_content_type("image")
+        self.assertEqual(backend.model, "gpt-4o")
+        self.assertEqual(backend.input_cost_per_million, 2.5)
+
+    def test_api_key_from_environment(self):
+        """api_key_env legge la chiave da una variabile d'ambiente."""
+        with patch.dict(os.environ, {"LOCAL_LLM_KEY": "segreta"}):
+            router = BackendRouter.from_config({"backends": {"local": {"base_url": "http://h/v1", "model": "m", "api_key_env": "LOCAL_LLM_KEY"}}})
+        self.assertEqual(router.backends["local"].api_key, "segreta")
+
+    def test_invalid_config(self):
+        """Regole verso backend inesistenti e opzioni sconosciute sollevano ValueError."""
+        with self.assertRaises(ValueError):
+            BackendRouter.from_config({"routes": {"pdf": "inesistente"}})
+        with self.assertRaises(ValueError):
+            BackendRouter.from_config({"default": "inesistente"})
+        with self.assertRaises(ValueError):
+            BackendRouter.from_config({"backends": {"local": {"model": "m", "temperatura": 0.2}}})
+
+    def test_route_by_input_size(self):
+        """La prima regola compatibile con la dimensione dell'input determina modello e parametri."""
+        router = BackendRouter.from_config({
+            "backends": {"local": {"base_url": "http://localhost:8000/v1", "model": "qwen"}},
+            "routes": {"orphan_material": [
+                {"max_input_size": 1000, "backend": "local", "max_tokens": 200},
+                {"temperature": 0.2},
+            ]},
+        })
+        small = router.route("orphan_material", 500)
+        self.assertEqual((small.backend.name, small.model, small.max_tokens, small.rule_index), ("local", "qwen", 200, 0))
+        large = router.route("orphan_material", 5000)
+        self.assertEqual((large.backend.name, large.temperature, large.max_tokens, large.rule_index), ("openai", 0.2, None, 1))
+        # Dimensione sconosciuta: si applicano solo le regole senza limite
+        self.assertEqual(router.route("orphan_material").rule_index, 1)
+
+    def test_default_image_routes(self):
+        """Senza configurazione tutte le immagini usano gpt-4o ad alto dettaglio, qualunque sia la dimensione."""
+        router = BackendRouter.default_router()
+        small = router.route("image", 20_000)
+        self.assertEqual((small.model, small.detail, small.max_tokens), ("gpt-4o", "high", 700))
+        large = router.route("image", 2_000_000)
+        self.assertEqual((large.model, large.detail, large.max_tokens), ("gpt-4o", "high", 700))
+        self.assertEqual(router.route("image").detail, "high")
+
+    def test_low_detail_image_rule_is_opt_in(self):
+        """Il basso dettaglio per le immagini piccole si attiva con una regola configurata."""
+        router = BackendRouter.from_config({"routes": {"image": _LOW_DETAIL_IMAGE_RULES}})
+        small = router.route("image", 20_000)
+        self.assertEqual((small.model, small.detail, small.max_tokens), ("gpt-4o-mini", "low", 300))
+        self.assertEqual(router.route("image", 2_000_000).model, "gpt-4o")
+
+    def test_configured_route_replaces_default_rules(self):
+        """Una regola configurata per un tipo di contenuto sostituisce quelle predefinite."""
+        router = BackendRouter.from_config({"routes": {"image": "openai-vision"}})
+        decision = router.route("image", 1000)
+        self.assertEqual((decision.model, decision.detail), ("gpt-4o", None))
+
+    def test_invalid_rule(self):
+        """Un livello di dettaglio o un'opzione sconosciuti e un budget di compressione non positivo sollevano ValueError."""
+        with self.assertRaises(ValueError):
+            BackendRouter.from_config({"routes": {"image": [{"detail": "medio"}]}})
+        with self.assertRaises(ValueError):
+            BackendRouter.from_config({"routes": {"vtt": [{"modello": "x"}]}})
+        with self.assertRaises(ValueError):
+            BackendRouter.from_config({"routes": {"vtt": [{"compress_tokens": 0}]}})
+
+    def test_requires_openai_key(self):
+        """La chiave OpenAI non serve se ogni tipo di contenuto va su un server locale."""
+        self.assertTrue(BackendRouter.default_router().requires_openai_key())
+        offline = BackendRouter.from_config({
+            "default": "local",
+            "backends": {"local": {"base_url": "http://localhost:8000/v1", "model": "qwen"}},
+            "routes": {"image": "local"},
+        })
+        self.assertFalse(offline.requires_openai_key())
+
+    def test_from_file(self):
+        """La configurazione viene letta da un file JSON; un file mancante solleva ValueError."""
+        with tempfile.TemporaryDirectory() as test_dir:
+            config_path = Path(test_dir) / "llm.json"
+            config_path.write_text(json.dumps({"backends": {"local": {"base_url": "http://h/v1", "model": "m"}}, "routes": {"pdf": "local"}}))
+            router = BackendRouter.from_file(config_path)
+            self.assertEqual(router.for_content_type("pdf").base_url, "http://h/v1")
+            with self.assertRaises(ValueError):
+                BackendRouter.from_file(Path(test_dir) / "mancante.json")
+
+
+class TestBackendCalls(unittest.TestCase):
+    """Verifica che le chiamate al modello usino endpoint e modello del backend."""
+
+    @patch('src.resume_generator.openai.OpenAI')
+    def test_summarize_uses_backend(self, mock_openai_constructor):
+        """summarize_with_openai usa URL base, modello e prezzi del backend."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = _completion()
+        mock_openai_constructor.return_value = mock_client
+        tracker = MagicMock()
+        backend = LLMBackend("local", "qwen", base_url="http://localhost:8001/v1", input_cost_per_million=1.0, output_cost_per_million=2.0)
+
+        summary, _ = summarize_with_openai("testo", "chiave", PromptManager(), langfuse_tracker=tracker, backend=backend)
+
+        self.assertEqual(summary, "Riassunto")
+        mock_openai_constructor.assert_called_once_with(api_key=LOCAL_API_KEY_PLACEHOLDER, base_url="http://localhost:8001/v1")
+        self.assertEqual(mock_client.chat.completions.create.call_args.kwargs["model"], "qwen")
+        tracked = tracker.track_llm_call.call_args.kwargs
+        self.assertEqual(tracked["model"], "qwen")
+        self.assertAlmostEqual(tracked["cost_usd"], 0.002)
+
+    @patch('src.resume_generator.openai.OpenAI')
+    def test_summarize_applies_route(self, mock_openai_constructor):
+        """summarize_with_openai applica modello, max_tokens e temperatura della decisione."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = _completion()
+        mock_openai_constructor.return_value = mock_client
+        router = BackendRouter.from_config({"routes": {"pdf": [{"max_input_size": 100, "model": "gpt-rapido", "max_tokens": 50, "temperature": 0.1}]}})
+
+        summarize_with_openai("testo", "chiave", PromptManager(), content_type="pdf", route=router.route("pdf", 5))
+
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        self.assertEqual((kwargs["model"], kwargs["max_tokens"], kwargs["temperature"]), ("gpt-rapido", 50, 0.1))
+
+    def test_section_routing_decision_is_tracked(self):
+        """La decisione di instradamento di una sezione viene registrata sul tracker e passata al riassunto."""
+        tracker = MagicMock()
+        router = BackendRouter.default_router()
+        task = _SectionSummaryTask("orphan_material", "Materiale", "breve frammento", "del materiale orfano")
+        with patch("src.resume_generator.summarize_long_text", return_value=("Riassunto", None)) as mock_summarize:
+            _run_section_summary(task, "chiave", PromptManager(), tracker, "Cap", "Lez", services=RunServices(backend_router=router))
+
+        decision = tracker.track_routing_decision.call_args.args[0]
+        self.assertEqual(decision["content_type"], "orphan_material")
+        self.assertEqual(decision["input_size"], len(task.text))
+        self.assertEqual(decision["max_tokens"], 400)
+        self.assertEqual(mock_summarize.call_args.kwargs["route"].max_tokens, 400)
+
+    @patch('src.image_describer.OpenAI')
+    def test_image_describer_applies_route(self, mock_openai_constructor):
+        """ImageDescriber usa modello, dettaglio e max_tokens della decisione di instradamento."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = _completion("Un'icona")
+        mock_openai_constructor.return_value = mock_client
+        router = BackendRouter.from_config({"routes": {"image": _LOW_DETAIL_IMAGE_RULES}})
+        describer = ImageDescriber(api_key="chiave", backend=router.for_content_type("image"))
+
+        describer.describe_image_url("/tmp/icona.png", route=router.route("image", 4_000))
+
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs["model"], "gpt-4o-mini")
+        self.assertEqual(kwargs["max_tokens"], 300)
+        self.assertEqual(kwargs["messages"][0]["content"][1]["image_url"]["detail"], "low")
+        mock_openai_constructor.assert_called_once() # Stesso backend: nessun client aggiuntivo
+
+    @patch('src.image_describer.OpenAI')
+    def test_image_describer_uses_backend(self, mock_openai_constructor):
+        """ImageDescriber usa il modello e l'endpoint del backend delle immagini."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = _completion("Un diagramma")
+        mock_openai_constructor.return_value = mock_client
+        backend = LLMBackend("local-vision", "llava", base_url="http://localhost:8002/v1")
+
+        describer = ImageDescriber(api_key="chiave", backend=backend)
+        description = describer.describe_image_url("http://example.com/img.png")
+
+        self.assertEqual(description, "Un diagramma")
+        mock_openai_constructor.assert_called_once_with(api_key=LOCAL_API_KEY_PLACEHOLDER, base_url="http://localhost:8002/v1")
+        self.assertEqual(mock_client.chat.completions.create.call_args.kwargs["model"], "llava")
+
+
+if __name__ == '__main__':
+    unittest.main()
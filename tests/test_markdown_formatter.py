@@ -86,5 +86,11 @@ class TestMarkdownFormatter(unittest.TestCase):
         """Verifica che il metodo horizontal_rule restituisca una linea orizzontale Markdown."""
         self.assertEqual(self.formatter.horizontal_rule(), "---")
 
+    def test_format_lesson_section(self):
+        """Verifica la formattazione di una sezione di lezione, con errori resi come blockquote."""
+        self.assertEqual(self.formatter.format_lesson_section("Titolo", " Testo "), "## Titolo\nTesto\n\n")
+        self.assertEqual(self.formatter.format_lesson_section("Titolo", "Errore X"), "## Titolo\n> Errore X\n\n")
+        self.assertEqual(self.formatter.format_lesson_section("Titolo", None), "")
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo output_writer.py.
+
+Verifica la scrittura in streaming su file temporaneo e la rinomina atomica
+nella destinazione finale, oltre alla scrittura in streaming dei riassunti.
+"""
+
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from src.output_writer import (
+    STALE_TEMP_AGE_S,
+    StreamingMarkdownFile,
+    WriteBehindWriter,
+    copy_stripped_text,
+    remove_stale_temp_files,
+    temp_path_for,
+    write_text_atomic,
+    _WriteRequest,
+)
+from src.markdown_formatter import MarkdownFormatter
+from src.prompt_manager import PromptManager
+from src.resume_generator import _finish_lesson, summarize_with_openai
+
+
+def _chunk(content=None, usage=None):
+    """Costruisce un chunk di streaming simile a quelli restituiti dal client OpenAI."""
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class TestStreamingMarkdownFile(unittest.TestCase):
+    """Classe di test per StreamingMarkdownFile."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.final_path = Path(self.test_dir.name) / "capitolo" / "lezione.md"
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_commit_renames_temp_file(self):
+        """Il contenuto è visibile solo sul file temporaneo fino al commit."""
+        with StreamingMarkdownFile(self.final_path) as stream:
+            stream.write("# Titolo\n")
+            self.assertTrue(stream.temp_path.exists())
+            self.assertFalse(self.final_path.exists())
+            self.assertEqual(stream.temp_path.read_text(encoding="utf-8"), "# Titolo\n")
+        self.assertEqual(self.final_path.read_text(encoding="utf-8"), "# Titolo\n")
+        self.assertFalse(stream.temp_path.exists())
+
+    def test_exception_leaves_no_output(self):
+        """Un'eccezione durante la scrittura rimuove il file temporaneo e non crea la destinazione."""
+        with self.assertRaises(RuntimeError):
+            with StreamingMarkdownFile(self.final_path) as stream:
+                stream.write("contenuto parziale")
+                raise RuntimeError("interruzione")
+        self.assertFalse(self.final_path.exists())
+        self.assertEqual(list(self.final_path.parent.iterdir()), [])
+
+    def test_section_reset_and_finish(self):
+        """reset scarta i token del tentativo, finish sostituisce l'intera sezione."""
+        with StreamingMarkdownFile(self.final_path) as stream:
+            stream.write("frontmatter\n")
+            section = stream.begin_section("## Sezione\n")
+            section.write("token èà ")
+            section.reset()
+            section.write("nuovo ")
+            self.assertEqual(stream.temp_path.read_text(encoding="utf-8"), "frontmatter\n## Sezione\nnuovo ")
+            section.finish("## Sezione\ndefinitivo\n\n")
+        self.assertEqual(self.final_path.read_text(encoding="utf-8"), "frontmatter\n## Sezione\ndefinitivo\n\n")
+
+
+class TestStreamingSummary(unittest.TestCase):
+    """Classe di test per la modalità streaming di summarize_with_openai."""
+
+    @patch('src.resume_generator.openai.OpenAI')
+    def test_tokens_written_as_they_arrive(self, mock_openai_constructor):
+        """I token vengono scritti sulla sezione e l'usage dell'ultimo chunk viene restituito."""
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=3, total_tokens=13)
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = iter(
+            [_chunk("Uno "), _chunk("due "), _chunk("tre"), _chunk(usage=usage)]
+        )
+        mock_openai_constructor.return_value = mock_client
+        sink = MagicMock()
+
+        summary, token_usage = summarize_with_openai(
+            "testo", "chiave", PromptManager(), stream_sink=sink
+        )
+
+        self.assertEqual(summary, "Uno due tre")
+        self.assertEqual(token_usage["total_tokens"], 13)
+        sink.reset.assert_called_once()
+        self.assertEqual([c.args[0] for c in sink.write.call_args_list], ["Uno ", "due ", "tre"])
+        _, kwargs = mock_client.chat.completions.create.call_args
+        self.assertTrue(kwargs["stream"])
+
+
+class TestWriteBehindWriter(unittest.TestCase):
+    """Classe di test per WriteBehindWriter e le scritture atomiche."""
+
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.test_dir.name)
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_submit_writes_files_atomically(self):
+        """I file accodati vengono scritti nella destinazione senza lasciare temporanei."""
+        with WriteBehindWriter() as writer:
+            futures = [writer.submit(self.output_dir / "cap" / f"{i}.md", f"contenuto {i}") for i in range(5)]
+            writer.flush()
+            self.assertTrue(all(future.done() for future in futures))
+
+        for i in range(5):
+            self.assertEqual((self.output_dir / "cap" / f"{i}.md").read_text(encoding="utf-8"), f"contenuto {i}")
+        self.assertEqual(list(self.output_dir.rglob(".*.tmp")), [])
+
+    def test_batch_syncs_own_files_and_directories(self):
+        """Un batch sincronizza i propri file temporanei e una volta ciascuna le directory, senza os.sync."""
+        requests = [_WriteRequest(self.output_dir / f"cap{i % 2}" / f"{i}.md", "x", None) for i in range(4)]
+        with WriteBehindWriter(batch_size=10) as writer, \
+                patch("src.output_writer._sync_files") as mock_sync, \
+                patch("src.output_writer._sync_directories") as mock_sync_dirs, \
+                patch("os.sync", create=True) as mock_global_sync:
+            writer._write_batch(requests)
+
+        mock_global_sync.assert_not_called()
+        mock_sync.assert_called_once()
+        self.assertEqual(len(list(mock_sync.call_args.args[0])), 4)
+        self.assertEqual(set(mock_sync_dirs.call_args.args[0]), {self.output_dir / "cap0", self.output_dir / "cap1"})
+        self.assertEqual(len(list(self.output_dir.rglob("*.md"))), 4)
+        self.assertTrue(all(request.future.done() for request in requests))
+
+    def test_failed_background_write_marks_lesson(self):
+        """Il LessonResult di una lezione accodata riporta l'esito della scrittura in background."""
+        blocker = self.output_dir / "file"
+        blocker.write_text("non una directory")
+        with WriteBehindWriter() as writer:
+            failed = _finish_lesson(MarkdownFormatter(), "Lezione", {"vtt": "Riassunto"}, 3, {}, blocker / "lezione.md", writer=writer)
+            written = _finish_lesson(MarkdownFormatter(), "Lezione", {"vtt": "Riassunto"}, 3, {}, self.output_dir / "ok.md", writer=writer)
+            self.assertFalse(failed.wait_written())
+            self.assertTrue(written.wait_written())
+        self.assertTrue((self.output_dir / "ok.md").exists())
+
+    def test_submit_file_renames_streamed_file(self):
+        """Un file in streaming staccato con detach() viene completato dal writer."""
+        final_path = self.output_dir / "lezione.md"
+        stream = StreamingMarkdownFile(final_path).open()
+        stream.write("# Lezione\n")
+        with WriteBehindWriter() as writer:
+            future = writer.submit_file(stream.detach(), final_path)
+            self.assertEqual(future.result(timeout=5), final_path)
+        self.assertEqual(final_path.read_text(encoding="utf-8"), "# Lezione\n")
+
+    def test_failed_write_sets_exception(self):
+        """Un errore di scrittura viene riportato nel Future senza fermare il writer."""
+        blocker = self.output_dir / "file"
+        blocker.write_text("non una directory")
+        with WriteBehindWriter() as writer:
+            failed = writer.submit(blocker / "lezione.md", "testo")
+            ok = writer.submit(self.output_dir / "ok.md", "testo")
+            self.assertIsInstance(failed.exception(timeout=5), OSError)
+            self.assertEqual(ok.result(timeout=5), self.output_dir / "ok.md")
+
+    def test_stale_temp_files_removed(self):
+        """Solo i temporanei di processi terminati (o molto vecchi) vengono rimossi, i file finali no."""
+        final_path = self.output_dir / "cap" / "lezione.md"
+        write_text_atomic(final_path, "completo")
+        finished = subprocess.Popen([sys.executable, "-c", "pass"])
+        finished.wait()
+        stale = final_path.with_name(f".lezione.md.{finished.pid}.0.tmp")
+        stale.write_text("troncato")
+        legacy = final_path.with_name(f".lezione.md.{finished.pid}.tmp") # Formato senza contatore
+        legacy.write_text("troncato")
+        own = temp_path_for(final_path)
+        own.write_text("in corso")
+        other_job = final_path.with_name(f".lezione.md.{os.getppid()}.3.tmp") # Processo ancora attivo
+        other_job.write_text("in corso")
+        abandoned = final_path.with_name(f".indice.md.{os.getppid()}.4.tmp")
+        abandoned.write_text("vecchio")
+        old_time = time.time() - STALE_TEMP_AGE_S - 60
+        os.utime(abandoned, (old_time, old_time))
+        cached = self.output_dir / ".cache" / f".voce.json.{finished.pid}.0.tmp"
+        cached.parent.mkdir()
+        cached.write_text("in scrittura")
+
+        self.assertEqual(remove_stale_temp_files(self.output_dir, skip_dirnames=(".cache",)), 3)
+        self.assertFalse(stale.exists())
+        self.assertFalse(legacy.exists())
+        self.assertFalse(abandoned.exists())
+        self.assertTrue(own.exists())
+        self.assertTrue(other_job.exists())
+        self.assertTrue(cached.exists())
+        self.assertEqual(final_path.read_text(encoding="utf-8"), "completo")
+
+    def test_concurrent_atomic_writes_to_same_path(self):
+        """Più thread che scrivono la stessa destinazione usano temporanei distinti."""
+        final_path = self.output_dir / "lezione.md"
+        self.assertNotEqual(temp_path_for(final_path), temp_path_for(final_path))
+        errors = []
+
+        def write(index):
+            try:
+                for _ in range(20):
+                    write_text_atomic(final_path, f"contenuto {index}\n" * 100)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        lines = set(final_path.read_text(encoding="utf-8").splitlines())
+        self.assertEqual(len(lines), 1) # Il contenuto di una sola scrittura, mai mescolato
+        self.assertEqual(list(self.output_dir.glob(".*.tmp")), [])
+
+
+class TestCopyStrippedText(unittest.TestCase):
+    """Classe di test per copy_stripped_text."""
+
+    def _copy(self, text, chunk_size):
+        chunks = []
+        written = copy_stripped_text(io.StringIO(text), chunks.append, chunk_size=chunk_size)
+        self.assertEqual(written, len("".join(chunks)))
+        return "".join(chunks)
+
+    def test_equivalent_to_strip(self):
+        """Il risultato coincide con strip() per qualsiasi dimensione del blocco."""
+        text = "\n\n  ## Sezione\nriga uno\n\n   \nriga due  \n\n\n"
+        for chunk_size in (1, 3, 7, 1024):
+            self.assertEqual(self._copy(text, chunk_size), text.strip())
+
+    def test_only_whitespace(self):
+        """Un contenuto di soli spazi non produce alcuna scrittura."""
+        self.assertEqual(self._copy(" \n\t\n ", 2), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
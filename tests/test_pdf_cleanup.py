@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo pdf_cleanup.py.
+
+Verifica la rimozione delle intestazioni e dei piè di pagina ripetuti, la
+compressione delle pagine di build delle slide e le statistiche del risparmio,
+anche sul testo estratto da un PDF reale.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from src.pdf_cleanup import clean_slide_pages, find_repeated_edge_lines
+from src.resume_generator import extract_text_from_pdf
+
+
+def slide(body: str, number: int, total: int = 6) -> str:
+    return f"Corso Python - Modulo 2\n{body}\n© Academy {number}/{total}"
+
+
+class TestCleanSlidePages(unittest.TestCase):
+    """Classe di test per clean_slide_pages."""
+
+    def test_headers_footers_and_build_pages(self):
+        """Intestazioni, piè di pagina numerati e pagine di build vengono rimossi; il contenuto resta."""
+        pages = [
+            slide("Le liste", 1),
+            slide("Le liste\n- sono mutabili", 2),
+            slide("Le liste\n- sono mutabili\n- sono ordinate", 3),
+            slide("I dizionari\n- chiave e valore", 4),
+            slide("Le tuple\n- sono immutabili", 5),
+            slide("Riepilogo\nCorso Python - Modulo 2 nel testo", 6),
+        ]
+        cleaned, stats = clean_slide_pages(pages)
+
+        self.assertEqual(cleaned, [
+            "Le liste\n- sono mutabili\n- sono ordinate",
+            "I dizionari\n- chiave e valore",
+            "Le tuple\n- sono immutabili",
+            "Riepilogo\nCorso Python - Modulo 2 nel testo", # La stessa riga, ma non in cima: resta
+        ])
+        self.assertEqual((stats.pages, stats.pages_kept, stats.build_pages_removed), (6, 4, 2))
+        self.assertEqual(stats.repeated_lines_removed, 12)
+        self.assertEqual(stats.bytes_saved, stats.bytes_before - len("\n\n".join(cleaned).encode("utf-8")))
+        self.assertGreater(stats.bytes_saved / stats.bytes_before, 0.5)
+        self.assertEqual(stats.tokens_saved, stats.bytes_saved // 4)
+
+    def test_short_documents_keep_their_lines(self):
+        """Con meno di tre pagine nessuna riga è considerata un'intestazione."""
+        pages = ["Titolo\nPrimo concetto", "Titolo\nSecondo concetto"]
+        self.assertEqual(find_repeated_edge_lines([p.splitlines() for p in pages]), set())
+        cleaned, stats = clean_slide_pages(pages)
+        self.assertEqual(cleaned, pages)
+        self.assertEqual(stats.bytes_saved, 0)
+
+    def test_identical_pages_are_collapsed(self):
+        """Pagine identiche consecutive vengono conservate una sola volta."""
+        cleaned, stats = clean_slide_pages(["Domande?", "Domande?"])
+        self.assertEqual(cleaned, ["Domande?"])
+        self.assertEqual(stats.build_pages_removed, 1)
+
+
+class TestSlidePdfExtraction(unittest.TestCase):
+    """Pulizia applicata al testo estratto da un PDF di slide."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = Path(self.temp_dir.name) / "slide.pdf"
+        pdf = canvas.Canvas(str(self.pdf_path), pagesize=letter)
+        bullets = ["Le funzioni", "- def definisce una funzione", "- return restituisce un valore"]
+        slides = [bullets[:count] for count in range(1, 4)] + [["I moduli"], ["I pacchetti"], ["Domande?"]]
+        for number, lines in enumerate(slides, start=1):
+            pdf.drawString(72, 750, "Corso Python")
+            for row, line in enumerate(lines):
+                pdf.drawString(72, 700 - row * 20, line)
+            pdf.drawString(72, 40, f"Pagina {number}")
+            pdf.showPage()
+        pdf.save()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_extract_text_from_slides(self):
+        """Il testo estratto contiene solo l'ultima pagina di build, senza intestazioni e numeri di pagina."""
+        text = extract_text_from_pdf(self.pdf_path)
+        self.assertEqual(text.count("Le funzioni"), 1)
+        self.assertIn("- return restituisce un valore", text)
+        self.assertNotIn("Corso Python", text)
+        self.assertNotIn("Pagina", text)
+        self.assertIn("I pacchetti", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo prompt_manager.py.
+
+Verifica la divisione del prompt in un prefisso di sistema stabile e in un
+suffisso con il testo da riassumere; verifica inoltre che i token letti dalla
+cache del provider siano registrati.
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from src.llm_backend import token_usage_from_response
+from src.prompt_manager import PromptManager
+from src.resume_generator import summarize_with_openai
+
+
+class TestPromptManager(unittest.TestCase):
+    """Classe di test per PromptManager."""
+
+    def test_system_prefix_is_stable(self):
+        """Il prefisso di sistema è identico tra chiamate e istanze diverse; solo il messaggio utente cambia."""
+        first = PromptManager().get_lesson_messages("Prima trascrizione")
+        second = PromptManager().get_lesson_messages("Seconda trascrizione, più lunga")
+
+        self.assertEqual([m["role"] for m in first], ["system", "user"])
+        self.assertEqual(first[0], second[0])
+        self.assertNotIn("Prima trascrizione", first[0]["content"])
+        self.assertIn("Prima trascrizione", first[1]["content"])
+        self.assertNotEqual(first[1], second[1])
+
+    def test_system_prefix_contains_only_instructions(self):
+        """Il prefisso di sistema è il template delle istruzioni, senza riempimento."""
+        system_prompt = PromptManager().get_system_prompt()
+        template = PromptManager().registry.get("system_practical_theoretical_face_to_face")
+        self.assertEqual(system_prompt, template.render())
+
+    def test_unsupported_lesson_type(self):
+        """Un tipo di lezione sconosciuto solleva ValueError."""
+        with self.assertRaises(ValueError):
+            PromptManager().get_lesson_messages("testo", lesson_type="tipo_sconosciuto")
+
+
+class TestCachedTokens(unittest.TestCase):
+    """Verifica la registrazione dei token del prompt letti dalla cache del provider."""
+
+    def test_token_usage_from_response(self):
+        """cached_tokens è letto da prompt_tokens_details, se presente."""
+        usage = SimpleNamespace(prompt_tokens=1500, completion_tokens=200, total_tokens=1700,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1280))
+        self.assertEqual(token_usage_from_response(usage)["cached_tokens"], 1280)
+        plain_usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        self.assertNotIn("cached_tokens", token_usage_from_response(plain_usage))
+
+    @patch('src.resume_generator.openai.OpenAI')
+    def test_summarize_sends_prefix_and_tracks_cached_tokens(self, mock_openai_constructor):
+        """summarize_with_openai invia il prefisso come messaggio di sistema e registra i token in cache."""
+        usage = SimpleNamespace(prompt_tokens=1500, completion_tokens=200, total_tokens=1700,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1280))
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Riassunto"))], usage=usage)
+        mock_openai_constructor.return_value = mock_client
+        tracker = MagicMock()
+        prompt_manager = PromptManager()
+
+        summary, token_usage = summarize_with_openai("testo della lezione", "chiave-cache", prompt_manager, langfuse_tracker=tracker)
+
+        self.assertEqual(summary, "Riassunto")
+        messages = mock_client.chat.completions.create.call_args.kwargs["messages"]
+        self.assertEqual(messages[0], {"role": "system", "content": prompt_manager.get_system_prompt()})
+        self.assertIn("testo della lezione", messages[1]["content"])
+        self.assertEqual(token_usage["cached_tokens"], 1280)
+        self.assertEqual(tracker.track_llm_call.call_args.kwargs["token_usage"]["cached_tokens"], 1280)
+
+
+if __name__ == '__main__':
+    unittest.main()
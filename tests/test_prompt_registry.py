@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo prompt_registry.py.
+
+Verifica il caricamento e la compilazione dei template da file, le impronte
+(che cambiano solo quando cambia il prompt interessato), la scelta del template
+per tipo di contenuto e la rigenerazione delle lezioni prodotte con prompt diversi.
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.markdown_formatter import MarkdownFormatter
+from src.prompt_manager import DEFAULT_PROMPTS_DIR, PromptManager
+from src.prompt_registry import PromptRegistry, PromptTemplate
+from src.resume_generator import (
+    LessonInputs,
+    build_lesson_frontmatter,
+    is_lesson_output_current,
+    lesson_prompt_content_types,
+    read_prompt_fingerprints,
+)
+
+
+class TestPromptTemplate(unittest.TestCase):
+    """Classe di test per PromptTemplate."""
+
+    def test_render_matches_str_format(self):
+        """La resa del template compilato coincide con str.format, graffe letterali comprese."""
+        text = "Testo:\n{lesson_transcript}\nJSON: {{\"a\": 1}} fine {lesson_transcript}"
+        template = PromptTemplate.compile("prova", text)
+        self.assertEqual(template.fields, ("lesson_transcript",))
+        self.assertEqual(template.render(lesson_transcript="abc"), text.format(lesson_transcript="abc"))
+
+    def test_missing_value(self):
+        """Un segnaposto senza valore solleva ValueError."""
+        with self.assertRaises(ValueError):
+            PromptTemplate.compile("prova", "{lesson_transcript}").render()
+
+    def test_unsupported_placeholders(self):
+        """Segnaposto posizionali, con attributi o specifiche di formato non sono ammessi."""
+        for text in ("{}", "{0}", "{a.b}", "{a:>10}", "{a!r}", "{aperta"):
+            with self.assertRaises(ValueError, msg=text):
+                PromptTemplate.compile("prova", text)
+
+    def test_fingerprint_depends_only_on_text(self):
+        """L'impronta è stabile e cambia con il testo."""
+        self.assertEqual(PromptTemplate.compile("a", "testo").fingerprint, PromptTemplate.compile("b", "testo").fingerprint)
+        self.assertNotEqual(PromptTemplate.compile("a", "testo").fingerprint, PromptTemplate.compile("a", "testo!").fingerprint)
+
+
+class TestPromptRegistry(unittest.TestCase):
+    """Classe di test per PromptRegistry e per le impronte di PromptManager."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.prompts_dir = Path(self.temp_dir.name) / "prompts"
+        shutil.copytree(DEFAULT_PROMPTS_DIR, self.prompts_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_from_directory(self):
+        """Tutti i template della directory sono caricati, per nome."""
+        registry = PromptRegistry.from_directory(self.prompts_dir)
+        for name in ("system_practical_theoretical_face_to_face", "vtt", "pdf", "html", "orphan_material", "reduce"):
+            self.assertIn(name, registry)
+        with self.assertRaises(ValueError):
+            registry.get("inesistente")
+        with self.assertRaises(ValueError):
+            PromptRegistry.from_directory(Path(self.temp_dir.name) / "mancante")
+
+    def test_templates_per_content_type(self):
+        """Ogni tipo di contenuto ha il proprio template; i tipi sconosciuti usano quello delle trascrizioni."""
+        manager = PromptManager(self.prompts_dir)
+        pdf_user = manager.get_lesson_messages("testo", content_type="pdf")[1]["content"]
+        vtt_user = manager.get_lesson_messages("testo", content_type="vtt")[1]["content"]
+        self.assertIn("PDF", pdf_user)
+        self.assertNotEqual(pdf_user, vtt_user)
+        self.assertEqual(manager.get_lesson_messages("testo", content_type="sconosciuto")[1]["content"], vtt_user)
+        reduce_user = manager.get_reduce_messages(["parte uno", "parte due"])[1]["content"]
+        self.assertIn("parte uno\n\nparte due", reduce_user)
+
+    def test_fingerprint_changes_only_with_affected_prompt(self):
+        """Modificare il template PDF cambia solo l'impronta del PDF; il prefisso di sistema cambia tutte le impronte."""
+        before = PromptManager(self.prompts_dir)
+        (self.prompts_dir / "pdf.txt").write_text("Slide:\n{lesson_transcript}\n", encoding="utf-8")
+        after_pdf = PromptManager(self.prompts_dir)
+
+        self.assertEqual(before.fingerprint("vtt"), after_pdf.fingerprint("vtt"))
+        self.assertNotEqual(before.fingerprint("pdf"), after_pdf.fingerprint("pdf"))
+        self.assertNotEqual(before.section_fingerprints()["pdf"], after_pdf.section_fingerprints()["pdf"])
+        self.assertEqual(before.section_fingerprints(["vtt", "html"]), after_pdf.section_fingerprints(["vtt", "html"]))
+        self.assertNotEqual(before.version, after_pdf.version)
+
+        system_file = self.prompts_dir / "system_practical_theoretical_face_to_face.txt"
+        system_file.write_text(system_file.read_text(encoding="utf-8") + "- Sii breve.\n", encoding="utf-8")
+        after_system = PromptManager(self.prompts_dir)
+        self.assertNotEqual(after_pdf.fingerprint("vtt"), after_system.fingerprint("vtt"))
+
+    def test_reduce_template_does_not_affect_lessons(self):
+        """Il template della fase di unione non fa parte dell'impronta delle lezioni."""
+        before = PromptManager(self.prompts_dir)
+        (self.prompts_dir / "reduce.txt").write_text("Unisci:\n{partial_summaries}\n", encoding="utf-8")
+        after = PromptManager(self.prompts_dir)
+        self.assertEqual(before.section_fingerprints(), after.section_fingerprints())
+        self.assertNotEqual(before.version, after.version)
+
+
+class TestLessonPromptFingerprint(unittest.TestCase):
+    """Rigenerazione delle lezioni generate con prompt diversi."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lesson_file = Path(self.temp_dir.name) / "01_Lezione.md"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_fingerprint_in_frontmatter(self):
+        """Le impronte delle sezioni registrate nel frontmatter vengono rilette dal file della lezione."""
+        frontmatter = build_lesson_frontmatter(MarkdownFormatter(), "01_Lezione", True, prompt_fingerprints={"vtt": "abc123", "pdf": "fed321"})
+        self.lesson_file.write_text(frontmatter + "## Riassunto\n\nprompt_fingerprint_html: nel corpo\n", encoding="utf-8")
+        self.assertEqual(read_prompt_fingerprints(self.lesson_file), {"vtt": "abc123", "pdf": "fed321"})
+
+    def test_is_lesson_output_current(self):
+        """Un file generato con prompt diversi va rigenerato; uno senza impronte (precedente) no."""
+        self.assertFalse(is_lesson_output_current(self.lesson_file, {"vtt": "abc123"}))
+
+        self.lesson_file.write_text(build_lesson_frontmatter(MarkdownFormatter(), "01_Lezione", prompt_fingerprints={"vtt": "abc123"}), encoding="utf-8")
+        self.assertTrue(is_lesson_output_current(self.lesson_file, {"vtt": "abc123", "pdf": "fed321"}))
+        self.assertFalse(is_lesson_output_current(self.lesson_file, {"vtt": "def456", "pdf": "fed321"}))
+
+        self.lesson_file.write_text(build_lesson_frontmatter(MarkdownFormatter(), "01_Lezione"), encoding="utf-8")
+        self.assertTrue(is_lesson_output_current(self.lesson_file, {"vtt": "def456"}))
+
+    def test_pdf_template_change_skips_lessons_without_pdf(self):
+        """Modificare il template dei PDF rigenera solo le lezioni che hanno una sezione PDF."""
+        prompts_dir = Path(self.temp_dir.name) / "prompts"
+        shutil.copytree(DEFAULT_PROMPTS_DIR, prompts_dir)
+        before = PromptManager(prompts_dir)
+        vtt_only = LessonInputs(Path("01_Lezione.vtt"), Path("."), vtt_text="Ciao a tutti")
+        self.assertEqual(lesson_prompt_content_types(vtt_only), ["vtt"])
+        with_pdf = Path(self.temp_dir.name) / "02_Lezione.md"
+        self.lesson_file.write_text(build_lesson_frontmatter(MarkdownFormatter(), "01_Lezione", prompt_fingerprints=before.section_fingerprints(["vtt"])), encoding="utf-8")
+        with_pdf.write_text(build_lesson_frontmatter(MarkdownFormatter(), "02_Lezione", prompt_fingerprints=before.section_fingerprints(["vtt", "pdf"])), encoding="utf-8")
+
+        (prompts_dir / "pdf.txt").write_text("Slide:\n{lesson_transcript}\n", encoding="utf-8")
+        after = PromptManager(prompts_dir).section_fingerprints()
+
+        self.assertTrue(is_lesson_output_current(self.lesson_file, after))
+        self.assertFalse(is_lesson_output_current(with_pdf, after))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo rate_limiter.py.
+
+Verifica il limite sulle richieste contemporanee, la spaziatura imposta dal
+limite di richieste al minuto, le statistiche raccolte e il controllo adattivo
+(AIMD) del limite in base a latenza ed errori 429, anche attraverso un client
+OpenAI reale con risposte HTTP simulate.
+"""
+
+import threading
+import time
+import unittest
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import openai
+from openai import OpenAI
+
+from src.image_describer import ImageDescriber
+from src.prompt_manager import PromptManager
+from src.rate_limiter import (
+    MIN_WINDOW_SAMPLES,
+    RETRY_MAX_DELAY_S,
+    AdaptiveRateLimiter,
+    RateLimiter,
+    client_max_retries,
+    is_rate_limit_error,
+    is_retryable_status,
+    retry_delay_s,
+)
+from src.resume_generator import get_openai_client, summarize_with_openai
+
+
+class _RateLimitError(Exception):
+    """Errore di prova con lo stato HTTP 429, come openai.RateLimitError."""
+    status_code = 429
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Classe di test per RateLimiter."""
+
+    def test_max_concurrent_requests(self):
+        """Le richieste in volo non superano max_concurrent."""
+        limiter = RateLimiter(max_concurrent=2)
+        lock = threading.Lock()
+        state = {"in_flight": 0, "max_in_flight": 0}
+
+        def request():
+            with limiter:
+                with lock:
+                    state["in_flight"] += 1
+                    state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+                time.sleep(0.01)
+                with lock:
+                    state["in_flight"] -= 1
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(state["max_in_flight"], 2)
+        stats = limiter.get_stats()
+        self.assertEqual(stats["requests"], 8)
+        self.assertEqual(stats["max_in_flight"], 2)
+
+    def test_requests_per_minute_spacing(self):
+        """Con un limite al minuto, le richieste consecutive sono distanziate."""
+        limiter = RateLimiter(max_concurrent=4, requests_per_minute=1200) # Una richiesta ogni 50 ms
+        start = time.monotonic()
+        for _ in range(3):
+            with limiter:
+                pass
+        elapsed = time.monotonic() - start
+
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertGreater(limiter.get_stats()["wait_seconds"], 0.0)
+
+    def test_slot_released_on_error(self):
+        """Un'eccezione durante la richiesta libera comunque lo slot."""
+        limiter = RateLimiter(max_concurrent=1)
+        with self.assertRaises(RuntimeError):
+            with limiter:
+                raise RuntimeError("errore API")
+
+        acquired = threading.Event()
+
+        def request():
+            with limiter:
+                acquired.set()
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        self.assertTrue(acquired.wait(timeout=2))
+        thread.join()
+
+    def test_invalid_configuration(self):
+        """Una configurazione non valida solleva ValueError."""
+        with self.assertRaises(ValueError):
+            RateLimiter(max_concurrent=0)
+        with self.assertRaises(ValueError):
+            RateLimiter(requests_per_minute=0)
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    """Classe di test per AdaptiveRateLimiter."""
+
+    def _fill_window(self, limiter, latency_s):
+        # Una finestra completa di richieste con il limite saturo
+        limiter._window_saturated = True
+        for _ in range(max(MIN_WINDOW_SAMPLES, limiter.limit)):
+            limiter.observe(latency_s)
+
+    def test_additive_increase_with_stable_latency(self):
+        """Con latenza stabile e limite saturo il limite sale di uno per finestra, fino al massimo."""
+        changes = []
+        limiter = AdaptiveRateLimiter(max_concurrent=6, initial_concurrent=4,
+                                      on_limit_change=lambda *change: changes.append(change))
+        for _ in range(4):
+            self._fill_window(limiter, 1.0)
+        self.assertEqual(limiter.limit, 6)
+        self.assertEqual(changes, [(4, 5, "latency_stable"), (5, 6, "latency_stable")])
+
+        # Senza saturazione il limite non sale
+        limiter = AdaptiveRateLimiter(max_concurrent=6, initial_concurrent=2)
+        for _ in range(MIN_WINDOW_SAMPLES):
+            limiter.observe(1.0)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_multiplicative_decrease(self):
+        """Un errore 429 dimezza il limite, un picco di latenza lo riduce; mai sotto il minimo."""
+        limiter = AdaptiveRateLimiter(max_concurrent=16, initial_concurrent=12)
+        self._fill_window(limiter, 1.0) # Riferimento del p95: 1 s
+        self.assertEqual(limiter.limit, 13)
+
+        limiter.observe(0.5, rate_limited=True)
+        self.assertEqual(limiter.limit, 6)
+        self._fill_window(limiter, 5.0) # p95 oltre il doppio del riferimento
+        self.assertEqual(limiter.limit, 5)
+        for _ in range(5):
+            limiter.observe(0.5, rate_limited=True)
+        self.assertEqual(limiter.limit, 1)
+
+        stats = limiter.get_stats()
+        self.assertEqual((stats["concurrency_limit"], stats["peak_concurrency_limit"], stats["rate_limited"]), (1, 13, 6))
+        self.assertEqual(stats["p95_latency_s"], 3.0) # Spostato verso il p95 del picco
+
+    def test_recovers_after_permanent_latency_shift(self):
+        """Un aumento permanente della latenza (testi più lunghi) riduce il limite una volta, poi il limite risale."""
+        changes = []
+        limiter = AdaptiveRateLimiter(max_concurrent=16, initial_concurrent=8,
+                                      on_limit_change=lambda *change: changes.append(change))
+        for _ in range(3):
+            self._fill_window(limiter, 1.0)
+        self.assertEqual(limiter.limit, 11)
+
+        for _ in range(6):
+            self._fill_window(limiter, 20.0) # Nuovo livello della latenza, senza sovraccarico
+        reasons = [reason for _, _, reason in changes]
+        self.assertEqual(reasons.count("latency_spike"), 1)
+        self.assertEqual(reasons[-5:], ["latency_stable"] * 5)
+        self.assertEqual(limiter.limit, 13)
+
+    def test_burst_of_429_from_same_overload(self):
+        """I 429 delle richieste avviate prima della riduzione non riducono di nuovo il limite."""
+        limiter = AdaptiveRateLimiter(max_concurrent=16, initial_concurrent=8)
+        started = time.monotonic()
+        limiter.observe(0.1, rate_limited=True, started_at=started)
+        limiter.observe(0.1, rate_limited=True, started_at=started)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.get_stats()["limit_decreases"], 1)
+
+    def test_limit_applies_to_requests_in_flight(self):
+        """Le richieste in volo non superano il limite corrente; un 429 nel context manager lo riduce."""
+        limiter = AdaptiveRateLimiter(max_concurrent=8, initial_concurrent=2)
+        lock = threading.Lock()
+        state = {"in_flight": 0, "max_in_flight": 0}
+
+        def request():
+            with limiter:
+                with lock:
+                    state["in_flight"] += 1
+                    state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+                time.sleep(0.01)
+                with lock:
+                    state["in_flight"] -= 1
+
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(state["max_in_flight"], 2)
+
+        with self.assertRaises(_RateLimitError):
+            with limiter:
+                raise _RateLimitError("Too Many Requests")
+        self.assertEqual(limiter.limit, 1)
+        with self.assertRaises(RuntimeError):
+            with limiter:
+                raise RuntimeError("errore API") # Errore non legato al carico: limite invariato
+        self.assertEqual(limiter.limit, 1)
+        self.assertTrue(is_rate_limit_error(_RateLimitError()))
+        self.assertFalse(is_rate_limit_error(None))
+        with self.assertRaises(ValueError):
+            AdaptiveRateLimiter(max_concurrent=2, min_concurrent=3)
+
+
+def _completion_json(content):
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Classe di test per i tentativi delle richieste fallite."""
+
+    def test_retry_delay(self):
+        """Attesa esponenziale, Retry-After della risposta se presente, mai oltre il massimo."""
+        self.assertEqual([retry_delay_s(None, attempt) for attempt in range(3)], [2.0, 4.0, 8.0])
+        self.assertEqual(retry_delay_s(None, 10), RETRY_MAX_DELAY_S)
+        response = httpx.Response(429, headers={"Retry-After": "7"})
+        self.assertEqual(retry_delay_s(SimpleNamespace(response=response), 0), 7.0)
+        response = httpx.Response(429, headers={"retry-after-ms": "1500"})
+        self.assertEqual(retry_delay_s(SimpleNamespace(response=response), 0), 1.5)
+        response = httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})
+        self.assertEqual(retry_delay_s(SimpleNamespace(response=response), 1), 4.0)
+
+    def test_retryable_status(self):
+        """Solo timeout, conflitti, 429 ed errori del server vengono ripetuti."""
+        self.assertEqual([is_retryable_status(code) for code in (400, 401, 404, 408, 409, 429, 500, 503)],
+                         [False, False, False, True, True, True, True, True])
+        self.assertFalse(is_retryable_status(None))
+
+    def test_sdk_retries_kept_without_adaptive_limiter(self):
+        """Il client rinuncia ai propri tentativi solo con il limitatore adattivo."""
+        self.assertIsNone(client_max_retries(None))
+        self.assertIsNone(client_max_retries(RateLimiter()))
+        self.assertEqual(client_max_retries(AdaptiveRateLimiter()), 0)
+        self.assertEqual(get_openai_client("chiave-default").max_retries, openai.DEFAULT_MAX_RETRIES)
+
+
+class TestRateLimitedClient(unittest.TestCase):
+    """Un 429 di un client OpenAI reale raggiunge il limitatore adattivo senza tentativi interni del client."""
+
+    def setUp(self):
+        self.requests = []
+        self.responses = [
+            httpx.Response(429, headers={"Retry-After": "7"}, json={"error": {"message": "Rate limit reached", "type": "requests"}}),
+            httpx.Response(200, json=_completion_json("Riassunto")),
+        ]
+
+        def handler(request):
+            self.requests.append(request)
+            return self.responses[min(len(self.requests), len(self.responses)) - 1]
+
+        # Costruttore reale, con le richieste HTTP servite dal gestore di prova
+        self.openai_constructor = partial(OpenAI, http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+        self.limiter = AdaptiveRateLimiter(max_concurrent=8, initial_concurrent=4)
+
+    def test_summary_client_does_not_retry(self):
+        """Il 429 riduce subito il limite e il nuovo tentativo è quello di _request_summary."""
+        with patch("src.resume_generator.openai.OpenAI", self.openai_constructor), \
+                patch("src.resume_generator.time.sleep") as mock_sleep:
+            self.assertEqual(get_openai_client("chiave", max_retries=client_max_retries(self.limiter)).max_retries, 0)
+            summary, _ = summarize_with_openai("testo", "chiave", PromptManager(), rate_limiter=self.limiter)
+
+        self.assertEqual(summary, "Riassunto")
+        self.assertEqual(len(self.requests), 2) # Un 429 e un successo, nessun tentativo del client
+        self.assertEqual(self.limiter.limit, 2)
+        mock_sleep.assert_called_once_with(7.0) # Retry-After della risposta
+
+    def test_summary_non_retryable_error(self):
+        """Un errore 400 non viene ripetuto."""
+        self.responses = [httpx.Response(400, json={"error": {"message": "Richiesta non valida", "type": "invalid_request_error"}})]
+        with patch("src.resume_generator.openai.OpenAI", self.openai_constructor), \
+                patch("src.resume_generator.time.sleep") as mock_sleep:
+            summary, _ = summarize_with_openai("testo", "chiave", PromptManager(), rate_limiter=self.limiter)
+
+        self.assertIn("Status 400", summary)
+        self.assertEqual(len(self.requests), 1)
+        mock_sleep.assert_not_called()
+
+    def test_image_describer_client_does_not_retry(self):
+        """Anche le descrizioni delle immagini ripetono la richiesta fuori dal client e dallo slot."""
+        with patch("src.image_describer.OpenAI", self.openai_constructor), \
+                patch("src.image_describer.time.sleep") as mock_sleep:
+            describer = ImageDescriber(api_key="chiave", rate_limiter=self.limiter)
+            description = describer.describe_image_url("http://example.com/img.png")
+
+        self.assertEqual(description, "Riassunto")
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.limiter.limit, 2)
+        mock_sleep.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
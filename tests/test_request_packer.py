@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo request_packer.py.
+
+Verifica la validazione delle risposte JSON, la ripartizione dei token, il
+raggruppamento dei testi brevi inviati da più thread (con i limiti di budget e
+la ricaduta sulle richieste singole) e l'uso del packer nella fase di riassunto.
+"""
+
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from src.llm_backend import BackendRouter
+from src.prompt_manager import PromptManager
+from src.request_packer import PackedItem, RequestPacker, merge_usage, parse_packed_response, split_usage
+from src.resume_generator import RunServices, _SectionSummaryTask, _run_section_summary, summarize_packed_items
+
+
+def _answer_all(context, items, skip=()):
+    """send di prova: un riassunto per ogni testo, tranne quelli in skip."""
+    response = {item.item_id: f"Riassunto di {item.text}" for item in items if item.text not in skip}
+    return json.dumps(response), {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140}
+
+
+def _run_concurrently(packer, texts, group="g"):
+    """Invia i testi al packer da thread diversi e restituisce i risultati per testo."""
+    results = {}
+    barrier = threading.Barrier(len(texts))
+
+    def worker(text):
+        barrier.wait()
+        results[text] = packer.summarize(text, "orphan_material", group)
+
+    threads = [threading.Thread(target=worker, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestPackedResponse(unittest.TestCase):
+    """Classe di test per la validazione delle risposte e la ripartizione dei token."""
+
+    def test_parse_packed_response(self):
+        """Vengono accettati solo i riassunti non vuoti degli id inviati, anche in un blocco di codice."""
+        response = '```json\n{"1": "Primo", "2": "  ", "3": 7, "9": "Estraneo"}\n```'
+        self.assertEqual(parse_packed_response(response, ["1", "2", "3", "4"]), {"1": "Primo"})
+        self.assertEqual(parse_packed_response("non è JSON", ["1"]), {})
+        self.assertEqual(parse_packed_response('["Primo"]', ["1"]), {})
+        self.assertEqual(parse_packed_response(None, ["1"]), {})
+
+    def test_split_and_merge_usage(self):
+        """I token del prompt seguono la lunghezza dei testi, quelli del completamento la lunghezza dei riassunti."""
+        items = [PackedItem("1", "pdf", "a" * 300, summary="x" * 30), PackedItem("2", "pdf", "b" * 100, summary=None)]
+        first, second = split_usage({"prompt_tokens": 400, "completion_tokens": 60, "total_tokens": 460}, items)
+        self.assertEqual(first, {"prompt_tokens": 300, "completion_tokens": 60, "total_tokens": 360})
+        self.assertEqual(second, {"prompt_tokens": 100, "completion_tokens": 0, "total_tokens": 100})
+        self.assertEqual(split_usage(None, items), [None, None])
+        self.assertEqual(merge_usage(second, {"total_tokens": 50})["total_tokens"], 150)
+        self.assertEqual(merge_usage(None, {"total_tokens": 50}), {"total_tokens": 50})
+
+
+class TestRequestPacker(unittest.TestCase):
+    """Classe di test per RequestPacker."""
+
+    def test_concurrent_texts_share_one_request(self):
+        """I testi inviati insieme diventano una richiesta; quello mancante nella risposta ricade sulla richiesta singola."""
+        send = MagicMock(side_effect=lambda context, items: _answer_all(context, items, skip=("testo 3",)))
+        packer = RequestPacker(send, linger_s=5, lone_linger_s=5)
+        texts = [f"testo {i}" for i in range(6)]
+        packer.max_items = len(texts) # Il lotto si chiude appena arriva l'ultimo testo
+
+        results = _run_concurrently(packer, texts)
+
+        send.assert_called_once()
+        self.assertEqual(results["testo 0"][0], "Riassunto di testo 0")
+        self.assertIsNone(results["testo 3"][0])
+        self.assertIsNotNone(results["testo 3"][1]) # La quota del prompt resta contabilizzata
+        self.assertEqual(sum(usage["total_tokens"] for _, usage in results.values()), 140)
+        self.assertEqual(packer.get_stats(), {"requests": 1, "items_packed": 5, "items_fallback": 1})
+
+    def test_token_budget_splits_batches(self):
+        """Un testo che supera il budget residuo del lotto apre un nuovo lotto."""
+        send = MagicMock(side_effect=_answer_all)
+        packer = RequestPacker(send, token_budget=60, max_item_tokens=30, linger_s=0.2, lone_linger_s=0.2)
+        texts = [f"{i}" * 100 for i in range(4)] # 26 token stimati ciascuno: due per lotto
+        results = _run_concurrently(packer, texts)
+        self.assertEqual(send.call_count, 2)
+        self.assertTrue(all(summary is not None for summary, _ in results.values()))
+        self.assertFalse(packer.accepts("x" * 200))
+        self.assertFalse(packer.accepts("   "))
+
+    def test_single_text_and_failed_request(self):
+        """Un lotto con un solo testo non viene inviato; una richiesta fallita fa ricadere tutti i testi."""
+        send = MagicMock(side_effect=RuntimeError("timeout"))
+        packer = RequestPacker(send, linger_s=0.05)
+        self.assertEqual(packer.summarize("testo isolato", "html", "g"), (None, None))
+        send.assert_not_called()
+
+        packer.max_items, packer.linger_s, packer.lone_linger_s = 2, 5, 5
+        results = _run_concurrently(packer, ["uno", "due"])
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual([summary for summary, _ in results.values()], [None, None])
+        self.assertEqual(packer.get_stats()["items_fallback"], 2)
+        with self.assertRaises(ValueError):
+            RequestPacker(send, token_budget=100, max_item_tokens=200)
+
+    def test_lone_text_does_not_wait(self):
+        """Senza altri testi in corso il testo non attende tutto linger_s."""
+        send = MagicMock(side_effect=_answer_all)
+        packer = RequestPacker(send, linger_s=5)
+        started = time.monotonic()
+        self.assertEqual(packer.summarize("testo isolato", "html", "g"), (None, None))
+        self.assertLess(time.monotonic() - started, 1)
+        send.assert_not_called()
+
+    def test_leader_waits_while_other_texts_are_active(self):
+        """Con altri testi in corso il primo testo di un lotto attende quelli che arrivano dopo."""
+        release = threading.Event()
+        sent_groups = []
+
+        def send(context, items):
+            sent_groups.append(context)
+            if context == "b":
+                release.wait(5) # Richiesta in volo: i suoi testi restano in corso
+            return _answer_all(context, items)
+
+        packer = RequestPacker(send, linger_s=5, max_items=2)
+        results = {}
+
+        def run(text, group):
+            results[text] = packer.summarize(text, "html", group, context=group)
+
+        busy = [threading.Thread(target=run, args=(text, "b")) for text in ("b1", "b2")]
+        for thread in busy:
+            thread.start()
+        while sent_groups != ["b"]:
+            time.sleep(0.01)
+        first = threading.Thread(target=run, args=("a1", "a"))
+        first.start()
+        time.sleep(0.2) # Oltre lone_linger_s: il lotto resta aperto perché "b" è in corso
+        run("a2", "a")
+        first.join()
+        release.set()
+        for thread in busy:
+            thread.join()
+
+        self.assertEqual(sent_groups, ["b", "a"])
+        self.assertEqual(results["a1"][0], "Riassunto di a1")
+        self.assertEqual(results["a2"][0], "Riassunto di a2")
+
+
+class TestPackingInSummary(unittest.TestCase):
+    """Uso del packer nella fase di riassunto e richiesta con più testi."""
+
+    def test_section_summary_uses_packer(self):
+        """Le sezioni brevi usano il riassunto del lotto; quelle senza riassunto valido una richiesta singola."""
+        packer = RequestPacker(lambda context, items: _answer_all(context, items, skip=("Note brevi",)), linger_s=5, lone_linger_s=5)
+        packer.max_items = 2
+        router = BackendRouter.default_router()
+        results = {}
+
+        def run(text):
+            task = _SectionSummaryTask("html", "HTML", text, "HTML")
+            results[text] = _run_section_summary(task, "chiave", PromptManager(), None, "Cap", f"Lez {text}",
+                                                 services=RunServices(backend_router=router, request_packer=packer))
+
+        with patch("src.resume_generator.summarize_long_text", return_value=("Riassunto singolo", {"total_tokens": 30})) as mock_summarize:
+            threads = [threading.Thread(target=run, args=(text,)) for text in ("Intro di due minuti", "Note brevi")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results["Intro di due minuti"][0], "Riassunto di Intro di due minuti")
+        summary, usage = results["Note brevi"]
+        self.assertEqual(summary, "Riassunto singolo")
+        self.assertGreater(usage["total_tokens"], 30) # Richiesta singola più la quota del lotto
+        mock_summarize.assert_called_once()
+
+    @patch('src.resume_generator.openai.OpenAI')
+    def test_summarize_packed_items_request(self, mock_openai_constructor):
+        """La richiesta chiede un oggetto JSON, contiene tutti i testi e scala max_tokens sul numero di testi."""
+        usage = SimpleNamespace(prompt_tokens=200, completion_tokens=80, total_tokens=280)
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"1": "A", "2": "B"}'))], usage=usage)
+        mock_openai_constructor.return_value = mock_client
+        route = BackendRouter.default_router().route("orphan_material", 100)
+        items = [PackedItem("1", "orphan_material", "Primo frammento"), PackedItem("2", "orphan_material", "Secondo frammento")]
+
+        response, token_usage = summarize_packed_items(route, items, "chiave", PromptManager())
+
+        self.assertEqual(parse_packed_response(response, ["1", "2"]), {"1": "A", "2": "B"})
+        self.assertEqual(token_usage["total_tokens"], 280)
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs["response_format"], {"type": "json_object"})
+        self.assertEqual(kwargs["max_tokens"], route.max_tokens * 2)
+        self.assertIn("Secondo frammento", kwargs["messages"][-1]["content"])
+
+
+if __name__ == '__main__':
+    unittest.main()
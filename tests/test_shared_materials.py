@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo shared_materials.py.
+
+Verifica l'individuazione degli allegati identici condivisi da più lezioni e
+la loro elaborazione in un corso: un'unica estrazione, un unico riassunto e un
+link dal file di ogni lezione.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.markdown_formatter import MarkdownFormatter
+from src.prompt_manager import PromptManager
+from src.resume_generator import process_course
+from src.shared_materials import SHARED_MATERIALS_DIRNAME, SharedMaterialIndex
+
+VTT_CONTENT = "WEBVTT\n\n00:00:01.000 --> 00:00:05.000\nCiao a tutti\n"
+
+
+class TestSharedMaterialIndex(unittest.TestCase):
+    """Classe di test per SharedMaterialIndex."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, name: str, content: bytes) -> Path:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return path
+
+    def test_identical_attachments_are_grouped(self):
+        """Copie con nomi diversi dello stesso allegato sono un solo documento; gli altri allegati no."""
+        first = self._write("01 - Intro/01_dispensa.pdf", b"%PDF dispensa")
+        copy = self._write("02 - Base/05_dispensa_copia.pdf", b"%PDF dispensa")
+        unique = self._write("02 - Base/05_esercizi.pdf", b"%PDF esercizi")
+        html = self._write("02 - Base/06_dispensa.html", b"%PDF dispensa") # Stesso contenuto, tipo diverso
+
+        index = SharedMaterialIndex.build(
+            [(Path("01.vtt"), [first]), (Path("05.vtt"), [copy, unique]), (Path("06.vtt"), [html])],
+            self.root / "out" / SHARED_MATERIALS_DIRNAME
+        )
+
+        self.assertEqual(len(index.materials), 1)
+        material = index.get(copy)
+        self.assertIs(index.get(first), material)
+        self.assertIsNone(index.get(unique))
+        self.assertIsNone(index.get(html))
+        self.assertEqual(material.source_file, first)
+        self.assertEqual(material.lessons, [Path("01.vtt"), Path("05.vtt")])
+        self.assertTrue(material.link.startswith(f"../{SHARED_MATERIALS_DIRNAME}/01_dispensa_"))
+        self.assertEqual(index.get_stats(), {"documents": 1, "references": 2, "reuses": 1, "tokens_saved": 0})
+
+    def test_attachment_of_a_single_lesson_is_not_shared(self):
+        """Un allegato di una sola lezione (anche se citato più volte) non è condiviso."""
+        pdf = self._write("01_dispensa.pdf", b"%PDF")
+        index = SharedMaterialIndex.build([(Path("01.vtt"), [pdf, pdf])], self.root / SHARED_MATERIALS_DIRNAME)
+        self.assertEqual(index.materials, {})
+        self.assertIsNone(index.get(pdf))
+
+
+class TestSharedMaterialsInCourse(unittest.TestCase):
+    """Elaborazione di un corso con lo stesso PDF allegato a più lezioni."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.course_dir = self.root / "corso"
+        for chapter, prefix in (("01 - Intro", "01"), ("02 - Base", "02")):
+            chapter_dir = self.course_dir / chapter
+            chapter_dir.mkdir(parents=True)
+            (chapter_dir / f"{prefix}_Lezione.vtt").write_text(VTT_CONTENT, encoding="utf-8")
+            (chapter_dir / f"{prefix}_cheatsheet.pdf").write_bytes(b"%PDF-1.4 cheat sheet")
+        self.output_dir = self.root / "out"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_shared_pdf_is_summarized_once(self):
+        """Il PDF comune viene estratto e riassunto una volta; le lezioni vi rimandano con un link."""
+        with patch("src.resume_generator.extract_text_from_pdf", return_value="Comandi principali") as mock_pdf, \
+             patch("src.resume_generator.summarize_long_text", return_value=("Riassunto", {"total_tokens": 10})) as mock_summarize, \
+             patch("src.resume_generator.create_image_describer", return_value=None):
+            report = process_course(str(self.course_dir), str(self.output_dir), MarkdownFormatter(), "chiave", PromptManager())
+
+        mock_pdf.assert_called_once()
+        pdf_calls = [c for c in mock_summarize.call_args_list if c.kwargs["content_type"] == "pdf"]
+        self.assertEqual(len(pdf_calls), 1)
+        self.assertEqual((report.shared_materials, report.shared_material_reuses, report.shared_material_tokens_saved), (1, 1, 10))
+
+        shared_files = list((self.output_dir / SHARED_MATERIALS_DIRNAME).glob("*.md"))
+        self.assertEqual(len(shared_files), 1)
+        self.assertIn("Riassunto", shared_files[0].read_text(encoding="utf-8"))
+        for lesson_file in (self.output_dir / "01 - Intro" / "01_Lezione.md", self.output_dir / "02 - Base" / "02_Lezione.md"):
+            content = lesson_file.read_text(encoding="utf-8")
+            self.assertIn(f"Materiale condiviso: [01_cheatsheet.pdf](../{SHARED_MATERIALS_DIRNAME}/{shared_files[0].name})", content)
+            # Il link è valido a partire dalla directory della lezione
+            self.assertTrue((lesson_file.parent / f"../{SHARED_MATERIALS_DIRNAME}/{shared_files[0].name}").exists())
+
+    def test_rerun_reports_tokens_saved_from_disk(self):
+        """Un'esecuzione successiva riprende il riassunto da disco e stima i token risparmiati dal suo frontmatter."""
+        with patch("src.resume_generator.extract_text_from_pdf", return_value="Comandi principali"), \
+             patch("src.resume_generator.summarize_long_text", return_value=("Riassunto", {"total_tokens": 10})), \
+             patch("src.resume_generator.create_image_describer", return_value=None):
+            process_course(str(self.course_dir), str(self.output_dir), MarkdownFormatter(), "chiave", PromptManager())
+        with patch("src.resume_generator.summarize_long_text") as mock_summarize, \
+             patch("src.resume_generator.create_image_describer", return_value=None):
+            report = process_course(str(self.course_dir), str(self.output_dir), MarkdownFormatter(), "chiave", PromptManager())
+
+        mock_summarize.assert_not_called()
+        self.assertEqual(report.total_tokens, 0)
+        self.assertEqual((report.shared_materials, report.shared_material_reuses, report.shared_material_tokens_saved), (1, 1, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo similarity_index.py.
+
+Verifica le firme MinHash (testi quasi identici, diversi, troppo brevi), la
+persistenza e l'isolamento per ambito dell'indice LSH e il riutilizzo dei
+riassunti di trascrizioni quasi identiche nella fase di riassunto.
+"""
+
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.prompt_manager import PromptManager
+from src.resume_generator import RunServices, _run_section_summary, _SectionSummaryTask
+from src import similarity_index
+from src.similarity_index import SimilarityIndex, estimate_similarity, minhash_signature
+
+
+def make_transcript(seed: int, words: int = 1000) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"parola{i}" for i in range(500)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def edit_transcript(text: str, changes: int) -> str:
+    """Sostituisce alcune parole, come in una riedizione della stessa lezione."""
+    words = text.split()
+    for position in range(0, len(words), len(words) // changes)[:changes]:
+        words[position] = "modificata"
+    return " ".join(words)
+
+
+class TestMinHash(unittest.TestCase):
+    """Classe di test per le firme MinHash."""
+
+    def test_near_duplicates_are_similar(self):
+        """Una trascrizione con poche parole cambiate ha similarità alta; una diversa, bassa."""
+        original = make_transcript(1)
+        near_duplicate = edit_transcript(original, 3)
+        self.assertGreaterEqual(estimate_similarity(minhash_signature(original), minhash_signature(near_duplicate)), 0.9)
+        self.assertLess(estimate_similarity(minhash_signature(original), minhash_signature(make_transcript(2))), 0.1)
+
+    def test_normalization_and_short_texts(self):
+        """Maiuscole e punteggiatura non cambiano la firma; i testi troppo brevi non hanno firma."""
+        text = make_transcript(3)
+        self.assertEqual(minhash_signature(text), minhash_signature(text.upper().replace(" ", ", ")))
+        self.assertIsNone(minhash_signature("Ciao a tutti e benvenuti al corso"))
+
+    def test_matches_exact_integer_arithmetic(self):
+        """Le firme calcolate in NumPy coincidono con quelle calcolate con gli interi Python (indici esistenti compatibili)."""
+        text = make_transcript(5, words=6000) # Più di un blocco di shingle
+        words = text.split()
+        shingles = {
+            similarity_index._hash64(" ".join(words[i:i + similarity_index.SHINGLE_SIZE]).encode("utf-8"))
+            for i in range(len(words) - similarity_index.SHINGLE_SIZE + 1)
+        }
+        prime = similarity_index._MERSENNE_PRIME
+        expected = tuple(min((a * x + b) % prime for x in shingles) for a, b in similarity_index._PERMUTATIONS)
+        self.assertEqual(minhash_signature(text), expected)
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    """Classe di test per SimilarityIndex."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "indice" / "trascrizioni.sqlite"
+        self.scope = SimilarityIndex.make_scope("vtt", "gpt-4o-mini", "abc123")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_lookup_across_runs(self):
+        """Un riassunto registrato viene trovato, riaprendo l'indice, per una trascrizione quasi identica."""
+        original = make_transcript(1)
+        index = SimilarityIndex(self.path)
+        index.add(minhash_signature(original), self.scope, "Riassunto originale", source="Corso 2023/01_Intro")
+        index.add(minhash_signature(make_transcript(2)), self.scope, "Altro riassunto")
+        index.close()
+
+        index = SimilarityIndex(self.path)
+        self.assertEqual(index.count(), 2)
+        summary, similarity, source = index.lookup(minhash_signature(edit_transcript(original, 3)), self.scope)
+        self.assertEqual((summary, source), ("Riassunto originale", "Corso 2023/01_Intro"))
+        self.assertGreaterEqual(similarity, 0.9)
+        self.assertIsNone(index.lookup(minhash_signature(make_transcript(4)), self.scope))
+        self.assertEqual(index.hits, 1)
+        index.close()
+
+    def test_scope_and_threshold(self):
+        """Non si riutilizzano riassunti di un altro prompt o sotto la soglia."""
+        original = make_transcript(1)
+        index = SimilarityIndex(self.path, threshold=0.99)
+        index.add(minhash_signature(original), self.scope, "Riassunto")
+        other_prompt = SimilarityIndex.make_scope("vtt", "gpt-4o-mini", "def456")
+        self.assertIsNone(index.lookup(minhash_signature(original), other_prompt))
+        self.assertIsNone(index.lookup(minhash_signature(edit_transcript(original, 10)), self.scope))
+        self.assertIsNotNone(index.lookup(minhash_signature(original), self.scope))
+        index.close()
+        with self.assertRaises(ValueError):
+            SimilarityIndex(self.path, threshold=0)
+
+    def test_section_summary_reuses_similar_transcript(self):
+        """Il riassunto di una trascrizione quasi identica viene riutilizzato senza chiamare il modello."""
+        index = SimilarityIndex(self.path)
+        services = RunServices(similarity_index=index)
+        prompt_manager = PromptManager()
+        original = make_transcript(1)
+        with patch("src.resume_generator.summarize_long_text", return_value=("Riassunto del corso 2023", {"total_tokens": 50})) as mock_summarize:
+            first = _run_section_summary(_SectionSummaryTask("vtt", "VTT", original, "VTT"), "chiave", prompt_manager, None,
+                                         "01 - Intro", "01_Benvenuto", services=services)
+            second = _run_section_summary(_SectionSummaryTask("vtt", "VTT", edit_transcript(original, 3), "VTT"), "chiave",
+                                          prompt_manager, None, "01 - Intro", "01_Benvenuto_2024", services=services)
+            _run_section_summary(_SectionSummaryTask("pdf", "PDF", original, "PDF"), "chiave", prompt_manager, None,
+                                 "01 - Intro", "01_Benvenuto", services=services)
+
+        self.assertEqual(first, ("Riassunto del corso 2023", {"total_tokens": 50}))
+        self.assertEqual(second, ("Riassunto del corso 2023", None))
+        self.assertEqual(mock_summarize.call_count, 2) # Solo le trascrizioni sono indicizzate
+        self.assertEqual(index.count(), 1)
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
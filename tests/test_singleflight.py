@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo singleflight.py.
+
+Verifica che le chiamate con la stessa chiave presentate in contemporanea
+vengano eseguite una sola volta (anche in caso di errore), che le chiavi
+diverse restino indipendenti e che riassunti e descrizioni delle immagini
+identici in corso condividano un'unica richiesta all'API.
+"""
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from src.image_describer import ImageDescriber
+from src.prompt_manager import PromptManager
+from src.resume_generator import summarize_with_openai
+from src.singleflight import SingleFlight, request_fingerprint
+
+
+def _run_concurrently(function, arguments):
+    """Esegue la funzione da thread diversi, partiti insieme, e restituisce i risultati per argomento."""
+    results = {}
+    barrier = threading.Barrier(len(arguments))
+
+    def worker(index, argument):
+        barrier.wait()
+        results[index] = function(argument)
+
+    threads = [threading.Thread(target=worker, args=(index, argument)) for index, argument in enumerate(arguments)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [results[index] for index in range(len(arguments))]
+
+
+def _slow_completion(content, delay=0.3):
+    """create di prova: risponde dopo un'attesa, per tenere la richiesta in corso."""
+    usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120)
+
+    def create(**kwargs):
+        time.sleep(delay)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+    return create
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Classe di test per SingleFlight."""
+
+    def test_identical_calls_run_once(self):
+        """Le chiamate con la stessa chiave condividono un'unica esecuzione."""
+        flights = SingleFlight()
+        calls = []
+
+        def call():
+            calls.append(1)
+            time.sleep(0.2)
+            return "risultato"
+
+        results = _run_concurrently(lambda _: flights.do("chiave", call), range(4))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], ["risultato"] * 4)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual((flights.coalesced, flights.in_flight()), (3, 0))
+        # Terminata la chiamata, la stessa chiave viene eseguita di nuovo
+        self.assertEqual(flights.do("chiave", lambda: "nuovo"), ("nuovo", False))
+
+    def test_different_keys_and_errors(self):
+        """Le chiavi diverse sono indipendenti; l'errore della chiamata arriva a tutti i chiamanti in attesa."""
+        flights = SingleFlight()
+        results = _run_concurrently(lambda key: flights.do(key, lambda: key), ["a", "b"])
+        self.assertEqual(results, [("a", False), ("b", False)])
+
+        def failing():
+            time.sleep(0.2)
+            raise RuntimeError("timeout")
+
+        def call(_):
+            try:
+                return flights.do("errore", failing)
+            except RuntimeError as e:
+                return str(e)
+
+        self.assertEqual(_run_concurrently(call, range(3)), ["timeout"] * 3)
+        self.assertEqual(request_fingerprint("m", 1, "testo"), request_fingerprint("m", 1, "testo"))
+        self.assertNotEqual(request_fingerprint("m", 1, "testo"), request_fingerprint("m", 2, "testo"))
+
+
+class TestCoalescedRequests(unittest.TestCase):
+    """Richieste identiche in corso verso l'API."""
+
+    @patch('src.resume_generator.openai.OpenAI')
+    def test_identical_summaries_share_one_request(self, mock_openai_constructor):
+        """I riassunti identici in corso usano una sola richiesta e i token sono contabilizzati una volta."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = _slow_completion("Riassunto condiviso")
+        mock_openai_constructor.return_value = mock_client
+        prompt_manager = PromptManager()
+
+        def summarize(text):
+            return summarize_with_openai(text, "chiave-singleflight", prompt_manager, content_type="pdf", lesson_name=text)
+
+        results = _run_concurrently(summarize, ["Stesso PDF", "Stesso PDF", "Altro PDF"])
+
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+        self.assertEqual([summary for summary, _ in results], ["Riassunto condiviso"] * 3)
+        usages = [usage for _, usage in results[:2]]
+        self.assertEqual(sorted(usage is None for usage in usages), [False, True])
+        self.assertEqual(results[2][1]["total_tokens"], 120)
+
+    @patch('src.image_describer.OpenAI')
+    def test_identical_images_share_one_request(self, mock_openai_constructor):
+        """La stessa immagine richiesta in contemporanea viene descritta una sola volta."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = _slow_completion("Un grafico a barre")
+        mock_openai_constructor.return_value = mock_client
+        tracker = MagicMock()
+        describer = ImageDescriber(api_key="chiave", langfuse_tracker=tracker)
+
+        results = _run_concurrently(
+            lambda url: describer.describe_image_url_with_usage(url, detail="low"),
+            ["https://example.com/grafico.png"] * 3
+        )
+
+        mock_client.chat.completions.create.assert_called_once()
+        self.assertEqual([description for description, _ in results], ["Un grafico a barre"] * 3)
+        self.assertEqual(sum(1 for _, usage in results if usage is not None), 1)
+        shared = [call.kwargs["prompt_info"].get("shared_request", False) for call in tracker.track_llm_call.call_args_list]
+        self.assertEqual(sorted(shared), [False, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test sul tempo di avvio della riga di comando.
+
+Verifica che le dipendenze pesanti (openai, langfuse, PyPDF2, webvtt, bs4, NumPy,
+LangChain) non vengano importate all'avvio e che il tempo di import di
+src.resume_generator, misurato con `python -X importtime`, resti sotto una soglia.
+La soglia (in millisecondi) può essere modificata con la variabile
+d'ambiente STARTUP_IMPORT_BUDGET_MS.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["openai", "langfuse", "PyPDF2", "webvtt", "bs4", "langchain_text_splitters", "numpy"]
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "500"))
+
+
+def _run_python(*args):
+    """Esegue un interprete Python separato nella radice del progetto."""
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+    )
+
+
+class TestStartupTime(unittest.TestCase):
+    """Classe di test per il tempo di avvio."""
+
+    def test_heavy_dependencies_not_imported(self):
+        """L'import del modulo e l'analisi degli argomenti (--help) non importano le dipendenze pesanti."""
+        script = (
+            "import json, sys\n"
+            "import src.resume_generator as rg\n"
+            "sys.argv = ['resume_generator', '--help']\n"
+            "try:\n"
+            "    rg.parse_arguments()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]), file=sys.stderr)\n"
+        )
+        result = _run_python("-c", script)
+        loaded = json.loads(result.stderr.strip().splitlines()[-1])
+        self.assertEqual(loaded, [])
+
+    def test_lazy_module_loaded_on_first_use(self):
+        """Il modulo differito viene importato al primo accesso a un attributo."""
+        script = (
+            "import sys\n"
+            "import src.resume_generator as rg\n"
+            "assert 'webvtt' not in sys.modules\n"
+            "rg.webvtt.read\n"
+            "assert 'webvtt' in sys.modules\n"
+        )
+        _run_python("-c", script)
+
+    def test_import_time_below_budget(self):
+        """Il tempo cumulativo di import di src.resume_generator resta sotto la soglia."""
+        timings = []
+        for _ in range(3): # Il minimo di più misure riduce il rumore
+            result = _run_python("-X", "importtime", "-c", "import src.resume_generator")
+            for line in result.stderr.splitlines():
+                fields = [field.strip() for field in line.split("|")]
+                if len(fields) == 3 and fields[2] == "src.resume_generator":
+                    timings.append(int(fields[1]) / 1000.0)
+        self.assertTrue(timings, "Riga di importtime per src.resume_generator non trovata")
+        self.assertLess(
+            min(timings), IMPORT_BUDGET_MS,
+            f"Import di src.resume_generator in {min(timings):.0f} ms (soglia {IMPORT_BUDGET_MS:.0f} ms)"
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test per il modulo text_compressor.py.
+
+Verifica la divisione in frasi, l'ordinamento TextRank, il rispetto del budget
+di token con le frasi conservate nell'ordine originale e l'applicazione della
+compressione in summarize_long_text quando la regola di instradamento la prevede.
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.llm_backend import BackendRouter
+from src.prompt_manager import PromptManager
+from src.resume_generator import summarize_long_text
+from src.text_compressor import MAX_SENTENCE_WORDS, compress_text, rank_sentences, split_sentences
+
+TOPIC_SENTENCES = [
+    "Le liste in Python sono sequenze mutabili di elementi.",
+    "Le liste si creano con le parentesi quadre e gli elementi separati da virgole.",
+    "Gli elementi delle liste si leggono con un indice che parte da zero.",
+    "Il metodo append aggiunge un elemento in fondo alle liste.",
+]
+OFF_TOPIC_SENTENCE = "Ricordate di bere un bicchiere d'acqua durante la pausa."
+
+
+class TestSplitSentences(unittest.TestCase):
+    """Classe di test per split_sentences."""
+
+    def test_sentences_across_caption_lines(self):
+        """Le frasi spezzate su più sottotitoli vengono ricomposte e divise alla punteggiatura."""
+        text = "Ciao a tutti,\noggi parliamo di liste.\nSiete pronti?\nIniziamo!"
+        self.assertEqual(split_sentences(text), ["Ciao a tutti, oggi parliamo di liste.", "Siete pronti?", "Iniziamo!"])
+
+    def test_long_unpunctuated_text(self):
+        """Una trascrizione senza punteggiatura viene divisa in finestre di parole."""
+        text = " ".join(f"parola{i}" for i in range(MAX_SENTENCE_WORDS * 2 + 5))
+        sentences = split_sentences(text)
+        self.assertEqual([len(s.split()) for s in sentences], [MAX_SENTENCE_WORDS, MAX_SENTENCE_WORDS, 5])
+
+
+class TestCompressText(unittest.TestCase):
+    """Classe di test per rank_sentences e compress_text."""
+
+    def test_central_sentences_rank_higher(self):
+        """Le frasi sull'argomento principale hanno punteggio più alto di quella isolata."""
+        scores = rank_sentences(TOPIC_SENTENCES + [OFF_TOPIC_SENTENCE])
+        self.assertAlmostEqual(float(scores.sum()), 1.0, places=6)
+        self.assertEqual(int(scores.argmin()), len(TOPIC_SENTENCES))
+
+    def test_budget_and_original_order(self):
+        """Il testo compresso rispetta il budget e conserva le frasi nell'ordine originale."""
+        sentences = [OFF_TOPIC_SENTENCE] + TOPIC_SENTENCES * 10
+        text = " ".join(sentences)
+        compressed, stats = compress_text(text, token_budget=60)
+
+        self.assertLessEqual(len(compressed), 60 * 4)
+        self.assertNotIn(OFF_TOPIC_SENTENCE, compressed)
+        positions = [text.index(sentence) for sentence in split_sentences(compressed)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual((stats.sentences, stats.chars_before, stats.chars_after), (len(sentences), len(text), len(compressed)))
+        self.assertLess(stats.ratio, 0.5)
+        self.assertEqual(stats.to_dict()["sentences_kept"], len(split_sentences(compressed)))
+
+    def test_short_text_is_unchanged(self):
+        """Un testo entro il budget non viene toccato."""
+        compressed, stats = compress_text("Testo breve.", token_budget=100)
+        self.assertEqual((compressed, stats.ratio, stats.tokens_saved, stats.sentences), ("Testo breve.", 1.0, 0, 0))
+        with self.assertRaises(ValueError):
+            compress_text("Testo", token_budget=0)
+
+
+class TestCompressionInSummary(unittest.TestCase):
+    """Compressione applicata prima della chiamata al modello."""
+
+    def test_route_with_compression_budget(self):
+        """Con compress_tokens nella regola il modello riceve il testo compresso e la compressione viene tracciata."""
+        router = BackendRouter.from_config({"routes": {"orphan_material": [{"compress_tokens": 60}]}})
+        text = " ".join([OFF_TOPIC_SENTENCE] + TOPIC_SENTENCES * 10)
+        tracker = MagicMock()
+        with patch("src.resume_generator.summarize_with_openai", return_value=("Riassunto", None)) as mock_summarize:
+            summarize_long_text(text, "chiave", PromptManager(), langfuse_tracker=tracker, lesson_name="Lez",
+                                content_type="orphan_material", route=router.route("orphan_material", len(text)))
+            summarize_long_text(text, "chiave", PromptManager(), content_type="vtt", route=router.route("vtt", len(text)))
+
+        compressed = mock_summarize.call_args_list[0].kwargs["text_content"]
+        self.assertLessEqual(len(compressed), 60 * 4)
+        self.assertEqual(mock_summarize.call_args_list[1].kwargs["text_content"], text)
+        content_type, stats = tracker.track_text_compression.call_args.args
+        self.assertEqual((content_type, stats["chars_after"]), ("orphan_material", len(compressed)))
+
+
+if __name__ == '__main__':
+    unittest.main()